@@ -14,7 +14,8 @@ TORCH_AVAILABLE = False
 TORCH_ERROR = None
 try:
     import torch
-    from torch.utils.data import TensorDataset, DataLoader
+    from torch.utils.data import DataLoader
+    from models.sequence_dataset import SequenceDataset
     from models.qlib_transformer import QlibTransformer as QlibStyleTransformer
     TORCH_AVAILABLE = True
 except (ImportError, OSError) as e:
@@ -31,13 +32,13 @@ from datetime import datetime
 # Qlib 风格组件
 from strategy.factors.qlib_style_data_handler import DataMasking, TimeSeriesSplitter
 from strategy.factors.ref_operator import RefOperator
+from strategy.factors.factor_store import FactorStore
 from models.qlib_metrics import QlibMetrics
 
 # 导入训练脚本的函数
 from train_transformer_with_real_data import (
     load_historical_data,
-    prepare_features_and_labels,
-    create_sequences
+    prepare_features_and_labels
 )
 
 if not TORCH_AVAILABLE:
@@ -47,6 +48,15 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def _get_factor_store(args):
+    """根据命令行参数创建因子缓存"""
+    return None if args.no_factor_cache else FactorStore(args.factor_cache)
+
+
+def _dataset_name(args):
+    return os.path.splitext(os.path.basename(args.data))[0]
+
+
 def load_model(model_path, n_features, seq_len, d_model=128, nhead=4, num_layers=2):
     """加载训练好的模型"""
     if not TORCH_AVAILABLE:
@@ -229,7 +239,9 @@ def backtest_transformer(args):
     df = load_historical_data(args.data)
 
     # 2. 准备特征和标签
-    features, labels = prepare_features_and_labels(df, args.ic_threshold)
+    features, labels = prepare_features_and_labels(
+        df, args.ic_threshold, _get_factor_store(args), _dataset_name(args)
+    )
 
     # 3. 时间序列分割
     splitter = TimeSeriesSplitter()
@@ -242,20 +254,16 @@ def backtest_transformer(args):
     test_df = df.iloc[test_start_idx:test_start_idx + len(y_test)].reset_index(drop=True)
 
     # 4. 创建序列数据
-    X_test_seq, y_test_seq = create_sequences(X_test, y_test, args.seq_len)
+    test_dataset = SequenceDataset(X_test, y_test, args.seq_len)
 
     # 获取对应的价格和时间戳
     test_prices = test_df['close'].values[args.seq_len:]
     test_timestamps = test_df['timestamp'].values[args.seq_len:]
 
-    logger.info(f"测试集序列: {X_test_seq.shape}")
+    logger.info(f"测试集序列: {len(test_dataset)} × ({args.seq_len}, {test_dataset.n_features})")
     logger.info(f"测试集价格: {len(test_prices)}")
 
     # 5. 创建 DataLoader
-    test_dataset = TensorDataset(
-        torch.FloatTensor(X_test_seq),
-        torch.FloatTensor(y_test_seq)
-    )
     test_loader = DataLoader(test_dataset, batch_size=args.batch_size, shuffle=False)
 
     # 6. 加载模型
@@ -290,7 +298,7 @@ def backtest_transformer(args):
         'timestamp': datetime.now().isoformat(),
         'model': 'Qlib Transformer',
         'data_file': args.data,
-        'test_samples': len(y_test_seq),
+        'test_samples': len(test_dataset),
         'evaluation_metrics': {
             'ic': float(eval_metrics['ic']),
             'rank_ic': float(eval_metrics['rank_ic']),
@@ -335,7 +343,9 @@ def backtest_randomforest_fallback(args):
     df = load_historical_data(args.data)
 
     # 2. 准备特征和标签
-    features, labels = prepare_features_and_labels(df, args.ic_threshold)
+    features, labels = prepare_features_and_labels(
+        df, args.ic_threshold, _get_factor_store(args), _dataset_name(args)
+    )
 
     # 3. 时间序列分割
     n_train = int(len(labels) * (1 - args.test_size))
@@ -414,6 +424,10 @@ def main():
                        help='测试集比例')
     parser.add_argument('--transaction-cost', type=float, default=0.001,
                        help='交易成本 (0.1%)')
+    parser.add_argument('--factor-cache', type=str, default='data/cache/factors',
+                       help='因子缓存目录')
+    parser.add_argument('--no-factor-cache', action='store_true',
+                       help='禁用因子缓存，每次重新计算')
 
     # 模型参数
     parser.add_argument('--seq-len', type=int, default=60,
@@ -0,0 +1,318 @@
+"""
+CPU Training - QlibTransformer 的 CPU 训练模式
+
+针对只有 CPU 的训练机：
+- 可配置 intra-op / inter-op 线程数
+- bf16 autocast（CPU 原生支持 bf16 时显著加速矩阵乘法，损失仍以 float32 计算）
+- torch.compile（可用时），编译失败自动回退 eager 模式
+- 后台线程预取批次：窗口 gather 与前向/反向计算重叠（CUDA 设备时使用 pinned memory）
+- 梯度累积：小批次占用内存，大批次的有效步长
+- 每个 epoch 只在验证集的固定抽样子集上计算 IC，最终评估再使用完整验证集
+
+数据集需提供 SequenceDataset 的 iter_batches / labels 接口
+"""
+
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
+import numpy as np
+import torch
+import torch.nn as nn
+import logging
+
+from .qlib_metrics import QlibMetrics
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CPUTrainingConfig:
+    """CPU 训练配置"""
+    num_threads: Optional[int] = None       # intra-op 线程数，None 使用 torch 默认（物理核数）
+    interop_threads: Optional[int] = None   # inter-op 线程数
+    bf16: bool = False                      # bf16 autocast
+    compile: bool = False                   # torch.compile
+    batch_size: int = 256
+    grad_accum_steps: int = 1               # 梯度累积步数（有效批大小 = batch_size * grad_accum_steps）
+    prefetch: int = 2                       # 预取批次数，0 表示不预取
+    eval_samples: Optional[int] = 20000     # 每个 epoch 验证抽样数，None 表示完整验证集
+    eval_batch_size: Optional[int] = None   # 验证批大小，默认 4 * batch_size
+    max_grad_norm: Optional[float] = None   # 梯度裁剪
+    shuffle: bool = False
+    seed: int = 42
+    log_every: int = 5
+
+
+def configure_threads(num_threads: Optional[int] = None,
+                      interop_threads: Optional[int] = None):
+    """设置 torch 线程数（inter-op 线程数只能在进程内首次并行计算前设置）"""
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    if interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError as e:
+            logger.warning(f"Cannot set inter-op threads: {e}")
+    logger.info(f"Torch threads: intra-op {torch.get_num_threads()}, "
+                f"inter-op {torch.get_num_interop_threads()}")
+
+
+def bf16_supported() -> bool:
+    """CPU 是否原生支持 bf16 计算"""
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except Exception:
+        return False
+
+
+def prefetch(batches: Iterator, depth: int = 2, pin_memory: bool = False) -> Iterator:
+    """
+    在后台线程预取批次
+
+    Args:
+        batches: 批次迭代器
+        depth: 预取深度，<= 0 时直接返回原迭代器
+        pin_memory: 是否把张量放入 pinned memory（仅向 CUDA 设备拷贝时有意义）
+    """
+    if depth <= 0:
+        yield from batches
+        return
+
+    buffer: queue.Queue = queue.Queue(maxsize=depth)
+    done = object()
+    stop = threading.Event()
+
+    def _pin(batch):
+        return tuple(t.pin_memory() if isinstance(t, torch.Tensor) else t for t in batch)
+
+    def _producer():
+        try:
+            for batch in batches:
+                if stop.is_set():
+                    return
+                buffer.put(_pin(batch) if pin_memory else batch)
+        except BaseException as e:
+            buffer.put(e)
+            return
+        buffer.put(done)
+
+    worker = threading.Thread(target=_producer, name="batch-prefetch", daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is done:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        # 释放生产者（可能阻塞在 put 上）
+        while worker.is_alive():
+            try:
+                buffer.get_nowait()
+            except queue.Empty:
+                worker.join(0.01)
+
+
+class CPUTrainer:
+    """
+    QlibTransformer 的 CPU 训练器
+
+    用法：
+        trainer = CPUTrainer(model, CPUTrainingConfig(num_threads=32, bf16=True))
+        history = trainer.fit(train_dataset, val_dataset, epochs=100)
+        preds = trainer.predict(val_dataset)
+    """
+
+    def __init__(self, model: nn.Module, config: Optional[CPUTrainingConfig] = None,
+                 optimizer: Optional[torch.optim.Optimizer] = None,
+                 criterion: Optional[nn.Module] = None,
+                 learning_rate: float = 1e-4, weight_decay: float = 1e-5,
+                 device: str = 'cpu'):
+        self.config = config or CPUTrainingConfig()
+        self.device = torch.device(device)
+        configure_threads(self.config.num_threads, self.config.interop_threads)
+
+        self.model = model.to(self.device)
+        self.optimizer = optimizer or torch.optim.Adam(
+            self.model.parameters(), lr=learning_rate, weight_decay=weight_decay
+        )
+        self.criterion = criterion or nn.MSELoss()
+
+        self.bf16 = self.config.bf16
+        if self.bf16 and self.device.type == 'cpu' and not bf16_supported():
+            logger.warning("CPU has no native bf16 support, autocast may be slower than float32")
+
+        # 编译后的模块与原模块共享参数，state_dict 仍从 self.model 读取
+        self._forward_module = self.model
+        if self.config.compile:
+            if hasattr(torch, 'compile'):
+                self._forward_module = torch.compile(self.model)
+            else:
+                logger.warning("torch.compile not available, using eager mode")
+
+        self._generator = torch.Generator().manual_seed(self.config.seed)
+        self.history: Dict[str, List[float]] = {
+            'train_loss': [], 'val_loss': [], 'ic': [], 'rank_ic': [], 'epoch_time': []
+        }
+        self.best_ic = -np.inf
+        self.best_epoch = -1
+
+    # ==================== 训练 ====================
+
+    def fit(self, train_dataset, val_dataset=None, epochs: int = 100) -> Dict[str, List[float]]:
+        """
+        训练模型
+
+        Args:
+            train_dataset: 训练集（SequenceDataset）
+            val_dataset: 验证集（SequenceDataset），每个 epoch 在抽样子集上计算 IC
+            epochs: 训练轮数
+
+        Returns:
+            训练历史
+        """
+        eval_indices = None
+        if val_dataset is not None:
+            eval_indices = self.eval_indices(len(val_dataset), self.config.eval_samples)
+            logger.info(f"Validation subset: {len(eval_indices)}/{len(val_dataset)} samples")
+
+        for epoch in range(epochs):
+            start = time.perf_counter()
+            train_loss = self.train_epoch(train_dataset)
+            self.history['train_loss'].append(train_loss)
+
+            message = f"Epoch {epoch+1:3d}/{epochs} | Train Loss: {train_loss:.6f}"
+            if val_dataset is not None:
+                metrics = self.evaluate(val_dataset, eval_indices)
+                self.history['val_loss'].append(metrics['loss'])
+                self.history['ic'].append(metrics['ic'])
+                self.history['rank_ic'].append(metrics['rank_ic'])
+                if metrics['ic'] > self.best_ic:
+                    self.best_ic = metrics['ic']
+                    self.best_epoch = epoch
+                message += (f" | Val Loss: {metrics['loss']:.6f}"
+                            f" | IC: {metrics['ic']:.4f}"
+                            f" | Rank IC: {metrics['rank_ic']:.4f}")
+
+            elapsed = time.perf_counter() - start
+            self.history['epoch_time'].append(elapsed)
+            if (epoch + 1) % self.config.log_every == 0 or epoch == 0:
+                logger.info(f"{message} | {elapsed:.1f}s")
+
+        return self.history
+
+    def train_epoch(self, dataset) -> float:
+        """训练一个 epoch，返回平均损失"""
+        config = self.config
+        accum = max(config.grad_accum_steps, 1)
+        self.model.train()
+        self.optimizer.zero_grad(set_to_none=True)
+
+        total_loss = 0.0
+        n_batches = 0
+        group_samples = 0
+        batches = dataset.iter_batches(config.batch_size, shuffle=config.shuffle,
+                                       generator=self._generator)
+
+        for X_batch, y_batch in self._prefetched(batches):
+            loss = self._loss(X_batch, y_batch)
+            # 按样本数加权累积，step 前再除以累积的样本数，与同样大小的单个批次等价
+            (loss * len(y_batch)).backward()
+            group_samples += len(y_batch)
+            total_loss += loss.item()
+            n_batches += 1
+            if n_batches % accum == 0:
+                self._step(group_samples)
+                group_samples = 0
+
+        if group_samples:
+            self._step(group_samples)
+
+        return total_loss / max(n_batches, 1)
+
+    # ==================== 评估 ====================
+
+    @staticmethod
+    def eval_indices(n: int, n_samples: Optional[int]) -> np.ndarray:
+        """验证集抽样：等间隔取样，覆盖整个验证区间且各 epoch 固定"""
+        if n_samples is None or n_samples >= n:
+            return np.arange(n)
+        return np.linspace(0, n - 1, n_samples).round().astype(np.int64)
+
+    @torch.no_grad()
+    def predict(self, dataset, indices: Optional[np.ndarray] = None) -> np.ndarray:
+        """预测（默认完整数据集）"""
+        preds, _ = self._predict_with_labels(dataset, indices)
+        return preds
+
+    @torch.no_grad()
+    def evaluate(self, dataset, indices: Optional[np.ndarray] = None) -> Dict[str, float]:
+        """
+        计算损失、IC 和 Rank IC
+
+        Args:
+            dataset: 验证集
+            indices: 只在这些样本上评估（默认完整数据集）
+        """
+        preds, labels = self._predict_with_labels(dataset, indices)
+        loss = float(np.mean((preds - labels) ** 2)) if len(preds) else np.nan
+        return {
+            'loss': loss,
+            'ic': QlibMetrics.information_coefficient(preds, labels),
+            'rank_ic': QlibMetrics.rank_ic(preds, labels),
+        }
+
+    # ==================== 内部实现 ====================
+
+    def _predict_with_labels(self, dataset, indices: Optional[np.ndarray]):
+        self.model.eval()
+        batch_size = self.config.eval_batch_size or 4 * self.config.batch_size
+        preds, labels = [], []
+        for X_batch, y_batch in self._prefetched(dataset.iter_batches(batch_size, indices=indices)):
+            with self._autocast():
+                y_pred = self._forward(X_batch.to(self.device, non_blocking=True))
+            preds.append(y_pred.float().reshape(-1).cpu().numpy())
+            if y_batch is not None:
+                labels.append(y_batch.numpy())
+        preds = np.concatenate(preds) if preds else np.empty(0, dtype=np.float32)
+        labels = np.concatenate(labels) if labels else np.empty(0, dtype=np.float32)
+        return preds.astype(np.float64), labels.astype(np.float64)
+
+    def _loss(self, X_batch: torch.Tensor, y_batch: torch.Tensor) -> torch.Tensor:
+        X_batch = X_batch.to(self.device, non_blocking=True)
+        y_batch = y_batch.to(self.device, non_blocking=True)
+        with self._autocast():
+            y_pred = self._forward(X_batch)
+        # 损失以 float32 计算
+        return self.criterion(y_pred.float().reshape(-1), y_batch)
+
+    def _forward(self, X: torch.Tensor) -> torch.Tensor:
+        if self._forward_module is self.model:
+            return self.model(X)
+        try:
+            return self._forward_module(X)
+        except Exception as e:
+            logger.warning(f"torch.compile failed, falling back to eager mode: {e}")
+            self._forward_module = self.model
+            return self.model(X)
+
+    def _step(self, n_samples: int):
+        for param in self.model.parameters():
+            if param.grad is not None:
+                param.grad.div_(n_samples)
+        if self.config.max_grad_norm:
+            nn.utils.clip_grad_norm_(self.model.parameters(), self.config.max_grad_norm)
+        self.optimizer.step()
+        self.optimizer.zero_grad(set_to_none=True)
+
+    def _autocast(self):
+        return torch.autocast(device_type=self.device.type, dtype=torch.bfloat16,
+                              enabled=self.bf16)
+
+    def _prefetched(self, batches: Iterator) -> Iterator:
+        return prefetch(batches, self.config.prefetch, pin_memory=self.device.type == 'cuda')
@@ -0,0 +1,497 @@
+"""
+Hyperparameter Search - 本地超参数搜索
+
+不依赖外部服务，在本机进程池上并行运行 trial：
+- 搜索策略：随机搜索（中位数剪枝）或 successive halving（按 rung 淘汰，幸存者从检查点继续训练）
+- 剪枝：trial 每个 epoch 上报验证 IC，预热若干 epoch 后低于同一 epoch 其他 trial 中位数的提前停止
+- 共享特征：特征矩阵只写一次 .npy，各工作进程以内存映射方式读取，不随任务序列化复制
+- 每个 trial 结束后追加一行到本地结果表（JSON Lines），可随时用 load_results 读取
+
+目标函数需为模块级函数（可被进程池序列化）：
+
+    def objective(trial: TrialContext) -> Optional[float]:
+        X = trial.data('X_train')
+        for epoch in range(trial.start_epoch, trial.epochs):
+            ...
+            if trial.report(epoch, ic):
+                break               # 被剪枝
+        trial.save_checkpoint(state)  # successive halving 下一 rung 从这里继续
+
+    search = HyperparameterSearch(objective, {'d_model': Choice([64, 128]),
+                                              'learning_rate': Uniform(1e-5, 1e-3, log=True)})
+    best = search.run(n_trials=32)
+"""
+
+import json
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+import logging
+
+logger = logging.getLogger(__name__)
+
+STRATEGIES = ('random', 'successive_halving')
+
+# ==================== 搜索空间 ====================
+
+
+@dataclass
+class Choice:
+    """离散取值"""
+    values: Sequence[Any]
+
+    def sample(self, rng: np.random.Generator):
+        value = self.values[rng.integers(len(self.values))]
+        return value.item() if isinstance(value, np.generic) else value
+
+
+@dataclass
+class Uniform:
+    """连续均匀分布（log=True 时在对数空间均匀）"""
+    low: float
+    high: float
+    log: bool = False
+
+    def sample(self, rng: np.random.Generator) -> float:
+        if self.log:
+            return float(math.exp(rng.uniform(math.log(self.low), math.log(self.high))))
+        return float(rng.uniform(self.low, self.high))
+
+
+@dataclass
+class IntUniform:
+    """整数均匀分布（包含两端）"""
+    low: int
+    high: int
+    step: int = 1
+
+    def sample(self, rng: np.random.Generator) -> int:
+        n = (self.high - self.low) // self.step + 1
+        return int(self.low + self.step * rng.integers(n))
+
+
+def sample_params(space: Dict[str, Any], rng: np.random.Generator,
+                  constraint: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                  max_attempts: int = 100) -> Dict[str, Any]:
+    """
+    从搜索空间采样一组参数
+
+    Args:
+        space: {参数名: Choice / Uniform / IntUniform / 固定值}
+        rng: 随机数生成器
+        constraint: 参数约束（如 d_model 能被 nhead 整除），不满足时重新采样
+    """
+    for _ in range(max_attempts):
+        params = {name: spec.sample(rng) if hasattr(spec, 'sample') else spec
+                  for name, spec in space.items()}
+        if constraint is None or constraint(params):
+            return params
+    raise ValueError(f"No valid parameters found in {max_attempts} attempts")
+
+
+# ==================== Trial ====================
+
+
+@dataclass
+class TrialResult:
+    """单个 trial（successive halving 中为单个 rung）的结果"""
+    trial_id: int
+    params: Dict[str, Any]
+    status: str = 'completed'       # completed / pruned / failed
+    score: float = float('nan')     # 上报的最佳 IC
+    epochs: int = 0                 # 已训练的 epoch 数
+    rung: int = 0
+    history: List[float] = field(default_factory=list)
+    elapsed: float = 0.0
+    error: Optional[str] = None
+    checkpoint: Any = field(default=None, repr=False)
+
+
+# 工作进程内共享特征的内存映射缓存 {路径: 数组}
+_shared_arrays: Dict[str, np.ndarray] = {}
+
+
+class TrialContext:
+    """
+    目标函数看到的 trial 接口：参数、训练预算、共享特征、剪枝上报与检查点
+    """
+
+    def __init__(self, trial_id: int, params: Dict[str, Any], epochs: int,
+                 start_epoch: int = 0, checkpoint: Any = None, seed: int = 0,
+                 data_paths: Optional[Dict[str, str]] = None, reports=None,
+                 prune_after: int = 3, prune_percentile: float = 50.0,
+                 prune_min_trials: int = 4, min_score: Optional[float] = None):
+        self.trial_id = trial_id
+        self.params = params
+        self.epochs = epochs
+        self.start_epoch = start_epoch
+        self.checkpoint = checkpoint
+        self.seed = seed
+        self.data_paths = data_paths or {}
+        self.history: List[float] = []
+        self.pruned = False
+
+        self._reports = reports
+        self._prune_after = prune_after
+        self._prune_percentile = prune_percentile
+        self._prune_min_trials = prune_min_trials
+        self._min_score = min_score
+        self._saved_checkpoint = None
+
+    def data(self, name: str) -> np.ndarray:
+        """共享特征（只读内存映射，同一进程内只打开一次）"""
+        path = self.data_paths[name]
+        array = _shared_arrays.get(path)
+        if array is None:
+            array = np.load(path, mmap_mode='r')
+            _shared_arrays[path] = array
+        return array
+
+    def report(self, epoch: int, value: float) -> bool:
+        """
+        上报一个 epoch 的验证指标（IC）
+
+        Returns:
+            是否应剪枝（目标函数应停止训练）
+        """
+        value = float(value)
+        self.history.append(value)
+        if self._reports is None:
+            return False
+
+        others = [v for trial_id, e, v in list(self._reports)
+                  if e == epoch and trial_id != self.trial_id and np.isfinite(v)]
+        self._reports.append((self.trial_id, epoch, value))
+
+        if epoch + 1 < self._prune_after:
+            return False
+        if self._min_score is not None and not value >= self._min_score:
+            self.pruned = True
+        elif len(others) >= self._prune_min_trials:
+            self.pruned = not value >= np.percentile(others, self._prune_percentile)
+        return self.pruned
+
+    def save_checkpoint(self, state: Any):
+        """保存训练状态（successive halving 的下一 rung 通过 trial.checkpoint 继续训练）"""
+        self._saved_checkpoint = state
+
+    @property
+    def best(self) -> float:
+        finite = [v for v in self.history if np.isfinite(v)]
+        return max(finite) if finite else float('nan')
+
+
+def _init_worker(threads: Optional[int]):
+    """工作进程初始化：限制每个进程的计算线程数，避免多进程超额订阅"""
+    if not threads:
+        return
+    for name in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[name] = str(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+def _run_trial(objective: Callable, context: TrialContext, rung: int) -> TrialResult:
+    """进程池入口（模块级函数以便序列化）"""
+    start = time.perf_counter()
+    result = TrialResult(trial_id=context.trial_id, params=context.params, rung=rung)
+    try:
+        value = objective(context)
+        result.status = 'pruned' if context.pruned else 'completed'
+        result.score = context.best if value is None or not np.isfinite(value) else float(value)
+    except Exception as e:
+        logger.error(f"Trial {context.trial_id} failed: {e}", exc_info=True)
+        result.status = 'failed'
+        result.error = f"{type(e).__name__}: {e}"
+    result.history = context.history
+    result.epochs = context.start_epoch + len(context.history)
+    result.checkpoint = context._saved_checkpoint
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+# ==================== 搜索驱动 ====================
+
+
+class HyperparameterSearch:
+    """
+    本地并行超参数搜索
+
+    用法：
+        search = HyperparameterSearch(objective, space, strategy='successive_halving',
+                                      max_epochs=27, min_epochs=3, n_jobs=8,
+                                      shared_data={'X_train': X_train, 'y_train': y_train})
+        best = search.run(n_trials=27)
+        table = search.results_table()
+    """
+
+    def __init__(self, objective: Callable[[TrialContext], Optional[float]],
+                 space: Dict[str, Any], strategy: str = 'random',
+                 max_epochs: int = 20, min_epochs: int = 3, reduction_factor: int = 3,
+                 n_jobs: Optional[int] = None, worker_threads: Optional[int] = 1,
+                 shared_data: Optional[Dict[str, Any]] = None,
+                 work_dir: str = "data/hpo", study_name: str = "default",
+                 prune_percentile: float = 50.0, prune_min_trials: int = 4,
+                 min_score: Optional[float] = None,
+                 constraint: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                 mp_context: Optional[str] = None, seed: int = 42):
+        """
+        Args:
+            objective: 目标函数 objective(trial) -> 分数（None 时取上报的最佳值）
+            space: 搜索空间
+            strategy: 'random'（中位数剪枝）/ 'successive_halving'
+            max_epochs: 每个 trial 的最大 epoch 数
+            min_epochs: 剪枝前的预热 epoch 数 / successive halving 第一个 rung 的 epoch 数
+            reduction_factor: successive halving 每个 rung 保留 1/reduction_factor
+            n_jobs: 并行进程数，默认 CPU 核数
+            worker_threads: 每个工作进程的计算线程数
+            shared_data: {名称: 数组或 .npy 路径}，数组会写入 work_dir 供工作进程内存映射
+            work_dir: 共享特征和结果表目录
+            study_name: 搜索名称（结果表文件名）
+            prune_percentile: 低于同一 epoch 其他 trial 该分位数时剪枝
+            prune_min_trials: 至少有这么多其他 trial 上报后才剪枝
+            min_score: 预热后低于该值直接剪枝
+            constraint: 参数约束
+            mp_context: 进程启动方式（'fork' / 'spawn'），None 使用平台默认
+            seed: 随机种子
+        """
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown strategy: {strategy}")
+
+        self.objective = objective
+        self.space = space
+        self.strategy = strategy
+        self.max_epochs = max_epochs
+        self.min_epochs = min(min_epochs, max_epochs)
+        self.reduction_factor = max(reduction_factor, 2)
+        self.n_jobs = n_jobs or os.cpu_count() or 1
+        self.worker_threads = worker_threads
+        self.work_dir = work_dir
+        self.study_name = study_name
+        self.prune_percentile = prune_percentile
+        self.prune_min_trials = prune_min_trials
+        self.min_score = min_score
+        self.constraint = constraint
+        self.mp_context = mp_context
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+
+        os.makedirs(work_dir, exist_ok=True)
+        self.results_path = os.path.join(work_dir, f"{study_name}_trials.jsonl")
+        self.data_paths = self._share(shared_data or {})
+        self.results: List[TrialResult] = []
+
+        logger.info(f"HyperparameterSearch initialized: {study_name} ({strategy}, "
+                    f"{self.n_jobs} workers, max_epochs={max_epochs})")
+
+    def run(self, n_trials: int = 20) -> Optional[TrialResult]:
+        """
+        运行搜索
+
+        Args:
+            n_trials: trial 数（successive halving 为第一个 rung 的 trial 数）
+
+        Returns:
+            最佳 trial
+        """
+        start = time.perf_counter()
+        param_sets = [sample_params(self.space, self.rng, self.constraint) for _ in range(n_trials)]
+        first_id = 1 + max((r.trial_id for r in self.results), default=-1)
+        trials = {first_id + i: params for i, params in enumerate(param_sets)}
+
+        if self.strategy == 'random':
+            self._run_random(trials)
+        else:
+            self._run_successive_halving(trials)
+
+        best = self.best()
+        logger.info(f"Search finished: {n_trials} trials in {time.perf_counter() - start:.1f}s")
+        if best is not None:
+            logger.info(f"Best trial {best.trial_id}: score {best.score:.4f}, params {best.params}")
+        return best
+
+    def best(self) -> Optional[TrialResult]:
+        """分数最高的 trial（successive halving 中取最后一个 rung 的结果）"""
+        latest: Dict[int, TrialResult] = {}
+        for result in self.results:
+            latest[result.trial_id] = result
+        candidates = [r for r in latest.values()
+                      if r.status != 'failed' and np.isfinite(r.score)]
+        if not candidates:
+            return None
+        # 训练更充分的 trial 优先（successive halving 中幸存者），其次比较分数
+        return max(candidates, key=lambda r: (r.epochs, r.score))
+
+    def results_table(self) -> pd.DataFrame:
+        """本次搜索（及同名历史搜索）的结果表"""
+        return load_results(self.results_path)
+
+    # ==================== 搜索策略 ====================
+
+    def _run_random(self, trials: Dict[int, Dict[str, Any]]):
+        """随机搜索：所有 trial 训练 max_epochs，通过共享的中间结果做中位数剪枝"""
+        pool, manager = self._start_pool(shared_reports=True)
+        try:
+            # 中间结果 (trial_id, epoch, value)：并行时由 Manager 进程托管，各 trial 共享
+            reports = manager.list() if manager is not None else []
+            contexts = [self._context(trial_id, params, self.max_epochs, reports=reports)
+                        for trial_id, params in trials.items()]
+            for result in self._submit(pool, contexts, rung=0):
+                self._record(result)
+        finally:
+            self._stop_pool(pool, manager)
+
+    def _run_successive_halving(self, trials: Dict[int, Dict[str, Any]]):
+        """
+        Successive halving：所有 trial 先训练 min_epochs，每个 rung 保留分数最高的
+        1/reduction_factor，幸存者从检查点继续训练到 reduction_factor 倍的 epoch 数
+        """
+        budgets = []
+        epochs = self.min_epochs
+        while epochs < self.max_epochs:
+            budgets.append(epochs)
+            epochs *= self.reduction_factor
+        budgets.append(self.max_epochs)
+
+        survivors: Dict[int, Optional[TrialResult]] = {trial_id: None for trial_id in trials}
+        pool, manager = self._start_pool(shared_reports=False)
+        try:
+            for rung, budget in enumerate(budgets):
+                contexts = [
+                    self._context(trial_id, trials[trial_id], budget,
+                                  start_epoch=previous.epochs if previous else 0,
+                                  checkpoint=previous.checkpoint if previous else None)
+                    for trial_id, previous in survivors.items()
+                ]
+                finished = list(self._submit(pool, contexts, rung=rung))
+
+                ranked = sorted((r for r in finished if r.status != 'failed' and np.isfinite(r.score)),
+                                key=lambda r: r.score, reverse=True)
+                is_last = rung == len(budgets) - 1
+                keep = len(ranked) if is_last else max(1, len(survivors) // self.reduction_factor)
+                kept = {r.trial_id for r in ranked[:keep]}
+
+                for result in finished:
+                    if result.trial_id not in kept:
+                        result.checkpoint = None
+                        if result.status == 'completed':
+                            result.status = 'pruned'
+                    self._record(result)
+
+                logger.info(f"Rung {rung} ({budget} epochs): {len(finished)} trials, "
+                            f"{len(kept)} promoted")
+                survivors = {r.trial_id: r for r in finished if r.trial_id in kept}
+                if is_last or not survivors:
+                    break
+        finally:
+            self._stop_pool(pool, manager)
+
+    # ==================== 内部实现 ====================
+
+    def _context(self, trial_id: int, params: Dict[str, Any], epochs: int,
+                 start_epoch: int = 0, checkpoint: Any = None, reports=None) -> TrialContext:
+        return TrialContext(
+            trial_id, params, epochs, start_epoch=start_epoch, checkpoint=checkpoint,
+            seed=self.seed + trial_id, data_paths=self.data_paths, reports=reports,
+            prune_after=self.min_epochs, prune_percentile=self.prune_percentile,
+            prune_min_trials=self.prune_min_trials, min_score=self.min_score
+        )
+
+    def _start_pool(self, shared_reports: bool):
+        """启动进程池（n_jobs <= 1 时串行，返回 (None, None)）"""
+        if self.n_jobs <= 1:
+            return None, None
+        context = multiprocessing.get_context(self.mp_context)
+        manager = context.Manager() if shared_reports else None
+        pool = ProcessPoolExecutor(max_workers=self.n_jobs, mp_context=context,
+                                   initializer=_init_worker, initargs=(self.worker_threads,))
+        return pool, manager
+
+    @staticmethod
+    def _stop_pool(pool: Optional[ProcessPoolExecutor], manager):
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        if manager is not None:
+            manager.shutdown()
+
+    def _submit(self, pool: Optional[ProcessPoolExecutor], contexts: List[TrialContext],
+                rung: int) -> Iterator[TrialResult]:
+        """运行一批 trial，按完成顺序产出结果"""
+        if pool is None:
+            for context in contexts:
+                yield _run_trial(self.objective, context, rung)
+            return
+        futures = [pool.submit(_run_trial, self.objective, context, rung) for context in contexts]
+        for future in as_completed(futures):
+            yield future.result()
+
+    def _share(self, shared_data: Dict[str, Any]) -> Dict[str, str]:
+        """把共享数组写入 work_dir/shared/，返回 {名称: .npy 路径}"""
+        paths = {}
+        shared_dir = os.path.join(self.work_dir, 'shared', self.study_name)
+        for name, value in shared_data.items():
+            if isinstance(value, str):
+                paths[name] = value
+                continue
+            if isinstance(value, (pd.DataFrame, pd.Series)):
+                value = value.to_numpy()
+            os.makedirs(shared_dir, exist_ok=True)
+            path = os.path.join(shared_dir, f"{name}.npy")
+            np.save(path, np.ascontiguousarray(value))
+            paths[name] = path
+        return paths
+
+    def _record(self, result: TrialResult):
+        """记录结果并追加到结果表"""
+        self.results.append(result)
+        record = {
+            'study': self.study_name,
+            'trial_id': result.trial_id,
+            'rung': result.rung,
+            'status': result.status,
+            'score': None if not np.isfinite(result.score) else result.score,
+            'epochs': result.epochs,
+            'elapsed': round(result.elapsed, 3),
+            'params': result.params,
+            'history': [None if not np.isfinite(v) else v for v in result.history],
+            'error': result.error,
+            'timestamp': time.time(),
+        }
+        with open(self.results_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, default=_json_default) + "\n")
+
+        score = f"{result.score:.4f}" if np.isfinite(result.score) else "nan"
+        logger.info(f"Trial {result.trial_id} [rung {result.rung}] {result.status}: "
+                    f"score {score}, {result.epochs} epochs, {result.elapsed:.1f}s, {result.params}")
+
+
+def load_results(path: str) -> pd.DataFrame:
+    """
+    读取结果表（参数展开为 param_<name> 列），按分数降序排列
+    """
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    with open(path, 'r', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    rows = []
+    for record in records:
+        params = record.pop('params', {})
+        record.pop('history', None)
+        rows.append({**record, **{f"param_{k}": v for k, v in params.items()}})
+    table = pd.DataFrame(rows)
+    return table.sort_values('score', ascending=False, na_position='last').reset_index(drop=True)
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -5,7 +5,7 @@ Qlib 风格评估指标
 
 import numpy as np
 import pandas as pd
-from typing import Dict, List, Tuple, Optional
+from typing import Callable, Dict, List, Tuple, Optional
 try:
     from scipy import stats
     _has_scipy = True
@@ -121,55 +121,90 @@ class QlibMetrics:
         Returns:
             分位数分析结果字典
         """
-        # 移除 NaN 值
-        mask = ~(np.isnan(y_pred) | np.isnan(y_true))
-        y_pred_clean = y_pred[mask]
-        y_true_clean = y_true[mask]
+        return QlibMetrics.quantile_analysis_multi(y_pred, y_true, (n_quantiles,))[n_quantiles]
 
-        if len(y_pred_clean) < n_quantiles:
-            return {
-                'quantile_returns': np.full(n_quantiles, np.nan),
-                'quantile_counts': np.zeros(n_quantiles, dtype=int),
-                'top_quantile_return': np.nan,
-                'bottom_quantile_return': np.nan,
-                'long_short_return': np.nan
-            }
-
-        # 根据预测值分组
-        quantiles = pd.qcut(y_pred_clean, q=n_quantiles, labels=False, duplicates='drop')
-
-        # 计算每组的平均收益
-        quantile_returns = []
-        quantile_counts = []
-
-        for q in range(n_quantiles):
-            mask_q = (quantiles == q)
-            if mask_q.sum() > 0:
-                quantile_returns.append(y_true_clean[mask_q].mean())
-                quantile_counts.append(mask_q.sum())
-            else:
-                quantile_returns.append(np.nan)
-                quantile_counts.append(0)
-
-        quantile_returns = np.array(quantile_returns)
-        quantile_counts = np.array(quantile_counts)
+    @staticmethod
+    def quantile_analysis_multi(
+        y_pred: np.ndarray,
+        y_true: np.ndarray,
+        n_quantiles: Tuple[int, ...] = (5, 10, 20)
+    ) -> Dict[int, Dict[str, any]]:
+        """
+        一次计算多个分组数的分位数分析
 
-        # Top Quantile (预测最高的组)
-        top_quantile_return = quantile_returns[-1]
+        分组与 pd.qcut(labels=False, duplicates='drop') 一致；所有分组数的分位点用一次
+        np.quantile 计算，各组收益和样本数用一次 bincount 汇总（不再逐组构造布尔掩码）
 
-        # Bottom Quantile (预测最低的组)
-        bottom_quantile_return = quantile_returns[0]
+        Args:
+            y_pred: 预测值
+            y_true: 真实值（收益率）
+            n_quantiles: 分组数列表
 
-        # Long-Short Return (做多 Top，做空 Bottom)
-        long_short_return = top_quantile_return - bottom_quantile_return
+        Returns:
+            {分组数: quantile_analysis 的结果字典}
+        """
+        y_pred = np.asarray(y_pred, dtype=np.float64)
+        y_true = np.asarray(y_true, dtype=np.float64)
 
-        return {
-            'quantile_returns': quantile_returns,
-            'quantile_counts': quantile_counts,
-            'top_quantile_return': top_quantile_return,
-            'bottom_quantile_return': bottom_quantile_return,
-            'long_short_return': long_short_return
-        }
+        # 移除 NaN 值
+        mask = ~(np.isnan(y_pred) | np.isnan(y_true))
+        y_pred_clean = y_pred[mask]
+        y_true_clean = y_true[mask]
+        n = len(y_pred_clean)
+
+        results = {}
+        valid = [q for q in n_quantiles if n >= q]
+        for q in n_quantiles:
+            if n < q:
+                results[q] = {
+                    'quantile_returns': np.full(q, np.nan),
+                    'quantile_counts': np.zeros(q, dtype=int),
+                    'top_quantile_return': np.nan,
+                    'bottom_quantile_return': np.nan,
+                    'long_short_return': np.nan
+                }
+
+        if valid:
+            probs = np.concatenate([np.linspace(0, 1, q + 1) for q in valid])
+            all_edges = np.quantile(y_pred_clean, probs)
+
+            # 每个分组数的组号加上偏移量后拼接，一次 bincount 得到所有组的和与计数
+            labels = np.empty(n * len(valid), dtype=np.int64)
+            offsets = np.cumsum([0] + valid[:-1])
+            start = 0
+            for i, q in enumerate(valid):
+                # 重复的分位点合并（duplicates='drop'），区间左开右闭、第一个区间包含最小值
+                edges = np.unique(all_edges[start:start + q + 1])
+                start += q + 1
+                label = np.searchsorted(edges, y_pred_clean, side='left') - 1
+                np.maximum(label, 0, out=label)
+                labels[i * n:(i + 1) * n] = label + offsets[i]
+
+            total = int(sum(valid))
+            sums = np.bincount(labels, weights=np.tile(y_true_clean, len(valid)), minlength=total)
+            counts = np.bincount(labels, minlength=total)
+
+            for i, q in enumerate(valid):
+                quantile_counts = counts[offsets[i]:offsets[i] + q]
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    quantile_returns = np.where(
+                        quantile_counts > 0, sums[offsets[i]:offsets[i] + q] / quantile_counts, np.nan
+                    )
+
+                # Top Quantile (预测最高的组) / Bottom Quantile (预测最低的组)
+                top_quantile_return = quantile_returns[-1]
+                bottom_quantile_return = quantile_returns[0]
+
+                results[q] = {
+                    'quantile_returns': quantile_returns,
+                    'quantile_counts': quantile_counts,
+                    'top_quantile_return': top_quantile_return,
+                    'bottom_quantile_return': bottom_quantile_return,
+                    # Long-Short Return (做多 Top，做空 Bottom)
+                    'long_short_return': top_quantile_return - bottom_quantile_return
+                }
+
+        return results
 
     @staticmethod
     def rolling_ic(
@@ -181,6 +216,9 @@ class QlibMetrics:
         """
         计算滚动 IC
 
+        第 i 个值为窗口 [i - window, i) 的 IC（前 window 个为 NaN）。
+        Pearson 用累积和向量化计算（O(n)），Spearman 按窗口批量排序求秩后计算
+
         Args:
             y_pred: 预测值
             y_true: 真实值
@@ -190,18 +228,121 @@ class QlibMetrics:
         Returns:
             滚动 IC 数组
         """
+        y_pred = np.asarray(y_pred, dtype=np.float64)
+        y_true = np.asarray(y_true, dtype=np.float64)
         n = len(y_pred)
         rolling_ics = np.full(n, np.nan)
+        if window < 1 or n <= window:
+            return rolling_ics
 
-        for i in range(window, n):
-            pred_window = y_pred[i-window:i]
-            true_window = y_true[i-window:i]
-            rolling_ics[i] = QlibMetrics.information_coefficient(
-                pred_window, true_window, method=method
-            )
+        # 含 NaN 的样本对不参与计算（与 information_coefficient 一致）
+        valid = ~(np.isnan(y_pred) | np.isnan(y_true))
+
+        if method == 'pearson':
+            rolling_ics[window:] = QlibMetrics._rolling_pearson(y_pred, y_true, valid, window)
+        elif method == 'spearman':
+            rolling_ics[window:] = QlibMetrics._rolling_spearman(y_pred, y_true, valid, window)
+        else:
+            raise ValueError(f"Unknown method: {method}")
 
         return rolling_ics
 
+    @staticmethod
+    def _rolling_pearson(x: np.ndarray, y: np.ndarray, valid: np.ndarray,
+                         window: int) -> np.ndarray:
+        """
+        滚动 Pearson 相关系数（累积和实现，O(n)）
+
+        第 k 个结果对应窗口 [k, k + window)
+        """
+        # 先减去全局均值，减小累积和相减的舍入误差
+        x = np.where(valid, x - x[valid].mean(), 0.0) if valid.any() else np.zeros_like(x)
+        y = np.where(valid, y - y[valid].mean(), 0.0) if valid.any() else np.zeros_like(y)
+
+        def window_sum(values):
+            total = np.concatenate(([0.0], np.cumsum(values)))
+            return total[window:-1] - total[:-window - 1]
+
+        count = window_sum(valid.astype(np.float64))
+        sx, sy = window_sum(x), window_sum(y)
+        sxx, syy, sxy = window_sum(x * x), window_sum(y * y), window_sum(x * y)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            var_x = sxx - sx * sx / count
+            var_y = syy - sy * sy / count
+            cov = sxy - sx * sy / count
+
+            # 累积和相减的残差视为 0（常数窗口），与 np.corrcoef 一样返回 NaN
+            tol_x = 1e-12 * (np.sum(x * x) + 1e-300)
+            tol_y = 1e-12 * (np.sum(y * y) + 1e-300)
+            ok = (count >= 2) & (var_x > tol_x) & (var_y > tol_y)
+            ic = np.where(ok, cov / np.sqrt(np.abs(var_x * var_y)), np.nan)
+
+        return np.clip(ic, -1.0, 1.0)
+
+    @staticmethod
+    def _rolling_spearman(x: np.ndarray, y: np.ndarray, valid: np.ndarray,
+                          window: int, chunk_elements: int = 1 << 21) -> np.ndarray:
+        """
+        滚动 Spearman 相关系数
+
+        每个窗口行内排序求平均秩（并列取平均，与 scipy.stats.spearmanr 一致），
+        再对秩计算 Pearson；按块处理，内存占用与 n 无关
+        """
+        from numpy.lib.stride_tricks import sliding_window_view
+
+        n_windows = len(x) - window
+        x_windows = sliding_window_view(np.where(valid, x, np.nan), window)
+        y_windows = sliding_window_view(np.where(valid, y, np.nan), window)
+        valid_windows = sliding_window_view(valid, window)
+        rows = max(chunk_elements // window, 1)
+
+        ic = np.empty(n_windows)
+        for start in range(0, n_windows, rows):
+            stop = min(start + rows, n_windows)
+            mask = valid_windows[start:stop]
+            rx = QlibMetrics._window_ranks(x_windows[start:stop])
+            ry = QlibMetrics._window_ranks(y_windows[start:stop])
+
+            count = mask.sum(axis=1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                dx = np.where(mask, rx - (np.where(mask, rx, 0).sum(axis=1) / count)[:, None], 0.0)
+                dy = np.where(mask, ry - (np.where(mask, ry, 0).sum(axis=1) / count)[:, None], 0.0)
+                var_x = (dx * dx).sum(axis=1)
+                var_y = (dy * dy).sum(axis=1)
+                r = (dx * dy).sum(axis=1) / np.sqrt(var_x * var_y)
+            ic[start:stop] = np.where((count >= 2) & (var_x > 0) & (var_y > 0), r, np.nan)
+
+        return np.clip(ic, -1.0, 1.0)
+
+    @staticmethod
+    def _window_ranks(windows: np.ndarray) -> np.ndarray:
+        """
+        每行的平均秩（从 1 开始，并列取平均；NaN 排在最后，由调用方屏蔽）
+
+        Args:
+            windows: (m, window)
+
+        Returns:
+            (m, window) 秩
+        """
+        m, w = windows.shape
+        order = np.argsort(windows, axis=1)
+        sorted_values = np.take_along_axis(windows, order, axis=1)
+
+        # 并列组的首尾位置：组首为与前一个值不同的位置
+        position = np.broadcast_to(np.arange(w, dtype=np.int32), (m, w))
+        new_group = np.ones((m, w), dtype=bool)
+        new_group[:, 1:] = sorted_values[:, 1:] != sorted_values[:, :-1]
+        first = np.maximum.accumulate(np.where(new_group, position, np.int32(0)), axis=1)
+        group_end = np.ones((m, w), dtype=bool)
+        group_end[:, :-1] = new_group[:, 1:]
+        last = np.minimum.accumulate(np.where(group_end, position, np.int32(w - 1))[:, ::-1], axis=1)[:, ::-1]
+
+        ranks = np.empty((m, w))
+        np.put_along_axis(ranks, order, (first + last) / 2.0 + 1.0, axis=1)
+        return ranks
+
     @staticmethod
     def compute_all_metrics(
         y_pred: np.ndarray,
@@ -436,7 +577,8 @@ class QlibStyleTrainer:
         y_train: np.ndarray,
         X_val: pd.DataFrame,
         y_val: np.ndarray,
-        n_epochs: int = 100
+        n_epochs: int = 100,
+        epoch_callback: Optional[Callable[[int, Dict[str, float]], bool]] = None
     ):
         """
         训练模型（支持 Early Stopping）
@@ -447,6 +589,8 @@ class QlibStyleTrainer:
             X_val: 验证集特征
             y_val: 验证集标签
             n_epochs: 最大训练轮数
+            epoch_callback: 每轮结束后调用 callback(epoch, val_metrics)，返回 True 时停止训练
+                （如超参数搜索的剪枝 TrialContext.report）
 
         Returns:
             训练历史
@@ -503,6 +647,11 @@ class QlibStyleTrainer:
                     print(f"Best {self.early_stopping_metric}: {self.best_score:.4f} at epoch {self.best_epoch}")
                 break
 
+            if epoch_callback is not None and epoch_callback(epoch, val_metrics):
+                if self.verbose:
+                    print(f"\nStopped by callback at epoch {epoch}")
+                break
+
         return self.history
 
     def _evaluate(self, X: pd.DataFrame, y: np.ndarray, prefix: str = '') -> Dict[str, float]:
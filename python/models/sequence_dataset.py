@@ -0,0 +1,137 @@
+"""
+Sequence Dataset - 时间序列窗口数据集
+
+只保存一份连续的 float32 特征矩阵，按索引返回长度为 seq_len 的窗口视图（unfold，零拷贝），
+不再逐个复制窗口（那样数据量会放大 seq_len 倍，转换为 Tensor 时还要再复制一次）。
+
+第 i 个样本：窗口 X[i : i + seq_len]，标签 y[i + seq_len]
+（与 create_sequences 相同：用过去 seq_len 根 K 线预测当前标签）
+
+特征矩阵可以是内存映射的 .npy 文件，多年 1 分钟数据无需全部读入内存。
+"""
+
+import os
+from typing import Iterator, Optional, Tuple, Union
+import numpy as np
+import pandas as pd
+import torch
+from torch.utils.data import Dataset
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SequenceDataset(Dataset):
+    """
+    滑动窗口序列数据集
+
+    - __getitem__ 返回 (seq_len, n_features) 的窗口视图和标签，配合 DataLoader 使用
+    - iter_batches 按批一次性 gather 窗口，跳过逐样本的 collate
+    """
+
+    def __init__(self, X: Union[np.ndarray, pd.DataFrame], y: Optional[np.ndarray] = None,
+                 seq_len: int = 60):
+        """
+        Args:
+            X: 特征矩阵 (n, n_features)，float32 且 C 连续时（包括内存映射）不复制
+            y: 标签 (n,)，为 None 时只返回窗口（推理）
+            seq_len: 窗口长度
+        """
+        if isinstance(X, pd.DataFrame):
+            X = X.to_numpy(dtype=np.float32)
+        if not (isinstance(X, np.ndarray) and X.dtype == np.float32 and X.flags.c_contiguous):
+            X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2:
+            raise ValueError(f"Expected 2-D feature matrix, got shape {X.shape}")
+        if y is not None and len(y) != len(X):
+            raise ValueError(f"Feature and label length mismatch: {len(X)} vs {len(y)}")
+
+        self.seq_len = seq_len
+        self.n_features = X.shape[1]
+        self.features = X
+
+        # 只读内存映射无法直接交给 torch，先以写时复制方式重新映射（不占用额外内存）
+        if isinstance(X, np.memmap) and not X.flags.writeable:
+            X = np.memmap(X.filename, dtype=X.dtype, mode='c', offset=X.offset, shape=X.shape)
+
+        # (n - seq_len + 1, seq_len, n_features) 的跨步视图
+        self._windows = torch.from_numpy(X).unfold(0, seq_len, 1).transpose(1, 2)
+
+        self.labels = None
+        if y is not None:
+            self.labels = torch.from_numpy(np.ascontiguousarray(y[seq_len:], dtype=np.float32))
+
+    @classmethod
+    def from_file(cls, path: str, y: Optional[np.ndarray] = None,
+                  seq_len: int = 60) -> 'SequenceDataset':
+        """由 save_features 写出的 .npy 文件创建（内存映射）"""
+        return cls(np.load(path, mmap_mode='r'), y, seq_len)
+
+    def __len__(self) -> int:
+        return max(len(self.features) - self.seq_len, 0)
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        if self.labels is None:
+            return self._windows[index]
+        return self._windows[index], self.labels[index]
+
+    def window(self, index: int) -> torch.Tensor:
+        """第 index 个样本的窗口视图（不复制）"""
+        return self._windows[index]
+
+    def get_batch(self, indices: Union[np.ndarray, torch.Tensor]) -> Tuple[torch.Tensor, Optional[torch.Tensor]]:
+        """
+        按索引 gather 一批窗口
+
+        Returns:
+            (X (batch, seq_len, n_features), y (batch,) 或 None)
+        """
+        indices = torch.as_tensor(indices, dtype=torch.long)
+        X = self._windows[indices]
+        y = self.labels[indices] if self.labels is not None else None
+        return X, y
+
+    def iter_batches(self, batch_size: int, shuffle: bool = False,
+                     generator: Optional[torch.Generator] = None,
+                     indices: Optional[np.ndarray] = None) -> Iterator[Tuple[torch.Tensor, Optional[torch.Tensor]]]:
+        """
+        按批迭代
+
+        Args:
+            batch_size: 批大小
+            shuffle: 是否打乱样本顺序
+            generator: 打乱使用的随机数生成器
+            indices: 只迭代这些样本（如验证集抽样）
+        """
+        order = (torch.as_tensor(indices, dtype=torch.long) if indices is not None
+                 else torch.arange(len(self)))
+        if shuffle:
+            order = order[torch.randperm(len(order), generator=generator)]
+        for start in range(0, len(order), batch_size):
+            yield self.get_batch(order[start:start + batch_size])
+
+    @property
+    def nbytes(self) -> int:
+        """特征矩阵占用的字节数（窗口不额外占用内存）"""
+        return self.features.nbytes
+
+
+def save_features(path: str, X: Union[np.ndarray, pd.DataFrame]) -> str:
+    """
+    把特征矩阵保存为 float32 .npy 文件，供 SequenceDataset.from_file 内存映射
+
+    Returns:
+        文件路径
+    """
+    if isinstance(X, pd.DataFrame):
+        X = X.to_numpy(dtype=np.float32)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    np.save(path, np.ascontiguousarray(X, dtype=np.float32))
+    logger.info(f"Features saved: {path} {np.shape(X)}")
+    return path
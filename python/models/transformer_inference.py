@@ -0,0 +1,246 @@
+"""
+Transformer Inference - QlibTransformer 低延迟推理
+
+实盘逐根 K 线推理：
+- 每个交易对维护一个滚动特征窗口：长度 2*seq_len 的缓冲区，每行写两次，
+  任意时刻最近 seq_len 行都是一段连续内存，取窗口无需拷贝或重排（无 KV cache，每次完整前向）
+- 同一周期多个交易对的窗口合并为一个批次，写入预分配的输入缓冲区后一次前向
+- 后端：TorchScript（trace + freeze）、ONNX Runtime（可选依赖）或 eager；ONNX 会话线程数固定，
+  torch 后端不修改进程级线程设置（与引擎中其他 torch 使用方共享，统一由 cpu_training.configure_threads 等配置）
+- 每次调用记录延迟直方图（strategy.latency.LatencyHistogram，可传入 LatencyTracer 的直方图一并导出到 Prometheus）
+"""
+
+import os
+import time
+from typing import Dict, Iterable, Optional
+import numpy as np
+import torch
+import torch.nn as nn
+import logging
+
+from strategy.latency import LatencyHistogram
+
+# ONNX Runtime 是可选依赖
+try:
+    import onnxruntime as ort
+    _has_onnxruntime = True
+except ImportError:
+    _has_onnxruntime = False
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('torchscript', 'onnx', 'eager')
+
+
+class RollingFeatureWindow:
+    """
+    单个交易对的滚动特征窗口
+
+    缓冲区长度 2*seq_len，第 t 行同时写入 pos 和 pos+seq_len，
+    buffer[pos:pos+seq_len] 即为按时间顺序排列的最近 seq_len 行
+    """
+
+    __slots__ = ('seq_len', 'buffer', 'pos', 'count')
+
+    def __init__(self, seq_len: int, n_features: int):
+        self.seq_len = seq_len
+        self.buffer = np.zeros((2 * seq_len, n_features), dtype=np.float32)
+        self.pos = 0
+        self.count = 0
+
+    @property
+    def ready(self) -> bool:
+        return self.count >= self.seq_len
+
+    def push(self, row: np.ndarray):
+        """加入最新一行特征"""
+        self.buffer[self.pos] = row
+        self.buffer[self.pos + self.seq_len] = row
+        self.pos = (self.pos + 1) % self.seq_len
+        self.count += 1
+
+    def window(self) -> np.ndarray:
+        """最近 seq_len 行（视图，从旧到新）"""
+        return self.buffer[self.pos:self.pos + self.seq_len]
+
+
+class TransformerInference:
+    """
+    QlibTransformer 批量推理
+
+    用法：
+        engine = TransformerInference(model, seq_len=60, n_features=74)
+        engine.update('BTCUSDT', feature_row)
+        predictions = engine.predict()      # {symbol: 预测值}，只包含窗口已满的交易对
+    """
+
+    def __init__(self, model: Optional[nn.Module], seq_len: int, n_features: int,
+                 backend: str = 'torchscript', onnx_path: Optional[str] = None,
+                 num_threads: Optional[int] = 1, max_batch: int = 64,
+                 latency: Optional[LatencyHistogram] = None):
+        """
+        Args:
+            model: 训练好的模型（onnx 后端且给定 onnx_path 时可为 None）
+            seq_len: 窗口长度
+            n_features: 特征数
+            backend: 'torchscript' / 'onnx' / 'eager'
+            onnx_path: ONNX 模型路径（onnx 后端）
+            num_threads: ONNX Runtime 会话的推理线程数，None 表示使用默认值（torch 后端不使用）
+            max_batch: 单次前向的最大批大小，超过时分批
+            latency: 前向延迟直方图，例如 tracer.histogram('inference', factor_id)；None 时新建
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend: {backend}")
+        if backend == 'onnx' and not _has_onnxruntime:
+            logger.warning("onnxruntime not installed, falling back to torchscript")
+            backend = 'torchscript'
+
+        self.seq_len = seq_len
+        self.n_features = n_features
+        self.backend = backend
+        self.max_batch = max_batch
+        self.num_threads = num_threads
+
+        self.windows: Dict[str, RollingFeatureWindow] = {}
+        self._input = np.zeros((max_batch, seq_len, n_features), dtype=np.float32)
+        self.latency = latency if latency is not None else LatencyHistogram()
+        self.stats = {'calls': 0, 'samples': 0}
+
+        if backend == 'onnx':
+            self._session = self._create_onnx_session(model, onnx_path)
+            self._input_name = self._session.get_inputs()[0].name
+            self._module = None
+        else:
+            if model is None:
+                raise ValueError(f"Model is required for backend {backend}")
+            self._module = self._prepare_module(model.eval(), backend)
+
+        self._warmup()
+        logger.info(f"TransformerInference initialized: backend={self.backend}, "
+                    f"seq_len={seq_len}, features={n_features}, threads={num_threads}")
+
+    # ==================== 窗口 ====================
+
+    def update(self, symbol: str, features: Iterable[float]) -> bool:
+        """
+        加入交易对的最新一行特征
+
+        Returns:
+            窗口是否已满（可预测）
+        """
+        window = self.windows.get(symbol)
+        if window is None:
+            window = RollingFeatureWindow(self.seq_len, self.n_features)
+            self.windows[symbol] = window
+        window.push(np.asarray(features, dtype=np.float32))
+        return window.ready
+
+    def is_ready(self, symbol: str) -> bool:
+        window = self.windows.get(symbol)
+        return window is not None and window.ready
+
+    def reset(self, symbol: Optional[str] = None):
+        """清空交易对（默认全部）的窗口"""
+        if symbol is None:
+            self.windows.clear()
+        else:
+            self.windows.pop(symbol, None)
+
+    # ==================== 推理 ====================
+
+    def predict(self, symbols: Optional[Iterable[str]] = None) -> Dict[str, float]:
+        """
+        对窗口已满的交易对批量预测
+
+        Args:
+            symbols: 需要预测的交易对，默认全部
+
+        Returns:
+            {symbol: 预测值}
+        """
+        if symbols is None:
+            symbols = self.windows.keys()
+        ready = [s for s in symbols if self.is_ready(s)]
+        results: Dict[str, float] = {}
+
+        for start in range(0, len(ready), self.max_batch):
+            chunk = ready[start:start + self.max_batch]
+            batch = self._input[:len(chunk)]
+            for i, symbol in enumerate(chunk):
+                batch[i] = self.windows[symbol].window()
+            predictions = self._run(batch)
+            for symbol, value in zip(chunk, predictions):
+                results[symbol] = float(value)
+
+        return results
+
+    def predict_windows(self, X: np.ndarray) -> np.ndarray:
+        """
+        对给定窗口批量预测
+
+        Args:
+            X: (n, seq_len, n_features)
+
+        Returns:
+            (n,) 预测值
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        outputs = [self._run(X[start:start + self.max_batch])
+                   for start in range(0, len(X), self.max_batch)]
+        return np.concatenate(outputs) if outputs else np.empty(0, dtype=np.float32)
+
+    def latency_summary(self) -> Dict[str, float]:
+        return self.latency.summary()
+
+    # ==================== 内部实现 ====================
+
+    def _run(self, batch: np.ndarray) -> np.ndarray:
+        start = time.perf_counter_ns()
+        if self._module is None:
+            output = self._session.run(None, {self._input_name: batch})[0]
+        else:
+            with torch.inference_mode():
+                output = self._module(torch.from_numpy(batch)).numpy()
+        self.latency.record(time.perf_counter_ns() - start)
+        self.stats['calls'] += 1
+        self.stats['samples'] += len(batch)
+        return output.reshape(-1)
+
+    def _prepare_module(self, model: nn.Module, backend: str):
+        if backend == 'eager':
+            return model
+        example = torch.zeros(1, self.seq_len, self.n_features)
+        try:
+            with torch.inference_mode():
+                traced = torch.jit.trace(model, example, check_trace=False)
+            return torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+        except Exception as e:
+            logger.warning(f"TorchScript trace failed, using eager mode: {e}")
+            self.backend = 'eager'
+            return model
+
+    def _create_onnx_session(self, model: Optional[nn.Module], onnx_path: Optional[str]):
+        if onnx_path is None or not os.path.exists(onnx_path):
+            if model is None:
+                raise ValueError("onnx_path or model is required for onnx backend")
+            onnx_path = onnx_path or 'transformer_inference.onnx'
+            example = torch.zeros(1, self.seq_len, self.n_features)
+            torch.onnx.export(model.eval(), example, onnx_path, input_names=['x'],
+                              output_names=['y'], dynamic_axes={'x': {0: 'batch'}, 'y': {0: 'batch'}})
+            logger.info(f"ONNX model exported: {onnx_path}")
+
+        options = ort.SessionOptions()
+        if self.num_threads:
+            options.intra_op_num_threads = self.num_threads
+            options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        return ort.InferenceSession(onnx_path, options, providers=['CPUExecutionProvider'])
+
+    def _warmup(self, n_calls: int = 3):
+        """预热（首次调用的图优化和内存分配不计入延迟统计）"""
+        for batch_size in (1, self.max_batch):
+            for _ in range(n_calls):
+                self._run(self._input[:batch_size])
+        self.latency.reset()
+        self.stats = {'calls': 0, 'samples': 0}
@@ -0,0 +1,447 @@
+"""
+快速 Protobuf 编解码 - 与 rust/common/proto/trade.proto 线格式兼容
+
+相对 protobuf_codec（逐字段切片 + dict）：
+- 预编译 struct.Struct，double 用 unpack_from 直接从缓冲区读取，不切片复制
+- 接受 bytes / memoryview / zmq.Frame（零拷贝帧），字符串直接从 memoryview 解码
+- MarketData 按 prost 的规范布局（字段按编号顺序全部出现）直线解码，price / volume 两个
+  double 及其 tag 用一次预编译 unpack_from 读出；任一 tag 不符（如零值字段被省略、
+  字段乱序、未知字段）回退到通用的逐字段解码
+- 缺省字段取 proto3 默认值；未知字段按 wire type 跳过（向前兼容）
+- 可直接解码为 MarketData / Trade 对象（factory 参数），并提供批量解码
+
+int32 / int64 按 proto3 规则解码为有符号整数（负数为 10 字节补码 varint）。
+截断或格式错误的消息抛出 ValueError。
+"""
+
+import struct
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+_DOUBLE = struct.Struct('<d')
+_unpack_double = _DOUBLE.unpack_from
+_pack_tagged_double = struct.Struct('<Bd').pack
+# MarketData 规范布局中紧随 symbol 的 [0x11 last_price][0x19 volume]
+_unpack_price_volume = struct.Struct('<BdBd').unpack_from
+
+MARKET_DATA_FIELDS = ('symbol', 'last_price', 'volume', 'exchange_time', 'local_time', 'exchange')
+TRADE_FIELDS = ('trade_id', 'order_id', 'strategy_id', 'symbol', 'side', 'filled_price',
+                'filled_volume', 'trade_time', 'status', 'error_code', 'error_message',
+                'is_retryable', 'commission', 'seq', 'gateway_id')
+
+_UINT64 = 1 << 64
+_INT64_MAX = (1 << 63) - 1
+
+
+# ==================== 基础读写 ====================
+
+
+def _read_varint(buf, pos: int, end: int) -> Tuple[int, int]:
+    """通用 varint 读取（最多 10 字节）"""
+    result = 0
+    shift = 0
+    while True:
+        if pos >= end:
+            raise ValueError("Truncated varint")
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+        if shift >= 70:
+            raise ValueError("Varint too long")
+
+
+def _varint_at(buf, pos: int) -> Tuple[int, int]:
+    """无边界检查的 varint 读取（越界时 IndexError 由调用方处理）"""
+    byte = buf[pos]
+    if byte < 0x80:
+        return byte, pos + 1
+    result = byte & 0x7f
+    shift = 7
+    while True:
+        pos += 1
+        byte = buf[pos]
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, pos + 1
+        shift += 7
+        if shift >= 70:
+            raise ValueError("Varint too long")
+
+
+def _int64(value: int) -> int:
+    value &= _UINT64 - 1
+    return value - _UINT64 if value > _INT64_MAX else value
+
+
+def _int32(value: int) -> int:
+    value &= 0xFFFFFFFF
+    return value - 0x100000000 if value & 0x80000000 else value
+
+
+def _read_string(buf, pos: int, end: int) -> Tuple[str, int]:
+    length = buf[pos] if pos < end else 0x80
+    if length & 0x80:
+        length, pos = _read_varint(buf, pos, end)
+    else:
+        pos += 1
+    stop = pos + length
+    if stop > end:
+        raise ValueError("Truncated length-delimited field")
+    return str(buf[pos:stop], 'utf-8'), stop
+
+
+def _skip_field(buf, pos: int, tag: int, end: int) -> int:
+    """跳过未知字段"""
+    wire_type = tag & 0x7
+    if wire_type == 0:
+        return _read_varint(buf, pos, end)[1]
+    if wire_type == 1:
+        pos += 8
+    elif wire_type == 2:
+        length, pos = _read_varint(buf, pos, end)
+        pos += length
+    elif wire_type == 5:
+        pos += 4
+    else:
+        raise ValueError(f"Unsupported wire type: {wire_type}")
+    if pos > end:
+        raise ValueError("Truncated field")
+    return pos
+
+
+_RAW_BUFFERS = (bytes, memoryview, bytearray)
+
+
+def _as_buffer(data):
+    """bytes / memoryview 原样返回，zmq.Frame 取其零拷贝 buffer"""
+    return data.buffer if hasattr(data, 'buffer') else data
+
+
+# ==================== 解码 ====================
+
+
+def decode_market_data_fields(data) -> tuple:
+    """
+    解码 MarketData，返回字段元组（顺序同 MARKET_DATA_FIELDS）
+
+    message MarketData {
+      string symbol = 1;  double last_price = 2;  double volume = 3;
+      int64 exchange_time = 4;  int64 local_time = 5;  string exchange = 6;
+    }
+    """
+    buf = data if data.__class__ in _RAW_BUFFERS else _as_buffer(data)
+
+    # 规范布局直线解码，布局不符或越界时回退通用解码
+    try:
+        if buf[0] == 0x0A and buf[1] < 0x80:
+            pos = 2 + buf[1]
+            tag_price, last_price, tag_volume, volume = _unpack_price_volume(buf, pos)
+            if tag_price == 0x11 and tag_volume == 0x19 and buf[pos + 18] == 0x20:
+                symbol = str(buf[2:pos], 'utf-8')
+                exchange_time, pos = _varint_at(buf, pos + 19)
+                if buf[pos] == 0x28:
+                    local_time, pos = _varint_at(buf, pos + 1)
+                    if buf[pos] == 0x32 and buf[pos + 1] < 0x80:
+                        end = pos + 2 + buf[pos + 1]
+                        if end == len(buf):
+                            if exchange_time > _INT64_MAX:
+                                exchange_time = _int64(exchange_time)
+                            if local_time > _INT64_MAX:
+                                local_time = _int64(local_time)
+                            return (symbol, last_price, volume, exchange_time, local_time,
+                                    str(buf[pos + 2:end], 'utf-8'))
+    except (IndexError, struct.error):
+        pass
+    return _decode_market_data_generic(buf)
+
+
+def _decode_market_data_generic(buf) -> tuple:
+    """逐字段解码（任意字段顺序、缺省字段、未知字段）"""
+    symbol = exchange = ''
+    last_price = volume = 0.0
+    exchange_time = local_time = 0
+    pos = 0
+    end = len(buf)
+
+    try:
+        while pos < end:
+            tag = buf[pos]
+            pos += 1
+            if tag & 0x80:
+                tag, pos = _read_varint(buf, pos - 1, end)
+
+            if tag == 0x11:          # 2: last_price
+                last_price = _unpack_double(buf, pos)[0]
+                pos += 8
+            elif tag == 0x19:        # 3: volume
+                volume = _unpack_double(buf, pos)[0]
+                pos += 8
+            elif tag == 0x0A:        # 1: symbol
+                symbol, pos = _read_string(buf, pos, end)
+            elif tag == 0x20:        # 4: exchange_time
+                exchange_time, pos = _read_varint(buf, pos, end)
+                exchange_time = _int64(exchange_time)
+            elif tag == 0x28:        # 5: local_time
+                local_time, pos = _read_varint(buf, pos, end)
+                local_time = _int64(local_time)
+            elif tag == 0x32:        # 6: exchange
+                exchange, pos = _read_string(buf, pos, end)
+            else:
+                pos = _skip_field(buf, pos, tag, end)
+    except struct.error:
+        raise ValueError("Truncated fixed64 field") from None
+
+    if pos > end:
+        raise ValueError("Truncated message")
+    return symbol, last_price, volume, exchange_time, local_time, exchange
+
+
+def decode_trade_fields(data) -> tuple:
+    """
+    解码 Trade，返回字段元组（顺序同 TRADE_FIELDS）
+
+    message Trade {
+      string trade_id = 1;  string order_id = 2;  string strategy_id = 3;  string symbol = 4;
+      string side = 5;  double filled_price = 6;  int32 filled_volume = 7;  int64 trade_time = 8;
+      string status = 9;  int32 error_code = 10;  string error_message = 11;
+      bool is_retryable = 12;  double commission = 13;  uint64 seq = 14;  string gateway_id = 15;
+    }
+    """
+    buf = _as_buffer(data)
+    trade_id = order_id = strategy_id = symbol = side = status = error_message = gateway_id = ''
+    filled_price = commission = 0.0
+    filled_volume = trade_time = error_code = seq = 0
+    is_retryable = False
+    pos = 0
+    end = len(buf)
+
+    try:
+        while pos < end:
+            tag = buf[pos]
+            pos += 1
+            if tag & 0x80:
+                tag, pos = _read_varint(buf, pos - 1, end)
+
+            if tag == 0x0A:
+                trade_id, pos = _read_string(buf, pos, end)
+            elif tag == 0x12:
+                order_id, pos = _read_string(buf, pos, end)
+            elif tag == 0x1A:
+                strategy_id, pos = _read_string(buf, pos, end)
+            elif tag == 0x22:
+                symbol, pos = _read_string(buf, pos, end)
+            elif tag == 0x2A:
+                side, pos = _read_string(buf, pos, end)
+            elif tag == 0x31:
+                filled_price = _unpack_double(buf, pos)[0]
+                pos += 8
+            elif tag == 0x38:
+                filled_volume, pos = _read_varint(buf, pos, end)
+                filled_volume = _int32(filled_volume)
+            elif tag == 0x40:
+                trade_time, pos = _read_varint(buf, pos, end)
+                trade_time = _int64(trade_time)
+            elif tag == 0x4A:
+                status, pos = _read_string(buf, pos, end)
+            elif tag == 0x50:
+                error_code, pos = _read_varint(buf, pos, end)
+                error_code = _int32(error_code)
+            elif tag == 0x5A:
+                error_message, pos = _read_string(buf, pos, end)
+            elif tag == 0x60:
+                value, pos = _read_varint(buf, pos, end)
+                is_retryable = value != 0
+            elif tag == 0x69:
+                commission = _unpack_double(buf, pos)[0]
+                pos += 8
+            elif tag == 0x70:
+                seq, pos = _read_varint(buf, pos, end)
+                seq &= _UINT64 - 1
+            elif tag == 0x7A:
+                gateway_id, pos = _read_string(buf, pos, end)
+            else:
+                pos = _skip_field(buf, pos, tag, end)
+    except struct.error:
+        raise ValueError("Truncated fixed64 field") from None
+
+    if pos > end:
+        raise ValueError("Truncated message")
+    return (trade_id, order_id, strategy_id, symbol, side, filled_price, filled_volume,
+            trade_time, status, error_code, error_message, is_retryable, commission, seq, gateway_id)
+
+
+def decode_market_data(data, factory: Optional[Callable[..., Any]] = None):
+    """
+    解码一条 MarketData
+
+    Args:
+        data: bytes / memoryview / zmq.Frame
+        factory: 按字段顺序构造对象（如 MarketData），None 时返回 dict
+
+    Returns:
+        factory(*fields) 或 {字段名: 值}
+    """
+    fields = decode_market_data_fields(data)
+    if factory is None:
+        return dict(zip(MARKET_DATA_FIELDS, fields))
+    return factory(*fields)
+
+
+def decode_trade(data, factory: Optional[Callable[..., Any]] = None):
+    """
+    解码一条 Trade
+
+    Args:
+        data: bytes / memoryview / zmq.Frame
+        factory: 按字段顺序构造对象（如 Trade），None 时返回 dict
+    """
+    fields = decode_trade_fields(data)
+    if factory is None:
+        return dict(zip(TRADE_FIELDS, fields))
+    return factory(*fields)
+
+
+def decode_market_data_batch(frames: Iterable, factory: Optional[Callable[..., Any]] = None,
+                             skip_invalid: bool = False) -> List[Any]:
+    """
+    批量解码 MarketData
+
+    Args:
+        frames: bytes / memoryview / zmq.Frame 序列
+        factory: 见 decode_market_data
+        skip_invalid: True 时跳过无法解码的消息（记录警告），否则抛出异常
+    """
+    decode = decode_market_data_fields
+    if not skip_invalid:
+        if factory is None:
+            return [dict(zip(MARKET_DATA_FIELDS, decode(frame))) for frame in frames]
+        return [factory(*decode(frame)) for frame in frames]
+
+    results = []
+    for frame in frames:
+        try:
+            fields = decode(frame)
+        except (ValueError, UnicodeDecodeError) as e:
+            logger.warning(f"Invalid market data message skipped: {e}")
+            continue
+        results.append(dict(zip(MARKET_DATA_FIELDS, fields)) if factory is None else factory(*fields))
+    return results
+
+
+def decode_trade_batch(frames: Iterable, factory: Optional[Callable[..., Any]] = None,
+                       skip_invalid: bool = False) -> List[Any]:
+    """批量解码 Trade（参数同 decode_market_data_batch）"""
+    results = []
+    for frame in frames:
+        try:
+            fields = decode_trade_fields(frame)
+        except (ValueError, UnicodeDecodeError) as e:
+            if not skip_invalid:
+                raise
+            logger.warning(f"Invalid trade message skipped: {e}")
+            continue
+        results.append(dict(zip(TRADE_FIELDS, fields)) if factory is None else factory(*fields))
+    return results
+
+
+# ==================== 编码 ====================
+
+
+def _varint(value: int) -> bytes:
+    """编码 varint（负数按 64 位补码，10 字节）"""
+    if 0 <= value < 0x80:
+        return _SMALL_VARINTS[value]
+    if value < 0:
+        value += _UINT64
+    out = bytearray()
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+_SMALL_VARINTS = [bytes([i]) for i in range(0x80)]
+
+
+def _string(out: list, tag: bytes, value: str):
+    if value:
+        data = value.encode('utf-8')
+        out.append(tag)
+        out.append(_varint(len(data)))
+        out.append(data)
+
+
+def _int(out: list, tag: bytes, value: int):
+    if value:
+        out.append(tag)
+        out.append(_varint(value))
+
+
+def encode_order(order_id: str, strategy_id: str, symbol: str,
+                 price: float, volume: int, side: str, timestamp: int) -> bytes:
+    """
+    编码订单消息（与 protobuf_codec.encode_order 字节一致）
+
+    message Order {
+      string order_id = 1;  string strategy_id = 2;  string symbol = 3;  double price = 4;
+      int32 volume = 5;  string side = 6;  int64 timestamp = 7;
+    }
+    """
+    out = []
+    _string(out, b'\x0a', order_id)
+    _string(out, b'\x12', strategy_id)
+    _string(out, b'\x1a', symbol)
+    if price != 0.0:
+        out.append(_pack_tagged_double(0x21, price))
+    _int(out, b'\x28', volume)
+    _string(out, b'\x32', side)
+    _int(out, b'\x38', timestamp)
+    return b''.join(out)
+
+
+def encode_market_data(symbol: str, last_price: float, volume: float,
+                       exchange_time: int, local_time: int, exchange: str) -> bytes:
+    """编码 MarketData（用于测试和行情回放）"""
+    out = []
+    _string(out, b'\x0a', symbol)
+    if last_price != 0.0:
+        out.append(_pack_tagged_double(0x11, last_price))
+    if volume != 0.0:
+        out.append(_pack_tagged_double(0x19, volume))
+    _int(out, b'\x20', exchange_time)
+    _int(out, b'\x28', local_time)
+    _string(out, b'\x32', exchange)
+    return b''.join(out)
+
+
+def encode_trade(trade_id: str = '', order_id: str = '', strategy_id: str = '', symbol: str = '',
+                 side: str = '', filled_price: float = 0.0, filled_volume: int = 0,
+                 trade_time: int = 0, status: str = '', error_code: int = 0,
+                 error_message: str = '', is_retryable: bool = False,
+                 commission: float = 0.0, seq: int = 0, gateway_id: str = '') -> bytes:
+    """编码 Trade（用于测试和成交回放）"""
+    out = []
+    _string(out, b'\x0a', trade_id)
+    _string(out, b'\x12', order_id)
+    _string(out, b'\x1a', strategy_id)
+    _string(out, b'\x22', symbol)
+    _string(out, b'\x2a', side)
+    if filled_price != 0.0:
+        out.append(_pack_tagged_double(0x31, filled_price))
+    _int(out, b'\x38', filled_volume)
+    _int(out, b'\x40', trade_time)
+    _string(out, b'\x4a', status)
+    _int(out, b'\x50', error_code)
+    _string(out, b'\x5a', error_message)
+    _int(out, b'\x60', int(is_retryable))
+    if commission != 0.0:
+        out.append(_pack_tagged_double(0x69, commission))
+    _int(out, b'\x70', seq)
+    _string(out, b'\x7a', gateway_id)
+    return b''.join(out)
@@ -0,0 +1,166 @@
+"""
+定长二进制行情帧 - 与 rust/common/src/market_frame.rs 对应
+
+行情服务（MD_FIXED_FRAMES=1）在 Protobuf 行情之外并行发布定长帧：
+- 行情帧 topic: mdf.<symbol>.<exchange>，40 字节小端布局：
+    u16 symbol_id | u16 exchange_id | u32 generation | f64 last_price | f64 volume
+    | i64 exchange_time | i64 local_time
+- 符号表 topic: mdf.$table，JSON {"generation": g, "symbols": [...], "exchanges": [...]}，
+  下标即 id；出现新符号时立即发布，之后每秒重发
+
+单帧用一次 struct.unpack_from 解码；批量帧可用 Struct.iter_unpack 逐条构造对象，
+或用 np.frombuffer 得到结构化数组（单个连续缓冲区零拷贝）。
+符号表尚未到达（或 generation 不匹配）的帧无法解析，计入 SymbolTable.unresolved 后丢弃。
+"""
+
+import json
+import struct
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+FRAME_TOPIC_PREFIX = 'mdf.'
+TABLE_TOPIC = 'mdf.$table'
+
+FRAME = struct.Struct('<HHIddqq')
+FRAME_SIZE = FRAME.size  # 40
+
+FRAME_DTYPE = np.dtype([
+    ('symbol_id', '<u2'),
+    ('exchange_id', '<u2'),
+    ('generation', '<u4'),
+    ('last_price', '<f8'),
+    ('volume', '<f8'),
+    ('exchange_time', '<i8'),
+    ('local_time', '<i8'),
+])
+assert FRAME_DTYPE.itemsize == FRAME_SIZE
+
+
+class SymbolTable:
+    """
+    订阅端符号表：generation -> (symbols, exchanges)
+
+    发布端的表只追加，收到的新表直接覆盖同 generation 的旧表
+    """
+
+    def __init__(self):
+        self.tables: Dict[int, Tuple[List[str], List[str]]] = {}
+        self.unresolved = 0
+
+    def update(self, payload) -> int:
+        """
+        应用一条符号表消息
+
+        Args:
+            payload: mdf.$table 消息体（bytes / memoryview / zmq.Frame）
+
+        Returns:
+            该消息的 generation
+        """
+        payload = getattr(payload, 'buffer', payload)
+        message = json.loads(bytes(payload))
+        generation = int(message['generation'])
+        if generation not in self.tables:
+            logger.info(f"Symbol table generation {generation}: {len(message['symbols'])} symbols")
+        self.tables[generation] = (list(message['symbols']), list(message['exchanges']))
+        return generation
+
+    def resolve(self, generation: int, symbol_id: int, exchange_id: int) -> Optional[Tuple[str, str]]:
+        """id -> (symbol, exchange)，无法解析时返回 None"""
+        table = self.tables.get(generation)
+        if table is None or symbol_id >= len(table[0]) or exchange_id >= len(table[1]):
+            return None
+        return table[0][symbol_id], table[1][exchange_id]
+
+
+def decode_frame(data, table: SymbolTable, factory: Optional[Callable[..., Any]] = None):
+    """
+    解码一个定长帧
+
+    Args:
+        data: bytes / memoryview / zmq.Frame
+        table: 符号表
+        factory: 按 MarketData 字段顺序构造对象，None 时返回 dict
+
+    Returns:
+        factory(symbol, last_price, volume, exchange_time, local_time, exchange)，
+        id 无法解析时返回 None
+    """
+    buf = getattr(data, 'buffer', data)
+    if len(buf) != FRAME_SIZE:
+        raise ValueError(f"Invalid frame size: {len(buf)}")
+    symbol_id, exchange_id, generation, last_price, volume, exchange_time, local_time = FRAME.unpack_from(buf)
+    names = table.resolve(generation, symbol_id, exchange_id)
+    if names is None:
+        table.unresolved += 1
+        return None
+    return _build(factory, names[0], last_price, volume, exchange_time, local_time, names[1])
+
+
+def decode_frames(frames: Sequence, table: SymbolTable,
+                  factory: Optional[Callable[..., Any]] = None) -> List[Any]:
+    """
+    批量解码定长帧（拼接为一个缓冲区后用 iter_unpack 逐条解析）
+
+    长度不符的帧记录警告后跳过；无法解析 id 的帧计入 table.unresolved
+    """
+    buffers = [getattr(frame, 'buffer', frame) for frame in frames]
+    if any(len(buf) != FRAME_SIZE for buf in buffers):
+        logger.warning("Invalid fixed frame size, frame skipped")
+        buffers = [buf for buf in buffers if len(buf) == FRAME_SIZE]
+
+    results = []
+    tables = table.tables
+    cached_generation = None
+    symbols = exchanges = ()
+    for symbol_id, exchange_id, generation, last_price, volume, exchange_time, local_time \
+            in FRAME.iter_unpack(b''.join(buffers)):
+        if generation != cached_generation:
+            symbols, exchanges = tables.get(generation, ((), ()))
+            cached_generation = generation
+        if symbol_id >= len(symbols) or exchange_id >= len(exchanges):
+            table.unresolved += 1
+            continue
+        results.append(_build(factory, symbols[symbol_id], last_price, volume,
+                              exchange_time, local_time, exchanges[exchange_id]))
+    return results
+
+
+def frames_to_array(data) -> np.ndarray:
+    """
+    把定长帧转换为结构化数组（dtype=FRAME_DTYPE）
+
+    Args:
+        data: 单个连续缓冲区（如录制文件，零拷贝）或帧序列（拼接一次）
+    """
+    if not isinstance(data, (bytes, bytearray, memoryview)):
+        data = b''.join(getattr(frame, 'buffer', frame) for frame in data)
+    if len(data) % FRAME_SIZE:
+        raise ValueError(f"Buffer size {len(data)} is not a multiple of {FRAME_SIZE}")
+    return np.frombuffer(data, dtype=FRAME_DTYPE)
+
+
+def encode_frame(symbol_id: int, exchange_id: int, generation: int, last_price: float,
+                 volume: float, exchange_time: int, local_time: int) -> bytes:
+    """编码定长帧（用于测试和行情回放）"""
+    return FRAME.pack(symbol_id, exchange_id, generation, last_price, volume, exchange_time, local_time)
+
+
+def encode_symbol_table(generation: int, symbols: Iterable[str], exchanges: Iterable[str]) -> bytes:
+    """编码符号表消息"""
+    return json.dumps({'generation': generation, 'symbols': list(symbols),
+                       'exchanges': list(exchanges)}).encode('utf-8')
+
+
+def frame_topic(symbol: str, exchange: str) -> str:
+    return f"{FRAME_TOPIC_PREFIX}{symbol}.{exchange}"
+
+
+def _build(factory, symbol, last_price, volume, exchange_time, local_time, exchange):
+    if factory is None:
+        return {'symbol': symbol, 'last_price': last_price, 'volume': volume,
+                'exchange_time': exchange_time, 'local_time': local_time, 'exchange': exchange}
+    return factory(symbol, last_price, volume, exchange_time, local_time, exchange)
@@ -82,7 +82,7 @@ def encode_order(order_id: str, strategy_id: str, symbol: str,
 
 def decode_trade(data: bytes) -> dict:
     """
-    解码成交回报消息
+    解码成交回报消息（data 可以是 bytes 或 memoryview）
 
     message Trade {
       string trade_id = 1;
@@ -98,6 +98,8 @@ def decode_trade(data: bytes) -> dict:
       string error_message = 11;
       bool is_retryable = 12;
       double commission = 13;
+      uint64 seq = 14;
+      string gateway_id = 15;
     }
     """
     result = {}
@@ -119,6 +121,8 @@ def decode_trade(data: bytes) -> dict:
                 result['error_code'] = value
             elif field_number == 12:
                 result['is_retryable'] = bool(value)
+            elif field_number == 14:
+                result['seq'] = value
 
         elif wire_type == 1:  # 64-bit
             value = struct.unpack('<d', data[pos:pos+8])[0]
@@ -130,7 +134,7 @@ def decode_trade(data: bytes) -> dict:
 
         elif wire_type == 2:  # length-delimited
             length, pos = _read_varint(data, pos)
-            value = data[pos:pos+length].decode('utf-8')
+            value = str(data[pos:pos+length], 'utf-8')  # bytes 或 memoryview（零拷贝帧）
             pos += length
 
             if field_number == 1:
@@ -147,6 +151,8 @@ def decode_trade(data: bytes) -> dict:
                 result['status'] = value
             elif field_number == 11:
                 result['error_message'] = value
+            elif field_number == 15:
+                result['gateway_id'] = value
 
         else:
             raise ValueError(f"Unknown wire type: {wire_type}")
@@ -156,7 +162,7 @@ def decode_trade(data: bytes) -> dict:
 
 def decode_market_data(data: bytes) -> dict:
     """
-    解码行情数据消息
+    解码行情数据消息（data 可以是 bytes 或 memoryview）
 
     message MarketData {
       string symbol = 1;
@@ -193,7 +199,7 @@ def decode_market_data(data: bytes) -> dict:
 
         elif wire_type == 2:  # length-delimited
             length, pos = _read_varint(data, pos)
-            value = data[pos:pos+length].decode('utf-8')
+            value = str(data[pos:pos+length], 'utf-8')  # bytes 或 memoryview（零拷贝帧）
             pos += length
 
             if field_number == 1:
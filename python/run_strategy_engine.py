@@ -14,19 +14,14 @@ from typing import Dict, Any
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 from strategy.engine import StrategyEngine
+from strategy.async_engine import AsyncStrategyEngine
+from strategy.shard_supervisor import ShardSupervisor
+from strategy.async_logging import setup_async_logging, JsonFormatter
 from strategy.strategies.ema_cross import EMACrossStrategy
 from strategy.strategies.grid_trading import GridTradingStrategy
 from strategy.strategies.momentum import MomentumStrategy
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(name)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('strategy_engine.log', mode='a')
-    ]
-)
+LOG_FORMAT = '%(asctime)s [%(levelname)s] %(name)s - %(message)s'
 
 logger = logging.getLogger(__name__)
 
@@ -68,6 +63,9 @@ def create_strategy(strategy_config: Dict[str, Any]):
     params = strategy_config.get('parameters', {})
     params['symbol'] = strategy_config.get('symbol', 'BTCUSDT')
     params['exchange'] = strategy_config.get('exchange', 'okx')
+    if strategy_config.get('run_in_executor'):
+        # 计算密集型策略（AsyncStrategyEngine 中在线程池执行）
+        params['run_in_executor'] = True
 
     # 创建策略实例
     strategy_class = STRATEGY_CLASSES[strategy_type]
@@ -101,8 +99,13 @@ def main():
     logger.info(f"Trading mode: {trading_mode}")
     logger.info(f"Log level: {log_level}")
 
-    # 设置日志级别
-    logging.getLogger().setLevel(getattr(logging, log_level))
+    # 日志：格式化和写盘在后台线程中完成（log_format = "json" 时日志文件为 JSON Lines）
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    file_handler = logging.FileHandler(global_config.get('log_file', 'strategy_engine.log'), mode='a')
+    file_handler.setFormatter(JsonFormatter() if global_config.get('log_format') == 'json'
+                              else logging.Formatter(LOG_FORMAT))
+    setup_async_logging([stream_handler, file_handler], level=getattr(logging, log_level))
 
     # 引擎配置
     # 根据环境变量决定连接哪个交易所
@@ -112,33 +115,60 @@ def main():
         md_endpoints = [os.getenv('MD_ENDPOINT', 'tcp://md-okx:5558')]
         trade_endpoint = os.getenv('TRADE_ENDPOINT', 'tcp://gateway-okx:5560')
         order_endpoint = os.getenv('ORDER_ENDPOINT', 'tcp://gateway-okx:5559')
+        replay_endpoint = os.getenv('TRADE_REPLAY_ENDPOINT', 'tcp://gateway-okx:5562')
     else:  # binance
         md_endpoints = [os.getenv('MD_ENDPOINT', 'tcp://md-binance:5555')]
         trade_endpoint = os.getenv('TRADE_ENDPOINT', 'tcp://gateway-binance:5557')
         order_endpoint = os.getenv('ORDER_ENDPOINT', 'tcp://gateway-binance:5556')
-
-    # 收集所有交易对
-    symbols = set()
-    for strategy_config in config.get('strategies', []):
-        if strategy_config.get('enabled', False):
-            symbols.add(strategy_config.get('symbol', 'BTCUSDT'))
+        replay_endpoint = os.getenv('TRADE_REPLAY_ENDPOINT', 'tcp://gateway-binance:5561')
 
     engine_config = {
         'md_endpoints': md_endpoints,
         'trade_endpoint': trade_endpoint,
         'order_endpoint': order_endpoint,
-        'symbols': list(symbols),
+        # 成交回报缺口回放（网关 ZMQ_REPLAY_ENDPOINT）
+        'trade_replay_endpoint': replay_endpoint,
+        # 策略状态快照和事件日志目录（未设置时不持久化，重启后策略重新预热）
+        'state_dir': os.getenv('STATE_DIR'),
         'use_protobuf': True,
-        'risk_management': config.get('risk_management', {})
+        'risk_management': config.get('risk_management', {}),
+        # 接收循环参数：recv_batch_size / conflate_market_data / md_rcvhwm / poll_timeout_ms
+        **config.get('engine', {})
     }
 
     logger.info(f"Market data endpoints: {md_endpoints}")
     logger.info(f"Trade endpoint: {trade_endpoint}")
     logger.info(f"Order endpoint: {order_endpoint}")
-    logger.info(f"Symbols: {list(symbols)}")
-
-    # 创建引擎
-    engine = StrategyEngine(engine_config)
+    logger.info(f"Trade replay endpoint: {replay_endpoint}")
+
+    # 多进程分片（workers > 1）：监督进程按交易对 / 权重把策略分到多个工作进程
+    workers = engine_config.get('workers', 1)
+    if workers > 1:
+        strategy_configs = [c for c in config.get('strategies', []) if c.get('enabled', False)]
+        if not strategy_configs:
+            logger.warning("No strategies loaded! Check your config file.")
+            sys.exit(0)
+        supervisor = ShardSupervisor(
+            engine_config, strategy_configs, workers,
+            strategy_factory=create_strategy,
+            shard_by=engine_config.get('shard_by', 'symbol'),
+            heartbeat_timeout=engine_config.get('heartbeat_timeout', 10.0),
+            max_restarts=engine_config.get('max_restarts', 10)
+        )
+        logger.info(f"Supervisor mode: {len(supervisor.shards)} shards "
+                    f"(shard_by: {engine_config.get('shard_by', 'symbol')})")
+        logger.info("=" * 80)
+        try:
+            supervisor.run()
+        except Exception as e:
+            logger.error(f"Supervisor failed: {e}", exc_info=True)
+            sys.exit(1)
+        return
+
+    # 创建引擎（async_engine = true 时使用 asyncio 引擎）
+    engine_class = AsyncStrategyEngine if engine_config.get('async_engine') else StrategyEngine
+    engine = engine_class(engine_config)
+    logger.info(f"Engine: {engine_class.__name__}")
 
     # 加载策略
     strategies_loaded = 0
@@ -154,6 +184,8 @@ def main():
         sys.exit(0)
 
     logger.info(f"Loaded {strategies_loaded} strategies")
+    # 行情订阅由策略声明的交易对决定
+    logger.info(f"Symbols: {engine.subscribed_symbols}")
     logger.info("=" * 80)
 
     # 运行引擎
@@ -4,6 +4,8 @@ TTQuant Strategy Module
 
 from .base_strategy import BaseStrategy, MarketData, Trade, Order, Position, Portfolio
 from .engine import StrategyEngine
+from .async_engine import AsyncStrategyEngine
+from .shard_supervisor import ShardSupervisor
 
 __all__ = [
     'BaseStrategy',
@@ -12,5 +14,7 @@ __all__ = [
     'Order',
     'Position',
     'Portfolio',
-    'StrategyEngine'
+    'StrategyEngine',
+    'AsyncStrategyEngine',
+    'ShardSupervisor'
 ]
@@ -0,0 +1,424 @@
+"""
+AsyncStrategyEngine - 基于 asyncio 的策略引擎
+
+与 StrategyEngine 共用订阅、解码、分发索引、持仓和风控逻辑，接收循环改为 zmq.asyncio：
+- 行情和成交回报各由一个读取任务处理（socket 可读后以 NOBLOCK 批量排空），互不等待
+- 普通同步策略仍在事件循环中直接调用，延迟与同步引擎相同
+- async def on_market_data / on_trade 的策略，以及配置了 run_in_executor 的计算密集型策略，
+  各自拥有一个有界邮箱和一个工作任务：行情积压超过 strategy_queue_size 时丢弃最旧的行情
+  （成交回报从不丢弃），慢策略只拖慢自己，不阻塞行情路径
+- run_in_executor 策略在线程池中执行（同一策略的回调串行执行）；执行器线程中的下单
+  转交事件循环线程发送
+- 订单高水位时进入网关的重试队列，由补发任务在 socket 可写时发送
+- 成交回报出现序号缺口时，回放请求在线程池中执行，应答回到事件循环中应用
+- 周期任务（指标导出、持久化等）通过 add_periodic_task 在后台运行，同步函数在事件循环线程中执行
+"""
+
+import asyncio
+import inspect
+import signal
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+import zmq
+import zmq.asyncio
+import logging
+
+from .base_strategy import BaseStrategy, MarketData, Order, Trade
+from .engine import StrategyEngine
+
+logger = logging.getLogger(__name__)
+
+_MARKET_DATA = 0
+_TRADE = 1
+
+
+class LoopOrderGateway:
+    """
+    订单网关代理
+
+    ZMQ socket 不是线程安全的：事件循环线程直接发送，其他线程（执行器中的策略）
+    通过 call_soon_threadsafe 转交事件循环线程发送。订单进入重试队列时唤醒补发任务
+    """
+
+    def __init__(self, gateway):
+        self.gateway = gateway
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.retry: Optional[asyncio.Event] = None
+        self._loop_thread: Optional[int] = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """绑定事件循环（在循环线程中调用）"""
+        self.loop = loop
+        self.retry = asyncio.Event()
+        self._loop_thread = threading.get_ident()
+
+    def send_order(self, order: Order) -> bool:
+        if self.loop is None or threading.get_ident() == self._loop_thread:
+            return self._send(order)
+        self.loop.call_soon_threadsafe(self._send, order)
+        return True
+
+    def _send(self, order: Order) -> bool:
+        accepted = self.gateway.send_order(order)
+        if self.gateway.pending and self.retry is not None:
+            self.retry.set()
+        return accepted
+
+    def __getattr__(self, name):
+        return getattr(self.gateway, name)
+
+
+class StrategyWorker:
+    """异步 / 执行器策略的有界邮箱"""
+
+    def __init__(self, strategy: BaseStrategy, mode: str, max_pending: int):
+        self.strategy = strategy
+        self.mode = mode                # 'async' / 'executor'
+        self.max_pending = max_pending  # 邮箱中最多积压的行情条数
+        self.events: Deque[Tuple[int, Any]] = deque()
+        self.md_pending = 0
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+        self.processed = 0
+        self.dropped = 0
+        self.max_depth = 0
+
+    def put_market_data(self, md: MarketData):
+        if self.md_pending >= self.max_pending:
+            self._drop_oldest_market_data()
+        else:
+            self.md_pending += 1
+        self._put((_MARKET_DATA, md))
+
+    def put_trade(self, trade: Trade):
+        self._put((_TRADE, trade))
+
+    def _put(self, event: Tuple[int, Any]):
+        self.events.append(event)
+        if len(self.events) > self.max_depth:
+            self.max_depth = len(self.events)
+        self.wakeup.set()
+
+    def _drop_oldest_market_data(self):
+        for i, (kind, _) in enumerate(self.events):
+            if kind == _MARKET_DATA:
+                del self.events[i]
+                self.dropped += 1
+                return
+
+    def stats(self) -> Dict[str, Any]:
+        return {'mode': self.mode, 'depth': len(self.events), 'max_depth': self.max_depth,
+                'processed': self.processed, 'dropped': self.dropped}
+
+
+class AsyncStrategyEngine(StrategyEngine):
+    """
+    asyncio 策略引擎
+
+    额外配置：
+        strategy_queue_size: 异步 / 执行器策略邮箱中最多积压的行情条数（默认 1000）
+        executor_workers: 执行器线程数（默认 4）
+        stats_interval: 周期输出统计信息的间隔秒数（默认 0，不输出）
+
+    策略配置中 run_in_executor = true 的策略在线程池中执行
+    """
+
+    def __init__(self, config: Dict):
+        super().__init__(config)
+
+        self.strategy_queue_size = config.get('strategy_queue_size', 1000)
+        self.executor = ThreadPoolExecutor(max_workers=config.get('executor_workers', 4),
+                                           thread_name_prefix='strategy')
+        self.order_gateway = LoopOrderGateway(self.order_gateway)
+
+        self._workers: Dict[str, StrategyWorker] = {}
+        self._periodic: List[Tuple[str, Callable, float]] = []
+        self._tasks: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopped: Optional[asyncio.Event] = None
+
+        stats_interval = config.get('stats_interval', 0)
+        if stats_interval:
+            self.add_periodic_task('stats', self._log_stats, stats_interval)
+
+    def add_strategy(self, strategy: BaseStrategy):
+        """添加策略（按 on_market_data / on_trade 是否为协程及 run_in_executor 选择执行方式）"""
+        super().add_strategy(strategy)
+
+        if strategy.config.get('run_in_executor', False):
+            mode = 'executor'
+            # 批量推理在事件循环中 flush，执行器中的策略直接推理
+            strategy.set_inference_batcher(None)
+        elif (inspect.iscoroutinefunction(strategy.on_market_data)
+              or inspect.iscoroutinefunction(strategy.on_trade)):
+            mode = 'async'
+        else:
+            return
+
+        worker = StrategyWorker(strategy, mode, self.strategy_queue_size)
+        self._workers[strategy.strategy_id] = worker
+        if self._loop is not None:
+            self._start_worker(worker)
+        logger.info(f"Strategy {strategy.strategy_id} runs in {mode} mode")
+
+    def add_periodic_task(self, name: str, fn: Callable, interval: float):
+        """
+        注册后台周期任务（在 run 之前调用）
+
+        Args:
+            name: 任务名
+            fn: 协程函数，或同步函数（在事件循环线程中执行，与策略回调和持仓更新串行，
+                不受线程池繁忙影响；须为短任务，耗时 I/O 应写成协程并自行放入线程池）
+            interval: 间隔秒数
+        """
+        self._periodic.append((name, fn, interval))
+
+    def worker_stats(self) -> Dict[str, Dict[str, Any]]:
+        """异步 / 执行器策略的邮箱统计"""
+        return {strategy_id: worker.stats() for strategy_id, worker in self._workers.items()}
+
+    # ==================== 运行 ====================
+
+    def run(self):
+        """运行策略引擎（阻塞，内部启动事件循环）"""
+        asyncio.run(self.run_async())
+
+    async def run_async(self):
+        """在当前事件循环中运行策略引擎，直到 stop 被调用"""
+        self.running = True
+        self.stats['start_time'] = time.time()
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        self.order_gateway.bind(self._loop)
+
+        logger.info("=" * 60)
+        logger.info("Async Strategy Engine Started")
+        logger.info("=" * 60)
+        logger.info(f"Strategies: {list(self.strategies.keys())}")
+        logger.info("=" * 60)
+
+        signals = [(signal.SIGINT, self.stop), (signal.SIGTERM, self.stop)]
+        if self.latency_tracer is not None and hasattr(signal, 'SIGUSR1'):
+            # SIGUSR1：写出延迟统计和追踪记录
+            signals.append((signal.SIGUSR1, lambda: self.latency_tracer.request_dump(self.latency_dump_path)))
+        for sig, handler in signals:
+            try:
+                self._loop.add_signal_handler(sig, handler)
+            except (NotImplementedError, RuntimeError, ValueError):
+                # 非主线程或平台不支持
+                logger.warning("Signal handlers not registered")
+                break
+
+        self._start_state_store()
+
+        self._tasks = [
+            asyncio.create_task(self._read_loop(self.md_sub, self._process_market_data), name='md_reader'),
+            asyncio.create_task(self._read_loop(self.trade_sub, self._process_trades), name='trade_reader'),
+            asyncio.create_task(self._order_retry_loop(), name='order_retry'),
+            asyncio.create_task(self._trade_recovery_loop(), name='trade_recovery'),
+        ]
+        for worker in self._workers.values():
+            self._start_worker(worker)
+        for name, fn, interval in self._periodic:
+            self._tasks.append(asyncio.create_task(self._periodic_loop(name, fn, interval), name=name))
+
+        try:
+            await self._stopped.wait()
+        finally:
+            self.running = False
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._tasks = []
+            for sig, _ in signals:
+                try:
+                    self._loop.remove_signal_handler(sig)
+                except (NotImplementedError, RuntimeError, ValueError):
+                    break
+            self._loop = None
+            self.executor.shutdown(wait=True)
+            self._shutdown()
+
+    def stop(self):
+        """停止引擎（可在任意线程调用）"""
+        self.running = False
+        loop = self._loop
+        if loop is not None and self._stopped is not None:
+            loop.call_soon_threadsafe(self._stopped.set)
+
+    # ==================== 任务 ====================
+
+    async def _read_loop(self, socket: zmq.Socket, process: Callable[[], int]):
+        """等待 socket 可读，然后用同步引擎的批量排空逻辑处理"""
+        # 异步影子 socket 只用于等待可读，关闭由 _shutdown 负责
+        waiter = zmq.asyncio.Socket.from_socket(socket)
+        while self.running:
+            try:
+                if not await waiter.poll(self.poll_timeout_ms, zmq.POLLIN):
+                    continue
+                process()
+                self._flush_inference()
+                if self._journal is not None and self._journal.pending:
+                    self._flush_journal()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Reader error: {e}", exc_info=True)
+            # 让出事件循环，策略工作任务和后台任务得以运行
+            await asyncio.sleep(0)
+
+    async def _order_retry_loop(self):
+        """订单进入重试队列后，等待订单 socket 可写并按顺序补发"""
+        gateway = self.order_gateway
+        waiter = zmq.asyncio.Socket.from_socket(gateway.socket)
+        while self.running:
+            await gateway.retry.wait()
+            while gateway.pending and self.running:
+                try:
+                    await waiter.poll(self.poll_timeout_ms, zmq.POLLOUT)
+                    # 超时也调用：过期订单在 flush_pending 中丢弃
+                    gateway.flush_pending()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Order retry error: {e}", exc_info=True)
+            gateway.retry.clear()
+
+    async def _trade_recovery_loop(self):
+        """成交回报出现缺口时请求补发（REQ 在线程池中等待应答，不阻塞事件循环）"""
+        loop = asyncio.get_running_loop()
+        while self.running:
+            await asyncio.sleep(self.poll_timeout_ms / 1000.0)
+            if not self.trade_sequencer.missing or time.monotonic() < self._replay_due:
+                continue
+            try:
+                for gap in self.trade_sequencer.gaps():
+                    reply = None
+                    if self.trade_replay is not None:
+                        reply = await loop.run_in_executor(self.executor, self.trade_replay.request, *gap)
+                    if not self._apply_trade_replay(gap, reply):
+                        break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Trade recovery error: {e}", exc_info=True)
+
+    def _start_worker(self, worker: StrategyWorker):
+        worker.task = asyncio.create_task(self._worker_loop(worker), name=worker.strategy.strategy_id)
+        self._tasks.append(worker.task)
+
+    async def _worker_loop(self, worker: StrategyWorker):
+        """按到达顺序串行执行一个策略的回调"""
+        loop = asyncio.get_running_loop()
+        strategy = worker.strategy
+        while self.running:
+            if not worker.events:
+                worker.wakeup.clear()
+                await worker.wakeup.wait()
+                continue
+
+            kind, event = worker.events.popleft()
+            try:
+                if kind == _MARKET_DATA:
+                    worker.md_pending -= 1
+                    await self._invoke(loop, worker, strategy.on_market_data, event)
+                else:
+                    await self._invoke(loop, worker, strategy.on_trade, event)
+                    self._apply_trade(strategy, event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Strategy {strategy.strategy_id} error: {e}", exc_info=True)
+            worker.processed += 1
+            self._flush_inference()
+
+    async def _invoke(self, loop: asyncio.AbstractEventLoop, worker: StrategyWorker,
+                      method: Callable, arg: Any):
+        if worker.mode == 'executor':
+            await loop.run_in_executor(self.executor, method, arg)
+            return
+        result = method(arg)
+        if inspect.isawaitable(result):
+            await result
+
+    async def _periodic_loop(self, name: str, fn: Callable, interval: float):
+        while self.running:
+            await asyncio.sleep(interval)
+            try:
+                if inspect.iscoroutinefunction(fn):
+                    await fn()
+                else:
+                    fn()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Periodic task {name} failed: {e}")
+
+    def _start_state_store(self):
+        """恢复状态并注册周期快照（快照任务为协程，在事件循环中采集状态）"""
+        if self.state_store is None:
+            return
+        self.restore_state()
+        if self.snapshot_interval > 0:
+            self.add_periodic_task('state_snapshot', self._save_snapshot_async, self.snapshot_interval)
+
+    async def _save_snapshot_async(self):
+        """
+        在事件循环中采集状态（与同步 / async 策略的回调串行），序列化和写文件放入线程池
+
+        执行器策略的回调可能与采集同时执行，其 get_state 需自行保证一致性
+        """
+        if self._journal is None:
+            return
+        snapshot_id, state = self._begin_snapshot()
+        await asyncio.get_running_loop().run_in_executor(self.executor, self._write_snapshot, snapshot_id, state)
+
+    def _flush_inference(self):
+        if self.inference_batcher.pending:
+            self.inference_batcher.flush()
+
+    def _log_stats(self):
+        elapsed = time.time() - self.stats['start_time']
+        logger.info(f"[Stats] {elapsed:.0f}s | md {self.stats['md_count']} | "
+                    f"trades {self.stats['trade_count']} | workers {self.worker_stats()}")
+
+    # ==================== 分发 ====================
+
+    def _dispatch_market_data(self, md: MarketData):
+        """同步策略直接调用，异步 / 执行器策略放入各自邮箱"""
+        tracer = self.latency_tracer
+        if tracer is not None:
+            tracer.record_feed(md.local_time)
+        for strategy in self._dispatch.get(md.symbol, self._wildcard):
+            worker = self._workers.get(strategy.strategy_id)
+            if worker is not None:
+                worker.put_market_data(md)
+                continue
+            try:
+                if tracer is None:
+                    strategy.on_market_data(md)
+                else:
+                    start = tracer.begin(strategy.strategy_id, md.symbol)
+                    try:
+                        strategy.on_market_data(md)
+                    finally:
+                        tracer.end(start)
+            except Exception as e:
+                logger.error(f"Strategy {strategy.strategy_id} error: {e}")
+
+        # 只更新持有该交易对的组合的未实现盈亏
+        for portfolio in self._holders.get(md.symbol, ()):
+            portfolio.update_unrealized_pnl(md.symbol, md.last_price)
+
+    def _dispatch_trade(self, trade: Trade):
+        """异步 / 执行器策略的成交回报进入邮箱，持仓在策略处理后更新"""
+        worker = self._workers.get(trade.strategy_id)
+        if worker is None:
+            super()._dispatch_trade(trade)
+            return
+        self.stats['trade_count'] += 1
+        worker.put_trade(trade)
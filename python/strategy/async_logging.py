@@ -0,0 +1,126 @@
+"""
+异步日志 - 日志记录在调用线程中只入队，格式化和写盘由后台线程完成
+
+setup_async_logging 把根 logger 现有的（或传入的）处理器移到 QueueListener 后台线程，
+根 logger 只保留一个 QueueHandler：
+- 入队时不做格式化（消息参数在后台线程中合并），交易路径上只有一次 put_nowait
+- 队列有界，写盘跟不上时丢弃新记录并计数（dropped），不阻塞调用线程
+- 订单 / 成交日志通过 extra={'event': {...}} 携带结构化字段，
+  JsonFormatter 输出为 JSON Lines，文本格式下与普通日志相同
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    不在调用线程格式化的 QueueHandler
+
+    标准 QueueHandler.prepare 会在入队前合并 msg % args，这里原样入队，由后台线程格式化
+    （同一进程内的队列不需要 pickle；日志参数应为不可变值）。队列满时丢弃并计数
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _QueueListener(logging.handlers.QueueListener):
+
+    def enqueue_sentinel(self):
+        # 队列可能已满：等待后台线程腾出位置，保证停止时队列中的日志全部写出
+        self.queue.put(self._sentinel)
+
+
+class JsonFormatter(logging.Formatter):
+    """JSON Lines 格式：时间、级别、logger、消息，以及 extra['event'] 中的结构化字段"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        event = getattr(record, 'event', None)
+        if event:
+            entry.update(event)
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+_handler: Optional[DeferredQueueHandler] = None
+_listener: Optional[_QueueListener] = None
+
+
+def setup_async_logging(handlers: Optional[List[logging.Handler]] = None,
+                        level: Optional[int] = None,
+                        queue_size: int = 100000) -> DeferredQueueHandler:
+    """
+    把根 logger 切换为异步日志（重复调用返回已安装的 QueueHandler）
+
+    Args:
+        handlers: 后台线程中使用的处理器，None 时沿用根 logger 当前的处理器
+        level: 根 logger 级别
+        queue_size: 队列容量，满时丢弃新记录
+
+    Returns:
+        安装在根 logger 上的 DeferredQueueHandler（dropped 为丢弃计数）
+    """
+    global _handler, _listener
+
+    root = logging.getLogger()
+    if level is not None:
+        root.setLevel(level)
+    if _handler is not None:
+        return _handler
+
+    if handlers is None:
+        handlers = list(root.handlers)
+    if not handlers:
+        stream = logging.StreamHandler()
+        stream.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s] %(message)s'))
+        handlers = [stream]
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    _handler = DeferredQueueHandler(queue.Queue(queue_size))
+    root.addHandler(_handler)
+    _listener = _QueueListener(_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_async_logging)
+    return _handler
+
+
+def stop_async_logging():
+    """写完队列中的日志，恢复根 logger 的同步处理器"""
+    global _handler, _listener
+
+    if _handler is None:
+        return
+    root = logging.getLogger()
+    root.removeHandler(_handler)
+    _listener.stop()
+    for handler in _listener.handlers:
+        root.addHandler(handler)
+    if _handler.dropped:
+        logger.warning(f"Async logging dropped {_handler.dropped} records")
+    _handler = None
+    _listener = None
@@ -9,9 +9,10 @@ BaseStrategy - 策略基类
 """
 
 from abc import ABC, abstractmethod
-from typing import Dict, Optional, Any
-from dataclasses import dataclass
+from typing import Dict, Optional, Any, Set
+from dataclasses import dataclass, asdict
 import time
+from time import perf_counter_ns
 import logging
 
 logger = logging.getLogger(__name__)
@@ -56,6 +57,8 @@ class Trade:
     error_message: str
     is_retryable: bool
     commission: float
+    seq: int = 0  # 网关按交易对分配的序号（0 表示未编号）
+    gateway_id: str = ''  # 网关会话 ID
 
 
 @dataclass
@@ -133,6 +136,20 @@ class Portfolio:
         unrealized = sum(pos.unrealized_pnl for pos in self.positions.values())
         return self.total_pnl + unrealized
 
+    def get_state(self) -> Dict[str, Any]:
+        """持仓、现金和已实现盈亏（用于状态快照）"""
+        return {
+            'positions': [asdict(pos) for pos in self.positions.values()],
+            'cash': self.cash,
+            'total_pnl': self.total_pnl,
+        }
+
+    def set_state(self, state: Dict[str, Any]):
+        """从 get_state 的结果恢复"""
+        self.positions = {pos['symbol']: Position(**pos) for pos in state['positions']}
+        self.cash = state['cash']
+        self.total_pnl = state['total_pnl']
+
 
 class BaseStrategy(ABC):
     """
@@ -141,6 +158,8 @@ class BaseStrategy(ABC):
     所有策略必须继承此类并实现：
     - on_market_data: 行情回调
     - on_trade: 成交回报回调
+
+    策略通过 get_symbols 声明关注的交易对，引擎只把这些交易对的行情分发给策略
     """
 
     def __init__(self, strategy_id: str, config: Dict[str, Any]):
@@ -150,6 +169,39 @@ class BaseStrategy(ABC):
         self._order_gateway = None
         self._order_counter = 0
         self._risk_manager = None  # 风控管理器（可选）
+        self.inference_batcher = None  # 批量推理（可选，由引擎注入）
+        self.latency_tracer = None  # 延迟追踪（可选，由引擎注入）
+
+    def get_symbols(self) -> Optional[Set[str]]:
+        """
+        策略关注的交易对（引擎据此建立分发索引和行情订阅）
+
+        默认取 self.symbols / self.symbol，其次取 config 中的 symbols / symbol；
+        返回 None 表示接收所有交易对的行情。子类可覆盖
+        """
+        symbols = getattr(self, 'symbols', None) or self.config.get('symbols')
+        if symbols:
+            return set(symbols)
+        symbol = getattr(self, 'symbol', None) or self.config.get('symbol')
+        return {symbol} if symbol else None
+
+    def get_state(self) -> Dict[str, Any]:
+        """
+        策略状态（引擎周期性写入快照，重启后通过 set_state 恢复）
+
+        值只能是 dict（str 键）/ list / str / 数值 / bool / None，且不能引用策略内部的可变对象
+        （快照可能在其他线程中序列化）。子类覆盖时合并 super().get_state() 并加入指标状态
+        """
+        return {'portfolio': self.portfolio.get_state(), 'order_counter': self._order_counter}
+
+    def set_state(self, state: Dict[str, Any]):
+        """
+        从 get_state 的结果恢复（在 add_strategy 之后、接收行情之前调用）
+
+        订单编号只增不减：取快照中的编号和当前编号中较大的一个
+        """
+        self.portfolio.set_state(state['portfolio'])
+        self._order_counter = max(self._order_counter, state.get('order_counter', 0))
 
     def set_order_gateway(self, gateway):
         """设置订单网关（依赖注入）"""
@@ -160,6 +212,14 @@ class BaseStrategy(ABC):
         self._risk_manager = risk_manager
         logger.info(f"Risk manager enabled for strategy: {self.strategy_id}")
 
+    def set_inference_batcher(self, batcher):
+        """设置批量推理收集器（可选）"""
+        self.inference_batcher = batcher
+
+    def set_latency_tracer(self, tracer):
+        """设置延迟追踪器（可选）"""
+        self.latency_tracer = tracer
+
     @abstractmethod
     def on_market_data(self, md: MarketData):
         """
@@ -193,19 +253,12 @@ class BaseStrategy(ABC):
 
         # 风控检查
         if self._risk_manager:
-            # 检查每日亏损限制
-            if not self._risk_manager.check_daily_loss_limit():
-                logger.warning(f"[Risk] Order rejected: Daily loss limit reached")
-                return
-
-            # 检查仓位限制（仅对开仓订单）
-            pos = self.get_position(symbol)
-            is_opening = (pos is None or pos.volume == 0) or \
-                        (pos.volume > 0 and side == 'BUY') or \
-                        (pos.volume < 0 and side == 'SELL')
-
-            if is_opening and not self._risk_manager.check_position_limit(symbol, volume, price):
-                logger.warning(f"[Risk] Order rejected: Position limit exceeded")
+            tracer = self.latency_tracer
+            start = perf_counter_ns() if tracer is not None else 0
+            allowed = self._check_risk(symbol, side, price, volume)
+            if tracer is not None:
+                tracer.record_risk(perf_counter_ns() - start)
+            if not allowed:
                 return
 
         self._order_counter += 1
@@ -221,6 +274,25 @@ class BaseStrategy(ABC):
 
         self._order_gateway.send_order(order)
 
+    def _check_risk(self, symbol: str, side: str, price: float, volume: int) -> bool:
+        """下单前的风控检查（每日亏损限制，开仓订单的仓位限制）"""
+        # 检查每日亏损限制
+        if not self._risk_manager.check_daily_loss_limit():
+            logger.warning(f"[Risk] Order rejected: Daily loss limit reached")
+            return False
+
+        # 检查仓位限制（仅对开仓订单）
+        pos = self.get_position(symbol)
+        is_opening = (pos is None or pos.volume == 0) or \
+                    (pos.volume > 0 and side == 'BUY') or \
+                    (pos.volume < 0 and side == 'SELL')
+
+        if is_opening and not self._risk_manager.check_position_limit(symbol, volume, price):
+            logger.warning(f"[Risk] Order rejected: Position limit exceeded")
+            return False
+
+        return True
+
     def check_risk_triggers(self, symbol: str, current_price: float):
         """
         检查风控触发条件（止损止盈）
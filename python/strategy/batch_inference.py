@@ -0,0 +1,84 @@
+"""
+InferenceBatcher - 批量模型推理
+
+一个事件循环周期内，策略把待预测的特征提交到批处理器，
+引擎在周期末调用 flush：同一个因子（模型）的所有请求合并为一次 calculate_batch 调用，
+再把结果分发给各自的回调。多交易对 ML 策略因此每个周期只调用一次模型
+"""
+
+from typing import Callable, Dict, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceBatcher:
+    """
+    批量推理收集器
+
+    因子需实现 calculate_batch({key: features}) -> {key: FactorValue}
+    （如 MLFactor）。同一周期内同一因子、同一 key 的多次提交只保留最后一次
+    """
+
+    def __init__(self):
+        # id(factor) -> (factor, {key: (features, callback)})
+        self._pending: Dict[int, Tuple[object, Dict[str, Tuple[Dict[str, float], Callable]]]] = {}
+        self.stats = {
+            'requests': 0,
+            'batches': 0,
+        }
+
+    @property
+    def pending(self) -> int:
+        """待处理的请求数"""
+        return sum(len(requests) for _, requests in self._pending.values())
+
+    def submit(self, factor, key: str, features: Dict[str, float], callback: Callable):
+        """
+        提交一次预测请求
+
+        Args:
+            factor: 实现 calculate_batch 的因子
+            key: 请求标识（通常为交易对）
+            features: 最新特征值
+            callback: 预测完成后调用 callback(factor_value)
+        """
+        entry = self._pending.get(id(factor))
+        if entry is None:
+            entry = (factor, {})
+            self._pending[id(factor)] = entry
+        entry[1][key] = (features, callback)
+
+    def flush(self) -> int:
+        """
+        执行所有待处理的请求
+
+        Returns:
+            处理的请求数
+        """
+        if not self._pending:
+            return 0
+
+        pending = self._pending
+        self._pending = {}
+        processed = 0
+
+        for factor, requests in pending.values():
+            try:
+                results = factor.calculate_batch(
+                    {key: features for key, (features, _) in requests.items()}
+                )
+            except Exception as e:
+                logger.error(f"Batch inference failed: {e}", exc_info=True)
+                continue
+            self.stats['batches'] += 1
+
+            for key, (_, callback) in requests.items():
+                processed += 1
+                try:
+                    callback(results[key])
+                except Exception as e:
+                    logger.error(f"Inference callback failed for {key}: {e}", exc_info=True)
+
+        self.stats['requests'] += processed
+        return processed
@@ -7,6 +7,25 @@ StrategyEngine - 策略引擎核心
 3. 接收策略订单并发送到 Gateway（ZMQ PUSH）
 4. 接收成交回报并分发到策略（ZMQ SUB）
 5. 集成风控管理
+
+接收循环每次唤醒时以 NOBLOCK 方式排空各个 socket（每次最多 recv_batch_size 条，
+零拷贝帧），行情突发时不必每条消息都调用一次 poll；
+开启 conflate_market_data 时同一批次内每个交易对只处理最新一条行情
+
+行情按交易对分发：add_strategy 时根据策略声明的交易对（get_symbols）建立
+symbol -> [strategy] 索引并订阅对应 topic；未实现盈亏只更新持有该交易对的组合
+
+market_data_format = 'fixed' 时订阅定长二进制行情帧（mdf.<symbol>，见 proto/fixed_frame.py）
+代替 Protobuf 行情（md.<symbol>）
+
+latency_tracing（默认开启）记录接收、解码、策略回调、风控、编码、发送各阶段的延迟和
+按策略的 tick-to-order 延迟（见 latency.py），收到 SIGUSR1 时写出到 latency_dump_path
+
+成交回报按 trade_id 去重，并按网关分配的序号检测缺口（PUB/SUB 高水位时静默丢弃）；
+配置 trade_replay_endpoint 时向网关请求补发缺失的成交，持仓无需整体重建（见 trade_recovery.py）
+
+配置 state_dir 时周期性写入策略状态快照（BaseStrategy.get_state）并把之后分发的行情和成交
+追加到事件日志；启动时恢复最新快照、重放日志尾部（订单不发出），策略无需重新预热（见 state_store.py）
 """
 
 import zmq
@@ -14,15 +33,25 @@ import json
 import time
 import signal
 import sys
+import inspect
+from time import perf_counter_ns
 import os
-from typing import Dict, List
-from .base_strategy import BaseStrategy, MarketData, Trade, Order
+from collections import deque
+from dataclasses import fields
+from operator import attrgetter
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+from .base_strategy import BaseStrategy, MarketData, Trade, Order, Portfolio
 from .risk_manager import RiskManager, RiskConfig
+from .batch_inference import InferenceBatcher
+from .latency import LatencyTracer
+from .trade_recovery import TradeDeduplicator, SequenceTracker, TradeReplayClient
+from .state_store import StateStore, EVENT_MARKET_DATA, EVENT_TRADE
 import logging
 
 # 添加 proto 目录到路径
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
-from proto.protobuf_codec import encode_order, decode_trade, decode_market_data
+from proto.fast_codec import encode_order, decode_trade, decode_market_data, decode_market_data_batch
+from proto.fixed_frame import SymbolTable, decode_frames, FRAME_TOPIC_PREFIX, TABLE_TOPIC
 
 logging.basicConfig(
     level=logging.INFO,
@@ -30,22 +59,48 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 事件日志记录的字段顺序与 dataclass 定义一致
+_md_fields = attrgetter(*(f.name for f in fields(MarketData)))
+_trade_fields = attrgetter(*(f.name for f in fields(Trade)))
+
 
 class OrderGateway:
-    """订单网关（ZMQ PUSH）"""
+    """
+    订单网关（ZMQ PUSH）
+
+    订单以 NOBLOCK 方式发送：发送队列达到高水位（SNDHWM）时不阻塞调用线程，
+    订单进入本地有界重试队列，由引擎在 socket 可写时按原顺序补发（flush_pending）。
+    重试队列满时拒绝新订单，排队超过 pending_timeout_ms 的订单过期丢弃（过时的订单不再发出）
+    """
 
-    def __init__(self, endpoint: str, use_protobuf: bool = True):
+    def __init__(self, endpoint: str, use_protobuf: bool = True, sndhwm: Optional[int] = None,
+                 max_pending: int = 10000, pending_timeout_ms: int = 1000):
         self.context = zmq.Context()
         self.socket = self.context.socket(zmq.PUSH)
+        if sndhwm is not None:
+            self.socket.setsockopt(zmq.SNDHWM, sndhwm)
         self.socket.connect(endpoint)
         self.use_protobuf = use_protobuf
+        self.max_pending = max_pending
+        self.pending_timeout = pending_timeout_ms / 1000.0
+        # 重试队列：(入队时间, 订单, 已编码的消息)
+        self.pending: Deque[Tuple[float, Order, bytes]] = deque()
+        # 延迟追踪（由引擎设置）：记录编码、发送和 tick-to-order
+        self.tracer = None
+        self.stats = {
+            'orders_sent': 0,
+            'hwm_hits': 0,          # 发送时遇到高水位、进入重试队列的订单数
+            'orders_retried': 0,    # 从重试队列补发成功的订单数
+            'orders_rejected': 0,   # 重试队列已满而拒绝的订单数
+            'orders_expired': 0,    # 排队超时丢弃的订单数
+            'max_pending': 0,
+        }
         logger.info(f"Order gateway connected to {endpoint} (protobuf: {use_protobuf})")
 
-    def send_order(self, order: Order):
-        """发送订单（Protobuf 或 JSON 格式）"""
+    def encode(self, order: Order) -> bytes:
+        """编码订单（Protobuf 或 JSON 格式）"""
         if self.use_protobuf:
-            # 使用 Protobuf 编码
-            order_bytes = encode_order(
+            return encode_order(
                 order_id=order.order_id,
                 strategy_id=order.strategy_id,
                 symbol=order.symbol,
@@ -54,21 +109,100 @@ class OrderGateway:
                 side=order.side,
                 timestamp=order.timestamp
             )
-            self.socket.send(order_bytes)
-        else:
-            # 使用 JSON 编码（用于测试）
-            order_dict = {
-                'order_id': order.order_id,
-                'strategy_id': order.strategy_id,
-                'symbol': order.symbol,
-                'price': order.price,
-                'volume': order.volume,
-                'side': order.side,
-                'timestamp': order.timestamp
-            }
-            self.socket.send_json(order_dict)
+        # 使用 JSON 编码（用于测试）
+        return json.dumps({
+            'order_id': order.order_id,
+            'strategy_id': order.strategy_id,
+            'symbol': order.symbol,
+            'price': order.price,
+            'volume': order.volume,
+            'side': order.side,
+            'timestamp': order.timestamp
+        }).encode('utf-8')
+
+    def send_order(self, order: Order) -> bool:
+        """
+        发送订单（不阻塞）
+
+        Returns:
+            已发送或已进入重试队列时返回 True，重试队列已满被拒绝时返回 False
+        """
+        tracer = self.tracer
+        encode_start = perf_counter_ns() if tracer is not None else 0
+        payload = self.encode(order)
+        encode_end = perf_counter_ns() if tracer is not None else 0
+
+        # 已有排队订单时先补发，保持订单顺序
+        if self.pending:
+            self.flush_pending()
+        if not self.pending:
+            try:
+                self.socket.send(payload, zmq.NOBLOCK)
+            except zmq.Again:
+                pass
+            else:
+                if tracer is not None:
+                    tracer.record_order(order, encode_start, encode_end, perf_counter_ns())
+                self.stats['orders_sent'] += 1
+                self._log_order(order, 'sent')
+                return True
+
+        if len(self.pending) >= self.max_pending:
+            self.stats['orders_rejected'] += 1
+            logger.error("[Order] %s rejected: retry queue full (%d)", order.order_id, len(self.pending),
+                         extra={'event': {'event': 'order_rejected', 'order_id': order.order_id,
+                                          'pending': len(self.pending)}})
+            return False
 
-        logger.info(f"[Order] {order.side} {order.volume} {order.symbol} @ ${order.price}")
+        self.stats['hwm_hits'] += 1
+        self.pending.append((time.monotonic(), order, payload))
+        if len(self.pending) > self.stats['max_pending']:
+            self.stats['max_pending'] = len(self.pending)
+        self._log_order(order, 'queued')
+        return True
+
+    def flush_pending(self) -> int:
+        """按顺序补发重试队列中的订单，直到 socket 再次达到高水位；返回补发的订单数"""
+        sent = 0
+        deadline = time.monotonic() - self.pending_timeout
+        pending = self.pending
+        while pending:
+            queued_at, order, payload = pending[0]
+            if queued_at < deadline:
+                pending.popleft()
+                self.stats['orders_expired'] += 1
+                logger.error("[Order] %s expired after %.0fms in retry queue", order.order_id,
+                             (time.monotonic() - queued_at) * 1000,
+                             extra={'event': {'event': 'order_expired', 'order_id': order.order_id}})
+                continue
+            try:
+                self.socket.send(payload, zmq.NOBLOCK)
+            except zmq.Again:
+                break
+            pending.popleft()
+            sent += 1
+            self._log_order(order, 'retried')
+        self.stats['orders_sent'] += sent
+        self.stats['orders_retried'] += sent
+        return sent
+
+    def _log_order(self, order: Order, status: str):
+        # 参数在日志后台线程中格式化（见 async_logging）
+        logger.info("[Order] %s %s %s @ $%s (%s)", order.side, order.volume, order.symbol, order.price, status,
+                    extra={'event': {'event': 'order', 'status': status, 'order_id': order.order_id,
+                                     'strategy_id': order.strategy_id, 'symbol': order.symbol,
+                                     'side': order.side, 'price': order.price, 'volume': order.volume}})
+
+
+class _ReplayOrderGateway:
+    """重放事件日志时代替订单网关：这些订单在重启前已经发出，重放时丢弃"""
+
+    def __init__(self):
+        self.discarded = 0
+
+    def send_order(self, order: Order) -> bool:
+        self.discarded += 1
+        return True
 
 
 class StrategyEngine:
@@ -79,6 +213,14 @@ class StrategyEngine:
         self.strategies: Dict[str, BaseStrategy] = {}
         self.running = False
 
+        # 分发索引：symbol -> 关注该交易对的策略（含接收所有行情的策略，按添加顺序）
+        self._dispatch: Dict[str, List[BaseStrategy]] = {}
+        # 未声明交易对的策略，接收所有行情
+        self._wildcard: List[BaseStrategy] = []
+        # symbol -> 持有该交易对非零仓位的组合
+        self._holders: Dict[str, List[Portfolio]] = {}
+        self._subscribed: Set[str] = set()
+
         # 风控管理器（可选）
         risk_config_dict = config.get('risk_management', {})
         if risk_config_dict.get('enabled', False):
@@ -101,53 +243,197 @@ class StrategyEngine:
         # ZMQ Context
         self.context = zmq.Context()
 
+        # 接收循环参数
+        self.recv_batch_size = config.get('recv_batch_size', 1000)
+        self.conflate_market_data = config.get('conflate_market_data', False)
+        self.poll_timeout_ms = config.get('poll_timeout_ms', 1000)
+
+        # 行情格式：'protobuf'（md.<symbol>）或 'fixed'（定长帧 mdf.<symbol>，需行情服务开启 MD_FIXED_FRAMES）
+        self.market_data_format = config.get('market_data_format', 'protobuf')
+        if self.market_data_format not in ('protobuf', 'fixed'):
+            raise ValueError(f"Unknown market data format: {self.market_data_format}")
+        self._md_prefix = FRAME_TOPIC_PREFIX if self.market_data_format == 'fixed' else 'md.'
+        self.symbol_table = SymbolTable()
+        self._table_topic = TABLE_TOPIC.encode()
+
         # 行情订阅（SUB）
         self.md_sub = self.context.socket(zmq.SUB)
+        # 接收高水位（突发行情时的缓冲条数），需在 connect 之前设置
+        if config.get('md_rcvhwm'):
+            self.md_sub.setsockopt(zmq.RCVHWM, config['md_rcvhwm'])
         md_endpoints = config.get('md_endpoints', ['tcp://localhost:5555'])
         for endpoint in md_endpoints:
             self.md_sub.connect(endpoint)
             logger.info(f"Connected to market data: {endpoint}")
 
-        # 订阅所有交易对
-        symbols = config.get('symbols', [])
-        for symbol in symbols:
-            topic = f"md.{symbol}"
-            self.md_sub.setsockopt_string(zmq.SUBSCRIBE, topic)
-            logger.info(f"Subscribed to {topic}")
+        # 订阅配置中的交易对（策略声明的交易对在 add_strategy 时订阅）
+        if self.market_data_format == 'fixed':
+            self._subscribe(TABLE_TOPIC)
+        for symbol in config.get('symbols', []):
+            self._subscribe(f"{self._md_prefix}{symbol}")
 
         # 成交回报订阅（SUB）
         self.trade_sub = self.context.socket(zmq.SUB)
         trade_endpoint = config.get('trade_endpoint', 'tcp://localhost:5557')
         self.trade_sub.connect(trade_endpoint)
-        self.trade_sub.setsockopt_string(zmq.SUBSCRIBE, "trade.")
+        # 成交回报 topic 为 trade.<symbol>.<exchange>，分片进程只订阅本分片的交易对
+        for topic in config.get('trade_topics', ['trade.']):
+            self.trade_sub.setsockopt_string(zmq.SUBSCRIBE, topic)
         logger.info(f"Connected to trade feed: {trade_endpoint}")
 
+        # 成交回报去重和缺口修复
+        self.trade_dedup = TradeDeduplicator(config.get('trade_dedup_size', 100000))
+        self.trade_sequencer = SequenceTracker()
+        replay_endpoint = config.get('trade_replay_endpoint')
+        if replay_endpoint:
+            self.trade_replay = TradeReplayClient(self.context, replay_endpoint,
+                                                  config.get('trade_replay_timeout_ms', 500))
+            logger.info(f"Trade replay endpoint: {replay_endpoint}")
+        else:
+            self.trade_replay = None
+        self.trade_replay_retry = config.get('trade_replay_retry_ms', 1000) / 1000.0
+        self.trade_replay_max_attempts = config.get('trade_replay_max_attempts', 5)
+        self._replay_attempts = 0
+        self._replay_due = 0.0
+        # 进行中的回放请求：(gateway_id, symbol, from_seq, to_seq) 和应答截止时间
+        self._replay_gap: Optional[Tuple[str, str, int, int]] = None
+        self._replay_deadline = 0.0
+
         # 订单网关（PUSH）
         order_endpoint = config.get('order_endpoint', 'tcp://localhost:5556')
         use_protobuf = config.get('use_protobuf', True)
-        self.order_gateway = OrderGateway(order_endpoint, use_protobuf)
+        self.order_gateway = OrderGateway(
+            order_endpoint, use_protobuf,
+            sndhwm=config.get('order_sndhwm'),
+            max_pending=config.get('order_max_pending', 10000),
+            pending_timeout_ms=config.get('order_pending_timeout_ms', 1000)
+        )
+
+        # 批量推理：一个轮询周期内的模型预测在周期末合并执行
+        self.inference_batcher = InferenceBatcher()
+
+        # 延迟追踪：接收、解码、策略回调、风控、编码、发送各阶段（见 latency.py）
+        if config.get('latency_tracing', True):
+            self.latency_tracer = LatencyTracer(trace_capacity=config.get('latency_trace_capacity', 10000),
+                                                trace_sample=config.get('latency_trace_sample', 0))
+        else:
+            self.latency_tracer = None
+        self.latency_dump_path = config.get('latency_dump_path', 'latency_trace.jsonl')
+        self.order_gateway.tracer = self.latency_tracer
+
+        # 状态快照和事件日志（见 state_store.py），restore_state 之后开始记录事件
+        state_dir = config.get('state_dir')
+        if state_dir:
+            self.state_store = StateStore(state_dir, fsync=config.get('state_fsync', False),
+                                          codec=config.get('state_codec'))
+        else:
+            self.state_store = None
+        self.snapshot_interval = config.get('snapshot_interval', 10.0)
+        self.journal_market_data = config.get('journal_market_data', True)
+        self._journal: Optional[StateStore] = None
+        self._md_journal: Optional[StateStore] = None
+
+        # 周期任务：[name, fn, interval, next_due]，在两次轮询之间执行
+        self._periodic_tasks: List[list] = []
 
         # Poller
         self.poller = zmq.Poller()
         self.poller.register(self.md_sub, zmq.POLLIN)
         self.poller.register(self.trade_sub, zmq.POLLIN)
+        # 重试队列非空时同时等待订单 socket 可写
+        self._order_polling = False
 
         # 统计
         self.stats = {
             'md_count': 0,
+            'md_conflated': 0,      # 被合并（未分发）的行情条数
+            'md_unresolved': 0,     # 符号表未到达而丢弃的定长帧
             'trade_count': 0,
+            'trade_duplicates': 0,  # 重复（已处理过）的成交回报
             'order_count': 0,
+            'recv_batches': 0,
+            'max_recv_batch': 0,
             'start_time': None
         }
 
     def add_strategy(self, strategy: BaseStrategy):
         """添加策略"""
         strategy.set_order_gateway(self.order_gateway)
+        strategy.set_inference_batcher(self.inference_batcher)
+        strategy.set_latency_tracer(self.latency_tracer)
         # 设置风控管理器
         if self.risk_manager:
             strategy.set_risk_manager(self.risk_manager)
         self.strategies[strategy.strategy_id] = strategy
-        logger.info(f"Strategy added: {strategy.strategy_id}")
+
+        symbols = strategy.get_symbols()
+        if symbols is None:
+            # 接收所有行情
+            self._subscribe(self._md_prefix)
+        else:
+            for symbol in sorted(symbols):
+                self._subscribe(f"{self._md_prefix}{symbol}")
+        self._rebuild_dispatch()
+        self.refresh_holders()
+
+        logger.info(f"Strategy added: {strategy.strategy_id} "
+                    f"(symbols: {sorted(symbols) if symbols is not None else 'all'})")
+
+    def add_periodic_task(self, name: str, fn: Callable[[], None], interval: float):
+        """
+        注册周期任务（在接收循环中、两次轮询之间同步执行，间隔精度受 poll_timeout_ms 限制）
+
+        Args:
+            name: 任务名
+            fn: 无参函数
+            interval: 间隔秒数
+        """
+        self._periodic_tasks.append([name, fn, interval, time.monotonic() + interval])
+
+    @property
+    def subscribed_symbols(self) -> List[str]:
+        """已建立分发索引的交易对"""
+        return sorted(self._dispatch)
+
+    def strategies_for(self, symbol: str) -> List[BaseStrategy]:
+        """接收该交易对行情的策略"""
+        return self._dispatch.get(symbol, self._wildcard)
+
+    def refresh_holders(self):
+        """根据各策略组合的当前持仓重建 symbol -> 组合 索引（持仓在引擎之外被修改后调用）"""
+        holders: Dict[str, List[Portfolio]] = {}
+        for strategy in self.strategies.values():
+            for symbol, position in strategy.portfolio.positions.items():
+                if position.volume != 0:
+                    holders.setdefault(symbol, []).append(strategy.portfolio)
+        self._holders = holders
+
+    def _rebuild_dispatch(self):
+        """按添加顺序重建 symbol -> 策略 分发索引"""
+        self._wildcard = [s for s in self.strategies.values() if s.get_symbols() is None]
+        dispatch: Dict[str, List[BaseStrategy]] = {}
+        declared = {s.strategy_id: s.get_symbols() for s in self.strategies.values()}
+        all_symbols = set().union(*(symbols for symbols in declared.values() if symbols))
+        for symbol in all_symbols:
+            dispatch[symbol] = [s for s in self.strategies.values()
+                                if declared[s.strategy_id] is None or symbol in declared[s.strategy_id]]
+        self._dispatch = dispatch
+
+    def _update_holder(self, symbol: str, portfolio: Portfolio):
+        """成交后更新持仓索引"""
+        position = portfolio.positions.get(symbol)
+        holders = self._holders.setdefault(symbol, [])
+        holding = position is not None and position.volume != 0
+        if holding and portfolio not in holders:
+            holders.append(portfolio)
+        elif not holding and portfolio in holders:
+            holders.remove(portfolio)
+
+    def _subscribe(self, topic: str):
+        if topic not in self._subscribed:
+            self.md_sub.setsockopt_string(zmq.SUBSCRIBE, topic)
+            self._subscribed.add(topic)
+            logger.info(f"Subscribed to {topic}")
 
     def run(self):
         """运行策略引擎"""
@@ -167,104 +453,512 @@ class StrategyEngine:
         except ValueError:
             # 在非主线程中运行，跳过信号处理
             logger.warning("Running in non-main thread, signal handlers not registered")
+        else:
+            # SIGUSR1：写出延迟统计和追踪记录
+            if self.latency_tracer is not None:
+                self.latency_tracer.install_signal_handler(self.latency_dump_path)
 
         try:
+            self._start_state_store()
+
             while self.running:
-                socks = dict(self.poller.poll(1000))
+                timeout = self.poll_timeout_ms
+                if self._replay_gap is not None:
+                    # 回放请求进行中时按其截止时间唤醒
+                    timeout = min(timeout, max(0, int((self._replay_deadline - time.monotonic()) * 1000)))
+                socks = dict(self.poller.poll(timeout))
 
                 # 处理行情数据
                 if self.md_sub in socks:
-                    self._handle_market_data()
+                    self._process_market_data()
 
                 # 处理成交回报
                 if self.trade_sub in socks:
-                    self._handle_trade()
+                    self._process_trades()
+
+                # 请求补发成交回报缺口（不阻塞：应答在 socket 可读时处理）
+                if self._replay_gap is not None:
+                    self._poll_trade_replay()
+                elif self.trade_sequencer.missing:
+                    self._recover_trade_gaps()
+
+                # 本周期提交的模型预测合并执行
+                if self.inference_batcher.pending:
+                    self.inference_batcher.flush()
+
+                # 事件日志在分发之后写出，不增加 tick-to-order 延迟
+                if self._journal is not None and self._journal.pending:
+                    self._flush_journal()
+
+                if self._periodic_tasks:
+                    self._run_periodic_tasks()
+
+                # 补发高水位时进入重试队列的订单
+                if self.order_gateway.pending:
+                    self.order_gateway.flush_pending()
+                self._watch_order_socket()
 
         except Exception as e:
             logger.error(f"Engine error: {e}", exc_info=True)
         finally:
             self._shutdown()
 
-    def _handle_market_data(self):
-        """处理行情数据"""
-        try:
-            topic = self.md_sub.recv_string()
-            data_bytes = self.md_sub.recv()  # 接收二进制数据
-
-            # 使用 Protobuf 解码
-            md_dict = decode_market_data(data_bytes)
-
-            md = MarketData(
-                symbol=md_dict['symbol'],
-                last_price=md_dict['last_price'],
-                volume=md_dict['volume'],
-                exchange_time=md_dict['exchange_time'],
-                local_time=md_dict['local_time'],
-                exchange=md_dict['exchange']
-            )
+    def _watch_order_socket(self):
+        """重试队列非空时在 poller 中注册订单 socket 的 POLLOUT，清空后注销"""
+        pending = bool(self.order_gateway.pending)
+        if pending != self._order_polling:
+            if pending:
+                self.poller.register(self.order_gateway.socket, zmq.POLLOUT)
+            else:
+                self.poller.unregister(self.order_gateway.socket)
+            self._order_polling = pending
 
-            self.stats['md_count'] += 1
+    def _run_periodic_tasks(self):
+        now = time.monotonic()
+        for task in self._periodic_tasks:
+            name, fn, interval, next_due = task
+            if now < next_due:
+                continue
+            task[3] = now + interval
+            try:
+                fn()
+            except Exception as e:
+                logger.error(f"Periodic task {name} failed: {e}")
 
-            # 分发到所有策略
-            for strategy in self.strategies.values():
-                strategy.on_market_data(md)
+    def _recv_batch(self, socket: zmq.Socket, limit: Optional[int] = None) -> List[List[zmq.Frame]]:
+        """
+        非阻塞地读取 socket 中已到达的消息（最多 limit 条）
+
+        Returns:
+            消息列表，每条消息为零拷贝帧列表 [topic, payload]
+        """
+        limit = limit or self.recv_batch_size
+        messages = []
+        for _ in range(limit):
+            try:
+                messages.append(socket.recv_multipart(zmq.NOBLOCK, copy=False))
+            except zmq.Again:
+                break
+
+        if messages:
+            self.stats['recv_batches'] += 1
+            if len(messages) > self.stats['max_recv_batch']:
+                self.stats['max_recv_batch'] = len(messages)
+        return messages
+
+    def _process_market_data(self) -> int:
+        """
+        排空行情 socket 并分发
 
-                # 更新未实现盈亏
-                strategy.portfolio.update_unrealized_pnl(md.symbol, md.last_price)
+        conflate_market_data 开启时按 topic（md.<symbol>）合并，只解码并分发每个交易对
+        的最新一条（ZMQ_CONFLATE 不支持多帧消息且不区分交易对，因此在应用层合并）
 
+        Returns:
+            本批次接收的消息数
+        """
+        messages = self._recv_batch(self.md_sub)
+        self.stats['md_count'] += len(messages)
+        tracer = self.latency_tracer
+        if tracer is not None:
+            tracer.mark_recv()
+
+        if self.conflate_market_data and len(messages) > 1:
+            latest = {}
+            for frames in messages:
+                topic = frames[0].bytes
+                # 重新插入使顺序为各交易对最新一条的到达顺序
+                latest.pop(topic, None)
+                latest[topic] = frames
+            self.stats['md_conflated'] += len(messages) - len(latest)
+            messages = list(latest.values())
+
+        if self.market_data_format == 'fixed':
+            batch = self._decode_fixed_frames(messages)
+        else:
+            # 批量解码为 MarketData（无法解码的消息记录警告后跳过）
+            batch = decode_market_data_batch([frames[-1].buffer for frames in messages],
+                                             MarketData, skip_invalid=True)
+        if tracer is not None:
+            tracer.record_decode(len(batch))
+        journal = self._md_journal
+        if journal is not None:
+            pending = journal.pending
+            for md in batch:
+                pending.append((EVENT_MARKET_DATA,) + _md_fields(md))
+        for md in batch:
+            self._dispatch_market_data(md)
+        return len(messages)
+
+    def _decode_fixed_frames(self, messages: List[List[zmq.Frame]]) -> List[MarketData]:
+        """先应用本批次中的符号表消息，再批量解码定长帧"""
+        payloads = []
+        for frames in messages:
+            if frames[0].bytes == self._table_topic:
+                self.symbol_table.update(frames[-1])
+            else:
+                payloads.append(frames[-1].buffer)
+        unresolved = self.symbol_table.unresolved
+        batch = decode_frames(payloads, self.symbol_table, MarketData)
+        self.stats['md_unresolved'] += self.symbol_table.unresolved - unresolved
+        return batch
+
+    def _process_trades(self) -> int:
+        """
+        排空成交回报 socket 并逐条分发（成交回报不合并）
+
+        Returns:
+            本批次接收的消息数
+        """
+        messages = self._recv_batch(self.trade_sub)
+        for frames in messages:
+            self._handle_trade(frames[-1].buffer)
+        return len(messages)
+
+    def _handle_market_data(self, data_bytes):
+        """处理一条行情数据（data_bytes 为 bytes 或 memoryview）"""
+        tracer = self.latency_tracer
+        if tracer is not None:
+            tracer.mark_recv()
+        try:
+            md = decode_market_data(data_bytes, MarketData)
         except Exception as e:
-            logger.error(f"Failed to handle market data: {e}")
+            logger.error(f"Failed to decode market data: {e}")
+            return
+        if tracer is not None:
+            tracer.record_decode(1)
+        if self._md_journal is not None:
+            self._md_journal.append((EVENT_MARKET_DATA,) + _md_fields(md))
+        self._dispatch_market_data(md)
 
-    def _handle_trade(self):
-        """处理成交回报"""
+    def _dispatch_market_data(self, md: MarketData):
+        """把一条已解码的行情分发到策略并更新持仓盈亏"""
+        tracer = self.latency_tracer
         try:
-            topic = self.trade_sub.recv_string()
-            data_bytes = self.trade_sub.recv()
+            # 只分发到关注该交易对的策略
+            if tracer is None:
+                for strategy in self._dispatch.get(md.symbol, self._wildcard):
+                    strategy.on_market_data(md)
+            else:
+                tracer.record_feed(md.local_time)
+                for strategy in self._dispatch.get(md.symbol, self._wildcard):
+                    start = tracer.begin(strategy.strategy_id, md.symbol)
+                    try:
+                        strategy.on_market_data(md)
+                    finally:
+                        tracer.end(start)
+
+            # 只更新持有该交易对的组合的未实现盈亏
+            for portfolio in self._holders.get(md.symbol, ()):
+                portfolio.update_unrealized_pnl(md.symbol, md.last_price)
 
-            # 尝试 Protobuf 解码
+        except Exception as e:
+            logger.error(f"Failed to handle market data: {e}")
+
+    def _handle_trade(self, data_bytes):
+        """处理一条成交回报（data_bytes 为 bytes 或 memoryview）"""
+        try:
             if self.order_gateway.use_protobuf:
-                trade_dict = decode_trade(data_bytes)
+                trade = decode_trade(data_bytes, Trade)
             else:
                 # JSON 解码（用于测试）
-                trade_dict = json.loads(data_bytes.decode('utf-8'))
-
-            trade = Trade(
-                trade_id=trade_dict.get('trade_id', ''),
-                order_id=trade_dict.get('order_id', ''),
-                strategy_id=trade_dict.get('strategy_id', ''),
-                symbol=trade_dict.get('symbol', ''),
-                side=trade_dict.get('side', ''),
-                filled_price=trade_dict.get('filled_price', 0.0),
-                filled_volume=trade_dict.get('filled_volume', 0),
-                trade_time=trade_dict.get('trade_time', 0),
-                status=trade_dict.get('status', ''),
-                error_code=trade_dict.get('error_code', 0),
-                error_message=trade_dict.get('error_message', ''),
-                is_retryable=trade_dict.get('is_retryable', False),
-                commission=trade_dict.get('commission', 0.0)
-            )
+                trade_dict = json.loads(bytes(data_bytes).decode('utf-8'))
+                trade = Trade(
+                    trade_id=trade_dict.get('trade_id', ''),
+                    order_id=trade_dict.get('order_id', ''),
+                    strategy_id=trade_dict.get('strategy_id', ''),
+                    symbol=trade_dict.get('symbol', ''),
+                    side=trade_dict.get('side', ''),
+                    filled_price=trade_dict.get('filled_price', 0.0),
+                    filled_volume=trade_dict.get('filled_volume', 0),
+                    trade_time=trade_dict.get('trade_time', 0),
+                    status=trade_dict.get('status', ''),
+                    error_code=trade_dict.get('error_code', 0),
+                    error_message=trade_dict.get('error_message', ''),
+                    is_retryable=trade_dict.get('is_retryable', False),
+                    commission=trade_dict.get('commission', 0.0),
+                    seq=trade_dict.get('seq', 0),
+                    gateway_id=trade_dict.get('gateway_id', '')
+                )
+
+        except Exception as e:
+            logger.error(f"Failed to decode trade: {e}")
+            return
+        if self._accept_trade(trade):
+            if self._journal is not None:
+                self._journal.append((EVENT_TRADE,) + _trade_fields(trade))
+            self._dispatch_trade(trade)
+
+    def _accept_trade(self, trade: Trade) -> bool:
+        """去重并检测序号缺口，返回是否应用该成交"""
+        if self.trade_dedup.seen(trade.trade_id) or (
+                trade.seq and not self.trade_sequencer.observe(trade.gateway_id, trade.symbol, trade.seq)):
+            self.stats['trade_duplicates'] += 1
+            return False
+        return True
+
+    def _recover_trade_gaps(self):
+        """
+        发出下一个缺口的回放请求（不等待应答，REQ socket 注册到 poller 中，应答由 _poll_trade_replay 处理；
+        请求超时时按 trade_replay_retry_ms 间隔重试）
+        """
+        if self._replay_gap is not None or time.monotonic() < self._replay_due:
+            return
+        gaps = self.trade_sequencer.gaps()
+        if self.trade_replay is None:
+            for gap in gaps:
+                self._apply_trade_replay(gap, None)
+            return
+        if gaps:
+            gap = gaps[0]
+            socket = self.trade_replay.send(*gap)
+            self.poller.register(socket, zmq.POLLIN)
+            self._replay_gap = gap
+            self._replay_deadline = time.monotonic() + self.trade_replay.timeout_ms / 1000.0
+
+    def _poll_trade_replay(self):
+        """应答到达时应用；超过截止时间仍未到达时重建 socket 并记为一次超时"""
+        reply = self.trade_replay.recv_reply()
+        if reply is None and time.monotonic() < self._replay_deadline:
+            return
+        self.poller.unregister(self.trade_replay.socket)
+        if reply is None:
+            self.trade_replay.close()
+        gap = self._replay_gap
+        self._replay_gap = None
+        self._apply_trade_replay(gap, reply)
+
+    def _apply_trade_replay(self, gap: Tuple[str, str, int, int], reply: Optional[tuple]) -> bool:
+        """
+        应用回放应答，区间内仍缺失的成交记为丢失
+
+        Args:
+            gap: (gateway_id, symbol, from_seq, to_seq)
+            reply: TradeReplayClient.request 的结果（None 为超时或未配置回放）
 
+        Returns:
+            False 表示请求超时、稍后重试
+        """
+        gateway_id, symbol, from_seq, to_seq = gap
+        if reply is not None:
+            self._replay_attempts = 0
+            header, payloads = reply
+            for payload in payloads:
+                self._handle_trade(payload)
+            reason = header.get('error') or (f"not in gateway journal (available seq "
+                                             f"{header.get('first_seq')}-{header.get('last_seq')})")
+        elif self.trade_replay is None:
+            reason = "trade_replay_endpoint not configured"
+        else:
+            self._replay_attempts += 1
+            if self._replay_attempts < self.trade_replay_max_attempts:
+                self._replay_due = time.monotonic() + self.trade_replay_retry
+                logger.warning(f"Trade replay request timed out ({self._replay_attempts}/"
+                               f"{self.trade_replay_max_attempts}), retrying")
+                return False
+            self._replay_attempts = 0
+            reason = "replay requests timed out"
+
+        lost = self.trade_sequencer.give_up(gateway_id, symbol, from_seq, to_seq)
+        if lost:
+            logger.error(f"{lost} trades lost on {gateway_id}/{symbol} (seq {from_seq}-{to_seq}): "
+                         f"{reason}; positions may be wrong")
+        else:
+            logger.info(f"Recovered trades on {gateway_id}/{symbol} (seq {from_seq}-{to_seq})")
+        return True
+
+    def _dispatch_trade(self, trade: Trade):
+        """把一条已解码的成交回报分发到对应策略并更新持仓"""
+        try:
             self.stats['trade_count'] += 1
 
             # 分发到对应策略
-            strategy_id = trade.strategy_id
-            if strategy_id in self.strategies:
-                strategy = self.strategies[strategy_id]
+            strategy = self.strategies.get(trade.strategy_id)
+            if strategy is not None:
                 strategy.on_trade(trade)
-
-                # 更新持仓
-                if trade.status == 'FILLED':
-                    strategy.portfolio.update_position(trade)
-                    logger.info(
-                        f"[Trade] {trade.side} {trade.filled_volume} {trade.symbol} @ "
-                        f"${trade.filled_price:.2f} | PnL: ${strategy.get_total_pnl():.2f}"
-                    )
-                else:
-                    logger.warning(f"[Trade] REJECTED: {trade.error_message}")
+                self._apply_trade(strategy, trade)
 
         except Exception as e:
             logger.error(f"Failed to handle trade: {e}")
 
+    def _apply_trade(self, strategy: BaseStrategy, trade: Trade):
+        """成交后更新策略持仓和持仓索引"""
+        if trade.status == 'FILLED':
+            strategy.portfolio.update_position(trade)
+            self._update_holder(trade.symbol, strategy.portfolio)
+            if logger.isEnabledFor(logging.INFO):
+                pnl = strategy.get_total_pnl()
+                logger.info("[Trade] %s %s %s @ $%.2f | PnL: $%.2f", trade.side, trade.filled_volume,
+                            trade.symbol, trade.filled_price, pnl,
+                            extra={'event': {'event': 'fill', 'trade_id': trade.trade_id,
+                                             'order_id': trade.order_id, 'strategy_id': trade.strategy_id,
+                                             'symbol': trade.symbol, 'side': trade.side,
+                                             'price': trade.filled_price, 'volume': trade.filled_volume,
+                                             'pnl': pnl}})
+        else:
+            logger.warning("[Trade] REJECTED: %s", trade.error_message,
+                           extra={'event': {'event': 'reject', 'order_id': trade.order_id,
+                                            'strategy_id': trade.strategy_id,
+                                            'error_code': trade.error_code}})
+
+    # ==================== 状态快照 ====================
+
+    def _start_state_store(self):
+        """恢复状态并注册周期快照（run 开始时调用）"""
+        if self.state_store is None:
+            return
+        self.restore_state()
+        if self.snapshot_interval > 0:
+            self.add_periodic_task('state_snapshot', self.save_snapshot, self.snapshot_interval)
+
+    def restore_state(self) -> bool:
+        """
+        加载最新快照并重放之后的事件日志，然后写入新快照、开始记录事件（run 开始时自动调用）
+
+        重放时策略回调照常执行以重建指标状态，发出的订单被丢弃；协程回调（async 策略）不重放，
+        只恢复快照中的状态和日志中成交对持仓的影响。快照中的成交序号使停机期间网关发出的成交
+        在重启后被识别为缺口并请求回放
+
+        Returns:
+            是否恢复了快照或事件日志
+        """
+        if self.state_store is None or self._journal is not None:
+            return False
+        start = time.perf_counter()
+        snapshot, records = self.state_store.load()
+        if snapshot is not None:
+            self._apply_snapshot(snapshot)
+        replayed = self._replay_journal(records)
+
+        self._journal = self.state_store
+        self._md_journal = self.state_store if self.journal_market_data else None
+        # 重放后的状态写入新快照，之后的事件记录到新的日志文件
+        self.save_snapshot()
+
+        if snapshot is None and not replayed:
+            logger.info("No saved strategy state, starting cold")
+            return False
+        logger.info(f"Strategy state restored in {(time.perf_counter() - start) * 1000:.1f}ms "
+                    f"(snapshot {snapshot['snapshot_id'] if snapshot is not None else 'none'}, "
+                    f"{replayed} journal events)")
+        return True
+
+    def capture_state(self) -> Dict[str, Any]:
+        """各策略状态、风控状态和成交序号（快照内容）"""
+        strategies = {}
+        for strategy_id, strategy in self.strategies.items():
+            try:
+                strategies[strategy_id] = strategy.get_state()
+            except Exception as e:
+                logger.error(f"Strategy {strategy_id} get_state failed: {e}")
+        return {
+            'wall_time': time.time_ns(),
+            'strategies': strategies,
+            'risk': self.risk_manager.get_state() if self.risk_manager is not None else None,
+            'trade_sequence': [[gateway_id, symbol, seq]
+                               for (gateway_id, symbol), seq in self.trade_sequencer.expected.items()],
+        }
+
+    def save_snapshot(self):
+        """采集状态并写入快照（restore_state 之前调用时不写入，避免覆盖未恢复的快照）"""
+        if self._journal is None:
+            return
+        self._write_snapshot(*self._begin_snapshot())
+
+    def _begin_snapshot(self) -> Tuple[int, Dict[str, Any]]:
+        """切换到新的日志文件并采集状态（须在引擎线程中调用）"""
+        return self.state_store.begin_snapshot(), self.capture_state()
+
+    def _write_snapshot(self, snapshot_id: int, state: Dict[str, Any]):
+        start = time.perf_counter()
+        try:
+            self.state_store.write_snapshot(snapshot_id, state)
+        except Exception as e:
+            logger.error(f"Failed to write state snapshot {snapshot_id}: {e}")
+            return
+        logger.debug(f"State snapshot {snapshot_id} written in {(time.perf_counter() - start) * 1000:.1f}ms "
+                     f"({self.state_store.stats['snapshot_bytes']} bytes)")
+
+    def _flush_journal(self):
+        try:
+            self._journal.flush()
+        except Exception as e:
+            logger.error(f"Failed to write state journal: {e}")
+
+    def _apply_snapshot(self, snapshot: Dict[str, Any]):
+        for strategy_id, state in snapshot['strategies'].items():
+            strategy = self.strategies.get(strategy_id)
+            if strategy is None:
+                logger.warning(f"Saved state for unknown strategy {strategy_id} ignored")
+                continue
+            try:
+                strategy.set_state(state)
+            except Exception as e:
+                logger.error(f"Strategy {strategy_id} set_state failed, starting cold: {e}")
+        if snapshot.get('risk') is not None and self.risk_manager is not None:
+            self.risk_manager.set_state(snapshot['risk'])
+        for gateway_id, symbol, seq in snapshot.get('trade_sequence', []):
+            self.trade_sequencer.expected[(gateway_id, symbol)] = seq
+
+    def _replay_journal(self, records: Iterable[list]) -> int:
+        """按顺序重放事件日志（订单不发出），返回重放的事件数"""
+        gateways = {strategy_id: strategy._order_gateway for strategy_id, strategy in self.strategies.items()}
+        discard = _ReplayOrderGateway()
+        for strategy in self.strategies.values():
+            strategy.set_order_gateway(discard)
+        self.refresh_holders()
+
+        count = 0
+        try:
+            for record in records:
+                try:
+                    if record[0] == EVENT_MARKET_DATA:
+                        self._replay_market_data(MarketData(*record[1:]))
+                    elif record[0] == EVENT_TRADE:
+                        self._replay_trade(Trade(*record[1:]))
+                    else:
+                        continue
+                except Exception as e:
+                    logger.error(f"Failed to replay journal event {record[:2]}: {e}")
+                    continue
+                count += 1
+        finally:
+            # 重放中提交的模型预测在恢复订单网关之前执行
+            if self.inference_batcher.pending:
+                self.inference_batcher.flush()
+            for strategy_id, strategy in self.strategies.items():
+                strategy.set_order_gateway(gateways[strategy_id])
+
+        if discard.discarded:
+            logger.info(f"{discard.discarded} orders from journal replay discarded (sent before restart)")
+        return count
+
+    def _replay_market_data(self, md: MarketData):
+        for strategy in self._dispatch.get(md.symbol, self._wildcard):
+            if inspect.iscoroutinefunction(strategy.on_market_data):
+                continue
+            try:
+                strategy.on_market_data(md)
+            except Exception as e:
+                logger.error(f"Strategy {strategy.strategy_id} replay error: {e}")
+        for portfolio in self._holders.get(md.symbol, ()):
+            portfolio.update_unrealized_pnl(md.symbol, md.last_price)
+
+    def _replay_trade(self, trade: Trade):
+        # 经过去重和序号跟踪，重建两者的状态
+        if not self._accept_trade(trade):
+            return
+        strategy = self.strategies.get(trade.strategy_id)
+        if strategy is None:
+            return
+        if not inspect.iscoroutinefunction(strategy.on_trade):
+            try:
+                strategy.on_trade(trade)
+            except Exception as e:
+                logger.error(f"Strategy {strategy.strategy_id} replay error: {e}")
+        if trade.status == 'FILLED':
+            strategy.portfolio.update_position(trade)
+            self._update_holder(trade.symbol, strategy.portfolio)
+
     def _signal_handler(self, signum, frame):
         """信号处理"""
         logger.info(f"Received signal {signum}, shutting down...")
@@ -281,17 +975,47 @@ class StrategyEngine:
         logger.info(f"Runtime: {elapsed:.1f}s")
         logger.info(f"Market data received: {self.stats['md_count']}")
         logger.info(f"Trades executed: {self.stats['trade_count']}")
+        sequencer = self.trade_sequencer
+        if self.stats['trade_duplicates'] or sequencer.detected:
+            logger.info(f"Trade feed: {self.stats['trade_duplicates']} duplicates, {sequencer.detected} missed "
+                        f"({sequencer.recovered} recovered, {sequencer.lost} lost, "
+                        f"{sequencer.missing_count} pending)")
+        gateway_stats = self.order_gateway.stats
+        logger.info(f"Orders sent: {gateway_stats['orders_sent']} (HWM hits: {gateway_stats['hwm_hits']}, "
+                    f"rejected: {gateway_stats['orders_rejected']}, expired: {gateway_stats['orders_expired']})")
+        if self.order_gateway.pending:
+            logger.warning(f"Unsent orders in retry queue: {len(self.order_gateway.pending)}")
+
+        # 延迟统计
+        if self.latency_tracer is not None:
+            for name, stats in self.latency_tracer.summary().items():
+                logger.info(f"Latency {name}: p50 {stats['p50_us']:.1f}us | p99 {stats['p99_us']:.1f}us | "
+                            f"max {stats['max_us']:.1f}us (n={stats['count']})")
 
         # 策略盈亏
         for strategy_id, strategy in self.strategies.items():
             pnl = strategy.get_total_pnl()
             logger.info(f"Strategy {strategy_id} PnL: ${pnl:.2f}")
 
+        # 最终快照：下次启动时无需重放事件日志
+        if self._journal is not None:
+            try:
+                self.save_snapshot()
+            except Exception as e:
+                logger.error(f"Failed to save final state snapshot: {e}")
+            self.state_store.close()
+            self._journal = self._md_journal = None
+            store_stats = self.state_store.stats
+            logger.info(f"State: {store_stats['snapshots_written']} snapshots "
+                        f"({store_stats['snapshot_bytes']} bytes), {store_stats['events_written']} journal events")
+
         logger.info("=" * 60)
 
         # 关闭 ZMQ
         self.md_sub.close()
         self.trade_sub.close()
+        if self.trade_replay is not None:
+            self.trade_replay.close()
         self.order_gateway.socket.close()
         self.context.term()
 
@@ -15,6 +15,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 from strategy.engine import StrategyEngine
 from strategy.base_strategy import BaseStrategy, MarketData, Order
 from strategy.metrics import start_metrics_server, EngineMetrics
+from strategy.async_logging import setup_async_logging
 
 logging.basicConfig(
     level=logging.INFO,
@@ -52,6 +53,9 @@ class SimpleStrategy(BaseStrategy):
 
 def main():
     """主函数"""
+    # 日志在后台线程中写出
+    log_handler = setup_async_logging()
+
     # 1. 启动 Metrics HTTP 服务器
     logger.info("Starting metrics server...")
     start_metrics_server(port=8000)
@@ -82,15 +86,18 @@ def main():
     # 注册策略到指标收集器
     engine_metrics.add_strategy(strategy.strategy_id)
 
+    # 各阶段延迟和按策略的 tick-to-order 延迟由引擎的 LatencyTracer 记录，抓取时导出
+    if engine.latency_tracer is not None:
+        engine_metrics.register_latency_tracer(engine.latency_tracer)
+
     # 6. 集成指标收集到引擎
     # 修改引擎的处理函数以记录指标
-    original_handle_md = engine._handle_market_data
+    original_dispatch_md = engine._dispatch_market_data
     original_handle_trade = engine._handle_trade
 
-    def handle_md_with_metrics():
+    def dispatch_md_with_metrics(md):
         """带指标记录的行情处理"""
-        start_time = time.time()
-        original_handle_md()
+        original_dispatch_md(md)
 
         # 记录指标
         for strategy_id, strategy in engine.strategies.items():
@@ -112,14 +119,9 @@ def main():
                         strategy.portfolio.unrealized_pnl.get(symbol, 0.0)
                     )
 
-        # 记录延迟
-        latency_ms = (time.time() - start_time) * 1000
-        for strategy_id in engine.strategies.keys():
-            engine_metrics.record_strategy_latency(strategy_id, latency_ms)
-
-    def handle_trade_with_metrics():
+    def handle_trade_with_metrics(data_bytes):
         """带指标记录的成交处理"""
-        original_handle_trade()
+        original_handle_trade(data_bytes)
 
         # 记录成交指标
         for strategy_id, strategy in engine.strategies.items():
@@ -130,7 +132,7 @@ def main():
             strategy_metrics.update_max_drawdown(max_dd)
 
     # 替换处理函数
-    engine._handle_market_data = handle_md_with_metrics
+    engine._dispatch_market_data = dispatch_md_with_metrics
     engine._handle_trade = handle_trade_with_metrics
 
     # 7. 启动后台任务更新运行时间
@@ -141,6 +143,10 @@ def main():
         while engine.running:
             uptime = time.time() - start_time
             engine_metrics.update_uptime(uptime)
+            engine_metrics.update_order_gateway(engine.order_gateway.stats,
+                                                len(engine.order_gateway.pending),
+                                                log_handler.dropped)
+            engine_metrics.update_trade_feed(engine.stats['trade_duplicates'], engine.trade_sequencer)
             time.sleep(1)
 
     uptime_thread = threading.Thread(target=update_uptime, daemon=True)
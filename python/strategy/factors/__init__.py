@@ -8,6 +8,12 @@ from .base_factor import BaseFactor, FactorValue
 from .feature_engineering import FeatureEngineering
 from .model_manager import ModelManager
 from .ml_factor import MLFactor, create_labels_from_returns
+from .model_watcher import ModelWatcher
+from .transformer_factor import TransformerFactor
+from .walk_forward import WalkForwardPipeline, monthly_folds
+from .factor_store import FactorStore
+from .ic_engine import ICEngine, ICReport, forward_returns
+from .orthogonalize import orthogonalize, RollingOrthogonalizer
 
 __all__ = [
     'BaseFactor',
@@ -15,5 +21,15 @@ __all__ = [
     'FeatureEngineering',
     'ModelManager',
     'MLFactor',
-    'create_labels_from_returns'
+    'create_labels_from_returns',
+    'ModelWatcher',
+    'TransformerFactor',
+    'WalkForwardPipeline',
+    'monthly_folds',
+    'FactorStore',
+    'ICEngine',
+    'ICReport',
+    'forward_returns',
+    'orthogonalize',
+    'RollingOrthogonalizer'
 ]
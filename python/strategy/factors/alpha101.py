@@ -9,6 +9,8 @@ import numpy as np
 import pandas as pd
 from typing import Dict, List, Optional, Union
 from .ref_operator import RefOperator
+from .ic_engine import ICEngine
+from .orthogonalize import orthogonalize
 
 
 class Alpha101:
@@ -21,6 +23,9 @@ class Alpha101:
     3. 返回值前面有足够的 NaN
     """
 
+    # 因子定义版本（修改任何因子公式时递增，用于 FactorStore 缓存失效）
+    VERSION = "1"
+
     def __init__(self):
         self.ref = RefOperator()
 
@@ -1572,54 +1577,32 @@ class Alpha101Manager:
         Returns:
             通过筛选的因子名称列表
         """
+        # 批量计算全部因子的 IC（每个因子在与标签的共同有效行上排名，与逐列 spearmanr 一致）
+        engine = ICEngine(method='spearman', min_periods=10)
+        report = engine.evaluate(factors, returns, factor_corr=False)
+        ic_values = report.primary.iloc[:, 0]
+
         selected_factors = []
 
         for col in factors.columns:
-            ic = self.calculate_ic(factors[col].values, returns.values)
+            ic = ic_values[str(col)]
             if not np.isnan(ic) and abs(ic) > ic_threshold:
                 selected_factors.append(col)
                 print(f"{col}: IC = {ic:.4f}")
 
         return selected_factors
 
-    def orthogonalize_factors(self, factors: pd.DataFrame) -> pd.DataFrame:
+    def orthogonalize_factors(self, factors: pd.DataFrame, method: str = 'qr') -> pd.DataFrame:
         """
-        因子正交化（施密特正交化）
+        因子正交化
 
         Args:
             factors: 因子 DataFrame
+            method: 'qr'（Householder QR，等价于按列顺序的施密特正交化）
+                    或 'lowdin'（对称正交化，与因子顺序无关）
 
         Returns:
-            正交化后的因子 DataFrame
+            正交化后的因子 DataFrame（每列均值为 0；满秩时范数为 1 且两两正交，秩亏时见 orthogonalize）
         """
-        from sklearn.preprocessing import StandardScaler
-
-        # 标准化
-        scaler = StandardScaler()
-        factors_scaled = pd.DataFrame(
-            scaler.fit_transform(factors.fillna(0)),
-            index=factors.index,
-            columns=factors.columns
-        )
-
-        # 施密特正交化
-        orthogonal_factors = pd.DataFrame(index=factors.index)
-
-        for i, col in enumerate(factors_scaled.columns):
-            vec = factors_scaled[col].values.copy()
-
-            # 减去在之前所有向量上的投影
-            for j in range(i):
-                prev_vec = orthogonal_factors.iloc[:, j].values
-                projection = np.dot(vec, prev_vec) / (np.dot(prev_vec, prev_vec) + 1e-10)
-                vec = vec - projection * prev_vec
-
-            # 归一化
-            norm = np.linalg.norm(vec)
-            if norm > 1e-10:
-                vec = vec / norm
-
-            orthogonal_factors[col] = vec
-
-        return orthogonal_factors
+        return orthogonalize(factors.fillna(0), method=method)
 
@@ -0,0 +1,234 @@
+"""
+Factor Store - 因子持久化缓存
+
+将计算好的因子列保存为 Parquet，避免每次训练/回测都从 CSV 重新计算：
+- 缓存键：因子定义版本 + 参数 → 子目录；输入 OHLCV 切片的哈希 → 命中校验
+- 数据源增长时（在原数据末尾追加新 K 线），只计算新增部分并追加写入
+- 所有写入先落临时文件再 os.replace，保证原子性
+"""
+
+import os
+import json
+import hashlib
+import shutil
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+import logging
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    _has_pyarrow = True
+except ImportError:
+    _has_pyarrow = False
+
+logger = logging.getLogger(__name__)
+
+OHLCV_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+
+class FactorStore:
+    """
+    因子存储
+
+    目录结构：
+        cache_dir/<name>/<key>/manifest.json
+        cache_dir/<name>/<key>/part-00000.parquet
+        cache_dir/<name>/<key>/part-00001.parquet   # 追加的新 K 线
+    """
+
+    def __init__(self, cache_dir: str = "data/cache/factors",
+                 columns: Sequence[str] = OHLCV_COLUMNS):
+        """
+        Args:
+            cache_dir: 缓存目录
+            columns: 参与指纹计算的输入列
+        """
+        self.cache_dir = cache_dir
+        self.columns = tuple(columns)
+        self.enabled = _has_pyarrow
+
+        if self.enabled:
+            os.makedirs(cache_dir, exist_ok=True)
+            logger.info(f"FactorStore initialized: {cache_dir}")
+        else:
+            logger.warning("pyarrow 未安装，FactorStore 已禁用（每次重新计算因子）")
+
+    # ==================== 指纹 ====================
+
+    def fingerprint(self, data: pd.DataFrame, n_rows: Optional[int] = None) -> str:
+        """
+        计算输入 OHLCV 切片的哈希
+
+        Args:
+            data: 输入数据
+            n_rows: 只对前 n_rows 行计算（用于判断数据源是否只是在末尾增长）
+
+        Returns:
+            十六进制哈希字符串
+        """
+        if n_rows is None:
+            n_rows = len(data)
+
+        h = hashlib.blake2b(digest_size=16)
+        h.update(str(n_rows).encode())
+        for col in self.columns:
+            if col not in data.columns:
+                continue
+            values = np.ascontiguousarray(data[col].values[:n_rows], dtype=np.float64)
+            h.update(col.encode())
+            h.update(values.tobytes())
+        return h.hexdigest()
+
+    @staticmethod
+    def make_key(version: str, params: Optional[Dict[str, Any]] = None) -> str:
+        """由因子定义版本和参数生成缓存键"""
+        payload = json.dumps({'version': str(version), 'params': params or {}},
+                             sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+    # ==================== 读写 ====================
+
+    def get_or_compute(
+        self,
+        name: str,
+        data: pd.DataFrame,
+        compute_fn: Callable[[pd.DataFrame], pd.DataFrame],
+        version: str = "1",
+        params: Optional[Dict[str, Any]] = None,
+        warmup: Optional[int] = None
+    ) -> pd.DataFrame:
+        """
+        读取缓存的因子，缺失时计算并写入
+
+        Args:
+            name: 数据集名称（如 BTCUSDT_1h）
+            data: 输入 OHLCV 数据
+            compute_fn: 因子计算函数 data -> DataFrame（行数与 data 相同）
+            version: 因子定义版本，修改因子公式时必须递增
+            params: 计算参数
+            warmup: 增量计算所需的回看行数。None 表示因子依赖全样本
+                    （如全序列 rank），数据增长时整体重算
+
+        Returns:
+            因子 DataFrame，索引与 data 对齐
+        """
+        if not self.enabled:
+            return compute_fn(data)
+
+        key = self.make_key(version, params)
+        entry_dir = os.path.join(self.cache_dir, name, key)
+        manifest = self._read_manifest(entry_dir)
+        n = len(data)
+
+        if manifest is not None:
+            cached_rows = manifest['n_rows']
+
+            # 完全命中
+            if cached_rows == n and manifest['source_hash'] == self.fingerprint(data):
+                logger.info(f"[FactorStore] hit: {name}/{key} ({n} rows)")
+                return self._read_parts(entry_dir, manifest, data.index)
+
+            # 数据源在末尾增长：只计算新增 K 线
+            if (warmup is not None and cached_rows < n
+                    and manifest['source_hash'] == self.fingerprint(data, cached_rows)):
+                start = max(0, cached_rows - warmup)
+                tail = compute_fn(data.iloc[start:])
+                new_rows = tail.iloc[cached_rows - start:]
+                new_rows = new_rows[manifest['columns']]
+
+                self._append_part(entry_dir, manifest, new_rows, data)
+                logger.info(f"[FactorStore] append: {name}/{key} "
+                            f"+{n - cached_rows} rows (total {n})")
+                return self._read_parts(entry_dir, manifest, data.index)
+
+        # 未命中：全量计算并覆盖
+        factors = compute_fn(data)
+        self._write_full(entry_dir, factors, data, version, params, warmup)
+        logger.info(f"[FactorStore] miss: {name}/{key} computed {factors.shape[1]} factors")
+        return factors
+
+    def load(self, name: str, version: str = "1",
+             params: Optional[Dict[str, Any]] = None) -> Optional[pd.DataFrame]:
+        """直接读取缓存（不校验输入数据），不存在时返回 None"""
+        if not self.enabled:
+            return None
+        entry_dir = os.path.join(self.cache_dir, name, self.make_key(version, params))
+        manifest = self._read_manifest(entry_dir)
+        if manifest is None:
+            return None
+        return self._read_parts(entry_dir, manifest, pd.RangeIndex(manifest['n_rows']))
+
+    def invalidate(self, name: str):
+        """删除某个数据集的全部缓存"""
+        path = os.path.join(self.cache_dir, name)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+            logger.info(f"[FactorStore] invalidated: {name}")
+
+    # ==================== 内部实现 ====================
+
+    def _read_manifest(self, entry_dir: str) -> Optional[Dict]:
+        manifest_file = os.path.join(entry_dir, "manifest.json")
+        if not os.path.exists(manifest_file):
+            return None
+        try:
+            with open(manifest_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"[FactorStore] corrupt manifest {manifest_file}: {e}")
+            return None
+
+    def _write_manifest(self, entry_dir: str, manifest: Dict):
+        manifest_file = os.path.join(entry_dir, "manifest.json")
+        tmp_file = manifest_file + ".tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_file, manifest_file)
+
+    def _write_table(self, path: str, frame: pd.DataFrame):
+        table = pa.Table.from_pandas(frame.reset_index(drop=True), preserve_index=False)
+        tmp_path = path + ".tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+
+    def _write_full(self, entry_dir: str, factors: pd.DataFrame, data: pd.DataFrame,
+                    version: str, params: Optional[Dict], warmup: Optional[int]):
+        if os.path.exists(entry_dir):
+            shutil.rmtree(entry_dir)
+        os.makedirs(entry_dir, exist_ok=True)
+
+        part = "part-00000.parquet"
+        self._write_table(os.path.join(entry_dir, part), factors)
+
+        self._write_manifest(entry_dir, {
+            'version': str(version),
+            'params': params or {},
+            'warmup': warmup,
+            'columns': list(factors.columns),
+            'parts': [part],
+            'n_rows': len(data),
+            'source_hash': self.fingerprint(data),
+            'updated_at': datetime.now().isoformat()
+        })
+
+    def _append_part(self, entry_dir: str, manifest: Dict,
+                     new_rows: pd.DataFrame, data: pd.DataFrame):
+        part = f"part-{len(manifest['parts']):05d}.parquet"
+        self._write_table(os.path.join(entry_dir, part), new_rows)
+
+        manifest['parts'].append(part)
+        manifest['n_rows'] = len(data)
+        manifest['source_hash'] = self.fingerprint(data)
+        manifest['updated_at'] = datetime.now().isoformat()
+        # manifest 最后写入：中途失败时旧 manifest 仍指向完整的旧分片
+        self._write_manifest(entry_dir, manifest)
+
+    def _read_parts(self, entry_dir: str, manifest: Dict, index: pd.Index) -> pd.DataFrame:
+        tables: List = [pq.read_table(os.path.join(entry_dir, part))
+                        for part in manifest['parts']]
+        frame = pa.concat_tables(tables).to_pandas()
+        frame.index = index
+        return frame[manifest['columns']]
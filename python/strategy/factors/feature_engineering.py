@@ -9,6 +9,8 @@ from collections import deque
 import numpy as np
 import logging
 
+from .incremental_features import IncrementalFeatures
+
 logger = logging.getLogger(__name__)
 
 
@@ -20,6 +22,9 @@ class FeatureEngineering:
     - 价格特征：收益率、波动率
     - 技术指标：MA、EMA、RSI、MACD、Bollinger Bands
     - 统计特征：偏度、峰度
+
+    extract_features 返回回看窗口内的完整特征序列（用于训练/批量计算）；
+    实盘逐笔调用 get_latest_features，只读取增量状态，复杂度 O(1)
     """
 
     def __init__(self, lookback_period: int = 50):
@@ -32,6 +37,7 @@ class FeatureEngineering:
         self.lookback_period = lookback_period
         self.price_history: Dict[str, deque] = {}
         self.volume_history: Dict[str, deque] = {}
+        self.incremental: Dict[str, IncrementalFeatures] = {}
 
     def update(self, symbol: str, price: float, volume: float):
         """
@@ -45,9 +51,16 @@ class FeatureEngineering:
         if symbol not in self.price_history:
             self.price_history[symbol] = deque(maxlen=self.lookback_period)
             self.volume_history[symbol] = deque(maxlen=self.lookback_period)
+            self.incremental[symbol] = IncrementalFeatures()
 
         self.price_history[symbol].append(price)
         self.volume_history[symbol].append(volume)
+        self.incremental[symbol].update(price, volume)
+
+    def get_sample_count(self, symbol: str) -> int:
+        """返回交易对累计收到的行情数"""
+        state = self.incremental.get(symbol)
+        return state.count if state is not None else 0
 
     def extract_features(self, symbol: str) -> Dict[str, np.ndarray]:
         """
@@ -256,19 +269,16 @@ class FeatureEngineering:
         """
         获取最新的特征值（用于实时预测）
 
+        直接返回增量状态中维护的最新值，不重新计算历史数组。
+        EMA / MACD / RSI 基于全部历史递推，与在完整序列上计算一致
+
         Args:
             symbol: 交易对
 
         Returns:
             最新特征字典
         """
-        features = self.extract_features(symbol)
-        if not features:
+        state = self.incremental.get(symbol)
+        if state is None:
             return {}
-
-        latest = {}
-        for key, values in features.items():
-            if len(values) > 0:
-                latest[key] = float(values[-1])
-
-        return latest
+        return state.latest
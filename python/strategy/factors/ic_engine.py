@@ -0,0 +1,408 @@
+"""
+IC Engine - 批量因子 IC 计算与筛选
+
+一次矩阵运算计算所有因子对所有标签周期的 IC：
+- 缺失值按因子/标签对成对剔除（pairwise-complete），Pearson IC 与逐列计算一致
+- Spearman IC 在每个因子/标签对的共同有效行上排名，与逐列剔除 NaN 后的 spearmanr 一致：
+  共同有效掩码相同的因子一起排名，掩码与各列自身有效掩码相同时复用整体排名
+- 滚动 IC 和因子相关性（Spearman）使用每列在自身有效值上的排名
+- 同一次调用内计算滚动 IC、IC 均值/标准差/IR 和因子间相关性
+- 在 IC 结果上做贪心去相关筛选
+"""
+
+import warnings
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple, Union
+import numpy as np
+import pandas as pd
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ICReport:
+    """IC 计算结果（行：因子，列：标签周期）"""
+    ic: pd.DataFrame                           # Pearson IC
+    rank_ic: Optional[pd.DataFrame]            # Spearman IC（rank=False 时为 None）
+    n_obs: pd.DataFrame                        # 每个因子/标签对的有效样本数
+    method: str = 'spearman'                   # 滚动 IC 和因子相关性使用的方法
+    ic_mean: Optional[pd.DataFrame] = None     # 滚动 IC 均值
+    ic_std: Optional[pd.DataFrame] = None      # 滚动 IC 标准差
+    icir: Optional[pd.DataFrame] = None        # IC 均值 / IC 标准差
+    rolling_ic: Optional[np.ndarray] = None    # (n_windows, n_factors, n_labels)
+    rolling_index: Optional[np.ndarray] = None # 每个窗口最后一行的位置
+    factor_corr: Optional[pd.DataFrame] = None # 因子间相关系数矩阵
+
+    @property
+    def primary(self) -> pd.DataFrame:
+        """筛选使用的 IC（按 method 选择 Pearson 或 Spearman）"""
+        if self.method == 'spearman' and self.rank_ic is not None:
+            return self.rank_ic
+        return self.ic
+
+
+def forward_returns(close: Union[np.ndarray, pd.Series],
+                    horizons: Sequence[int] = (1,)) -> pd.DataFrame:
+    """
+    构建多周期未来收益率标签
+
+    Args:
+        close: 收盘价
+        horizons: 预测周期列表
+
+    Returns:
+        列名为 ret_{h} 的 DataFrame，t 时刻为 t -> t+h 的收益率
+    """
+    index = close.index if isinstance(close, pd.Series) else None
+    prices = np.asarray(close, dtype=np.float64)
+
+    labels = {}
+    for h in horizons:
+        ret = np.full(len(prices), np.nan)
+        ret[:-h] = (prices[h:] - prices[:-h]) / prices[:-h]
+        labels[f'ret_{h}'] = ret
+
+    return pd.DataFrame(labels, index=index)
+
+
+class ICEngine:
+    """
+    批量 IC 计算引擎
+
+    使用方法：
+        engine = ICEngine(method='spearman', window=240)
+        report = engine.evaluate(factors, forward_returns(close, [1, 5, 10]))
+        selected = engine.select(report, ic_threshold=0.03, max_corr=0.7)
+    """
+
+    def __init__(
+        self,
+        method: str = 'spearman',
+        min_periods: int = 10,
+        window: Optional[int] = None,
+        step: Optional[int] = None
+    ):
+        """
+        Args:
+            method: 'spearman' 或 'pearson'，决定滚动 IC / 因子相关性 / 筛选使用的 IC
+            min_periods: 有效样本数少于该值时 IC 记为 NaN
+            window: 滚动 IC 窗口（None 表示不计算滚动 IC）
+            step: 滚动步长（默认等于 window，即不重叠分段），window 必须是 step 的整数倍
+        """
+        if method not in ('spearman', 'pearson'):
+            raise ValueError(f"Unknown method: {method}")
+        self.method = method
+        self.min_periods = min_periods
+        self.window = window
+        self.step = step if step is not None else window
+
+        if window is not None and window % self.step != 0:
+            raise ValueError(f"window ({window}) must be a multiple of step ({self.step})")
+
+    # ==================== 公共接口 ====================
+
+    def evaluate(
+        self,
+        factors: Union[pd.DataFrame, np.ndarray],
+        labels: Union[pd.DataFrame, pd.Series, np.ndarray],
+        rank: bool = True,
+        factor_corr: bool = True
+    ) -> ICReport:
+        """
+        计算所有因子对所有标签的 IC
+
+        Args:
+            factors: 因子矩阵 (n_samples, n_factors)
+            labels: 标签 (n_samples,) 或 (n_samples, n_labels)
+            rank: 是否计算 Spearman IC
+            factor_corr: 是否计算因子间相关性
+
+        Returns:
+            ICReport
+        """
+        F, factor_names = self._as_matrix(factors, 'alpha')
+        Y, label_names = self._as_matrix(labels, 'label')
+        if len(F) != len(Y):
+            raise ValueError(f"Factor and label length mismatch: {len(F)} vs {len(Y)}")
+
+        ic, n_obs = self.pairwise_corr(F, Y, self.min_periods)
+
+        rank_ic = None
+        F_rank = Y_rank = None
+        if rank:
+            F_rank = self.rank_matrix(F)
+            Y_rank = self.rank_matrix(Y)
+            rank_ic = self.rank_corr(F, Y, self.min_periods, F_rank, Y_rank)
+
+        # 滚动 IC / 因子相关性使用的输入
+        if self.method == 'spearman':
+            if F_rank is None:
+                F_rank = self.rank_matrix(F)
+                Y_rank = self.rank_matrix(Y)
+            F_used, Y_used = F_rank, Y_rank
+        else:
+            F_used, Y_used = F, Y
+
+        def frame(values):
+            return pd.DataFrame(values, index=factor_names, columns=label_names)
+
+        report = ICReport(
+            ic=frame(ic),
+            rank_ic=frame(rank_ic) if rank_ic is not None else None,
+            n_obs=frame(n_obs.astype(np.int64)),
+            method=self.method
+        )
+
+        if self.window is not None:
+            rolling, ends = self.rolling_corr(F_used, Y_used, self.window, self.step,
+                                              min_periods=min(self.min_periods, self.window))
+            with warnings.catch_warnings():
+                # 某些因子所有窗口都无效时 nanmean 会告警
+                warnings.simplefilter('ignore', category=RuntimeWarning)
+                ic_mean = np.nanmean(rolling, axis=0)
+                ic_std = np.nanstd(rolling, axis=0)
+            icir = np.divide(ic_mean, ic_std, out=np.full_like(ic_mean, np.nan),
+                             where=ic_std > 0)
+            report.ic_mean = frame(ic_mean)
+            report.ic_std = frame(ic_std)
+            report.icir = frame(icir)
+            report.rolling_ic = rolling
+            report.rolling_index = ends
+
+        if factor_corr:
+            corr, _ = self.pairwise_corr(F_used, F_used, self.min_periods)
+            report.factor_corr = pd.DataFrame(corr, index=factor_names, columns=factor_names)
+
+        return report
+
+    def select(
+        self,
+        report: ICReport,
+        ic_threshold: float = 0.03,
+        max_corr: float = 0.7,
+        max_factors: Optional[int] = None,
+        label: Optional[str] = None,
+        by: str = 'ic'
+    ) -> List[str]:
+        """
+        贪心去相关筛选：按 |得分| 从高到低依次加入，与已选因子相关性超过 max_corr 的跳过
+
+        Args:
+            report: evaluate 的结果
+            ic_threshold: |IC| 阈值
+            max_corr: 与已选因子的最大 |相关系数|
+            max_factors: 最多选择的因子数
+            label: 使用哪个标签的 IC（默认取所有标签 |IC| 的均值）
+            by: 'ic' 按 IC 排序，'icir' 按 IC-IR 排序（需要设置 window）
+
+        Returns:
+            选中的因子名称列表
+        """
+        ic = report.primary
+        ic_abs = ic[label].abs() if label is not None else ic.abs().mean(axis=1)
+
+        if by == 'icir':
+            if report.icir is None:
+                raise ValueError("ICIR not available, set window when creating ICEngine")
+            icir = report.icir
+            score = icir[label].abs() if label is not None else icir.abs().mean(axis=1)
+        elif by == 'ic':
+            score = ic_abs
+        else:
+            raise ValueError(f"Unknown selection key: {by}")
+
+        candidates = score[(ic_abs > ic_threshold) & score.notna()].sort_values(ascending=False)
+
+        corr = report.factor_corr
+        if corr is None and max_corr < 1.0:
+            raise ValueError("Factor correlation not available, evaluate with factor_corr=True")
+
+        selected: List[str] = []
+        for name in candidates.index:
+            if max_factors is not None and len(selected) >= max_factors:
+                break
+            if selected and max_corr < 1.0:
+                # 相关性为 NaN（样本不足）时视为不相关
+                if (corr.loc[name, selected].abs() > max_corr).any():
+                    continue
+            selected.append(name)
+
+        return selected
+
+    # ==================== 向量化计算 ====================
+
+    @staticmethod
+    def rank_matrix(X: np.ndarray) -> np.ndarray:
+        """按列排名（平均秩，NaN 保持 NaN）"""
+        return pd.DataFrame(X).rank(axis=0, method='average').to_numpy(dtype=np.float64)
+
+    @staticmethod
+    def pairwise_corr(A: np.ndarray, B: np.ndarray,
+                      min_periods: int = 2) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        成对剔除缺失值的相关系数矩阵
+
+        Args:
+            A: (n, k) 矩阵
+            B: (n, h) 矩阵
+            min_periods: 最少有效样本数
+
+        Returns:
+            (corr, n_obs)，形状均为 (k, h)
+        """
+        A0, Ma = _center(A)
+        B0, Mb = _center(B)
+
+        n = Ma.T @ Mb
+        sa = A0.T @ Mb
+        sb = Ma.T @ B0
+        saa = (A0 * A0).T @ Mb
+        sbb = Ma.T @ (B0 * B0)
+        sab = A0.T @ B0
+
+        return _corr_from_sums(n, sa, sb, saa, sbb, sab, min_periods), n
+
+    @classmethod
+    def rank_corr(cls, A: np.ndarray, B: np.ndarray, min_periods: int = 2,
+                  A_rank: Optional[np.ndarray] = None,
+                  B_rank: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        成对剔除缺失值的 Spearman 相关系数矩阵（每对在共同有效行上重新排名）
+
+        对 B 的每一列，把 A 的列按与该列的共同有效掩码分组，每组排名一次后一起计算；
+        共同有效掩码等于列自身的有效掩码时直接使用整体排名
+
+        Args:
+            A: (n, k) 矩阵
+            B: (n, h) 矩阵
+            min_periods: 最少有效样本数
+            A_rank / B_rank: rank_matrix(A) / rank_matrix(B)（None 时现算）
+
+        Returns:
+            (k, h) 相关系数矩阵
+        """
+        if A_rank is None:
+            A_rank = cls.rank_matrix(A)
+        if B_rank is None:
+            B_rank = cls.rank_matrix(B)
+        valid_a = np.isfinite(A)
+        valid_b = np.isfinite(B)
+        corr = np.full((A.shape[1], B.shape[1]), np.nan)
+
+        for l in range(B.shape[1]):
+            joint = valid_a & valid_b[:, l:l + 1]
+            groups = {}
+            for j, key in enumerate(np.packbits(joint, axis=0).T):
+                groups.setdefault(key.tobytes(), []).append(j)
+
+            for cols in groups.values():
+                rows = joint[:, cols[0]]
+                if rows.sum() < min_periods:
+                    continue
+                if np.array_equal(rows, valid_a[:, cols[0]]):
+                    a = A_rank[np.ix_(rows, cols)]
+                else:
+                    a = cls.rank_matrix(A[np.ix_(rows, cols)])
+                if np.array_equal(rows, valid_b[:, l]):
+                    b = B_rank[rows, l:l + 1]
+                else:
+                    b = cls.rank_matrix(B[rows, l:l + 1])
+                corr[cols, l] = cls.pairwise_corr(a, b, min_periods)[0][:, 0]
+
+        return corr
+
+    @staticmethod
+    def rolling_corr(A: np.ndarray, B: np.ndarray, window: int, step: int,
+                     min_periods: int = 2) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        分块累加的滚动相关系数
+
+        先按 step 行分块计算各块的一阶/二阶矩，再在块维度上用前缀和得到
+        每个 window 的统计量，内存占用 O(n_blocks * k * h)
+
+        Returns:
+            (rolling, ends)：rolling 形状 (n_windows, k, h)，ends 为每个窗口最后一行的位置
+        """
+        n_rows = len(A)
+        n_blocks = n_rows // step
+        blocks_per_window = window // step
+        if n_blocks < blocks_per_window:
+            k, h = A.shape[1], B.shape[1]
+            return np.empty((0, k, h)), np.empty(0, dtype=np.int64)
+
+        # 丢弃最前面不足一块的行，保证最新数据被包含
+        offset = n_rows - n_blocks * step
+        A0, Ma = _center(A[offset:])
+        B0, Mb = _center(B[offset:])
+
+        def blocks(X):
+            return X.reshape(n_blocks, step, X.shape[1])
+
+        A0, Ma, B0, Mb = blocks(A0), blocks(Ma), blocks(B0), blocks(Mb)
+        At, Mat = A0.transpose(0, 2, 1), Ma.transpose(0, 2, 1)
+
+        sums = [
+            Mat @ Mb,              # n
+            At @ Mb,               # sum a
+            Mat @ B0,              # sum b
+            (At * At) @ Mb,        # sum a^2
+            Mat @ (B0 * B0),       # sum b^2
+            At @ B0,               # sum ab
+        ]
+
+        windowed = []
+        for s in sums:
+            c = np.cumsum(s, axis=0)
+            c = np.concatenate([np.zeros_like(c[:1]), c], axis=0)
+            windowed.append(c[blocks_per_window:] - c[:-blocks_per_window])
+
+        rolling = _corr_from_sums(*windowed, min_periods)
+        ends = offset + (np.arange(blocks_per_window, n_blocks + 1) * step) - 1
+        return rolling, ends
+
+    # ==================== 内部工具 ====================
+
+    @staticmethod
+    def _as_matrix(data, prefix: str) -> Tuple[np.ndarray, List[str]]:
+        if isinstance(data, pd.DataFrame):
+            return data.to_numpy(dtype=np.float64), [str(c) for c in data.columns]
+        if isinstance(data, pd.Series):
+            name = str(data.name) if data.name is not None else f'{prefix}_0'
+            return data.to_numpy(dtype=np.float64).reshape(-1, 1), [name]
+
+        X = np.asarray(data, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(-1, 1)
+        return X, [f'{prefix}_{i}' for i in range(X.shape[1])]
+
+
+def _center(X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """按列减去均值并把 NaN/Inf 置 0，返回 (中心化矩阵, 有效掩码)"""
+    mask = np.isfinite(X)
+    maskf = mask.astype(np.float64)
+    X0 = np.where(mask, X, 0.0)
+    counts = maskf.sum(axis=0)
+    means = np.divide(X0.sum(axis=0), counts, out=np.zeros(X.shape[1]), where=counts > 0)
+    # 中心化不改变相关系数，但能显著降低平方和公式的舍入误差
+    X0 = np.where(mask, X0 - means, 0.0)
+    # 常数列精确置 0，保证方差为 0 而不是舍入噪声
+    col_max = np.where(mask, X, -np.inf).max(axis=0, initial=-np.inf)
+    col_min = np.where(mask, X, np.inf).min(axis=0, initial=np.inf)
+    X0[:, col_max == col_min] = 0.0
+    return X0, maskf
+
+
+def _corr_from_sums(n, sa, sb, saa, sbb, sab, min_periods: int) -> np.ndarray:
+    """由成对样本数和一阶/二阶矩计算相关系数"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = sab - sa * sb / n
+        var_a = saa - sa * sa / n
+        var_b = sbb - sb * sb / n
+        denom = np.sqrt(var_a * var_b)
+        corr = cov / denom
+
+    # 常数列（方差为 0）或样本不足时为 NaN
+    invalid = (n < min_periods) | ~(denom > 0) | ~np.isfinite(corr)
+    corr = np.where(invalid, np.nan, corr)
+    return np.clip(corr, -1.0, 1.0)
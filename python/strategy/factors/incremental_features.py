@@ -0,0 +1,257 @@
+"""
+Incremental Features - 增量特征计算
+
+实盘逐笔更新时只维护每个交易对的运行状态，不再从历史数组重新计算：
+- 滚动窗口（MA、标准差、偏度、峰度）：环形缓冲区 + 幂和，定期从缓冲区重算消除累积误差
+- EMA / MACD：递推
+- RSI：Wilder 平滑递推
+
+窗口类特征与 FeatureEngineering.extract_features 的最后一个值一致；
+EMA / MACD / RSI 使用全部历史递推，等价于在完整序列上计算（与训练脚本一致），
+而不是在 lookback 窗口内重新起算
+"""
+
+import math
+from collections import deque
+from typing import Dict
+
+
+class RollingWindow:
+    """
+    固定长度滚动窗口，O(1) 维护 1~4 阶幂和
+
+    为减小相消误差，幂和基于偏移量 shift 计算（y = x - shift），
+    每 maxlen 次更新从缓冲区重算一次并把 shift 重置为窗口首个值
+    """
+
+    __slots__ = ('maxlen', 'values', 'shift', 's1', 's2', 's3', 's4', '_pushes')
+
+    def __init__(self, maxlen: int):
+        self.maxlen = maxlen
+        self.values = deque(maxlen=maxlen)
+        self.shift = 0.0
+        self.s1 = self.s2 = self.s3 = self.s4 = 0.0
+        self._pushes = 0
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def push(self, x: float):
+        """加入新值（窗口已满时移除最旧的值）"""
+        values = self.values
+        if not values:
+            self.shift = x
+
+        if len(values) == self.maxlen:
+            y = values[0] - self.shift
+            y2 = y * y
+            self.s1 -= y
+            self.s2 -= y2
+            self.s3 -= y2 * y
+            self.s4 -= y2 * y2
+
+        values.append(x)
+        y = x - self.shift
+        y2 = y * y
+        self.s1 += y
+        self.s2 += y2
+        self.s3 += y2 * y
+        self.s4 += y2 * y2
+
+        self._pushes += 1
+        if self._pushes >= self.maxlen:
+            self._resync()
+
+    def _resync(self):
+        """从缓冲区重算幂和"""
+        self._pushes = 0
+        self.shift = self.values[0]
+        s1 = s2 = s3 = s4 = 0.0
+        for x in self.values:
+            y = x - self.shift
+            y2 = y * y
+            s1 += y
+            s2 += y2
+            s3 += y2 * y
+            s4 += y2 * y2
+        self.s1, self.s2, self.s3, self.s4 = s1, s2, s3, s4
+
+    def mean(self) -> float:
+        return self.shift + self.s1 / len(self.values)
+
+    def variance(self) -> float:
+        """总体方差（ddof=0）"""
+        n = len(self.values)
+        mu = self.s1 / n
+        return max(self.s2 / n - mu * mu, 0.0)
+
+    def std(self) -> float:
+        return math.sqrt(self.variance())
+
+    def skewness(self) -> float:
+        """偏度，样本数 < 3 或方差为 0 时为 0"""
+        n = len(self.values)
+        if n < 3:
+            return 0.0
+        mu = self.s1 / n
+        m2 = self.s2 / n - mu * mu
+        if m2 <= 0:
+            return 0.0
+        m3 = self.s3 / n - 3 * mu * self.s2 / n + 2 * mu ** 3
+        return m3 / m2 ** 1.5
+
+    def kurtosis(self) -> float:
+        """超额峰度，样本数 < 4 或方差为 0 时为 0"""
+        n = len(self.values)
+        if n < 4:
+            return 0.0
+        mu = self.s1 / n
+        m2 = self.s2 / n - mu * mu
+        if m2 <= 0:
+            return 0.0
+        m4 = (self.s4 / n - 4 * mu * self.s3 / n
+              + 6 * mu * mu * self.s2 / n - 3 * mu ** 4)
+        return m4 / (m2 * m2) - 3
+
+
+class EMAState:
+    """EMA 递推，首个值作为初始值"""
+
+    __slots__ = ('alpha', 'value')
+
+    def __init__(self, period: int):
+        self.alpha = 2.0 / (period + 1)
+        self.value = None
+
+    def update(self, x: float) -> float:
+        if self.value is None:
+            self.value = x
+        else:
+            self.value += self.alpha * (x - self.value)
+        return self.value
+
+
+class WilderRSI:
+    """Wilder RSI：前 period 个涨跌幅取简单平均，之后按 (avg*(period-1)+x)/period 平滑"""
+
+    __slots__ = ('period', 'avg_gain', 'avg_loss', '_count')
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+        self._count = 0
+
+    def update(self, delta: float) -> float:
+        gain = delta if delta > 0 else 0.0
+        loss = -delta if delta < 0 else 0.0
+        self._count += 1
+
+        if self._count <= self.period:
+            # 初始阶段累加，满 period 个后取平均
+            self.avg_gain += gain
+            self.avg_loss += loss
+            if self._count < self.period:
+                return 50.0
+            self.avg_gain /= self.period
+            self.avg_loss /= self.period
+        else:
+            self.avg_gain = (self.avg_gain * (self.period - 1) + gain) / self.period
+            self.avg_loss = (self.avg_loss * (self.period - 1) + loss) / self.period
+
+        rs = self.avg_gain / (self.avg_loss + 1e-8)
+        return 100 - 100 / (1 + rs)
+
+
+class IncrementalFeatures:
+    """
+    单个交易对的增量特征状态
+
+    每次 update 以 O(1) 更新全部特征，latest 保存最新特征值
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.last_price = None
+
+        self.price_5 = RollingWindow(5)
+        self.price_10 = RollingWindow(10)
+        self.price_20 = RollingWindow(20)
+        self.volume_5 = RollingWindow(5)
+        self.volume_20 = RollingWindow(20)
+        self.returns_5 = RollingWindow(5)
+        self.returns_20 = RollingWindow(20)
+
+        self.ema_5 = EMAState(5)
+        self.ema_10 = EMAState(10)
+        self.ema_20 = EMAState(20)
+        self.ema_12 = EMAState(12)
+        self.ema_26 = EMAState(26)
+        self.macd_signal = EMAState(9)
+        self.rsi = WilderRSI(14)
+
+        self.latest: Dict[str, float] = {}
+
+    def update(self, price: float, volume: float) -> Dict[str, float]:
+        """加入一笔行情并返回最新特征（样本数 < 2 时为空字典）"""
+        price = float(price)
+        volume = float(volume)
+        prev_price = self.last_price
+        self.last_price = price
+        self.count += 1
+
+        self.price_5.push(price)
+        self.price_10.push(price)
+        self.price_20.push(price)
+        self.volume_5.push(volume)
+        self.volume_20.push(volume)
+
+        ema_5 = self.ema_5.update(price)
+        ema_10 = self.ema_10.update(price)
+        ema_20 = self.ema_20.update(price)
+        macd = self.ema_12.update(price) - self.ema_26.update(price)
+        macd_signal = self.macd_signal.update(macd)
+
+        if prev_price is None:
+            return self.latest
+
+        ret = (price - prev_price) / prev_price
+        self.returns_5.push(ret)
+        self.returns_20.push(ret)
+        rsi = self.rsi.update(price - prev_price)
+
+        bb_middle = self.price_20.mean()
+        bb_std = self.price_20.std()
+        bb_upper = bb_middle + 2 * bb_std
+        bb_lower = bb_middle - 2 * bb_std
+
+        n_returns = self.count - 1
+        full_returns = n_returns >= 20
+
+        self.latest = {
+            'price': price,
+            'volume': volume,
+            'returns': ret,
+            'log_returns': math.log(price / prev_price),
+            'volatility': self.returns_5.std() if n_returns >= 5 else 0.0,
+            'ma_5': self.price_5.mean(),
+            'ma_10': self.price_10.mean(),
+            'ma_20': bb_middle,
+            'ema_5': ema_5,
+            'ema_10': ema_10,
+            'ema_20': ema_20,
+            'rsi_14': rsi,
+            'macd': macd,
+            'macd_signal': macd_signal,
+            'macd_histogram': macd - macd_signal,
+            'bb_upper': bb_upper,
+            'bb_middle': bb_middle,
+            'bb_lower': bb_lower,
+            'bb_width': (bb_upper - bb_lower) / (bb_middle + 1e-8),
+            'bb_position': (price - bb_lower) / (bb_upper - bb_lower + 1e-8),
+            'volume_ma_5': self.volume_5.mean(),
+            'volume_ratio': volume / (self.volume_20.mean() + 1e-8),
+            'skewness': self.returns_20.skewness() if full_returns else 0.0,
+            'kurtosis': self.returns_20.kurtosis() if full_returns else 0.0,
+        }
+        return self.latest
@@ -8,7 +8,7 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 import numpy as np
 from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
 from sklearn.preprocessing import StandardScaler
@@ -18,6 +18,7 @@ import logging
 from .base_factor import BaseFactor, FactorValue
 from .feature_engineering import FeatureEngineering
 from .model_manager import ModelManager
+from .tree_compiler import try_compile
 
 logger = logging.getLogger(__name__)
 
@@ -42,10 +43,21 @@ class MLFactor(BaseFactor):
         ])
         self.prediction_horizon = config.get('prediction_horizon', 1)
 
-        # 模型和预处理器
-        self.model = None
-        self.scaler = StandardScaler()
+        # 模型和预处理器（从模型库加载时按需反序列化，见 model / scaler 属性）
+        self._model = None
+        self._scaler = StandardScaler()
+        self._artifact = None
         self.is_trained = False
+        # 当前模型在模型库中的版本（未从模型库加载时为 None）
+        self.model_version: Optional[str] = None
+        # 推理异常次数（热更新后用于判断是否回滚）
+        self.error_count = 0
+
+        # 推理参数（训练/加载后由 scaler 预先计算，推理时不再调用 sklearn 的 transform）
+        self._scale_mean: Optional[np.ndarray] = None
+        self._scale_std: Optional[np.ndarray] = None
+        # 编译后的树模型（不支持编译时为 None，退回 sklearn）
+        self.compiled = None
 
         # 模型管理器
         model_dir = config.get('model_dir', 'models')
@@ -60,6 +72,28 @@ class MLFactor(BaseFactor):
         logger.info(f"  Features: {self.feature_names}")
         logger.info(f"  Prediction horizon: {self.prediction_horizon}")
 
+    @property
+    def model(self):
+        """sklearn 模型；从模型库加载时第一次访问才反序列化"""
+        if self._model is None and self._artifact is not None:
+            self._load_objects()
+        return self._model
+
+    @model.setter
+    def model(self, value):
+        self._model = value
+
+    @property
+    def scaler(self):
+        """特征标准化器；从模型库加载时第一次访问才反序列化"""
+        if self._scaler is None and self._artifact is not None:
+            self._load_objects()
+        return self._scaler
+
+    @scaler.setter
+    def scaler(self, value):
+        self._scaler = value
+
     def get_required_features(self) -> List[str]:
         """返回所需特征列表"""
         return self.feature_names
@@ -97,29 +131,131 @@ class MLFactor(BaseFactor):
 
         # 提取最新特征
         X = self._extract_feature_vector(features)
+        return self._predict(X)
 
-        # 预测
-        try:
-            prediction = self.model.predict(X)[0]
-            probabilities = self.model.predict_proba(X)[0]
-            confidence = float(max(probabilities))
+    def calculate_latest(self, features: Dict[str, float]) -> FactorValue:
+        """
+        使用最新特征值计算因子（实盘路径）
 
-            # 转换为因子值：1 (上涨) -> 1.0, 0 (下跌) -> -1.0
-            factor_value = 1.0 if prediction == 1 else -1.0
+        Args:
+            features: FeatureEngineering.get_latest_features 返回的最新特征值
 
+        Returns:
+            因子值对象
+        """
+        if not self.is_trained:
+            logger.warning(f"Model not trained: {self.factor_id}")
             return FactorValue(
                 symbol="",
                 timestamp=0,
-                value=factor_value,
-                confidence=confidence,
-                metadata={
-                    'prediction': int(prediction),
-                    'probabilities': probabilities.tolist()
-                }
+                value=0.0,
+                confidence=0.0,
+                metadata={'error': 'model_not_trained'}
+            )
+
+        missing = [name for name in self.feature_names if name not in features]
+        if missing:
+            logger.warning(f"Invalid features: {self.factor_id}")
+            return FactorValue(
+                symbol="",
+                timestamp=0,
+                value=0.0,
+                confidence=0.0,
+                metadata={'error': 'invalid_features'}
+            )
+
+        X = np.array([[features[name] for name in self.feature_names]], dtype=float)
+        return self._predict(X)
+
+    def calculate_batch(self, features: Dict[str, Dict[str, float]]) -> Dict[str, FactorValue]:
+        """
+        批量计算多个交易对的因子值（一次模型调用）
+
+        Args:
+            features: {symbol: 最新特征值}
+
+        Returns:
+            {symbol: 因子值对象}
+        """
+        if not features:
+            return {}
+
+        if not self.is_trained:
+            logger.warning(f"Model not trained: {self.factor_id}")
+            return {
+                symbol: FactorValue(symbol=symbol, timestamp=0, value=0.0, confidence=0.0,
+                                    metadata={'error': 'model_not_trained'})
+                for symbol in features
+            }
+
+        results: Dict[str, FactorValue] = {}
+        symbols = []
+        rows = []
+        for symbol, values in features.items():
+            if any(name not in values for name in self.feature_names):
+                results[symbol] = FactorValue(symbol=symbol, timestamp=0, value=0.0,
+                                              confidence=0.0,
+                                              metadata={'error': 'invalid_features'})
+                continue
+            symbols.append(symbol)
+            rows.append([values[name] for name in self.feature_names])
+
+        if not rows:
+            return results
+
+        try:
+            predictions, confidences, probabilities = self.predict_batch(np.array(rows, dtype=float))
+        except Exception as e:
+            logger.error(f"Prediction error: {e}")
+            self.error_count += 1
+            for symbol in symbols:
+                results[symbol] = FactorValue(symbol=symbol, timestamp=0, value=0.0,
+                                              confidence=0.0, metadata={'error': str(e)})
+            return results
+
+        for i, symbol in enumerate(symbols):
+            results[symbol] = self._to_factor_value(
+                predictions[i], confidences[i], probabilities[i], symbol
             )
+        return results
+
+    def predict_batch(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        对原始（未标准化）特征矩阵批量预测
+
+        只调用一次 predict_proba，类别取概率最大者（与 sklearn 分类器的 predict 一致）
+
+        Args:
+            X: (n_samples, n_features) 原始特征
+
+        Returns:
+            (预测类别, 置信度, 各类别概率)
+        """
+        X = np.nan_to_num(np.asarray(X, dtype=float), nan=0.0, posinf=0.0, neginf=0.0)
+        if self._scale_mean is None:
+            self._refresh_inference_params()
+        X = (X - self._scale_mean) / self._scale_std
+
+        if self.compiled is not None:
+            probabilities = self.compiled.predict_proba(X)
+            classes = self.compiled.classes
+        else:
+            probabilities = self.model.predict_proba(X)
+            classes = self.model.classes_
+        best = probabilities.argmax(axis=1)
+        predictions = classes[best]
+        confidences = probabilities[np.arange(len(best)), best]
+        return predictions, confidences, probabilities
+
+    def _predict(self, X: np.ndarray) -> FactorValue:
+        """对单个原始特征向量进行预测"""
+        try:
+            predictions, confidences, probabilities = self.predict_batch(X)
+            return self._to_factor_value(predictions[0], confidences[0], probabilities[0])
 
         except Exception as e:
             logger.error(f"Prediction error: {e}")
+            self.error_count += 1
             return FactorValue(
                 symbol="",
                 timestamp=0,
@@ -128,6 +264,34 @@ class MLFactor(BaseFactor):
                 metadata={'error': str(e)}
             )
 
+    @staticmethod
+    def _to_factor_value(prediction, confidence, probabilities, symbol: str = "") -> FactorValue:
+        """转换为因子值：1 (上涨) -> 1.0, 0 (下跌) -> -1.0"""
+        return FactorValue(
+            symbol=symbol,
+            timestamp=0,
+            value=1.0 if prediction == 1 else -1.0,
+            confidence=float(confidence),
+            metadata={
+                'prediction': int(prediction),
+                'probabilities': probabilities.tolist()
+            }
+        )
+
+    def _refresh_inference_params(self, compiled=None, mean=None, scale=None):
+        """
+        预先计算标准化所需的均值和缩放向量，并编译树模型
+
+        mean / scale / compiled 由模型库的数组直接给出时，不访问 scaler / model
+        """
+        n_features = len(self.feature_names)
+        if mean is None or scale is None:
+            mean = getattr(self.scaler, 'mean_', None)
+            scale = getattr(self.scaler, 'scale_', None)
+        self._scale_mean = np.asarray(mean, dtype=float) if mean is not None else np.zeros(n_features)
+        self._scale_std = np.asarray(scale, dtype=float) if scale is not None else np.ones(n_features)
+        self.compiled = compiled if compiled is not None else try_compile(self.model)
+
     def train(self, features: Dict[str, np.ndarray], labels: np.ndarray,
               test_size: float = 0.2, random_state: int = 42):
         """
@@ -167,6 +331,7 @@ class MLFactor(BaseFactor):
         # 训练
         self.model.fit(X_train_scaled, y_train)
         self.is_trained = True
+        self._refresh_inference_params()
 
         # 评估
         train_score = self.model.score(X_train_scaled, y_train)
@@ -188,11 +353,17 @@ class MLFactor(BaseFactor):
             'test_accuracy': float(test_score),
             'prediction_horizon': self.prediction_horizon
         }
-        self.model_manager.save_model(
+        path = self.model_manager.save_model(
             {'model': self.model, 'scaler': self.scaler},
             self.factor_id,
-            metadata
+            metadata,
+            arrays={
+                'scaler_mean': self._scale_mean,
+                'scaler_scale': self._scale_std,
+            }
         )
+        self._artifact = None
+        self.model_version = os.path.basename(path)
 
         return {
             'train_accuracy': train_score,
@@ -239,7 +410,7 @@ class MLFactor(BaseFactor):
         return X
 
     def _extract_feature_vector(self, features: Dict[str, np.ndarray]) -> np.ndarray:
-        """提取最新特征向量"""
+        """提取最新特征向量（未标准化）"""
         feature_values = []
         for name in self.feature_names:
             if name not in features:
@@ -248,23 +419,72 @@ class MLFactor(BaseFactor):
             value = features[name][-1] if len(features[name]) > 0 else 0.0
             feature_values.append(value)
 
-        X = np.array([feature_values])
-        X = np.nan_to_num(X, nan=0.0, posinf=0.0, neginf=0.0)
-        X = self.scaler.transform(X)
+        return np.array([feature_values], dtype=float)
 
-        return X
-
-    def _load_model(self):
-        """加载模型"""
+    def _load_model(self, version: Optional[str] = None):
+        """加载模型（失败时只记录警告）"""
         try:
+            self.load_version(version)
+        except Exception as e:
+            logger.warning(f"Failed to load model: {e}")
+
+    def load_version(self, version: Optional[str] = None):
+        """
+        从模型库加载模型，失败时抛出异常
+
+        新格式只内存映射 scaler 统计量和编译后的树，model.pkl 在第一次访问
+        model / scaler 时才反序列化；旧格式直接反序列化
+
+        Args:
+            version: 版本号，默认 latest
+        """
+        if self.model_manager.get_latest_version(self.factor_id) is None and version is None:
             model_data, metadata = self.model_manager.load_model(self.factor_id)
+            self._artifact = None
             self.model = model_data['model']
             self.scaler = model_data['scaler']
-            self.is_trained = True
-            logger.info(f"Model loaded: {self.factor_id}")
-            logger.info(f"  Metadata: {metadata}")
-        except Exception as e:
-            logger.warning(f"Failed to load model: {e}")
+            self.model_version = None
+            self._refresh_inference_params()
+        else:
+            artifact = self.model_manager.load_artifact(self.factor_id, version)
+            metadata = artifact.metadata
+            self._artifact = artifact
+            self._model = None
+            self._scaler = None
+            self.model_version = artifact.version
+            mean = scale = None
+            if artifact.has_array('scaler_mean') and artifact.has_array('scaler_scale'):
+                mean = artifact.array('scaler_mean')
+                scale = artifact.array('scaler_scale')
+            self._refresh_inference_params(artifact.compiled(), mean, scale)
+        self.is_trained = True
+        logger.info(f"Model loaded: {self.factor_id} (version {self.model_version})")
+        logger.info(f"  Metadata: {metadata}")
+
+    # 推理所用的全部模型状态，热更新时整体替换
+    _MODEL_FIELDS = ('_model', '_scaler', '_artifact', '_scale_mean', '_scale_std',
+                     'compiled', 'model_version', 'is_trained')
+
+    def model_snapshot(self) -> Dict[str, Any]:
+        """导出当前模型状态"""
+        return {name: getattr(self, name) for name in self._MODEL_FIELDS}
+
+    def restore_model(self, snapshot: Dict[str, Any]):
+        """
+        替换为 model_snapshot 导出的模型状态
+
+        只做属性赋值，需在两次行情处理之间（引擎主线程）调用
+        """
+        for name in self._MODEL_FIELDS:
+            setattr(self, name, snapshot[name])
+
+    def _load_objects(self):
+        """反序列化模型库中的 model / scaler"""
+        model_data = self._artifact.load_object()
+        if self._model is None:
+            self._model = model_data['model']
+        if self._scaler is None:
+            self._scaler = model_data['scaler']
 
 
 def create_labels_from_returns(returns: np.ndarray, horizon: int = 1) -> np.ndarray:
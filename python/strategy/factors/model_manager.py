@@ -2,26 +2,112 @@
 Model Manager - 模型管理器
 
 负责模型的训练、保存、加载和版本管理
+
+目录结构：
+    model_dir/<model_id>/latest                    # 当前版本指针（文本文件）
+    model_dir/<model_id>/v0001/manifest.json       # 元数据 + 每个文件的 sha256
+    model_dir/<model_id>/v0001/arrays/<name>.npy   # 数值部分（scaler 统计量、编译后的树、state_dict）
+    model_dir/<model_id>/v0001/model.pkl           # 其余对象（按需反序列化）
+
+- 版本目录写完后整体 rename，latest 指针用 os.replace 原子更新，版本一经发布不再修改
+- 数值部分以 .npy 保存，加载时内存映射，启动时无需反序列化整个对象图
+- 回滚只需修改 latest 指针
 """
 
 import os
 import pickle
 import json
-from typing import Any, Dict, Optional
+import shutil
+import hashlib
+import uuid
+from typing import Any, Dict, List, Optional
 from datetime import datetime
+import numpy as np
 import logging
 
+from .tree_compiler import CompiledTreeEnsemble, try_compile
+
 logger = logging.getLogger(__name__)
 
+LATEST_FILE = "latest"
+MANIFEST_FILE = "manifest.json"
+MODEL_FILE = "model.pkl"
+ARRAY_DIR = "arrays"
+COMPILED_PREFIX = "compiled."
+
+
+class ModelArtifact:
+    """
+    某个模型版本的只读视图
+
+    数组在第一次访问时以内存映射方式打开，pickle 对象在第一次访问时才反序列化
+    """
+
+    def __init__(self, path: str, manifest: Dict):
+        self.path = path
+        self.manifest = manifest
+        self._arrays: Dict[str, np.ndarray] = {}
+        self._objects: Dict[str, Any] = {}
+
+    @property
+    def model_id(self) -> str:
+        return self.manifest['model_id']
+
+    @property
+    def version(self) -> str:
+        return self.manifest['version']
+
+    @property
+    def metadata(self) -> Dict:
+        return self.manifest.get('metadata', {})
+
+    def has_array(self, name: str) -> bool:
+        return name in self.manifest.get('arrays', {})
+
+    def array(self, name: str) -> np.ndarray:
+        """读取数组（只读内存映射）"""
+        if name not in self._arrays:
+            if not self.has_array(name):
+                raise KeyError(f"Array not found: {name}")
+            file_path = os.path.join(self.path, ARRAY_DIR, f"{name}.npy")
+            self._arrays[name] = np.load(file_path, mmap_mode='r', allow_pickle=False)
+        return self._arrays[name]
+
+    def arrays(self, prefix: str = "") -> Dict[str, np.ndarray]:
+        """读取名称以 prefix 开头的全部数组（键去掉前缀）"""
+        return {
+            name[len(prefix):]: self.array(name)
+            for name in self.manifest.get('arrays', {})
+            if name.startswith(prefix)
+        }
+
+    def load_object(self) -> Any:
+        """反序列化 model.pkl"""
+        if MODEL_FILE not in self._objects:
+            file_path = os.path.join(self.path, MODEL_FILE)
+            if not os.path.exists(file_path):
+                raise FileNotFoundError(f"Model file not found: {file_path}")
+            with open(file_path, 'rb') as f:
+                self._objects[MODEL_FILE] = pickle.load(f)
+        return self._objects[MODEL_FILE]
+
+    def compiled(self) -> Optional[CompiledTreeEnsemble]:
+        """编译后的树模型（内存映射），不存在时返回 None"""
+        meta = self.manifest.get('compiled')
+        if meta is None:
+            return None
+        return CompiledTreeEnsemble.from_arrays(self.arrays(COMPILED_PREFIX), meta)
+
 
 class ModelManager:
     """
     模型管理器
 
     功能：
-    - 模型持久化（保存/加载）
-    - 模型版本管理
+    - 模型持久化（保存/加载），每次保存生成新的不可变版本
+    - 模型版本管理（latest 指针、回滚、内容哈希校验）
     - 模型元数据管理
+    - 树模型编译结果与数值参数以 .npy 保存，可内存映射
     """
 
     def __init__(self, model_dir: str = "models"):
@@ -35,78 +121,217 @@ class ModelManager:
         os.makedirs(model_dir, exist_ok=True)
         logger.info(f"ModelManager initialized: {model_dir}")
 
-    def save_model(self, model: Any, model_id: str, metadata: Optional[Dict] = None):
+    # ==================== 保存 ====================
+
+    def save_model(self, model: Any, model_id: str, metadata: Optional[Dict] = None,
+                   arrays: Optional[Dict[str, np.ndarray]] = None) -> str:
         """
-        保存模型
+        保存模型为新版本并更新 latest 指针
 
         Args:
-            model: 模型对象
+            model: 模型对象（写入 model.pkl；为 None 时只保存数组）
             model_id: 模型 ID
             metadata: 模型元数据
-        """
-        try:
-            # 创建模型子目录
-            model_path = os.path.join(self.model_dir, model_id)
-            os.makedirs(model_path, exist_ok=True)
+            arrays: 额外的数值参数（如 scaler 统计量、state_dict），以 .npy 保存
 
-            # 保存模型
-            model_file = os.path.join(model_path, "model.pkl")
-            with open(model_file, 'wb') as f:
-                pickle.dump(model, f)
-
-            # 保存元数据
-            if metadata is None:
-                metadata = {}
+        Returns:
+            新版本目录路径（内容与 latest 完全相同时返回已有版本）
+        """
+        model_root = os.path.join(self.model_dir, model_id)
+        os.makedirs(model_root, exist_ok=True)
+        tmp_path = os.path.join(model_root, f".tmp-{uuid.uuid4().hex}")
 
+        try:
+            os.makedirs(os.path.join(tmp_path, ARRAY_DIR))
+            files: Dict[str, str] = {}
+            array_names: Dict[str, List[int]] = {}
+
+            if model is not None:
+                with open(os.path.join(tmp_path, MODEL_FILE), 'wb') as f:
+                    pickle.dump(model, f)
+                files[MODEL_FILE] = _sha256(os.path.join(tmp_path, MODEL_FILE))
+
+            # 树模型编译结果（用于低延迟推理）
+            estimator = model.get('model') if isinstance(model, dict) else model
+            compiled = try_compile(estimator) if estimator is not None else None
+            if compiled is not None and compiled.classes.dtype.hasobject:
+                # 字符串等对象类型的类别无法写入 .npy
+                compiled = None
+            compiled_meta = None
+            all_arrays = dict(arrays or {})
+            if compiled is not None:
+                compiled_arrays, compiled_meta = compiled.to_arrays()
+                all_arrays.update({COMPILED_PREFIX + k: v for k, v in compiled_arrays.items()})
+
+            for name, value in all_arrays.items():
+                rel_path = os.path.join(ARRAY_DIR, f"{name}.npy")
+                np.save(os.path.join(tmp_path, rel_path), np.ascontiguousarray(value),
+                        allow_pickle=False)
+                files[rel_path] = _sha256(os.path.join(tmp_path, rel_path))
+                array_names[name] = list(np.shape(value))
+
+            content_hash = _combine_hashes(files)
+
+            # 内容未变化时不生成新版本
+            latest = self.get_latest_version(model_id)
+            if latest is not None:
+                latest_manifest = self._read_manifest(model_id, latest)
+                if latest_manifest.get('content_hash') == content_hash:
+                    shutil.rmtree(tmp_path)
+                    logger.info(f"Model unchanged: {model_id} (version {latest})")
+                    return os.path.join(model_root, latest)
+
+            metadata = dict(metadata or {})
             metadata['model_id'] = model_id
             metadata['saved_at'] = datetime.now().isoformat()
+            metadata['compiled'] = compiled is not None
 
-            metadata_file = os.path.join(model_path, "metadata.json")
-            with open(metadata_file, 'w') as f:
-                json.dump(metadata, f, indent=2)
+            manifest = {
+                'model_id': model_id,
+                'metadata': metadata,
+                'files': files,
+                'arrays': array_names,
+                'compiled': compiled_meta,
+                'content_hash': content_hash,
+                'created_at': metadata['saved_at'],
+            }
 
-            logger.info(f"Model saved: {model_id}")
-            logger.info(f"  Path: {model_file}")
+            version = self._publish(model_root, tmp_path, manifest)
 
         except Exception as e:
+            if os.path.exists(tmp_path):
+                shutil.rmtree(tmp_path, ignore_errors=True)
             logger.error(f"Failed to save model {model_id}: {e}")
             raise
 
-    def load_model(self, model_id: str) -> tuple:
+        self._write_latest(model_id, version)
+        version_path = os.path.join(model_root, version)
+        logger.info(f"Model saved: {model_id} (version {version})")
+        logger.info(f"  Path: {version_path}")
+        return version_path
+
+    # ==================== 加载 ====================
+
+    def load_artifact(self, model_id: str, version: Optional[str] = None) -> ModelArtifact:
         """
-        加载模型
+        打开模型版本（延迟加载）
 
         Args:
             model_id: 模型 ID
+            version: 版本号，默认 latest
 
         Returns:
-            (model, metadata) 元组
+            ModelArtifact
         """
-        try:
-            model_path = os.path.join(self.model_dir, model_id)
+        version = version or self.get_latest_version(model_id)
+        if version is None:
+            raise FileNotFoundError(f"Model not found: {model_id}")
+        manifest = self._read_manifest(model_id, version)
+        return ModelArtifact(os.path.join(self.model_dir, model_id, version), manifest)
 
-            # 加载模型
-            model_file = os.path.join(model_path, "model.pkl")
-            if not os.path.exists(model_file):
-                raise FileNotFoundError(f"Model file not found: {model_file}")
+    def load_model(self, model_id: str, version: Optional[str] = None) -> tuple:
+        """
+        加载模型（反序列化 model.pkl）
 
-            with open(model_file, 'rb') as f:
-                model = pickle.load(f)
+        Args:
+            model_id: 模型 ID
+            version: 版本号，默认 latest
 
-            # 加载元数据
-            metadata_file = os.path.join(model_path, "metadata.json")
-            metadata = {}
-            if os.path.exists(metadata_file):
-                with open(metadata_file, 'r') as f:
-                    metadata = json.load(f)
+        Returns:
+            (model, metadata) 元组
+        """
+        try:
+            if self.get_latest_version(model_id) is None and version is None:
+                return self._load_legacy(model_id)
 
-            logger.info(f"Model loaded: {model_id}")
-            return model, metadata
+            artifact = self.load_artifact(model_id, version)
+            model = artifact.load_object()
+            logger.info(f"Model loaded: {model_id} (version {artifact.version})")
+            return model, artifact.metadata
 
         except Exception as e:
             logger.error(f"Failed to load model {model_id}: {e}")
             raise
 
+    def load_compiled(self, model_id: str, version: Optional[str] = None) -> Optional[CompiledTreeEnsemble]:
+        """
+        加载树模型编译结果（内存映射）
+
+        Args:
+            model_id: 模型 ID
+            version: 版本号，默认 latest
+
+        Returns:
+            CompiledTreeEnsemble，未编译时返回 None
+        """
+        if self.get_latest_version(model_id) is None and version is None:
+            return None
+        return self.load_artifact(model_id, version).compiled()
+
+    # ==================== 版本管理 ====================
+
+    def list_versions(self, model_id: str) -> List[str]:
+        """列出模型的全部版本（从旧到新）"""
+        model_root = os.path.join(self.model_dir, model_id)
+        if not os.path.isdir(model_root):
+            return []
+        return sorted(
+            item for item in os.listdir(model_root)
+            if _is_version(item)
+            and os.path.exists(os.path.join(model_root, item, MANIFEST_FILE))
+        )
+
+    def get_latest_version(self, model_id: str) -> Optional[str]:
+        """读取 latest 指针"""
+        latest_file = os.path.join(self.model_dir, model_id, LATEST_FILE)
+        if not os.path.exists(latest_file):
+            return None
+        with open(latest_file, 'r') as f:
+            return f.read().strip() or None
+
+    def set_latest(self, model_id: str, version: str):
+        """
+        把 latest 指针切换到指定版本（回滚/前滚）
+
+        Args:
+            model_id: 模型 ID
+            version: 目标版本
+        """
+        if version not in self.list_versions(model_id):
+            raise ValueError(f"Version not found: {model_id}/{version}")
+        self._write_latest(model_id, version)
+        logger.info(f"Model {model_id} latest -> {version}")
+
+    def rollback(self, model_id: str) -> str:
+        """
+        回滚到 latest 的上一个版本
+
+        Returns:
+            回滚后的版本号
+        """
+        versions = self.list_versions(model_id)
+        latest = self.get_latest_version(model_id)
+        if latest not in versions or versions.index(latest) == 0:
+            raise ValueError(f"No earlier version to roll back to: {model_id}")
+        previous = versions[versions.index(latest) - 1]
+        self.set_latest(model_id, previous)
+        return previous
+
+    def verify(self, model_id: str, version: Optional[str] = None) -> bool:
+        """
+        校验版本内所有文件的 sha256
+
+        Returns:
+            全部一致时返回 True
+        """
+        artifact = self.load_artifact(model_id, version)
+        for rel_path, expected in artifact.manifest['files'].items():
+            file_path = os.path.join(artifact.path, rel_path)
+            if not os.path.exists(file_path) or _sha256(file_path) != expected:
+                logger.error(f"Checksum mismatch: {model_id}/{artifact.version}/{rel_path}")
+                return False
+        return True
+
     def list_models(self) -> list:
         """
         列出所有模型
@@ -121,21 +346,19 @@ class ModelManager:
         for item in os.listdir(self.model_dir):
             model_path = os.path.join(self.model_dir, item)
             if os.path.isdir(model_path):
-                model_file = os.path.join(model_path, "model.pkl")
-                if os.path.exists(model_file):
+                if (os.path.exists(os.path.join(model_path, LATEST_FILE))
+                        or os.path.exists(os.path.join(model_path, MODEL_FILE))):
                     models.append(item)
 
         return models
 
     def delete_model(self, model_id: str):
         """
-        删除模型
+        删除模型（全部版本）
 
         Args:
             model_id: 模型 ID
         """
-        import shutil
-
         model_path = os.path.join(self.model_dir, model_id)
         if os.path.exists(model_path):
             shutil.rmtree(model_path)
@@ -143,19 +366,101 @@ class ModelManager:
         else:
             logger.warning(f"Model not found: {model_id}")
 
-    def get_model_info(self, model_id: str) -> Dict:
+    def get_model_info(self, model_id: str, version: Optional[str] = None) -> Dict:
         """
         获取模型信息
 
         Args:
             model_id: 模型 ID
+            version: 版本号，默认 latest
 
         Returns:
             模型元数据
         """
-        metadata_file = os.path.join(self.model_dir, model_id, "metadata.json")
-        if not os.path.exists(metadata_file):
-            return {}
-
-        with open(metadata_file, 'r') as f:
+        version = version or self.get_latest_version(model_id)
+        if version is None:
+            # 旧格式
+            metadata_file = os.path.join(self.model_dir, model_id, "metadata.json")
+            if not os.path.exists(metadata_file):
+                return {}
+            with open(metadata_file, 'r') as f:
+                return json.load(f)
+
+        info = dict(self._read_manifest(model_id, version).get('metadata', {}))
+        info['version'] = version
+        return info
+
+    # ==================== 内部实现 ====================
+
+    def _publish(self, model_root: str, tmp_path: str, manifest: Dict) -> str:
+        """写入 manifest 后把临时目录 rename 为下一个版本号（目录 rename 是原子的）"""
+        existing = [int(v[1:]) for v in os.listdir(model_root) if _is_version(v)]
+        number = max(existing, default=0) + 1
+
+        while True:
+            version = f"v{number:04d}"
+            manifest['version'] = version
+            with open(os.path.join(tmp_path, MANIFEST_FILE), 'w') as f:
+                json.dump(manifest, f, indent=2)
+            try:
+                os.rename(tmp_path, os.path.join(model_root, version))
+                return version
+            except OSError:
+                # 并发写入占用了该版本号
+                if not os.path.exists(os.path.join(model_root, version)):
+                    raise
+                number += 1
+
+    def _write_latest(self, model_id: str, version: str):
+        latest_file = os.path.join(self.model_dir, model_id, LATEST_FILE)
+        tmp_file = f"{latest_file}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_file, 'w') as f:
+            f.write(version)
+        os.replace(tmp_file, latest_file)
+
+    def _read_manifest(self, model_id: str, version: str) -> Dict:
+        manifest_file = os.path.join(self.model_dir, model_id, version, MANIFEST_FILE)
+        if not os.path.exists(manifest_file):
+            raise FileNotFoundError(f"Model version not found: {model_id}/{version}")
+        with open(manifest_file, 'r') as f:
             return json.load(f)
+
+    def _load_legacy(self, model_id: str) -> tuple:
+        """旧格式：model_dir/<model_id>/model.pkl + metadata.json"""
+        model_path = os.path.join(self.model_dir, model_id)
+        model_file = os.path.join(model_path, MODEL_FILE)
+        if not os.path.exists(model_file):
+            raise FileNotFoundError(f"Model file not found: {model_file}")
+
+        with open(model_file, 'rb') as f:
+            model = pickle.load(f)
+
+        metadata = {}
+        metadata_file = os.path.join(model_path, "metadata.json")
+        if os.path.exists(metadata_file):
+            with open(metadata_file, 'r') as f:
+                metadata = json.load(f)
+
+        logger.info(f"Model loaded: {model_id} (legacy format)")
+        return model, metadata
+
+
+def _is_version(name: str) -> bool:
+    return len(name) > 1 and name[0] == 'v' and name[1:].isdigit()
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _combine_hashes(files: Dict[str, str]) -> str:
+    """由各文件哈希得到整个版本的内容哈希"""
+    h = hashlib.sha256()
+    for rel_path in sorted(files):
+        h.update(rel_path.encode())
+        h.update(files[rel_path].encode())
+    return h.hexdigest()
@@ -0,0 +1,241 @@
+"""
+Model Watcher - 模型热更新
+
+后台线程轮询 ModelManager 的 latest 指针，发现新版本后：
+1. 在后台线程加载（内存映射数组，不反序列化 model.pkl）并用样本数据预热
+2. 检查输出是否合理（概率有限、在 [0, 1] 内且每行和为 1，类别与当前模型一致）
+3. 通过检查的版本暂存，由引擎主线程在两次行情处理之间调用 apply_pending 整体替换
+
+替换后进入观察期：观察期内 MLFactor 出现推理异常则恢复旧模型。
+检查失败或回滚的版本不再尝试，并可选地把模型库 latest 指针回退到当前使用的版本
+"""
+
+import copy
+import threading
+from typing import Any, Dict, Optional, Set
+import numpy as np
+import logging
+
+from .ml_factor import MLFactor
+
+logger = logging.getLogger(__name__)
+
+
+class ModelWatcher:
+    """
+    MLFactor 的模型热更新
+
+    用法：
+        watcher = ModelWatcher(ml_factor)
+        watcher.start()
+        ...
+        watcher.apply_pending()   # 每次处理行情前调用（主线程）
+    """
+
+    def __init__(self, factor: MLFactor, interval: float = 5.0,
+                 warmup_samples: Optional[np.ndarray] = None, n_warmup: int = 256,
+                 probation_ticks: int = 100, rollback_registry: bool = True):
+        """
+        Args:
+            factor: 需要热更新的 MLFactor
+            interval: 轮询间隔（秒）
+            warmup_samples: 预热和检查用的原始特征 (n, n_features)，
+                            默认按新模型的标准化参数生成正态样本
+            n_warmup: 默认生成的样本数
+            probation_ticks: 替换后的观察期（apply_pending 调用次数）
+            rollback_registry: 检查失败或回滚时是否把模型库 latest 指针回退
+        """
+        self.factor = factor
+        self.interval = interval
+        self.warmup_samples = warmup_samples
+        self.n_warmup = n_warmup
+        self.probation_ticks = probation_ticks
+        self.rollback_registry = rollback_registry
+
+        self._lock = threading.Lock()
+        self._pending: Optional[Dict[str, Any]] = None
+        self._rejected: Set[str] = set()
+        self._previous: Optional[Dict[str, Any]] = None
+        self._probation_left = 0
+        self._error_base = 0
+        # 当前模型的类别：只在主线程读取模型（可能触发反序列化），后台线程检查时读取此副本
+        self._classes = self._classes_of(factor)
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.stats = {
+            'checks': 0,
+            'swaps': 0,
+            'rejected': 0,
+            'rollbacks': 0,
+        }
+
+    # ==================== 后台线程 ====================
+
+    def start(self):
+        """启动后台轮询线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name=f"model-watcher-{self.factor.factor_id}", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"ModelWatcher started: {self.factor.factor_id} (interval {self.interval}s)")
+
+    def stop(self, timeout: Optional[float] = None):
+        """停止后台轮询线程"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Model watcher error: {e}", exc_info=True)
+            self._stop.wait(self.interval)
+
+    def check(self) -> bool:
+        """
+        检查模型库是否有新版本，有则加载、预热、检查并暂存（在后台线程调用）
+
+        Returns:
+            是否暂存了新版本
+        """
+        self.stats['checks'] += 1
+        factor = self.factor
+        latest = factor.model_manager.get_latest_version(factor.factor_id)
+        if latest is None or latest == factor.model_version or latest in self._rejected:
+            return False
+        with self._lock:
+            if self._pending is not None and self._pending['model_version'] == latest:
+                return False
+
+        # 在副本上加载，不影响正在使用的模型
+        candidate = copy.copy(factor)
+        try:
+            candidate.load_version(latest)
+            error = self._validate(candidate)
+        except Exception as e:
+            error = f"load failed: {e}"
+
+        if error is not None:
+            self._reject(latest, error)
+            return False
+
+        with self._lock:
+            self._pending = candidate.model_snapshot()
+        logger.info(f"Model {factor.factor_id} version {latest} ready for swap")
+        return True
+
+    # ==================== 主线程 ====================
+
+    def apply_pending(self) -> bool:
+        """
+        替换为暂存的新模型，并推进观察期（在引擎主线程、两次行情处理之间调用）
+
+        Returns:
+            本次是否替换了模型
+        """
+        factor = self.factor
+
+        if self._pending is not None:
+            with self._lock:
+                pending, self._pending = self._pending, None
+            if pending is not None:
+                self._previous = factor.model_snapshot()
+                factor.restore_model(pending)
+                self._set_classes()
+                self._probation_left = self.probation_ticks
+                self._error_base = factor.error_count
+                self.stats['swaps'] += 1
+                logger.info(f"Model {factor.factor_id} swapped: "
+                            f"{self._previous['model_version']} -> {factor.model_version}")
+                return True
+
+        if self._previous is not None:
+            if factor.error_count > self._error_base:
+                self.rollback()
+            else:
+                self._probation_left -= 1
+                if self._probation_left <= 0:
+                    self._previous = None
+
+        return False
+
+    def rollback(self):
+        """恢复替换前的模型（在引擎主线程调用）"""
+        if self._previous is None:
+            return
+        factor = self.factor
+        failed = factor.model_version
+        factor.restore_model(self._previous)
+        self._set_classes()
+        self._previous = None
+        self.stats['rollbacks'] += 1
+        logger.error(f"Model {factor.factor_id} rolled back: {failed} -> {factor.model_version}")
+        self._reject(failed, "inference errors during probation", count=False)
+
+    # ==================== 内部实现 ====================
+
+    def _validate(self, candidate: MLFactor) -> Optional[str]:
+        """预热并检查新模型输出，通过时返回 None，否则返回原因"""
+        X = self.warmup_samples
+        if X is None:
+            rng = np.random.default_rng(0)
+            n_features = len(candidate.feature_names)
+            X = (candidate._scale_mean
+                 + candidate._scale_std * rng.standard_normal((self.n_warmup, n_features)))
+
+        predictions, confidences, probabilities = candidate.predict_batch(X)
+
+        if len(probabilities) != len(X):
+            return f"expected {len(X)} predictions, got {len(probabilities)}"
+        if not np.isfinite(probabilities).all():
+            return "non-finite probabilities"
+        if (probabilities < 0).any() or (probabilities > 1).any():
+            return "probabilities outside [0, 1]"
+        if not np.allclose(probabilities.sum(axis=1), 1.0, atol=1e-6):
+            return "probabilities do not sum to 1"
+
+        with self._lock:
+            current_classes = self._classes
+        if current_classes is not None:
+            candidate_classes = self._classes_of(candidate)
+            if not np.array_equal(current_classes, candidate_classes):
+                return f"classes changed: {list(current_classes)} -> {list(candidate_classes)}"
+
+        return None
+
+    def _set_classes(self):
+        """模型替换或回滚后更新类别副本（主线程）"""
+        classes = self._classes_of(self.factor)
+        with self._lock:
+            self._classes = classes
+
+    @staticmethod
+    def _classes_of(factor: MLFactor) -> Optional[np.ndarray]:
+        """模型的类别，未训练时为 None"""
+        if not factor.is_trained:
+            return None
+        return factor.compiled.classes if factor.compiled is not None else factor.model.classes_
+
+    def _reject(self, version: str, reason: str, count: bool = True):
+        """标记版本为不可用，并可选地回退模型库 latest 指针"""
+        self._rejected.add(version)
+        if count:
+            self.stats['rejected'] += 1
+        logger.error(f"Model {self.factor.factor_id} version {version} rejected: {reason}")
+
+        current = self.factor.model_version
+        manager = self.factor.model_manager
+        if (self.rollback_registry and current is not None
+                and manager.get_latest_version(self.factor.factor_id) == version):
+            try:
+                manager.set_latest(self.factor.factor_id, current)
+            except Exception as e:
+                logger.error(f"Failed to roll back registry: {e}")
@@ -0,0 +1,316 @@
+"""
+Factor Orthogonalization - 因子正交化
+
+在连续的 float64 矩阵上做因子正交化：
+- QR（Householder）：结果与按列顺序的施密特正交化相同，但数值稳定
+- 对称正交化（Löwdin）：X (XᵀX)^(-1/2)，不依赖因子顺序，且是与原因子最接近的正交基
+
+秩亏（常数列或线性相关的列）时两种方法都丢弃零空间方向，但结果形态不同，见 orthogonalize
+
+所有方法都先由 [1 | X] 的 R 因子得到一个 k×k 的变换矩阵，再用一次矩阵乘法作用到数据上：
+- 分块模式：TSQR 逐块累积 R，适用于放不进内存的长矩阵
+- 滚动模式：在尾部窗口上定期重新拟合变换，实盘逐根 K 线输出正交化后的因子
+"""
+
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, Optional, Union
+import numpy as np
+import pandas as pd
+import logging
+
+logger = logging.getLogger(__name__)
+
+METHODS = ('qr', 'lowdin')
+
+
+@dataclass
+class OrthoTransform:
+    """拟合得到的正交化变换：((X - mean) / scale) @ matrix"""
+    mean: np.ndarray     # (k,)
+    scale: np.ndarray    # (k,)
+    matrix: np.ndarray   # (k, k)
+    rank: int            # 有效（非退化）因子数，即输出矩阵的秩
+    method: str = 'qr'
+
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        """对 (n, k) 或 (k,) 的数据应用变换，缺失值按 0 处理"""
+        X = _as_float_matrix(X)
+        return ((X - self.mean) / self.scale) @ self.matrix
+
+
+class TSQR:
+    """
+    Tall-Skinny QR：逐块累积 [1 | X] 的 R 因子
+
+    每块只需与当前 (k+1)×(k+1) 的 R 堆叠后做一次 Householder QR，
+    内存占用与总行数无关
+    """
+
+    def __init__(self, n_factors: int):
+        self.n_factors = n_factors
+        self.n_rows = 0
+        self._R = np.zeros((0, n_factors + 1))
+
+    def partial_fit(self, chunk: np.ndarray) -> 'TSQR':
+        """累积一块数据 (m, k)"""
+        chunk = _as_float_matrix(chunk)
+        if chunk.ndim != 2 or chunk.shape[1] != self.n_factors:
+            raise ValueError(f"Expected chunk with {self.n_factors} columns, got {chunk.shape}")
+        if len(chunk) == 0:
+            return self
+
+        augmented = np.empty((len(chunk), self.n_factors + 1))
+        augmented[:, 0] = 1.0
+        augmented[:, 1:] = chunk
+
+        self._R = np.linalg.qr(np.vstack([self._R, augmented]), mode='r')
+        self.n_rows += len(chunk)
+        return self
+
+    @property
+    def R(self) -> np.ndarray:
+        """对角线非负的上三角 R 因子 (k+1, k+1)"""
+        k1 = self.n_factors + 1
+        R = np.zeros((k1, k1))
+        R[:len(self._R)] = self._R[:k1]
+        signs = np.where(np.diag(R) < 0, -1.0, 1.0)
+        return R * signs[:, None]
+
+    def transform(self, method: str = 'qr', rtol: float = 1e-8) -> OrthoTransform:
+        """由累积的 R 因子构造正交化变换"""
+        if self.n_rows == 0:
+            raise ValueError("TSQR has no data")
+        return _transform_from_r(self.R, self.n_rows, method, rtol)
+
+
+def fit_orthogonalizer(X: Union[np.ndarray, pd.DataFrame], method: str = 'qr',
+                       rtol: float = 1e-8) -> OrthoTransform:
+    """
+    在 (n, k) 因子矩阵上拟合正交化变换
+
+    Args:
+        X: 因子矩阵，缺失值按 0 处理
+        method: 'qr'（Householder，等价于施密特正交化）或 'lowdin'（对称正交化）
+        rtol: 退化判定阈值：因子去除前面因子后的残差范数 / 原范数 < rtol 时视为线性相关
+
+    Returns:
+        OrthoTransform
+    """
+    X = _as_float_matrix(X)
+    return TSQR(X.shape[1]).partial_fit(X).transform(method, rtol)
+
+
+def orthogonalize(factors: Union[np.ndarray, pd.DataFrame], method: str = 'qr',
+                  rtol: float = 1e-8) -> Union[np.ndarray, pd.DataFrame]:
+    """
+    因子正交化
+
+    结果每列均值为 0；输入满秩时每列范数为 1，且两两正交。
+    秩亏（rank < k，存在常数列或线性相关的列）时两种方法都丢弃零空间方向，输出的秩为 rank：
+    - qr：与前面因子线性相关（或为常数）的列输出为 0，其余 rank 列范数为 1 且两两正交
+    - lowdin：结果为 U_r V_rᵀ（Z = U S Vᵀ 只保留非零奇异值），常数列输出为 0，
+      但一组线性相关的列共享它们张成的正交方向：输出的 Gram 矩阵是秩为 rank 的投影矩阵 V_r V_rᵀ，
+      这些列范数小于 1、彼此不正交（例如 x 与 2x 都输出 u/√2）。
+      需要每列正交归一时先剔除线性相关的因子，或使用 qr
+
+    Args:
+        factors: 因子矩阵 (n, k)，DataFrame 时保留索引和列名
+        method: 'qr' 或 'lowdin'
+        rtol: 退化判定阈值
+
+    Returns:
+        正交化后的因子，类型与输入一致
+    """
+    X = _as_float_matrix(factors)
+    result = fit_orthogonalizer(X, method, rtol).apply(X)
+
+    if isinstance(factors, pd.DataFrame):
+        return pd.DataFrame(result, index=factors.index, columns=factors.columns)
+    return result
+
+
+def orthogonalize_chunked(chunks: Callable[[], Iterable[np.ndarray]], n_factors: int,
+                          method: str = 'qr', rtol: float = 1e-8) -> Iterator[np.ndarray]:
+    """
+    分块正交化（两遍扫描）
+
+    第一遍用 TSQR 累积 R 因子，第二遍逐块输出正交化结果。
+    chunks 需可重复调用，例如按行组读取 Parquet 的函数
+
+    Args:
+        chunks: 返回 (m_i, k) 数据块迭代器的函数
+        n_factors: 因子数 k
+        method: 'qr' 或 'lowdin'
+        rtol: 退化判定阈值
+
+    Yields:
+        与输入块一一对应的正交化结果
+    """
+    tsqr = TSQR(n_factors)
+    for chunk in chunks():
+        tsqr.partial_fit(chunk)
+
+    transform = tsqr.transform(method, rtol)
+    logger.info(f"Chunked orthogonalization: {tsqr.n_rows} rows, "
+                f"rank {transform.rank}/{n_factors}")
+
+    for chunk in chunks():
+        yield transform.apply(chunk)
+
+
+def rolling_orthogonalize(factors: Union[np.ndarray, pd.DataFrame], window: int,
+                          method: str = 'qr', refit_every: int = 1,
+                          rtol: float = 1e-8) -> Union[np.ndarray, pd.DataFrame]:
+    """
+    滚动正交化（回测用，与 RollingOrthogonalizer 的实盘输出一致）
+
+    第 t 行使用在 [t-window+1, t] 上拟合的变换（每 refit_every 行重新拟合一次），
+    前 window-1 行为 NaN
+
+    Args:
+        factors: 因子矩阵 (n, k)
+        window: 拟合窗口
+        method: 'qr' 或 'lowdin'
+        refit_every: 重新拟合间隔
+        rtol: 退化判定阈值
+
+    Returns:
+        正交化后的因子，类型与输入一致
+    """
+    X = _as_float_matrix(factors)
+    n, k = X.shape
+    result = np.full((n, k), np.nan)
+
+    transform = None
+    for end in range(window - 1, n):
+        if transform is None or (end - window + 1) % refit_every == 0:
+            transform = fit_orthogonalizer(X[end - window + 1:end + 1], method, rtol)
+        result[end] = transform.apply(X[end])
+
+    if isinstance(factors, pd.DataFrame):
+        return pd.DataFrame(result, index=factors.index, columns=factors.columns)
+    return result
+
+
+class RollingOrthogonalizer:
+    """
+    实盘滚动正交化
+
+    环形缓冲区保存最近 window 根 K 线的因子值，每 refit_every 根重新拟合一次变换，
+    其余时间每次 update 只需一次 O(k²) 的向量-矩阵乘法
+    """
+
+    def __init__(self, n_factors: int, window: int, method: str = 'qr',
+                 refit_every: int = 1, rtol: float = 1e-8):
+        if method not in METHODS:
+            raise ValueError(f"Unknown method: {method}")
+        self.n_factors = n_factors
+        self.window = window
+        self.method = method
+        self.refit_every = refit_every
+        self.rtol = rtol
+
+        self._buffer = np.zeros((window, n_factors))
+        self._count = 0
+        self._since_refit = 0
+        self.transform: Optional[OrthoTransform] = None
+
+    @property
+    def is_ready(self) -> bool:
+        return self._count >= self.window
+
+    def update(self, values: np.ndarray) -> Optional[np.ndarray]:
+        """
+        加入最新一根 K 线的因子值
+
+        Returns:
+            正交化后的最新因子值 (k,)，窗口未填满时返回 None
+        """
+        row = _as_float_matrix(values).reshape(-1)
+        self._buffer[self._count % self.window] = row
+        self._count += 1
+
+        if not self.is_ready:
+            return None
+
+        # QR / Löwdin 的变换与行顺序无关，环形缓冲区无需重排
+        if self.transform is None or self._since_refit >= self.refit_every - 1:
+            self.transform = fit_orthogonalizer(self._buffer, self.method, self.rtol)
+            self._since_refit = 0
+        else:
+            self._since_refit += 1
+
+        return self.transform.apply(row)
+
+    def reset(self):
+        self._buffer[:] = 0.0
+        self._count = 0
+        self._since_refit = 0
+        self.transform = None
+
+
+# ==================== 内部实现 ====================
+
+def _as_float_matrix(X) -> np.ndarray:
+    """转换为 C 连续的 float64 数组，非有限值置 0"""
+    if isinstance(X, (pd.DataFrame, pd.Series)):
+        X = X.to_numpy(dtype=np.float64)
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    if not np.isfinite(X).all():
+        X = np.where(np.isfinite(X), X, 0.0)
+    return X
+
+
+def _transform_from_r(R: np.ndarray, n_rows: int, method: str, rtol: float) -> OrthoTransform:
+    """
+    由 [1 | X] 的 R 因子构造变换
+
+    [1 | X] = [q0 | Q] R，其中 q0 = 1/√n，R[0, 1:] = √n·mean，
+    因此中心化后的 Xc = Q · R[1:, 1:]，后续只需在 k×k 的 Rc 上计算
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown method: {method}")
+
+    k = R.shape[0] - 1
+    mean = R[0, 1:] / np.sqrt(n_rows)
+    Rc = R[1:, 1:].copy()
+    col_norm = np.linalg.norm(Rc, axis=0)
+    # 中心化后范数相对原始范数只剩舍入误差的列是常数列，精确置 0
+    constant = col_norm <= rtol * np.linalg.norm(R[:, 1:], axis=0)
+    Rc[:, constant] = 0.0
+    col_norm[constant] = 0.0
+    matrix = np.zeros((k, k))
+
+    if method == 'qr':
+        # 残差范数相对原范数过小的列与前面的列线性相关，施密特正交化中输出 0
+        keep = np.abs(np.diag(Rc)) > rtol * col_norm
+        keep &= col_norm > 0
+        idx = np.flatnonzero(keep)
+        if len(idx) > 0:
+            # 剔除退化列后重新分解，等价于只对保留列做施密特正交化
+            Rk = Rc[:, idx] if len(idx) < k else Rc
+            if len(idx) < k:
+                Rk = np.linalg.qr(Rk, mode='r')
+                Rk = Rk * np.where(np.diag(Rk) < 0, -1.0, 1.0)[:, None]
+            matrix[np.ix_(idx, idx)] = _triangular_inverse(Rk)
+        return OrthoTransform(mean=mean, scale=np.ones(k), matrix=matrix,
+                              rank=len(idx), method=method)
+
+    # Löwdin：先标准化（与 StandardScaler 一致，常数列 scale=1）
+    scale = col_norm / np.sqrt(n_rows)
+    scale = np.where(scale > 0, scale, 1.0)
+    # Z = Q · M，ZᵀZ = MᵀM = V S² Vᵀ，(ZᵀZ)^(-1/2) = V S⁻¹ Vᵀ
+    # 直接对 M 做 SVD，避免显式构造 ZᵀZ 使条件数平方
+    M = Rc / scale
+    _, s, Vt = np.linalg.svd(M)
+    keep = s > rtol * (s[0] if len(s) else 0.0)
+    V = Vt[keep].T
+    matrix = (V / s[keep]) @ V.T
+    return OrthoTransform(mean=mean, scale=scale, matrix=matrix,
+                          rank=int(keep.sum()), method=method)
+
+
+def _triangular_inverse(R: np.ndarray) -> np.ndarray:
+    """上三角矩阵求逆"""
+    k = R.shape[0]
+    return np.linalg.solve(R, np.eye(k)) if k > 0 else R
@@ -48,30 +48,31 @@ class DataMasking:
         features['returns_10'] = RefOperator.returns(close, 10 + self.feature_gap - 1)
 
         # 2. 移动平均特征
+        gap = self.feature_gap
+        close_ma = RefOperator.rolling_batch(close, [5, 10, 20, 60], 'mean', gap)
         for period in [5, 10, 20, 60]:
-            ma = RefOperator.rolling_mean(close, period, self.feature_gap)
+            ma = close_ma[period]
             features[f'ma_{period}'] = ma
             # MA 偏离度
             features[f'ma_{period}_ratio'] = (close - ma) / (ma + 1e-10)
 
         # 3. 波动率特征
+        close_std = RefOperator.rolling_batch(close, [5, 10, 20], 'std', gap)
         for period in [5, 10, 20]:
-            features[f'volatility_{period}'] = RefOperator.rolling_std(
-                close, period, self.feature_gap
-            )
+            features[f'volatility_{period}'] = close_std[period]
 
         # 4. 价格位置特征（当前价格在 N 日高低点的位置）
+        high_max = RefOperator.rolling_batch(high, [5, 10, 20], 'max', gap)
+        low_min = RefOperator.rolling_batch(low, [5, 10, 20], 'min', gap)
         for period in [5, 10, 20]:
-            high_max = RefOperator.rolling_max(high, period, self.feature_gap)
-            low_min = RefOperator.rolling_min(low, period, self.feature_gap)
             features[f'price_position_{period}'] = (
-                (close - low_min) / (high_max - low_min + 1e-10)
+                (close - low_min[period]) / (high_max[period] - low_min[period] + 1e-10)
             )
 
         # 5. 成交量特征
+        volume_ma = RefOperator.rolling_batch(volume, [5, 10, 20], 'mean', gap)
         for period in [5, 10, 20]:
-            vol_ma = RefOperator.rolling_mean(volume, period, self.feature_gap)
-            features[f'volume_ratio_{period}'] = volume / (vol_ma + 1e-10)
+            features[f'volume_ratio_{period}'] = volume / (volume_ma[period] + 1e-10)
 
         # 6. 动量特征
         for period in [5, 10, 20]:
@@ -5,7 +5,8 @@ Ref Operator - 参考 Qlib 的实现
 
 import numpy as np
 import pandas as pd
-from typing import Union
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import Dict, Iterable, Union
 
 
 class RefOperator:
@@ -103,23 +104,12 @@ class RefOperator:
             # t=3: mean([1,2,3]) = 2
             # t=4: mean([2,3,4]) = 3
         """
-        if isinstance(data, pd.Series):
-            data = data.values
-
-        result = np.full(len(data), np.nan, dtype=float)
-
-        for i in range(window + gap - 1, len(data)):
-            # 使用 [i-window-gap+1 : i-gap+1] 的数据
-            start_idx = i - window - gap + 1
-            end_idx = i - gap + 1
-            result[i] = np.mean(data[start_idx:end_idx])
-
-        return result
+        return RefOperator.rolling_batch(data, [window], 'mean', gap)[window]
 
     @staticmethod
     def rolling_std(data: Union[np.ndarray, pd.Series], window: int, gap: int = 1) -> np.ndarray:
         """
-        滚动标准差，确保不使用未来数据
+        滚动标准差（总体标准差，ddof=0），确保不使用未来数据
 
         Args:
             data: 原始数据
@@ -129,48 +119,161 @@ class RefOperator:
         Returns:
             滚动标准差
         """
-        if isinstance(data, pd.Series):
-            data = data.values
-
-        result = np.full(len(data), np.nan, dtype=float)
-
-        for i in range(window + gap - 1, len(data)):
-            start_idx = i - window - gap + 1
-            end_idx = i - gap + 1
-            result[i] = np.std(data[start_idx:end_idx])
-
-        return result
+        return RefOperator.rolling_batch(data, [window], 'std', gap)[window]
 
     @staticmethod
     def rolling_max(data: Union[np.ndarray, pd.Series], window: int, gap: int = 1) -> np.ndarray:
         """
         滚动最大值，确保不使用未来数据
         """
-        if isinstance(data, pd.Series):
-            data = data.values
-
-        result = np.full(len(data), np.nan, dtype=float)
-
-        for i in range(window + gap - 1, len(data)):
-            start_idx = i - window - gap + 1
-            end_idx = i - gap + 1
-            result[i] = np.max(data[start_idx:end_idx])
-
-        return result
+        return RefOperator.rolling_batch(data, [window], 'max', gap)[window]
 
     @staticmethod
     def rolling_min(data: Union[np.ndarray, pd.Series], window: int, gap: int = 1) -> np.ndarray:
         """
         滚动最小值，确保不使用未来数据
         """
+        return RefOperator.rolling_batch(data, [window], 'min', gap)[window]
+
+    @staticmethod
+    def rolling_batch(
+        data: Union[np.ndarray, pd.Series],
+        windows: Iterable[int],
+        func: str = 'mean',
+        gap: int = 1
+    ) -> Dict[int, np.ndarray]:
+        """
+        对同一序列一次计算多个窗口的滚动统计量
+
+        与单窗口函数语义相同：t 时刻使用 [t-window-gap+1, t-gap+1) 的数据，
+        前 window+gap-1 个值为 NaN，窗口内含 NaN 时结果为 NaN
+
+        Args:
+            data: 原始数据
+            windows: 窗口大小列表
+            func: 'mean' / 'std' / 'max' / 'min'
+            gap: 时间间隔
+
+        Returns:
+            {window: 滚动结果}
+
+        Example:
+            ma = RefOperator.rolling_batch(close, [5, 10, 20, 60], 'mean')
+            ma[20]  # 20 期均线
+        """
+        if func not in ('mean', 'std', 'max', 'min'):
+            raise ValueError(f"Unknown rolling func: {func}")
+        if gap < 0:
+            raise ValueError(f"gap must be non-negative, got {gap}")
+
         if isinstance(data, pd.Series):
             data = data.values
+        x = np.ascontiguousarray(data, dtype=float)
+
+        if func == 'mean':
+            # 所有窗口共享一次前缀和
+            trailing = _trailing_mean(x, list(windows))
+        elif func == 'std':
+            windows = list(windows)
+            means = _trailing_mean(x, windows)
+            trailing = {w: _trailing_std(x, w, means[w]) for w in windows}
+        else:
+            ufunc = np.maximum if func == 'max' else np.minimum
+            trailing = {w: _trailing_extreme(x, w, ufunc) for w in windows}
+
+        return {w: _apply_gap(t, gap) for w, t in trailing.items()}
+
+
+# ==================== 向量化实现 ====================
+#
+# 以下函数计算以 j 结尾的窗口 x[j-w+1 : j+1] 的统计量（j < w-1 为 NaN），
+# 再由 _apply_gap 整体后移 gap 位，得到 t = j + gap 时刻的值
+
+def _check_window(window: int):
+    if window < 1:
+        raise ValueError(f"window must be positive, got {window}")
+
+
+def _apply_gap(trailing: np.ndarray, gap: int) -> np.ndarray:
+    if gap == 0:
+        return trailing
+    result = np.full(len(trailing), np.nan)
+    result[gap:] = trailing[:-gap]
+    return result
+
+
+def _trailing_mean(x: np.ndarray, windows) -> Dict[int, np.ndarray]:
+    """前缀和滚动均值，窗口内含非有限值时退回逐窗口计算以保持 NaN/Inf 语义"""
+    n = len(x)
+    finite = np.isfinite(x)
+    # 减去参考值降低前缀和的量级，减小相减时的舍入误差
+    ref = x[finite].mean() if finite.any() else 0.0
+    csum = np.concatenate([[0.0], np.cumsum(np.where(finite, x - ref, 0.0))])
+    cbad = np.concatenate([[0], np.cumsum(~finite)])
+
+    results = {}
+    for w in windows:
+        _check_window(w)
+        out = np.full(n, np.nan)
+        if n >= w:
+            out[w - 1:] = (csum[w:] - csum[:-w]) / w + ref
+            bad = np.flatnonzero(cbad[w:] - cbad[:-w]) + (w - 1)
+            if len(bad) > 0:
+                views = sliding_window_view(x, w)
+                with np.errstate(invalid='ignore'):
+                    out[bad] = views[bad - (w - 1)].mean(axis=1)
+        results[w] = out
+    return results
+
+
+def _trailing_std(x: np.ndarray, window: int, mean: np.ndarray) -> np.ndarray:
+    """
+    两遍法滚动标准差
+
+    前缀平方和在价格量级较大时存在严重的相消误差，这里用已算好的滚动均值，
+    对窗口内每个偏移量做一次整列运算累加离差平方，结果与逐窗口 np.std 一致
+    """
+    n = len(x)
+    out = np.full(n, np.nan)
+    if n < window:
+        return out
+
+    m = n - window + 1
+    center = mean[window - 1:]
+    acc = np.zeros(m)
+    buf = np.empty(m)
+    with np.errstate(invalid='ignore'):
+        for k in range(window):
+            np.subtract(x[k:k + m], center, out=buf)
+            np.multiply(buf, buf, out=buf)
+            acc += buf
+    out[window - 1:] = np.sqrt(acc / window)
+    return out
+
+
+def _trailing_extreme(x: np.ndarray, window: int, ufunc) -> np.ndarray:
+    """
+    van Herk / Gil-Werman 滚动极值
 
-        result = np.full(len(data), np.nan, dtype=float)
+    按 window 分块，块内前缀极值与后缀极值各做一次 accumulate，
+    任一窗口最多跨两个块：extreme(x[s..j]) = ufunc(suffix[s], prefix[j])。
+    复杂度 O(n)，与窗口大小无关；np.maximum/np.minimum 会传播 NaN，与 np.max/np.min 一致
+    """
+    _check_window(window)
+    n = len(x)
+    out = np.full(n, np.nan)
+    if n < window:
+        return out
 
-        for i in range(window + gap - 1, len(data)):
-            start_idx = i - window - gap + 1
-            end_idx = i - gap + 1
-            result[i] = np.min(data[start_idx:end_idx])
+    n_blocks = -(-n // window)
+    padded = np.empty(n_blocks * window)
+    padded[:n] = x
+    padded[n:] = x[-1]
+    blocks = padded.reshape(n_blocks, window)
+
+    prefix = ufunc.accumulate(blocks, axis=1).reshape(-1)[:n]
+    suffix = ufunc.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].reshape(-1)[:n]
+
+    out[window - 1:] = ufunc(suffix[:n - window + 1], prefix[window - 1:])
+    return out
 
-        return result
@@ -0,0 +1,181 @@
+"""
+TransformerFactor - QlibTransformer 因子
+
+在 StrategyEngine 中运行 QlibTransformer：
+- 每个交易对维护滚动特征窗口（TransformerInference），每根新 K 线只写入一行：
+  特征中带 K 线时间戳，同一根 K 线内的重复调用不推进窗口，返回该 K 线已算出的因子值
+- 实现 calculate_batch，配合 InferenceBatcher 每个周期对所有交易对一次前向
+- 因子值为模型的收益率预测值
+"""
+
+from typing import Any, Dict, List, Optional
+import numpy as np
+import logging
+
+from .base_factor import BaseFactor, FactorValue
+
+# PyTorch 是可选依赖
+try:
+    import torch
+    from models.transformer_inference import TransformerInference
+    _has_torch = True
+except (ImportError, OSError):
+    _has_torch = False
+
+logger = logging.getLogger(__name__)
+
+
+class TransformerFactor(BaseFactor):
+    """
+    QlibTransformer 因子
+
+    config:
+        feature_names: 模型输入特征（顺序与训练时一致）
+        bar_field: 特征中 K 线时间戳的字段名（默认 bar_time），不作为模型输入
+        seq_len: 窗口长度
+        model_path: state_dict 路径（未直接传入 model 时使用）
+        d_model / nhead / num_layers: 模型结构
+        backend: 'torchscript' / 'onnx' / 'eager'
+        onnx_path: ONNX 模型路径
+        num_threads: ONNX 推理线程数
+        max_batch: 单次前向最大批大小
+    """
+
+    def __init__(self, factor_id: str, config: Dict[str, Any], model=None):
+        super().__init__(factor_id, config)
+
+        self.feature_names: List[str] = config['feature_names']
+        self.seq_len = config.get('seq_len', 60)
+        self.bar_field = config.get('bar_field', 'bar_time')
+        self.inference: Optional['TransformerInference'] = None
+        # symbol -> 最近写入窗口的 K 线时间戳 / 该 K 线的因子值
+        self._bars: Dict[str, Any] = {}
+        self._results: Dict[str, FactorValue] = {}
+
+        if not _has_torch:
+            logger.warning(f"PyTorch not available, TransformerFactor disabled: {factor_id}")
+            return
+
+        try:
+            if model is None and config.get('backend') != 'onnx':
+                model = self._load_model(config)
+            self.inference = TransformerInference(
+                model,
+                seq_len=self.seq_len,
+                n_features=len(self.feature_names),
+                backend=config.get('backend', 'torchscript'),
+                onnx_path=config.get('onnx_path'),
+                num_threads=config.get('num_threads', 1),
+                max_batch=config.get('max_batch', 64)
+            )
+        except Exception as e:
+            logger.warning(f"Failed to load transformer model: {e}")
+
+        logger.info(f"TransformerFactor initialized: {factor_id}")
+        logger.info(f"  Features: {len(self.feature_names)}, seq_len: {self.seq_len}")
+
+    @property
+    def is_ready(self) -> bool:
+        return self.inference is not None
+
+    def get_required_features(self) -> List[str]:
+        return self.feature_names
+
+    def calculate(self, features: Dict[str, np.ndarray]) -> FactorValue:
+        """
+        由完整特征历史计算因子值（取最后 seq_len 行，不修改滚动窗口）
+
+        Args:
+            features: {特征名: 历史数组}
+        """
+        if not self.is_ready:
+            return self._error("", 'model_not_loaded')
+        if any(name not in features or len(features[name]) < self.seq_len
+               for name in self.feature_names):
+            return self._error("", 'invalid_features')
+
+        window = np.column_stack([np.asarray(features[name][-self.seq_len:], dtype=np.float32)
+                                  for name in self.feature_names])
+        prediction = self.inference.predict_windows(window[None])[0]
+        return self._to_factor_value("", prediction)
+
+    def calculate_batch(self, features: Dict[str, Dict[str, float]]) -> Dict[str, FactorValue]:
+        """
+        新 K 线的特征写入滚动窗口，并对窗口已满的交易对一次前向
+
+        窗口按 K 线推进：features 中 bar_field 的时间戳大于上次写入的时间戳时才写入一行；
+        同一根（或更早的）K 线重复调用不修改窗口，直接返回该 K 线已算出的因子值
+
+        Args:
+            features: {symbol: 最新特征值（含 bar_field）}
+
+        Returns:
+            {symbol: 因子值对象}
+        """
+        if not self.is_ready:
+            return {symbol: self._error(symbol, 'model_not_loaded') for symbol in features}
+
+        results: Dict[str, FactorValue] = {}
+        ready = []
+        for symbol, values in features.items():
+            bar = values.get(self.bar_field)
+            if bar is None or any(name not in values for name in self.feature_names):
+                results[symbol] = self._error(symbol, 'invalid_features')
+                continue
+            last = self._bars.get(symbol)
+            if last is None or bar > last:
+                row = [values[name] for name in self.feature_names]
+                self.inference.update(symbol, np.nan_to_num(row, nan=0.0, posinf=0.0, neginf=0.0))
+                self._bars[symbol] = bar
+                self._results.pop(symbol, None)
+            elif symbol in self._results:
+                results[symbol] = self._results[symbol]
+                continue
+            if self.inference.is_ready(symbol):
+                ready.append(symbol)
+            else:
+                results[symbol] = self._error(symbol, 'warming_up')
+
+        try:
+            predictions = self.inference.predict(ready)
+        except Exception as e:
+            logger.error(f"Transformer inference error: {e}")
+            return {**results, **{symbol: self._error(symbol, str(e)) for symbol in ready}}
+
+        for symbol in ready:
+            value = self._to_factor_value(symbol, predictions[symbol])
+            self._results[symbol] = value
+            results[symbol] = value
+        return results
+
+    def latency_summary(self) -> Dict[str, float]:
+        """推理延迟统计（微秒）"""
+        return self.inference.latency_summary() if self.is_ready else {}
+
+    def _load_model(self, config: Dict[str, Any]):
+        from models.qlib_transformer import QlibTransformer
+
+        model = QlibTransformer(
+            input_dim=len(self.feature_names),
+            d_model=config.get('d_model', 128),
+            nhead=config.get('nhead', 4),
+            num_layers=config.get('num_layers', 2),
+            max_seq_len=self.seq_len
+        )
+        model.load_state_dict(torch.load(config['model_path'], map_location='cpu'))
+        return model
+
+    @staticmethod
+    def _to_factor_value(symbol: str, prediction: float) -> FactorValue:
+        return FactorValue(
+            symbol=symbol,
+            timestamp=0,
+            value=float(prediction),
+            confidence=1.0,
+            metadata={'prediction': float(prediction)}
+        )
+
+    @staticmethod
+    def _error(symbol: str, error: str) -> FactorValue:
+        return FactorValue(symbol=symbol, timestamp=0, value=0.0, confidence=0.0,
+                           metadata={'error': error})
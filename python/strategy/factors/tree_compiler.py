@@ -0,0 +1,253 @@
+"""
+Tree Compiler - 树模型编译器
+
+把训练好的 RandomForestClassifier / GradientBoostingClassifier 展平为连续的 NumPy 数组
+（特征索引、阈值、左右子节点、叶子值），用向量化遍历对单行或小批量样本求值：
+- 所有树同时遍历，每层一次数组索引，循环次数等于最大树深
+- 叶子节点指向自身，无需逐节点判断是否到达叶子
+- 子节点按 [右, 左] 交错存放，用比较结果 (x <= threshold) 直接索引下一个节点
+- 比较、累加顺序与 sklearn 相同，结果与 predict_proba 一致
+- 缺失值 (NaN) 按每个节点的 missing_go_to_left 路由（与 sklearn 相同）；
+  输入不含 NaN 时不做额外判断
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+from scipy.special import expit
+import logging
+
+logger = logging.getLogger(__name__)
+
+# sklearn 中叶子节点的 children_left / children_right 取值
+_TREE_LEAF = -1
+
+
+class UnsupportedModelError(ValueError):
+    """模型类型或配置不支持编译"""
+
+
+@dataclass
+class CompiledTreeEnsemble:
+    """
+    编译后的树集成模型
+
+    kind='forest'：values 为每个节点的类别概率 (n_nodes, n_classes)，对所有树取平均
+    kind='gbdt'  ：values 为乘以学习率后的叶子值 (n_nodes,)，与初始值逐阶段累加后经链接函数得到概率
+    """
+    kind: str
+    classes: np.ndarray
+    n_features: int
+    feature: np.ndarray     # (n_nodes,) int32，叶子为 0
+    threshold: np.ndarray   # (n_nodes,) float64
+    children: np.ndarray    # (2 * n_nodes,) int32，[2i]=右子节点，[2i+1]=左子节点，叶子指向自身
+    missing_left: np.ndarray  # (n_nodes,) bool，NaN 是否走左子节点（sklearn 的 missing_go_to_left）
+    values: np.ndarray
+    roots: np.ndarray       # (n_trees,) 每棵树根节点在展平数组中的位置
+    max_depth: int
+    init_raw: np.ndarray    # gbdt 初始原始预测 (K,)，forest 为空数组
+
+    # ==================== 推理 ====================
+
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        """
+        返回每个样本在每棵树上落入的叶子节点
+
+        Args:
+            X: (n_samples, n_features)
+
+        Returns:
+            (n_samples, n_trees) 叶子节点在展平数组中的位置
+        """
+        # sklearn 内部把输入转换为 float32 后与 float64 阈值比较
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features, got {X.shape[1]}")
+
+        feature, threshold, children = self.feature, self.threshold, self.children
+
+        if np.isnan(X).any():
+            # 含缺失值：NaN 与阈值比较为 False，按节点的 missing_go_to_left 决定方向
+            missing_left = self.missing_left
+            rows = np.arange(len(X))[:, None]
+            node = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+            for _ in range(self.max_depth):
+                x = X[rows, feature[node]]
+                go_left = (x <= threshold[node]) | (np.isnan(x) & missing_left[node])
+                node = children[2 * node + go_left]
+            return node
+
+        if len(X) == 1:
+            # 单行快速路径：一维索引
+            x = X[0]
+            node = self.roots
+            for _ in range(self.max_depth):
+                node = children[2 * node + (x[feature[node]] <= threshold[node])]
+            return node.reshape(1, -1)
+
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        for _ in range(self.max_depth):
+            node = children[2 * node + (X[rows, feature[node]] <= threshold[node])]
+
+        return node
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """类别概率 (n_samples, n_classes)"""
+        leaves = self.apply(X)
+
+        if self.kind == 'forest':
+            # 按树的顺序依次累加（cumsum 为严格顺序求和），再除以树的数量
+            proba = np.cumsum(self.values[leaves], axis=1)[:, -1]
+            return proba / len(self.roots)
+
+        # gbdt：初始值 + 各阶段 learning_rate * 叶子值，按阶段顺序累加
+        n_samples = len(leaves)
+        k = len(self.init_raw)
+        stages = self.values[leaves].reshape(n_samples, -1, k)
+        init = np.broadcast_to(self.init_raw, (n_samples, 1, k))
+        raw = np.cumsum(np.concatenate([init, stages], axis=1), axis=1)[:, -1]
+
+        if k == 1:
+            proba = np.empty((n_samples, 2))
+            proba[:, 1] = expit(raw[:, 0])
+            proba[:, 0] = 1 - proba[:, 1]
+            return proba
+
+        # softmax（与 sklearn 相同：减去行最大值后归一化）
+        raw = raw - raw.max(axis=1, keepdims=True)
+        np.exp(raw, out=raw)
+        raw /= raw.sum(axis=1, keepdims=True)
+        return raw
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """预测类别"""
+        return self.classes[self.predict_proba(X).argmax(axis=1)]
+
+    # ==================== 持久化 ====================
+
+    # 需要保存的数组字段（标量字段保存在 meta 中）
+    ARRAY_FIELDS = ('classes', 'feature', 'threshold', 'children', 'missing_left', 'values',
+                    'roots', 'init_raw')
+
+    def to_arrays(self) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+        """拆分为 (数组字典, 标量元数据)，用于写入 .npy"""
+        arrays = {name: getattr(self, name) for name in self.ARRAY_FIELDS}
+        meta = {'kind': self.kind, 'n_features': self.n_features, 'max_depth': self.max_depth}
+        return arrays, meta
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> 'CompiledTreeEnsemble':
+        """由数组（可为内存映射）和标量元数据重建（早期保存的模型没有 missing_left，NaN 走右子节点）"""
+        arrays = dict(arrays)
+        if 'missing_left' not in arrays:
+            arrays['missing_left'] = np.zeros(len(arrays['feature']), dtype=bool)
+        return cls(
+            kind=meta['kind'],
+            n_features=int(meta['n_features']),
+            max_depth=int(meta['max_depth']),
+            **{name: np.asarray(arrays[name]) for name in cls.ARRAY_FIELDS}
+        )
+
+
+def compile_ensemble(model: Any) -> CompiledTreeEnsemble:
+    """
+    编译训练好的树集成分类器
+
+    Args:
+        model: RandomForestClassifier / ExtraTreesClassifier / GradientBoostingClassifier
+
+    Returns:
+        CompiledTreeEnsemble
+
+    Raises:
+        UnsupportedModelError: 不支持的模型类型
+    """
+    estimators = getattr(model, 'estimators_', None)
+    if estimators is None:
+        raise UnsupportedModelError(f"Unsupported model: {type(model).__name__}")
+
+    if getattr(model, 'n_outputs_', 1) != 1:
+        raise UnsupportedModelError("Multi-output models are not supported")
+
+    classes = np.asarray(model.classes_)
+    n_features = int(model.n_features_in_)
+
+    if isinstance(estimators, np.ndarray):
+        # GradientBoosting: estimators_ 为 (n_stages, K) 的回归树数组
+        init = getattr(model, 'init_', None)
+        if not (init == 'zero' or type(init).__name__.startswith('Dummy')):
+            raise UnsupportedModelError(f"Unsupported init estimator: {type(init).__name__}")
+
+        init_raw = np.asarray(model._raw_predict_init(np.zeros((1, n_features))),
+                              dtype=np.float64)[0]
+        trees = [est.tree_ for est in estimators.ravel()]  # 阶段优先，与 predict_stages 一致
+        lr = float(model.learning_rate)
+        leaf_values = [lr * tree.value[:, 0, 0] for tree in trees]
+        kind = 'gbdt'
+    else:
+        trees = [est.tree_ for est in estimators]
+        n_classes = len(classes)
+        leaf_values = [_tree_proba(tree, n_classes) for tree in trees]
+        init_raw = np.empty(0)
+        kind = 'forest'
+
+    sizes = np.array([tree.node_count for tree in trees])
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+
+    feature, threshold, children, missing_left = [], [], [], []
+    for tree, offset in zip(trees, offsets):
+        nodes = np.arange(tree.node_count)
+        is_leaf = tree.children_left == _TREE_LEAF
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(tree.threshold)
+        left = np.where(is_leaf, nodes, tree.children_left) + offset
+        right = np.where(is_leaf, nodes, tree.children_right) + offset
+        children.append(np.column_stack([right, left]).ravel())
+        # 旧版 sklearn 的树不支持缺失值，没有 missing_go_to_left
+        missing = getattr(tree, 'missing_go_to_left', None)
+        missing_left.append(np.zeros(tree.node_count, dtype=bool) if missing is None
+                            else np.asarray(missing, dtype=bool))
+
+    compiled = CompiledTreeEnsemble(
+        kind=kind,
+        classes=classes,
+        n_features=n_features,
+        feature=np.concatenate(feature).astype(np.int32),
+        threshold=np.concatenate(threshold).astype(np.float64),
+        children=np.concatenate(children).astype(np.int32),
+        missing_left=np.concatenate(missing_left),
+        values=np.ascontiguousarray(np.concatenate(leaf_values), dtype=np.float64),
+        roots=offsets.astype(np.int32),
+        max_depth=max(int(tree.max_depth) for tree in trees),
+        init_raw=init_raw
+    )
+    logger.info(f"Compiled {kind} ensemble: {len(trees)} trees, "
+                f"{len(compiled.feature)} nodes, depth {compiled.max_depth}")
+    return compiled
+
+
+def try_compile(model: Any) -> Optional[CompiledTreeEnsemble]:
+    """编译模型，不支持时返回 None"""
+    try:
+        return compile_ensemble(model)
+    except UnsupportedModelError as e:
+        logger.debug(f"Model not compiled: {e}")
+        return None
+
+
+def _tree_proba(tree, n_classes: int) -> np.ndarray:
+    """
+    单棵分类树每个节点的类别概率
+
+    新版 sklearn 的 tree_.value 已是比例，predict_proba 直接返回；
+    旧版保存加权计数，predict_proba 按行和归一化。两种情况都按 sklearn 的方式处理
+    """
+    proba = np.array(tree.value[:, 0, :n_classes], dtype=np.float64)
+    normalizer = proba.sum(axis=1)
+    if not np.allclose(normalizer, 1.0):
+        normalizer[normalizer == 0.0] = 1.0
+        proba /= normalizer[:, None]
+    return proba
@@ -0,0 +1,299 @@
+"""
+Walk-Forward Retraining - 滚动重训练与样本外评估
+
+每个 fold 用截至测试区间开始前的数据训练一个模型，在紧随其后的测试区间上评估：
+- fold 之间相互独立，用进程池并行训练
+- 每个 fold 的特征只用截至该 fold 测试区间末尾的数据计算（全样本类因子不会看到未来），
+  结果缓存到 FactorStore，重复运行直接命中
+- 评估使用 QlibMetrics.compute_all_metrics（预测上涨概率 vs 未来收益率）
+- 每个 fold 的模型通过 ModelManager 发布为 <model_id>_fold<NN>
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field, asdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import logging
+
+from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
+from sklearn.preprocessing import StandardScaler
+
+from .factor_store import FactorStore
+from .ic_engine import forward_returns
+from .model_manager import ModelManager
+from models.qlib_metrics import QlibMetrics
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Fold:
+    """一个 walk-forward fold（行号区间，左闭右开）"""
+    index: int
+    train_start: int
+    train_end: int
+    test_start: int
+    test_end: int
+    label: str = ""   # 如测试区间所在月份
+
+
+@dataclass
+class FoldResult:
+    """单个 fold 的训练与评估结果"""
+    fold: Fold
+    metrics: Dict[str, Any]
+    model_id: Optional[str] = None
+    model_path: Optional[str] = None
+    train_samples: int = 0
+    test_samples: int = 0
+    elapsed: float = 0.0
+    error: Optional[str] = None
+    predictions: Optional[np.ndarray] = field(default=None, repr=False)
+
+
+def monthly_folds(timestamps: pd.Series, n_folds: int = 12, min_train: int = 1000,
+                  train_window: Optional[int] = None, gap: int = 1) -> List[Fold]:
+    """
+    按自然月划分测试区间（最近 n_folds 个完整或部分月份）
+
+    Args:
+        timestamps: 每行的时间戳
+        n_folds: fold 数
+        min_train: 最少训练样本数，不足的 fold 跳过
+        train_window: 训练窗口行数，None 为扩展窗口（从头开始）
+        gap: 训练集末尾与测试集之间的间隔行数（训练时另外剔除标签区间进入测试集的行）
+
+    Returns:
+        Fold 列表（按时间顺序）
+    """
+    months = pd.to_datetime(pd.Series(timestamps)).dt.to_period('M').to_numpy()
+    starts = np.flatnonzero(np.r_[True, months[1:] != months[:-1]])
+    ends = np.r_[starts[1:], len(months)]
+
+    folds = []
+    for start, end in list(zip(starts.tolist(), ends.tolist()))[-n_folds:]:
+        train_end = start - gap
+        train_start = 0 if train_window is None else max(0, train_end - train_window)
+        if train_end - train_start < min_train:
+            logger.warning(f"Skip fold {months[start]}: {train_end - train_start} training rows")
+            continue
+        folds.append(Fold(len(folds), train_start, train_end, start, end, str(months[start])))
+    return folds
+
+
+def index_folds(n: int, n_splits: int = 5, test_size: Optional[int] = None,
+                gap: int = 1) -> List[Fold]:
+    """与 TimeSeriesSplitter.walk_forward_split 相同的行号划分（扩展窗口）"""
+    test_size = test_size or n // (n_splits + 1)
+    folds = []
+    for i in range(n_splits):
+        test_start = n - (n_splits - i) * test_size
+        folds.append(Fold(i, 0, test_start - gap, test_start, min(test_start + test_size, n),
+                          f"split{i}"))
+    return folds
+
+
+def create_classifier(model_type: str = 'random_forest', **params):
+    """创建分类器（与 MLFactor 的默认参数一致，单线程以免进程池内超额订阅）"""
+    if model_type == 'random_forest':
+        defaults = dict(n_estimators=100, max_depth=10, min_samples_split=20,
+                        min_samples_leaf=10, random_state=42, n_jobs=1)
+        return RandomForestClassifier(**{**defaults, **params})
+    if model_type == 'gradient_boosting':
+        defaults = dict(n_estimators=100, max_depth=5, learning_rate=0.1, random_state=42)
+        return GradientBoostingClassifier(**{**defaults, **params})
+    raise ValueError(f"Unknown model type: {model_type}")
+
+
+class WalkForwardPipeline:
+    """
+    并行 walk-forward 重训练
+
+    feature_fn 需为模块级函数（可被进程池序列化）：DataFrame(OHLCV) -> DataFrame(特征)，
+    行与输入对齐，t 行只使用 t 及之前的数据
+    """
+
+    def __init__(self, feature_fn: Callable[[pd.DataFrame], pd.DataFrame],
+                 model_id: str, model_type: str = 'random_forest',
+                 model_params: Optional[Dict[str, Any]] = None,
+                 model_dir: str = "models", cache_dir: Optional[str] = "data/cache/factors",
+                 feature_version: str = "1", horizon: int = 1,
+                 n_jobs: Optional[int] = None, publish: bool = True, n_quantiles: int = 5):
+        """
+        Args:
+            feature_fn: 特征计算函数
+            model_id: 模型 ID 前缀，fold 模型发布为 <model_id>_fold<NN>
+            model_type: 'random_forest' / 'gradient_boosting'
+            model_params: 覆盖默认模型参数
+            model_dir: ModelManager 目录
+            cache_dir: FactorStore 目录，None 表示不缓存
+            feature_version: 特征定义版本（修改 feature_fn 时递增）
+            horizon: 标签周期（t -> t+horizon 的收益率，> 0 为上涨）
+            n_jobs: 并行进程数，默认 CPU 核数
+            publish: 是否通过 ModelManager 发布每个 fold 的模型
+            n_quantiles: 分位数分析组数
+        """
+        self.feature_fn = feature_fn
+        self.model_id = model_id
+        self.model_type = model_type
+        self.model_params = model_params or {}
+        self.model_dir = model_dir
+        self.cache_dir = cache_dir
+        self.feature_version = feature_version
+        self.horizon = horizon
+        self.n_jobs = n_jobs or os.cpu_count() or 1
+        self.publish = publish
+        self.n_quantiles = n_quantiles
+
+    def run(self, data: pd.DataFrame, folds: List[Fold],
+            dataset_name: str = "default") -> List[FoldResult]:
+        """
+        并行训练并评估所有 fold
+
+        Args:
+            data: OHLCV 数据（按时间排序）
+            folds: fold 列表
+            dataset_name: 特征缓存的数据集名称
+
+        Returns:
+            按 fold 顺序排列的结果
+        """
+        start = time.perf_counter()
+        tasks = [(self, data.iloc[:fold.test_end], fold, dataset_name) for fold in folds]
+        results: Dict[int, FoldResult] = {}
+
+        if self.n_jobs <= 1 or len(tasks) <= 1:
+            for task in tasks:
+                result = _run_fold(task)
+                results[result.fold.index] = result
+                self._log_result(result)
+        else:
+            with ProcessPoolExecutor(max_workers=min(self.n_jobs, len(tasks))) as pool:
+                futures = [pool.submit(_run_fold, task) for task in tasks]
+                for future in as_completed(futures):
+                    result = future.result()
+                    results[result.fold.index] = result
+                    self._log_result(result)
+
+        ordered = [results[fold.index] for fold in folds]
+        logger.info(f"Walk-forward finished: {len(folds)} folds in {time.perf_counter() - start:.1f}s "
+                    f"({self.n_jobs} workers)")
+        return ordered
+
+    def train_fold(self, data: pd.DataFrame, fold: Fold, dataset_name: str) -> FoldResult:
+        """训练并评估单个 fold（在工作进程中运行）"""
+        start = time.perf_counter()
+
+        features = self._features(data, fold, dataset_name)
+        returns = forward_returns(data['close'], (self.horizon,)).iloc[:, 0].to_numpy()
+
+        X = np.nan_to_num(features.to_numpy(dtype=np.float64), nan=0.0, posinf=0.0, neginf=0.0)
+        train = np.arange(fold.train_start, fold.train_end)
+        test = np.arange(fold.test_start, fold.test_end)
+        # 只使用标签已知的样本；t 行的标签用到 t+horizon 的价格，
+        # 剔除 t + horizon >= test_start 的训练行（gap < horizon 时标签会看到测试区间）
+        train = train[(train + self.horizon < fold.test_start) & np.isfinite(returns[train])]
+        test = test[np.isfinite(returns[test])]
+        y_train = (returns[train] > 0).astype(int)
+
+        scaler = StandardScaler()
+        X_train = scaler.fit_transform(X[train])
+        model = create_classifier(self.model_type, **self.model_params)
+        model.fit(X_train, y_train)
+
+        proba = model.predict_proba(scaler.transform(X[test]))
+        up = np.flatnonzero(model.classes_ == 1)
+        y_pred = proba[:, up[0]] if len(up) else np.zeros(len(test))
+
+        metrics = QlibMetrics.compute_all_metrics(y_pred, returns[test], n_quantiles=self.n_quantiles)
+        metrics['accuracy'] = float(np.mean((y_pred > 0.5) == (returns[test] > 0))) if len(test) else np.nan
+        metrics = _to_builtin(metrics)
+
+        result = FoldResult(fold=fold, metrics=metrics, train_samples=len(train),
+                            test_samples=len(test), predictions=y_pred)
+
+        if self.publish:
+            model_id = f"{self.model_id}_fold{fold.index:02d}"
+            metadata = {
+                'model_type': self.model_type,
+                'feature_names': list(features.columns),
+                'prediction_horizon': self.horizon,
+                'walk_forward': asdict(fold),
+                'train_samples': len(train),
+                'test_samples': len(test),
+                'metrics': metrics,
+            }
+            result.model_id = model_id
+            result.model_path = ModelManager(self.model_dir).save_model(
+                {'model': model, 'scaler': scaler}, model_id, metadata,
+                arrays={'scaler_mean': scaler.mean_, 'scaler_scale': scaler.scale_}
+            )
+
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    @staticmethod
+    def summary(results: List[FoldResult]) -> pd.DataFrame:
+        """各 fold 指标汇总表（最后一行为均值）"""
+        rows = []
+        for r in results:
+            rows.append({
+                'fold': r.fold.label or r.fold.index,
+                'train_samples': r.train_samples,
+                'test_samples': r.test_samples,
+                'ic': r.metrics.get('ic', np.nan),
+                'rank_ic': r.metrics.get('rank_ic', np.nan),
+                'accuracy': r.metrics.get('accuracy', np.nan),
+                'long_short_return': r.metrics.get('long_short_return', np.nan),
+                'elapsed': r.elapsed,
+                'model_id': r.model_id,
+                'error': r.error,
+            })
+        table = pd.DataFrame(rows)
+        if len(table):
+            numeric = table.select_dtypes(include='number').mean()
+            table.loc[len(table)] = {**numeric.to_dict(), 'fold': 'mean'}
+        return table
+
+    def _features(self, data: pd.DataFrame, fold: Fold, dataset_name: str) -> pd.DataFrame:
+        """计算（或从缓存读取）截至 fold 测试区间末尾的特征"""
+        if self.cache_dir is None:
+            return self.feature_fn(data)
+        store = FactorStore(self.cache_dir)
+        return store.get_or_compute(
+            f"{dataset_name}_walk_forward", data, self.feature_fn,
+            version=self.feature_version, params={'end': fold.test_end}
+        )
+
+    @staticmethod
+    def _log_result(result: FoldResult):
+        if result.error:
+            logger.error(f"Fold {result.fold.label}: {result.error}")
+            return
+        logger.info(f"Fold {result.fold.label}: IC {result.metrics['ic']:.4f}, "
+                    f"Rank IC {result.metrics['rank_ic']:.4f}, "
+                    f"{result.test_samples} test samples, {result.elapsed:.1f}s")
+
+
+def _run_fold(task: Tuple[WalkForwardPipeline, pd.DataFrame, Fold, str]) -> FoldResult:
+    """进程池入口（模块级函数以便序列化）"""
+    pipeline, data, fold, dataset_name = task
+    try:
+        return pipeline.train_fold(data, fold, dataset_name)
+    except Exception as e:
+        logger.error(f"Fold {fold.label} failed: {e}", exc_info=True)
+        return FoldResult(fold=fold, metrics={}, error=str(e))
+
+
+def _to_builtin(value):
+    """把指标中的 numpy 类型转换为可 JSON 序列化的内置类型"""
+    if isinstance(value, dict):
+        return {k: _to_builtin(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_to_builtin(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
@@ -0,0 +1,313 @@
+"""
+引擎内部延迟追踪 - perf_counter_ns 打点，HDR 风格直方图聚合，采样追踪环形缓冲区
+
+打点位置（同步引擎 / asyncio 引擎中在事件循环里直接执行的策略）：
+- feed: 行情服务本地时间戳（MarketData.local_time，纳秒）到本进程收到（墙钟，同机部署时有意义）
+- decode: 一批行情的解码耗时（平均每条）
+- queue: 批次收齐到策略回调开始（同批次中排在前面的行情和策略的耗时）
+- strategy: 策略 on_market_data 耗时（按策略）
+- risk: 下单时的风控检查耗时（按策略）
+- encode / send: 订单编码、NOBLOCK 发送耗时
+- tick_to_order: 行情批次收齐到订单发出（按策略，只统计在行情回调中同步发出的订单）
+
+LatencyHistogram 为对数-线性分桶（每个 2 的幂区间 64 个子桶，相对误差约 1.6%），
+由引擎线程单线程写入、不加锁；读端复制计数后计算分位数。
+追踪环形缓冲区记录每个订单的各阶段耗时，以及每 trace_sample 次策略回调采样一次；
+install_signal_handler 后收到 SIGUSR1 时写出到 JSON Lines 文件。
+"""
+
+import json
+import signal
+import threading
+import time
+from time import perf_counter_ns
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('feed', 'decode', 'queue', 'strategy', 'risk', 'encode', 'send', 'tick_to_order')
+
+TRACE_FIELDS = ('wall_time', 'kind', 'strategy_id', 'symbol', 'order_id',
+                'queue_ns', 'strategy_ns', 'risk_ns', 'encode_ns', 'send_ns', 'tick_to_order_ns')
+
+
+class LatencyHistogram:
+    """
+    HDR 风格直方图（纳秒）
+
+    小于 2^precision_bits 的值精确计数；更大的值按 2 的幂分段，每段 2^(precision_bits-1) 个子桶。
+    超过 max_value 的值计入最后一个桶（max 仍记录真实值）
+    """
+
+    def __init__(self, precision_bits: int = 7, max_value: int = 60 * 10**9):
+        self.precision_bits = precision_bits
+        self._linear = 1 << precision_bits
+        self._half = self._linear >> 1
+        self.max_value = max_value
+        self.counts = [0] * (self._index(max_value) + 1)
+        self._last = len(self.counts) - 1
+        self.total = 0
+        self.sum = 0
+        self.max = 0
+
+    def _index(self, value: int) -> int:
+        if value < self._linear:
+            return value if value > 0 else 0
+        shift = value.bit_length() - self.precision_bits
+        return self._half * shift + (value >> shift)
+
+    def bucket_bounds(self, index: int) -> Tuple[int, int]:
+        """桶 index 覆盖的值区间 [lower, upper]"""
+        if index < self._linear:
+            return index, index
+        shift = index // self._half - 1
+        top = index - self._half * shift
+        return top << shift, ((top + 1) << shift) - 1
+
+    def record(self, value: int):
+        """记录一个值（纳秒，单线程写入）"""
+        if value < self._linear:
+            index = value if value > 0 else 0
+        else:
+            shift = value.bit_length() - self.precision_bits
+            index = self._half * shift + (value >> shift)
+            if index > self._last:
+                index = self._last
+        self.counts[index] += 1
+        self.total += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def reset(self):
+        self.counts = [0] * len(self.counts)
+        self.total = 0
+        self.sum = 0
+        self.max = 0
+
+    def merge(self, other: 'LatencyHistogram'):
+        """合并另一个相同精度的直方图"""
+        if len(other.counts) != len(self.counts):
+            raise ValueError("Histogram layouts differ")
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.total += other.total
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def snapshot(self) -> np.ndarray:
+        """计数副本（读端调用）"""
+        return np.array(self.counts, dtype=np.int64)
+
+    def percentiles(self, quantiles=(50.0, 90.0, 99.0, 99.9), counts: Optional[np.ndarray] = None) -> List[int]:
+        """
+        分位数（纳秒，取所在桶的上界）
+
+        Args:
+            quantiles: 百分位
+            counts: snapshot() 结果，None 时现取
+        """
+        if counts is None:
+            counts = self.snapshot()
+        cumulative = np.cumsum(counts)
+        total = int(cumulative[-1]) if len(cumulative) else 0
+        if total == 0:
+            return [0 for _ in quantiles]
+        results = []
+        for q in quantiles:
+            rank = max(1, int(np.ceil(q / 100.0 * total)))
+            index = int(np.searchsorted(cumulative, rank))
+            if index >= self._last:
+                # 溢出桶没有上界，取记录到的最大值
+                results.append(self.max)
+            else:
+                results.append(min(self.bucket_bounds(index)[1], self.max))
+        return results
+
+    def cumulative_counts(self, bounds: List[int], counts: Optional[np.ndarray] = None) -> List[int]:
+        """不超过各上界的样本数（按桶上界判断，用于导出 Prometheus 直方图）"""
+        if counts is None:
+            counts = self.snapshot()
+        uppers = np.array([self.bucket_bounds(i)[1] for i in range(len(counts))], dtype=np.int64)
+        cumulative = np.cumsum(counts)
+        results = []
+        for bound in bounds:
+            index = int(np.searchsorted(uppers, bound, side='right')) - 1
+            results.append(int(cumulative[index]) if index >= 0 else 0)
+        return results
+
+    def summary(self) -> Dict[str, float]:
+        """样本数、均值、p50 / p90 / p99 / p99.9、最大值（微秒）"""
+        counts = self.snapshot()
+        total = int(counts.sum())
+        p50, p90, p99, p999 = self.percentiles(counts=counts)
+        return {
+            'count': total,
+            'mean_us': self.sum / total / 1000 if total else 0.0,
+            'p50_us': p50 / 1000,
+            'p90_us': p90 / 1000,
+            'p99_us': p99 / 1000,
+            'p999_us': p999 / 1000,
+            'max_us': self.max / 1000,
+        }
+
+
+class LatencyTracer:
+    """
+    引擎延迟追踪器（引擎线程中调用；在执行器线程中下单时不记录按策略的阶段）
+
+    Args:
+        trace_capacity: 追踪环形缓冲区容量（0 不记录追踪）
+        trace_sample: 每多少次策略回调采样一条追踪（0 只记录订单）
+    """
+
+    def __init__(self, trace_capacity: int = 0, trace_sample: int = 0):
+        self.histograms: Dict[Tuple[str, str], LatencyHistogram] = {}
+        self.trace_capacity = trace_capacity
+        self.trace_sample = trace_sample
+        self._trace: List[Optional[tuple]] = [None] * trace_capacity
+        self._trace_index = 0
+        self._callbacks = 0
+
+        # 当前行情批次
+        self.tick_ns = 0
+        self.tick_wall_ns = 0
+        # 当前策略回调
+        self.current: Optional[str] = None
+        self.current_symbol: Optional[str] = None
+        self.callback_start = 0
+        self._risk_ns = 0
+
+        self._thread = threading.get_ident()
+        self._dump_path: Optional[str] = None
+
+    def histogram(self, stage: str, strategy_id: str = '') -> LatencyHistogram:
+        key = (stage, strategy_id)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = LatencyHistogram()
+        return histogram
+
+    # ==================== 打点（热路径） ====================
+
+    def mark_recv(self):
+        """行情批次收齐"""
+        self.tick_ns = perf_counter_ns()
+        self.tick_wall_ns = time.time_ns()
+        self._thread = threading.get_ident()
+
+    def record_decode(self, count: int):
+        """行情批次解码完成（count 为解码条数）"""
+        if count:
+            self.histogram('decode').record((perf_counter_ns() - self.tick_ns) // count)
+
+    def record_feed(self, local_time: int):
+        if local_time > 0:
+            feed = self.tick_wall_ns - local_time
+            if feed >= 0:
+                self.histogram('feed').record(feed)
+
+    def begin(self, strategy_id: str, symbol: str) -> int:
+        """策略回调开始，返回开始时间"""
+        self.current = strategy_id
+        self.current_symbol = symbol
+        self._risk_ns = 0
+        start = self.callback_start = perf_counter_ns()
+        return start
+
+    def end(self, start: int):
+        """策略回调结束"""
+        strategy_id = self.current
+        stop = perf_counter_ns()
+        self.current = None
+        self.histogram('strategy', strategy_id).record(stop - start)
+        queue = start - self.tick_ns
+        self.histogram('queue', strategy_id).record(queue)
+
+        self._callbacks += 1
+        if self.trace_capacity and self.trace_sample and self._callbacks % self.trace_sample == 0:
+            self._append_trace(('tick', strategy_id, self.current_symbol, None,
+                                queue, stop - start, None, None, None, None))
+
+    def record_risk(self, elapsed: int):
+        """风控检查耗时"""
+        if self.current is not None and threading.get_ident() == self._thread:
+            self._risk_ns += elapsed
+            self.histogram('risk', self.current).record(elapsed)
+        else:
+            self.histogram('risk').record(elapsed)
+
+    def record_order(self, order, encode_start: int, encode_end: int, send_end: int):
+        """订单编码并发出（进入重试队列的订单不记录 send / tick_to_order）"""
+        self.histogram('encode').record(encode_end - encode_start)
+        self.histogram('send').record(send_end - encode_end)
+
+        if self.current != order.strategy_id or threading.get_ident() != self._thread:
+            return
+        tick_to_order = send_end - self.tick_ns
+        self.histogram('tick_to_order', order.strategy_id).record(tick_to_order)
+        if self.trace_capacity:
+            self._append_trace(('order', order.strategy_id, order.symbol, order.order_id,
+                                self.callback_start - self.tick_ns, encode_start - self.callback_start,
+                                self._risk_ns, encode_end - encode_start, send_end - encode_end,
+                                tick_to_order))
+
+    def _append_trace(self, entry: tuple):
+        self._trace[self._trace_index % self.trace_capacity] = (time.time_ns(),) + entry
+        self._trace_index += 1
+
+    # ==================== 读取 ====================
+
+    def trace(self) -> List[Dict[str, Any]]:
+        """追踪缓冲区中的记录（按时间顺序）"""
+        count = min(self._trace_index, self.trace_capacity)
+        start = self._trace_index - count
+        entries = [self._trace[i % self.trace_capacity] for i in range(start, self._trace_index)]
+        return [dict(zip(TRACE_FIELDS, entry)) for entry in entries if entry is not None]
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """各阶段延迟统计：'stage' 或 'stage/strategy_id' -> summary"""
+        # 先复制字典（引擎线程可能同时新建直方图）
+        items = sorted(list(self.histograms.items()))
+        return {(f"{stage}/{strategy_id}" if strategy_id else stage): histogram.summary()
+                for (stage, strategy_id), histogram in items if histogram.total}
+
+    def reset(self):
+        for histogram in self.histograms.values():
+            histogram.reset()
+
+    def dump(self, path: str):
+        """写出延迟统计和追踪记录（JSON Lines：首行为统计，之后每行一条追踪）"""
+        summary = self.summary()
+        trace = self.trace()
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'wall_time': time.time_ns(), 'latency': summary}) + '\n')
+            for entry in trace:
+                f.write(json.dumps(entry) + '\n')
+        logger.info(f"Latency trace dumped to {path} ({len(trace)} entries)")
+
+    def install_signal_handler(self, path: str, signum: int = getattr(signal, 'SIGUSR1', 0)) -> bool:
+        """
+        收到 SIGUSR1 时在后台线程写出延迟统计和追踪记录（只能在主线程中注册）
+
+        Returns:
+            是否注册成功
+        """
+        if not signum:
+            return False
+        self._dump_path = path
+        try:
+            signal.signal(signum, self._on_signal)
+        except ValueError:
+            logger.warning("Latency dump signal handler not registered (non-main thread)")
+            return False
+        return True
+
+    def request_dump(self, path: Optional[str] = None):
+        """在后台线程中写出（不阻塞引擎线程）"""
+        path = path or self._dump_path or 'latency_trace.jsonl'
+        threading.Thread(target=self.dump, args=(path,), name='latency-dump', daemon=True).start()
+
+    def _on_signal(self, signum, frame):
+        self.request_dump()
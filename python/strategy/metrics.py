@@ -4,7 +4,8 @@ Prometheus Metrics for TTQuant Strategy Engine
 导出策略引擎的性能指标到 Prometheus
 """
 
-from prometheus_client import Counter, Gauge, Histogram, start_http_server
+from prometheus_client import Counter, Gauge, start_http_server, REGISTRY
+from prometheus_client.core import GaugeMetricFamily, HistogramMetricFamily
 from typing import Dict
 import logging
 
@@ -126,14 +127,6 @@ engine_trades_received = Counter(
     ['strategy_id', 'status']
 )
 
-# 策略执行延迟（毫秒）
-engine_strategy_latency = Histogram(
-    'engine_strategy_latency_ms',
-    'Strategy execution latency in milliseconds',
-    ['strategy_id'],
-    buckets=[1, 5, 10, 50, 100, 500, 1000, 5000]
-)
-
 # 活跃策略数
 engine_active_strategies = Gauge(
     'engine_active_strategies',
@@ -146,6 +139,100 @@ engine_uptime_seconds = Gauge(
     'Engine uptime in seconds'
 )
 
+# 订单重试队列深度（发送队列达到高水位后排队的订单）
+engine_order_pending = Gauge(
+    'engine_order_pending',
+    'Orders waiting in the retry queue after hitting the send HWM'
+)
+
+# 订单发送遇到高水位的次数
+engine_order_hwm_hits = Counter(
+    'engine_order_hwm_hits_total',
+    'Orders that hit the send HWM and were queued for retry'
+)
+
+# 未发出的订单（reason: rejected 重试队列已满 / expired 排队超时）
+engine_orders_dropped = Counter(
+    'engine_orders_dropped_total',
+    'Orders dropped before being sent',
+    ['reason']
+)
+
+# 异步日志队列满时丢弃的日志条数
+engine_log_dropped = Counter(
+    'engine_log_records_dropped_total',
+    'Log records dropped because the async logging queue was full'
+)
+
+# 重复（已处理过）的成交回报
+engine_trades_duplicate = Counter(
+    'engine_trades_duplicate_total',
+    'Duplicate trade reports dropped by the engine'
+)
+
+# 成交回报序号缺口（result: detected 发现缺失 / recovered 回放补到 / lost 无法回补）
+engine_trades_missed = Counter(
+    'engine_trades_missed_total',
+    'Trade reports missed on the trade feed (sequence gaps)',
+    ['result']
+)
+
+# 引擎各阶段延迟的导出桶（微秒）
+LATENCY_BUCKETS_US = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 50000, 100000]
+LATENCY_QUANTILES = (50.0, 90.0, 99.0, 99.9)
+# 策略回调延迟（engine_strategy_latency_ms，由 'strategy' 阶段导出）的桶（毫秒）
+STRATEGY_LATENCY_BUCKETS_MS = [0.01, 0.05, 0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000]
+
+
+class LatencyCollector:
+    """
+    引擎延迟指标（自定义 Collector）
+
+    抓取时把 LatencyTracer 的 HDR 直方图转换为 Prometheus 直方图和分位数，
+    热路径上只有 LatencyTracer 的计数，没有 Prometheus 调用。
+    各策略的 'strategy' 阶段（on_market_data 回调）另外按毫秒导出为 engine_strategy_latency_ms
+    """
+
+    def __init__(self, tracer):
+        self.tracer = tracer
+
+    def collect(self):
+        histograms = HistogramMetricFamily(
+            'engine_stage_latency_us',
+            'Engine stage latency in microseconds (tick_to_order: market data batch received to order sent)',
+            labels=['stage', 'strategy_id']
+        )
+        quantiles = GaugeMetricFamily(
+            'engine_stage_latency_quantile_us',
+            'Engine stage latency quantiles in microseconds',
+            labels=['stage', 'strategy_id', 'quantile']
+        )
+        strategy_latency = HistogramMetricFamily(
+            'engine_strategy_latency_ms',
+            'Strategy callback latency in milliseconds',
+            labels=['strategy_id']
+        )
+        for (stage, strategy_id), histogram in list(self.tracer.histograms.items()):
+            counts = histogram.snapshot()
+            total = int(counts.sum())
+            if total == 0:
+                continue
+            cumulative = histogram.cumulative_counts([bound * 1000 for bound in LATENCY_BUCKETS_US], counts)
+            buckets = [(str(bound), count) for bound, count in zip(LATENCY_BUCKETS_US, cumulative)]
+            buckets.append(('+Inf', total))
+            histograms.add_metric([stage, strategy_id], buckets, histogram.sum / 1000)
+            for q, value in zip(LATENCY_QUANTILES, histogram.percentiles(LATENCY_QUANTILES, counts)):
+                quantiles.add_metric([stage, strategy_id, f"{q / 100:g}"], value / 1000)
+            if stage == 'strategy':
+                cumulative = histogram.cumulative_counts([bound * 1e6 for bound in STRATEGY_LATENCY_BUCKETS_MS],
+                                                         counts)
+                buckets = [(str(bound), count) for bound, count in zip(STRATEGY_LATENCY_BUCKETS_MS, cumulative)]
+                buckets.append(('+Inf', total))
+                strategy_latency.add_metric([strategy_id], buckets, histogram.sum / 1e6)
+        yield histograms
+        yield quantiles
+        yield strategy_latency
+
 
 class StrategyMetrics:
     """策略指标收集器"""
@@ -229,6 +316,7 @@ class EngineMetrics:
 
     def __init__(self):
         self.strategy_metrics: Dict[str, StrategyMetrics] = {}
+        self._last_totals: Dict[str, int] = {}
 
     def add_strategy(self, strategy_id: str):
         """添加策略"""
@@ -260,14 +348,38 @@ class EngineMetrics:
             status=status
         ).inc()
 
-    def record_strategy_latency(self, strategy_id: str, latency_ms: float):
-        """记录策略执行延迟"""
-        engine_strategy_latency.labels(strategy_id=strategy_id).observe(latency_ms)
-
     def update_uptime(self, uptime_seconds: float):
         """更新运行时间"""
         engine_uptime_seconds.set(uptime_seconds)
 
+    def register_latency_tracer(self, tracer, registry=REGISTRY) -> LatencyCollector:
+        """导出引擎的 LatencyTracer（StrategyEngine.latency_tracer）"""
+        collector = LatencyCollector(tracer)
+        registry.register(collector)
+        return collector
+
+    def update_order_gateway(self, stats: Dict[str, int], pending: int, log_dropped: int = 0):
+        """更新订单网关背压指标（stats 为 OrderGateway.stats 累计值）"""
+        engine_order_pending.set(pending)
+        self._inc(engine_order_hwm_hits, 'hwm_hits', stats['hwm_hits'])
+        self._inc(engine_orders_dropped.labels(reason='rejected'), 'orders_rejected', stats['orders_rejected'])
+        self._inc(engine_orders_dropped.labels(reason='expired'), 'orders_expired', stats['orders_expired'])
+        self._inc(engine_log_dropped, 'log_dropped', log_dropped)
+
+    def update_trade_feed(self, duplicates: int, sequencer):
+        """更新成交回报去重和缺口指标（sequencer 为 StrategyEngine.trade_sequencer）"""
+        self._inc(engine_trades_duplicate, 'trade_duplicates', duplicates)
+        self._inc(engine_trades_missed.labels(result='detected'), 'trades_missed', sequencer.detected)
+        self._inc(engine_trades_missed.labels(result='recovered'), 'trades_recovered', sequencer.recovered)
+        self._inc(engine_trades_missed.labels(result='lost'), 'trades_lost', sequencer.lost)
+
+    def _inc(self, counter, key: str, total: int):
+        """把累计值转换为 Counter 增量"""
+        delta = total - self._last_totals.get(key, 0)
+        if delta > 0:
+            counter.inc(delta)
+        self._last_totals[key] = total
+
 
 def start_metrics_server(port: int = 8000):
     """启动 Prometheus metrics HTTP 服务器"""
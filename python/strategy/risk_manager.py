@@ -8,9 +8,9 @@
 4. 最大持仓限制（Max Position Limit）
 """
 
-from typing import Dict, Optional
-from dataclasses import dataclass
-from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+from dataclasses import dataclass, asdict
+from datetime import date, datetime, timedelta
 import logging
 
 logger = logging.getLogger(__name__)
@@ -241,6 +241,24 @@ class RiskManager:
 
         return max(1, volume)  # 至少1手
 
+    def get_state(self) -> Dict[str, Any]:
+        """资金、每日统计和各持仓的止损止盈价格（用于状态快照）"""
+        return {
+            'current_capital': self.current_capital,
+            'daily_pnl': self.daily_pnl,
+            'daily_trades': self.daily_trades,
+            'last_reset_date': self.last_reset_date.isoformat(),
+            'position_risks': [asdict(risk) for risk in self.position_risks.values()],
+        }
+
+    def set_state(self, state: Dict[str, Any]):
+        """从 get_state 的结果恢复（快照早于今天时每日统计在下一次检查时重置）"""
+        self.current_capital = state['current_capital']
+        self.daily_pnl = state['daily_pnl']
+        self.daily_trades = state['daily_trades']
+        self.last_reset_date = date.fromisoformat(state['last_reset_date'])
+        self.position_risks = {risk['symbol']: PositionRisk(**risk) for risk in state['position_risks']}
+
     def get_stats(self) -> Dict:
         """获取风控统计信息"""
         return {
@@ -0,0 +1,621 @@
+"""
+ShardSupervisor - 多进程分片策略引擎
+
+单个引擎进程受 GIL 限制，策略数量达到几十个时行情处理会排队。监督进程把策略分到
+多个工作进程（分片），每个工作进程运行一个独立的 StrategyEngine / AsyncStrategyEngine，
+拥有自己的行情 SUB、成交回报 SUB 和订单 PUSH：
+- 分片方式 shard_by = 'symbol'：同一交易对的策略在同一进程（行情只需订阅一次，成交回报
+  只订阅本分片的交易对），按交易对组的权重之和均衡
+- shard_by = 'weight'：按策略配置中的 weight（默认 1.0）逐个均衡
+- 共享内存（SharedShardState）中每个工作进程一行：心跳、盈亏、持仓市值等，由该进程
+  周期写入（seqlock，读端无锁）；控制行保存全局暂停标志；每个分片另有一行基线，
+  由监督进程写入
+- 工作进程的风控管理器替换为 SharedRiskManager：在本进程检查之外，按所有进程汇总的
+  盈亏和持仓市值检查每日亏损和总仓位限制
+- 监督进程重启退出或心跳超时的工作进程（指数退避，超过 max_restarts 后放弃该分片），
+  汇总当日亏损超过 daily_loss_limit 时设置全局暂停
+- 亏损限制按当日盈亏（与 RiskManager.daily_pnl 一样按本地日期划分）：工作进程写入的盈亏为
+  组合总盈亏减去当日起点，行中记录日期；跨日时监督进程清零各分片基线的盈亏，并解除因亏损
+  触发的全局暂停（手动暂停需调用 resume）
+
+工作进程重启后从空仓开始（订单编号从新区间开始，避免重复），而崩溃前的当日亏损和
+网关上仍持有的仓位并未消失：监督进程在工作进程退出后把它最后写入的当日盈亏、持仓市值和持仓数
+累加到该分片的基线行，汇总风控（totals）包含基线，崩溃重启不会重置汇总亏损和总仓位检查。
+配置 state_dir 时重启的进程先从快照恢复组合持仓再开始写入：当日盈亏从恢复后的总盈亏起算，
+崩溃前的当日盈亏仍由基线计入；持仓先保守地全部计入基线（与恢复的持仓重复计入），新进程
+写入恢复出的持仓市值后，监督进程从基线中减去这一部分，只保留快照之后未恢复的差额
+"""
+
+import multiprocessing as mp
+import os
+import signal
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+import logging
+
+from .engine import StrategyEngine
+from .risk_manager import RiskConfig, RiskManager
+
+logger = logging.getLogger(__name__)
+
+# 控制行字段
+CONTROL_FIELDS = ('seq', 'halted', 'updated')
+# 工作进程行字段（seq 为 seqlock 计数，写入期间为奇数）
+# day 为 pnl 所属的日期（date.toordinal()），pnl 为当日盈亏
+# restored_exposure / restored_positions 为启动时从状态快照恢复的持仓市值和持仓数
+WORKER_FIELDS = ('seq', 'pid', 'heartbeat', 'restarts', 'strategies', 'day', 'pnl', 'exposure',
+                 'positions', 'md_count', 'trade_count', 'restored_exposure', 'restored_positions')
+# 分片基线行字段：之前各次运行的进程退出时留下的当日盈亏、持仓市值和持仓数
+BASELINE_FIELDS = ('seq', 'day', 'pnl', 'exposure', 'positions')
+_ROW_SIZE = max(len(CONTROL_FIELDS), len(WORKER_FIELDS), len(BASELINE_FIELDS))
+_CONTROL_INDEX = {name: i for i, name in enumerate(CONTROL_FIELDS)}
+_WORKER_INDEX = {name: i for i, name in enumerate(WORKER_FIELDS)}
+_BASELINE_INDEX = {name: i for i, name in enumerate(BASELINE_FIELDS)}
+
+# 重启后订单编号的起点间隔（strategy_id_<restarts * ORDER_ID_STRIDE + n>）
+ORDER_ID_STRIDE = 1_000_000_000
+
+
+def _trading_day() -> int:
+    """当日日期序号（与 RiskManager.reset_daily_stats 一样按本地日期划分）"""
+    return datetime.now().date().toordinal()
+
+
+def assign_shards(strategy_configs: List[Dict[str, Any]], n_workers: int,
+                  by: str = 'symbol') -> List[List[Dict[str, Any]]]:
+    """
+    把策略配置分配到 n_workers 个分片（最长处理时间优先的贪心：重的组先分配到当前最轻的分片）
+
+    Args:
+        strategy_configs: 策略配置（可含 weight，默认 1.0）
+        n_workers: 分片数
+        by: 'symbol' 同一交易对的策略分到同一分片；'weight' 按策略逐个均衡
+
+    Returns:
+        每个分片的策略配置列表（策略少于分片数时部分分片为空）
+    """
+    if by not in ('symbol', 'weight'):
+        raise ValueError(f"Unknown shard_by: {by}")
+    if n_workers < 1:
+        raise ValueError(f"n_workers must be positive: {n_workers}")
+
+    groups: Dict[Any, List[Dict[str, Any]]] = {}
+    for i, config in enumerate(strategy_configs):
+        symbol = config.get('symbol')
+        key = symbol if by == 'symbol' and symbol is not None else ('#', i)
+        groups.setdefault(key, []).append(config)
+
+    def weight(group):
+        return sum(float(config.get('weight', 1.0)) for config in group)
+
+    shards: List[List[Dict[str, Any]]] = [[] for _ in range(n_workers)]
+    loads = [0.0] * n_workers
+    for group in sorted(groups.values(), key=weight, reverse=True):
+        target = loads.index(min(loads))
+        shards[target].extend(group)
+        loads[target] += weight(group)
+    return shards
+
+
+class SharedShardState:
+    """
+    共享内存中的分片状态表（float64，行 0 为控制行，行 i + 1 为工作进程 i，
+    行 n_workers + i + 1 为分片 i 的基线）
+
+    每行只有一个写入方（控制行和基线行为监督进程，工作进程行为对应进程；工作进程退出后
+    监督进程清零它的行），写入时 seq 先加 1
+    （奇数）再写字段、再加 1；读端复制整行后 seq 未变且为偶数即为一致快照
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, n_workers: int, owner: bool):
+        self.shm = shm
+        self.n_workers = n_workers
+        self.owner = owner
+        self.array = np.ndarray((2 * n_workers + 1, _ROW_SIZE), dtype=np.float64, buffer=shm.buf)
+
+    @classmethod
+    def create(cls, n_workers: int) -> 'SharedShardState':
+        """创建共享内存（监督进程），退出时调用 unlink"""
+        size = (2 * n_workers + 1) * _ROW_SIZE * 8
+        state = cls(shared_memory.SharedMemory(create=True, size=size), n_workers, owner=True)
+        state.array[:] = 0.0
+        return state
+
+    @classmethod
+    def attach(cls, name: str, n_workers: int) -> 'SharedShardState':
+        """连接已有的共享内存（工作进程）"""
+        # spawn 启动的工作进程与监督进程共用 resource_tracker，重复登记同名共享内存无副作用，
+        # 由监督进程 unlink 时注销
+        shm = shared_memory.SharedMemory(name=name)
+        return cls(shm, n_workers, owner=False)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    # ==================== 写入 ====================
+
+    def write_worker(self, index: int, **values: float):
+        """写入工作进程行（仅由该进程调用）"""
+        self._write(self.array[index + 1], _WORKER_INDEX, values)
+
+    def write_control(self, **values: float):
+        """写入控制行（仅由监督进程调用）"""
+        self._write(self.array[0], _CONTROL_INDEX, values)
+
+    def write_baseline(self, index: int, **values: float):
+        """写入分片基线行（仅由监督进程调用）"""
+        self._write(self.array[self.n_workers + index + 1], _BASELINE_INDEX, values)
+
+    @staticmethod
+    def _write(row: np.ndarray, index: Dict[str, int], values: Dict[str, float]):
+        row[0] += 1
+        for name, value in values.items():
+            row[index[name]] = value
+        row[0] += 1
+
+    # ==================== 读取 ====================
+
+    def read_worker(self, index: int) -> Dict[str, float]:
+        return dict(zip(WORKER_FIELDS, self._read(self.array[index + 1])))
+
+    def read_control(self) -> Dict[str, float]:
+        return dict(zip(CONTROL_FIELDS, self._read(self.array[0])))
+
+    def read_baseline(self, index: int) -> Dict[str, float]:
+        return dict(zip(BASELINE_FIELDS, self._read(self.array[self.n_workers + index + 1])))
+
+    @staticmethod
+    def _read(row: np.ndarray, retries: int = 100) -> List[float]:
+        for _ in range(retries):
+            snapshot = row.tolist()
+            seq = snapshot[0]
+            if seq % 2 == 0 and row[0] == seq:
+                return snapshot
+        # 写入方在写入途中退出：返回最后一次读取的值
+        return snapshot
+
+    @property
+    def halted(self) -> bool:
+        return bool(self.array[0, _CONTROL_INDEX['halted']])
+
+    def totals(self, exclude: Optional[int] = None, day: Optional[int] = None) -> Dict[str, float]:
+        """
+        所有工作进程（可排除一个）的盈亏、持仓市值和持仓数之和，加上所有分片的基线
+
+        排除的只是该工作进程当前写入的行，它的基线（崩溃前留下的仓位）仍然计入。
+        指定 day 时只计入该日的盈亏（跨日后尚未写入新一天盈亏的行不计入）
+        """
+        totals = {'pnl': 0.0, 'exposure': 0.0, 'positions': 0.0}
+        for index in range(self.n_workers):
+            rows = [self.read_baseline(index)]
+            if index != exclude:
+                rows.append(self.read_worker(index))
+            for row in rows:
+                if day is None or row['day'] == day:
+                    totals['pnl'] += row['pnl']
+                totals['exposure'] += row['exposure']
+                totals['positions'] += row['positions']
+        return totals
+
+    def close(self):
+        self.array = None
+        self.shm.close()
+
+    def unlink(self):
+        if self.owner:
+            self.shm.unlink()
+
+
+class SharedRiskManager(RiskManager):
+    """
+    分片工作进程的风控管理器
+
+    在 RiskManager 的本进程检查之外：
+    - 全局暂停时拒绝所有订单
+    - 所有工作进程的当日盈亏之和低于 -daily_loss_limit 时拒绝所有订单
+    - 其他工作进程的持仓市值 + 本进程持仓 + 新订单超过总仓位限制时拒绝开仓
+    """
+
+    def __init__(self, config: RiskConfig, initial_capital: float,
+                 state: SharedShardState, worker_index: int):
+        super().__init__(config, initial_capital)
+        self.state = state
+        self.worker_index = worker_index
+
+    def check_daily_loss_limit(self) -> bool:
+        if not super().check_daily_loss_limit():
+            return False
+        if not self.config.enabled:
+            return True
+
+        if self.state.halted:
+            logger.warning("Trading halted by supervisor")
+            return False
+
+        total_pnl = self.state.totals(day=_trading_day())['pnl']
+        if total_pnl < -self.config.daily_loss_limit:
+            logger.warning(f"Aggregate loss limit reached: ${total_pnl:.2f} < "
+                           f"${-self.config.daily_loss_limit:.2f}")
+            return False
+        return True
+
+    def check_position_limit(self, symbol: str, volume: int, price: float) -> bool:
+        if not super().check_position_limit(symbol, volume, price):
+            return False
+        if not self.config.enabled:
+            return True
+
+        local_value = sum(abs(risk.volume * risk.current_price) for risk in self.position_risks.values())
+        total_value = self.state.totals(exclude=self.worker_index)['exposure'] + local_value + volume * price
+        max_total_value = self.current_capital * self.config.max_total_position_pct
+        if total_value > max_total_value:
+            logger.warning(f"Aggregate position too large: ${total_value:.2f} > ${max_total_value:.2f}")
+            return False
+        return True
+
+
+class WorkerStatePublisher:
+    """
+    把工作进程的心跳、当日盈亏和持仓市值写入共享内存（引擎的周期任务中调用）
+
+    当日盈亏 = 各策略总盈亏（已实现 + 未实现）之和 - 当日起点；起点为创建时（恢复状态之后）
+    的总盈亏，跨日后第一次写入时更新为当时的总盈亏。创建时的持仓市值和持仓数作为恢复的持仓写入
+    """
+
+    def __init__(self, engine: StrategyEngine, state: SharedShardState, index: int, restarts: int):
+        self.engine = engine
+        self.state = state
+        self.index = index
+        self.restarts = restarts
+        self.day = _trading_day()
+        self.day_start_pnl, self.restored_exposure, self.restored_positions = self._portfolio_totals()
+
+    def _portfolio_totals(self):
+        """(总盈亏, 持仓市值, 持仓数)"""
+        pnl = 0.0
+        exposure = 0.0
+        positions = 0
+        for strategy in self.engine.strategies.values():
+            pnl += strategy.get_total_pnl()
+            for position in strategy.portfolio.positions.values():
+                if position.volume != 0:
+                    # 当前市值 = 成本 + 未实现盈亏
+                    exposure += abs(position.avg_price * position.volume + position.unrealized_pnl)
+                    positions += 1
+        return pnl, exposure, positions
+
+    def publish(self):
+        pnl, exposure, positions = self._portfolio_totals()
+        day = _trading_day()
+        if day != self.day:
+            logger.info(f"Shard {self.index} day rollover, previous day PnL: ${pnl - self.day_start_pnl:.2f}")
+            self.day = day
+            self.day_start_pnl = pnl
+
+        self.state.write_worker(self.index, pid=os.getpid(), heartbeat=time.time(), restarts=self.restarts,
+                                strategies=len(self.engine.strategies), day=day,
+                                pnl=pnl - self.day_start_pnl, exposure=exposure, positions=positions,
+                                md_count=self.engine.stats['md_count'],
+                                trade_count=self.engine.stats['trade_count'],
+                                restored_exposure=self.restored_exposure,
+                                restored_positions=self.restored_positions)
+
+
+def _run_shard(index: int, engine_config: Dict[str, Any], strategy_configs: List[Dict[str, Any]],
+               shm_name: str, n_workers: int, restarts: int,
+               strategy_factory: Callable[[Dict[str, Any]], Any], heartbeat_interval: float):
+    """工作进程入口：创建引擎和本分片的策略，周期写入共享状态"""
+    from .async_engine import AsyncStrategyEngine
+    from .async_logging import setup_async_logging
+
+    setup_async_logging()
+    state = SharedShardState.attach(shm_name, n_workers)
+    if engine_config.get('state_dir'):
+        # 每个分片的策略集合固定，状态快照按分片分目录保存
+        engine_config = {**engine_config, 'state_dir': os.path.join(engine_config['state_dir'], f"shard-{index}")}
+    engine_class = AsyncStrategyEngine if engine_config.get('async_engine') else StrategyEngine
+    engine = engine_class(engine_config)
+
+    if engine.risk_manager is not None:
+        engine.risk_manager = SharedRiskManager(engine.risk_manager.config,
+                                                engine.risk_manager.initial_capital, state, index)
+
+    for strategy_config in strategy_configs:
+        strategy = strategy_factory(strategy_config)
+        if strategy is None:
+            continue
+        # 重启后的订单编号从新区间开始，避免与崩溃前的订单重复
+        strategy._order_counter = restarts * ORDER_ID_STRIDE
+        engine.add_strategy(strategy)
+
+    # 先恢复状态快照（run 中不再重复恢复），当日盈亏从恢复后的总盈亏起算
+    engine.restore_state()
+    publisher = WorkerStatePublisher(engine, state, index, restarts)
+    publisher.publish()
+    engine.add_periodic_task('shard_state', publisher.publish, heartbeat_interval)
+    logger.info(f"Shard {index} started (pid {os.getpid()}, restarts {restarts}): "
+                f"{list(engine.strategies)}")
+    try:
+        engine.run()
+    finally:
+        state.close()
+
+
+@dataclass
+class Shard:
+    """监督进程中一个分片的运行状态"""
+    index: int
+    strategy_configs: List[Dict[str, Any]]
+    engine_config: Dict[str, Any]
+    process: Optional[Any] = None
+    started_at: float = 0.0
+    restarts: int = 0
+    next_start: float = 0.0
+    failed: bool = False
+    exit_codes: List[Optional[int]] = field(default_factory=list)
+    # 上次退出时计入基线、等待新进程确认恢复了多少的持仓市值和持仓数
+    pending_exposure: float = 0.0
+    pending_positions: float = 0.0
+    pending: bool = False
+
+
+class ShardSupervisor:
+    """
+    多进程分片监督进程
+
+    Args:
+        engine_config: 引擎配置（每个工作进程使用相同配置）
+        strategy_configs: 已启用的策略配置
+        n_workers: 工作进程数
+        strategy_factory: 模块级函数 config -> 策略实例（spawn 方式启动，需可 pickle）
+        shard_by: 'symbol' / 'weight'，见 assign_shards
+        heartbeat_interval: 工作进程写入共享状态的间隔秒数
+        heartbeat_timeout: 心跳超过该秒数未更新视为卡死，终止并重启
+        startup_timeout: 启动后首次心跳的超时秒数
+        restart_delay: 重启退避的初始秒数（每次翻倍，最多 max_restart_delay）
+        max_restarts: 单个分片的最大重启次数，超过后放弃该分片
+    """
+
+    def __init__(self, engine_config: Dict[str, Any], strategy_configs: List[Dict[str, Any]],
+                 n_workers: int, strategy_factory: Callable[[Dict[str, Any]], Any],
+                 shard_by: str = 'symbol', heartbeat_interval: float = 1.0,
+                 heartbeat_timeout: float = 10.0, startup_timeout: float = 60.0,
+                 restart_delay: float = 1.0, max_restart_delay: float = 30.0,
+                 max_restarts: int = 10, monitor_interval: float = 0.5,
+                 stats_interval: float = 60.0):
+        self.engine_config = engine_config
+        self.strategy_factory = strategy_factory
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.startup_timeout = startup_timeout
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.max_restarts = max_restarts
+        self.monitor_interval = monitor_interval
+        self.stats_interval = stats_interval
+
+        risk_config = engine_config.get('risk_management', {})
+        self.daily_loss_limit = (risk_config.get('daily_loss_limit', 5000.0)
+                                 if risk_config.get('enabled', False) else None)
+
+        assigned = [configs for configs in assign_shards(strategy_configs, n_workers, shard_by) if configs]
+        self.shards = [Shard(index, configs, self._shard_engine_config(configs, shard_by))
+                       for index, configs in enumerate(assigned)]
+
+        self.context = mp.get_context('spawn')
+        self.state: Optional[SharedShardState] = None
+        self.running = False
+        self._last_stats = 0.0
+        self._day = _trading_day()
+        # 当前的全局暂停是否由汇总亏损触发（跨日时自动解除）
+        self._loss_halted = False
+
+    @staticmethod
+    def _shard_engine_config(strategy_configs: List[Dict[str, Any]], shard_by: str) -> Dict[str, Any]:
+        config = {}
+        symbols = [c.get('symbol') for c in strategy_configs]
+        if shard_by == 'symbol' and all(symbols):
+            # 成交回报 topic: trade.<symbol>.<exchange>
+            config['trade_topics'] = [f"trade.{symbol}." for symbol in sorted(set(symbols))]
+        return config
+
+    # ==================== 生命周期 ====================
+
+    def start(self):
+        """创建共享内存并启动所有工作进程"""
+        self.state = SharedShardState.create(len(self.shards))
+        self.running = True
+        for shard in self.shards:
+            self._start_shard(shard)
+        logger.info(f"Supervisor started {len(self.shards)} shards: "
+                    f"{[[c.get('name') for c in shard.strategy_configs] for shard in self.shards]}")
+
+    def run(self):
+        """启动工作进程并监控，直到收到 SIGINT / SIGTERM（阻塞）"""
+        try:
+            signal.signal(signal.SIGINT, self._signal_handler)
+            signal.signal(signal.SIGTERM, self._signal_handler)
+        except ValueError:
+            logger.warning("Running in non-main thread, signal handlers not registered")
+
+        self.start()
+        try:
+            while self.running:
+                time.sleep(self.monitor_interval)
+                self.check_workers()
+                self.check_risk()
+                if self.stats_interval and time.time() - self._last_stats >= self.stats_interval:
+                    self._last_stats = time.time()
+                    self._log_stats()
+        finally:
+            self.shutdown()
+
+    def stop(self):
+        self.running = False
+
+    def shutdown(self, timeout: float = 10.0):
+        """终止所有工作进程并释放共享内存"""
+        self.running = False
+        for shard in self.shards:
+            if shard.process is not None and shard.process.is_alive():
+                shard.process.terminate()
+        for shard in self.shards:
+            if shard.process is not None:
+                shard.process.join(timeout)
+                if shard.process.is_alive():
+                    logger.warning(f"Shard {shard.index} did not exit, killing")
+                    shard.process.kill()
+                    shard.process.join()
+        if self.state is not None:
+            self._log_stats()
+            self.state.close()
+            self.state.unlink()
+            self.state = None
+        logger.info("Supervisor stopped")
+
+    def _signal_handler(self, signum, frame):
+        logger.info(f"Received signal {signum}, stopping shards...")
+        self.running = False
+
+    def _start_shard(self, shard: Shard):
+        shard.process = self.context.Process(
+            target=_run_shard,
+            args=(shard.index, {**self.engine_config, **shard.engine_config}, shard.strategy_configs,
+                  self.state.name, len(self.shards), shard.restarts, self.strategy_factory,
+                  self.heartbeat_interval),
+            name=f"shard-{shard.index}",
+            daemon=True
+        )
+        shard.process.start()
+        shard.started_at = time.time()
+
+    # ==================== 监控 ====================
+
+    def check_workers(self):
+        """重启退出或心跳超时的工作进程（run 中周期调用）"""
+        now = time.time()
+        for shard in self.shards:
+            if shard.failed or not self.running:
+                continue
+
+            process = shard.process
+            if process is not None:
+                if process.is_alive():
+                    heartbeat = self.state.read_worker(shard.index)['heartbeat']
+                    if heartbeat >= shard.started_at:
+                        if shard.pending:
+                            self._confirm_restore(shard)
+                        if now - heartbeat <= self.heartbeat_timeout:
+                            continue
+                        logger.error(f"Shard {shard.index} heartbeat lost for {now - heartbeat:.1f}s, terminating")
+                    elif now - shard.started_at <= self.startup_timeout:
+                        continue
+                    else:
+                        logger.error(f"Shard {shard.index} did not start in {self.startup_timeout:.0f}s, terminating")
+                    process.terminate()
+                    process.join(5)
+                    if process.is_alive():
+                        process.kill()
+                        process.join()
+
+                shard.exit_codes.append(process.exitcode)
+                shard.process = None
+                self._carry_baseline(shard)
+                if shard.restarts >= self.max_restarts:
+                    shard.failed = True
+                    logger.error(f"Shard {shard.index} exited ({process.exitcode}) after "
+                                 f"{shard.restarts} restarts, giving up")
+                    continue
+                delay = min(self.restart_delay * 2 ** shard.restarts, self.max_restart_delay)
+                shard.next_start = now + delay
+                shard.restarts += 1
+                logger.error(f"Shard {shard.index} exited ({process.exitcode}), restarting in {delay:.1f}s")
+
+            if now >= shard.next_start:
+                self._start_shard(shard)
+                logger.info(f"Shard {shard.index} restarted (attempt {shard.restarts})")
+
+    def _carry_baseline(self, shard: Shard):
+        """
+        工作进程退出后把它最后写入的当日盈亏、持仓市值和持仓数累加到分片基线，并清零工作进程行
+
+        先写基线再清零：两步之间读到的汇总偏保守（重复计入）而不是遗漏。
+        基线或工作进程行的盈亏不属于当日时不计入。持仓全部计入基线，新进程从快照恢复的部分
+        在其第一次心跳后由 _confirm_restore 减去
+        """
+        day = _trading_day()
+        row = self.state.read_worker(shard.index)
+        baseline = self.state.read_baseline(shard.index)
+        pnl = (baseline['pnl'] if baseline['day'] == day else 0.0) + (row['pnl'] if row['day'] == day else 0.0)
+        self.state.write_baseline(shard.index, day=day, pnl=pnl,
+                                  exposure=baseline['exposure'] + row['exposure'],
+                                  positions=baseline['positions'] + row['positions'])
+        self.state.write_worker(shard.index, pnl=0.0, exposure=0.0, positions=0.0)
+        # 新进程尚未确认前又退出：上次未确认的部分保留在基线中
+        shard.pending_exposure = row['exposure']
+        shard.pending_positions = row['positions']
+        shard.pending = True
+        if row['pnl'] or row['exposure']:
+            logger.warning(f"Shard {shard.index} exited holding PnL ${row['pnl']:.2f}, "
+                           f"exposure ${row['exposure']:.2f}; carried into aggregate risk")
+
+    def _confirm_restore(self, shard: Shard):
+        """新进程写入心跳后，从基线中减去它从快照恢复的持仓（最多减去上次退出时计入的部分）"""
+        row = self.state.read_worker(shard.index)
+        exposure = min(shard.pending_exposure, row['restored_exposure'])
+        positions = min(shard.pending_positions, row['restored_positions'])
+        shard.pending = False
+        if exposure <= 0 and positions <= 0:
+            return
+        baseline = self.state.read_baseline(shard.index)
+        self.state.write_baseline(shard.index, exposure=max(0.0, baseline['exposure'] - exposure),
+                                  positions=max(0.0, baseline['positions'] - positions))
+        logger.info(f"Shard {shard.index} restored exposure ${exposure:.2f} from state snapshot; "
+                    f"${shard.pending_exposure - exposure:.2f} kept in baseline")
+
+    def check_risk(self):
+        """跨日处理；汇总当日亏损超过 daily_loss_limit 时暂停所有工作进程的下单"""
+        day = _trading_day()
+        if day != self._day:
+            self._roll_day(day)
+        if self.daily_loss_limit is None or self.state.halted:
+            return
+        total_pnl = self.state.totals(day=day)['pnl']
+        if total_pnl < -self.daily_loss_limit:
+            self.halt(f"aggregate PnL ${total_pnl:.2f} < ${-self.daily_loss_limit:.2f}")
+            self._loss_halted = True
+
+    def _roll_day(self, day: int):
+        """跨日：清零各分片基线的当日盈亏（持仓仍然计入），解除因亏损触发的全局暂停"""
+        for shard in self.shards:
+            self.state.write_baseline(shard.index, day=day, pnl=0.0)
+        self._day = day
+        logger.info("Day rollover: shard baseline PnL reset")
+        if self._loss_halted:
+            self.resume()
+
+    def halt(self, reason: str = 'manual'):
+        """暂停所有工作进程的下单（需启用风控）"""
+        self.state.write_control(halted=1.0, updated=time.time())
+        self._loss_halted = False
+        logger.warning(f"Trading halted: {reason}")
+
+    def resume(self):
+        self.state.write_control(halted=0.0, updated=time.time())
+        self._loss_halted = False
+        logger.info("Trading resumed")
+
+    def snapshot(self) -> List[Dict[str, float]]:
+        """各工作进程最近一次写入的状态"""
+        return [self.state.read_worker(shard.index) for shard in self.shards]
+
+    def _log_stats(self):
+        totals = self.state.totals(day=_trading_day())
+        logger.info(f"[Supervisor] shards {len(self.shards)} | PnL ${totals['pnl']:.2f} | "
+                    f"exposure ${totals['exposure']:.2f} | positions {totals['positions']:.0f} | "
+                    f"restarts {[shard.restarts for shard in self.shards]}")
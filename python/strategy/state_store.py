@@ -0,0 +1,225 @@
+"""
+策略状态快照与事件日志 - 重启后恢复组合持仓、指标状态和风控状态，不再从零预热
+
+- 快照：引擎周期性地采集各策略 get_state()、风控状态和成交序号，整体写入一个文件
+  （先写临时文件再 os.replace，保证原子性）
+- 事件日志：快照之后分发的行情和成交按顺序追加写入（只追加），每次快照开始新的日志文件
+- 启动时加载最新的有效快照，再按顺序重放之后的日志，然后立即写一个新快照
+
+文件编码为 msgpack（已安装时）或 JSON / JSON Lines，加载时按扩展名识别，两种格式可混用。
+状态为嵌套的 dict / list / 标量，不适合列式存储，因此不使用 Arrow
+
+目录结构：
+    state_dir/snapshot-00000003.msgpack
+    state_dir/journal-00000003.msgpack     # 快照 3 之后的事件
+    state_dir/journal-00000004.msgpack     # 快照 4 写入前（或失败时）的事件
+
+保留最近两个快照：最新的快照损坏时回退到上一个，并重放两者之后的全部日志
+"""
+
+import os
+import json
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import logging
+
+try:
+    import msgpack
+    _has_msgpack = True
+except ImportError:
+    _has_msgpack = False
+
+logger = logging.getLogger(__name__)
+
+STATE_VERSION = 1
+
+# 日志记录：('m', *MarketData 字段) / ('t', *Trade 字段)
+EVENT_MARKET_DATA = 'm'
+EVENT_TRADE = 't'
+
+_FILE_PATTERN = re.compile(r'^(snapshot|journal)-(\d{8})\.(msgpack|json|jsonl)$')
+
+
+class StateStore:
+    """
+    快照和事件日志文件（由引擎线程调用；write_snapshot 可在其他线程执行）
+
+    Args:
+        state_dir: 状态目录
+        fsync: 写快照和日志后 fsync（默认只保证进程崩溃时不丢失已写出的数据）
+        codec: 'msgpack' / 'json'，None 时优先 msgpack
+    """
+
+    def __init__(self, state_dir: str, fsync: bool = False, codec: Optional[str] = None):
+        if codec is None:
+            codec = 'msgpack' if _has_msgpack else 'json'
+        if codec == 'msgpack' and not _has_msgpack:
+            logger.warning("msgpack 未安装，状态快照使用 JSON 编码")
+            codec = 'json'
+        if codec not in ('msgpack', 'json'):
+            raise ValueError(f"Unknown state codec: {codec}")
+
+        self.state_dir = state_dir
+        self.fsync = fsync
+        self.codec = codec
+        self._snapshot_ext = 'msgpack' if codec == 'msgpack' else 'json'
+        self._journal_ext = 'msgpack' if codec == 'msgpack' else 'jsonl'
+
+        self.pending: List[tuple] = []
+        self._journal = None
+        self._journal_id = 0
+        self.stats = {'events_written': 0, 'snapshots_written': 0, 'snapshot_bytes': 0}
+
+        os.makedirs(state_dir, exist_ok=True)
+        logger.info(f"State store: {state_dir} ({codec})")
+
+    # ==================== 文件 ====================
+
+    def _files(self, kind: str) -> List[Tuple[int, str]]:
+        """[(id, path)]，按 id 升序"""
+        files = []
+        for name in os.listdir(self.state_dir):
+            match = _FILE_PATTERN.match(name)
+            if match and match.group(1) == kind:
+                files.append((int(match.group(2)), os.path.join(self.state_dir, name)))
+        return sorted(files)
+
+    def _path(self, kind: str, file_id: int) -> str:
+        ext = self._snapshot_ext if kind == 'snapshot' else self._journal_ext
+        return os.path.join(self.state_dir, f"{kind}-{file_id:08d}.{ext}")
+
+    def _sync(self, f):
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+
+    # ==================== 加载 ====================
+
+    def load(self) -> Tuple[Optional[Dict[str, Any]], Iterator[list]]:
+        """
+        加载最新的有效快照
+
+        Returns:
+            (快照，None 表示没有有效快照；之后的日志记录迭代器)
+        """
+        snapshot = None
+        snapshot_id = -1
+        for file_id, path in reversed(self._files('snapshot')):
+            try:
+                snapshot = self._read_snapshot(path)
+            except Exception as e:
+                logger.error(f"Corrupt state snapshot {path}: {e}")
+                continue
+            if snapshot.get('version') != STATE_VERSION:
+                logger.error(f"Unsupported state snapshot version in {path}: {snapshot.get('version')}")
+                snapshot = None
+                continue
+            snapshot_id = file_id
+            break
+
+        journals = [path for file_id, path in self._files('journal') if file_id >= snapshot_id]
+        return snapshot, self._read_journals(journals)
+
+    def _read_snapshot(self, path: str) -> Dict[str, Any]:
+        if path.endswith('.msgpack'):
+            if not _has_msgpack:
+                raise RuntimeError("msgpack not installed")
+            with open(path, 'rb') as f:
+                return msgpack.unpackb(f.read(), raw=False)
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _read_journals(self, paths: List[str]) -> Iterator[list]:
+        for path in paths:
+            count = 0
+            try:
+                if path.endswith('.msgpack'):
+                    if not _has_msgpack:
+                        raise RuntimeError("msgpack not installed")
+                    with open(path, 'rb') as f:
+                        # 末尾写了一半的记录被忽略
+                        for record in msgpack.Unpacker(f, raw=False):
+                            count += 1
+                            yield record
+                else:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        for line in f:
+                            if not line.endswith('\n'):
+                                logger.warning(f"Truncated record at end of {path} ignored")
+                                break
+                            record = json.loads(line)
+                            count += 1
+                            yield record
+            except Exception as e:
+                logger.error(f"Failed to read state journal {path} after {count} records: {e}")
+            else:
+                logger.info(f"Replayed {count} events from {os.path.basename(path)}")
+
+    # ==================== 事件日志 ====================
+
+    def append(self, record: tuple):
+        """记录一个事件（在 flush 时写出）"""
+        self.pending.append(record)
+
+    def flush(self):
+        """把缓存的事件追加写入当前日志文件"""
+        if not self.pending or self._journal is None:
+            return
+        records = self.pending
+        self.pending = []
+        if self.codec == 'msgpack':
+            packb = msgpack.packb
+            self._journal.write(b''.join(packb(record) for record in records))
+        else:
+            dumps = json.dumps
+            self._journal.write(''.join(dumps(record) + '\n' for record in records).encode('utf-8'))
+        self._sync(self._journal)
+        self.stats['events_written'] += len(records)
+
+    # ==================== 快照 ====================
+
+    def begin_snapshot(self) -> int:
+        """
+        写出缓存的事件并开始新的日志文件（之后的事件属于新快照），返回新快照的 id
+
+        须在采集状态的同一线程中、采集之前调用
+        """
+        self.flush()
+        if self._journal is None:
+            existing = self._files('snapshot') + self._files('journal')
+            self._journal_id = max((file_id for file_id, _ in existing), default=0)
+        else:
+            self._journal.close()
+        self._journal_id += 1
+        self._journal = open(self._path('journal', self._journal_id), 'ab')
+        return self._journal_id
+
+    def write_snapshot(self, snapshot_id: int, state: Dict[str, Any]):
+        """写入快照并删除更早的快照和日志（保留上一个快照作为回退）"""
+        snapshot = {'version': STATE_VERSION, 'snapshot_id': snapshot_id, **state}
+        if self.codec == 'msgpack':
+            data = msgpack.packb(snapshot)
+        else:
+            data = json.dumps(snapshot, separators=(',', ':')).encode('utf-8')
+
+        path = self._path('snapshot', snapshot_id)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            self._sync(f)
+        os.replace(tmp_path, path)
+        self.stats['snapshots_written'] += 1
+        self.stats['snapshot_bytes'] = len(data)
+
+        snapshots = [file_id for file_id, _ in self._files('snapshot') if file_id <= snapshot_id]
+        keep = snapshots[-2] if len(snapshots) > 1 else snapshot_id
+        for kind in ('snapshot', 'journal'):
+            for file_id, old_path in self._files(kind):
+                if file_id < keep:
+                    os.remove(old_path)
+
+    def close(self):
+        self.flush()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
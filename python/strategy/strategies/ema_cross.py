@@ -134,6 +134,22 @@ class EMACrossStrategy(BaseStrategy):
         else:
             logger.warning(f"[Trade] Order rejected: {trade.error_message}")
 
+    def get_state(self) -> Dict[str, Any]:
+        """持仓、EMA 值和上一次的交叉状态"""
+        return {
+            **super().get_state(),
+            'ema_fast': self.ema_fast.value,
+            'ema_slow': self.ema_slow.value,
+            'last_cross': self.last_cross,
+        }
+
+    def set_state(self, state: Dict[str, Any]):
+        """恢复后 EMA 无需重新预热"""
+        super().set_state(state)
+        self.ema_fast.value = state['ema_fast']
+        self.ema_slow.value = state['ema_slow']
+        self.last_cross = state['last_cross']
+
 
 if __name__ == "__main__":
     # 测试策略
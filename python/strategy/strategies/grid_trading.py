@@ -167,3 +167,27 @@ class GridTradingStrategy(BaseStrategy):
                 )
         else:
             logger.warning(f"[Trade] Order rejected: {trade.error_message}")
+
+    def get_state(self) -> Dict[str, Any]:
+        """持仓、网格中心价和各网格的成交标记"""
+        return {
+            **super().get_state(),
+            'center_price': self.center_price,
+            'buy_grids': [[grid.price, grid.volume, grid.filled] for grid in self.buy_grids],
+            'sell_grids': [[grid.price, grid.volume, grid.filled] for grid in self.sell_grids],
+            'initialized': self.initialized,
+        }
+
+    def set_state(self, state: Dict[str, Any]):
+        """恢复快照时的网格（不按当前价格重新布网格）"""
+        super().set_state(state)
+        self.center_price = state['center_price']
+        self.buy_grids = [self._restore_grid(*grid) for grid in state['buy_grids']]
+        self.sell_grids = [self._restore_grid(*grid) for grid in state['sell_grids']]
+        self.initialized = state['initialized']
+
+    @staticmethod
+    def _restore_grid(price: float, volume: int, filled: bool) -> GridLevel:
+        grid = GridLevel(price, volume)
+        grid.filled = filled
+        return grid
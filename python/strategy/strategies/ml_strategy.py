@@ -8,14 +8,13 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from typing import Dict, Optional
+from typing import Dict
 import logging
 
-from strategy.base_strategy import BaseStrategy, Signal
+from strategy.base_strategy import BaseStrategy, MarketData, Trade
 from strategy.factors.ml_factor import MLFactor
+from strategy.factors.model_watcher import ModelWatcher
 from strategy.factors.feature_engineering import FeatureEngineering
-from proto.market_data_pb2 import MarketData
-from proto.trade_pb2 import Trade
 
 logger = logging.getLogger(__name__)
 
@@ -50,8 +49,19 @@ class MLStrategy(BaseStrategy):
             config=ml_config
         )
 
-        # 交易参数
+        # 模型热更新：后台加载新版本，处理行情前替换
+        self.model_watcher = None
+        if config.get('hot_reload', False):
+            self.model_watcher = ModelWatcher(
+                self.ml_factor,
+                interval=config.get('reload_interval', 5.0),
+                probation_ticks=config.get('reload_probation_ticks', 100)
+            )
+            self.model_watcher.start()
+
+        # 交易参数（symbols 为多交易对配置，同一周期内的预测合并为一次模型调用）
         self.symbol = config.get('symbol', 'BTCUSDT')
+        self.symbols = set(config.get('symbols', [self.symbol]))
         self.position_size = config.get('position_size', 0.1)
         self.confidence_threshold = config.get('confidence_threshold', 0.6)
         self.stop_loss_pct = config.get('stop_loss_pct', 0.02)
@@ -59,104 +69,108 @@ class MLStrategy(BaseStrategy):
 
         # 状态
         self.last_price = 0.0
-        self.entry_price = 0.0
+        self.entry_prices: Dict[str, float] = {}
 
         logger.info(f"MLStrategy initialized: {strategy_id}")
-        logger.info(f"  Symbol: {self.symbol}")
+        logger.info(f"  Symbols: {sorted(self.symbols)}")
         logger.info(f"  Confidence threshold: {self.confidence_threshold}")
 
-    def on_market_data(self, md: MarketData) -> Optional[Signal]:
+    def on_market_data(self, md: MarketData):
         """
-        处理市场数据
+        处理市场数据，预测后通过 send_order 下单
 
         Args:
             md: 市场数据
-
-        Returns:
-            交易信号（如果有）
         """
-        if md.symbol != self.symbol:
-            return None
+        if md.symbol not in self.symbols:
+            return
+
+        # 两次行情之间替换热更新的模型
+        if self.model_watcher is not None:
+            self.model_watcher.apply_pending()
 
         # 更新特征
         self.feature_eng.update(md.symbol, md.last_price, md.volume)
         self.last_price = md.last_price
 
-        # 提取特征
-        features = self.feature_eng.extract_features(md.symbol)
+        # 样本不足 lookback 时不预测
+        if self.feature_eng.get_sample_count(md.symbol) < self.ml_factor.lookback_period:
+            return
+
+        # 读取增量维护的最新特征 (O(1))
+        features = self.feature_eng.get_latest_features(md.symbol)
         if not features:
-            return None
+            return
+
+        # 由引擎注入批处理器时，预测延迟到本轮询周期末与其他交易对合并执行，
+        # 回调在引擎 flush 时下单
+        if self.inference_batcher is not None:
+            self.inference_batcher.submit(
+                self.ml_factor, md.symbol, features,
+                lambda factor_value: self._on_prediction(md, factor_value)
+            )
+            return
 
         # 计算 ML 因子
-        factor_value = self.ml_factor.calculate(features)
+        factor_value = self.ml_factor.calculate_latest(features)
+        self._on_prediction(md, factor_value)
 
+    def _on_prediction(self, md: MarketData, factor_value):
+        """
+        根据 ML 因子决定交易并下单
+
+        Args:
+            md: 触发预测的市场数据
+            factor_value: ML 因子值
+        """
         # 检查置信度
         if factor_value.confidence < self.confidence_threshold:
             logger.debug(f"Low confidence: {factor_value.confidence:.4f}")
-            return None
+            return
 
         # 获取当前持仓
-        current_position = self.portfolio.get_position(md.symbol)
+        position = self.get_position(md.symbol)
+        current_position = position.volume if position else 0
 
-        # 生成交易信号
-        signal = None
+        # (side, volume, reason)
+        order = None
 
         if factor_value.value > 0:  # 预测上涨
             if current_position <= 0:
                 # 开多仓
-                signal = Signal(
-                    symbol=md.symbol,
-                    side='BUY',
-                    price=md.last_price,
-                    volume=self.position_size,
-                    reason=f"ML prediction: UP (confidence={factor_value.confidence:.4f})"
-                )
-                self.entry_price = md.last_price
+                order = ('BUY', self.position_size,
+                         f"ML prediction: UP (confidence={factor_value.confidence:.4f})")
+                self.entry_prices[md.symbol] = md.last_price
 
         elif factor_value.value < 0:  # 预测下跌
             if current_position >= 0:
                 # 开空仓或平多仓
-                signal = Signal(
-                    symbol=md.symbol,
-                    side='SELL',
-                    price=md.last_price,
-                    volume=abs(current_position) if current_position > 0 else self.position_size,
-                    reason=f"ML prediction: DOWN (confidence={factor_value.confidence:.4f})"
-                )
-                self.entry_price = md.last_price
+                order = ('SELL', abs(current_position) if current_position > 0 else self.position_size,
+                         f"ML prediction: DOWN (confidence={factor_value.confidence:.4f})")
+                self.entry_prices[md.symbol] = md.last_price
 
         # 止损止盈检查
-        if current_position != 0 and self.entry_price > 0:
-            pnl_pct = (md.last_price - self.entry_price) / self.entry_price
-            if current_position > 0:
-                pnl_pct = pnl_pct
-            else:
+        entry_price = self.entry_prices.get(md.symbol, 0.0)
+        if current_position != 0 and entry_price > 0:
+            pnl_pct = (md.last_price - entry_price) / entry_price
+            if current_position < 0:
                 pnl_pct = -pnl_pct
 
+            close_side = 'SELL' if current_position > 0 else 'BUY'
             # 止损
             if pnl_pct < -self.stop_loss_pct:
-                signal = Signal(
-                    symbol=md.symbol,
-                    side='SELL' if current_position > 0 else 'BUY',
-                    price=md.last_price,
-                    volume=abs(current_position),
-                    reason=f"Stop loss triggered: {pnl_pct:.2%}"
-                )
+                order = (close_side, abs(current_position), f"Stop loss triggered: {pnl_pct:.2%}")
 
             # 止盈
             elif pnl_pct > self.take_profit_pct:
-                signal = Signal(
-                    symbol=md.symbol,
-                    side='SELL' if current_position > 0 else 'BUY',
-                    price=md.last_price,
-                    volume=abs(current_position),
-                    reason=f"Take profit triggered: {pnl_pct:.2%}"
-                )
+                order = (close_side, abs(current_position), f"Take profit triggered: {pnl_pct:.2%}")
 
-        if signal:
-            logger.info(f"Signal generated: {signal.side} {signal.volume} @ {signal.price:.2f} - {signal.reason}")
+        if order is None:
+            return
 
-        return signal
+        side, volume, reason = order
+        logger.info(f"Signal generated: {side} {volume} @ {md.last_price:.2f} - {reason}")
+        self.send_order(md.symbol, side, md.last_price, volume)
 
     def on_trade(self, trade: Trade):
         """
@@ -172,6 +186,6 @@ class MLStrategy(BaseStrategy):
 
             # 更新入场价格
             if trade.side == "BUY":
-                self.entry_price = trade.filled_price
+                self.entry_prices[trade.symbol] = trade.filled_price
             elif trade.side == "SELL":
-                self.entry_price = 0.0
+                self.entry_prices[trade.symbol] = 0.0
@@ -181,3 +181,19 @@ class MomentumStrategy(BaseStrategy):
                 )
         else:
             logger.warning(f"[Trade] Order rejected: {trade.error_message}")
+
+    def get_state(self) -> Dict[str, Any]:
+        """持仓、价格 / 成交量历史和持仓标记"""
+        return {
+            **super().get_state(),
+            'price_history': list(self.price_history),
+            'volume_history': list(self.volume_history),
+            'in_position': self.in_position,
+        }
+
+    def set_state(self, state: Dict[str, Any]):
+        """恢复后无需重新积累 lookback_period 条行情"""
+        super().set_state(state)
+        self.price_history = list(state['price_history'])[-self.lookback_period:]
+        self.volume_history = list(state['volume_history'])[-self.lookback_period:]
+        self.in_position = state['in_position']
@@ -0,0 +1,185 @@
+"""
+成交回报去重与缺口修复
+
+ZMQ PUB/SUB 在发送队列达到高水位时静默丢弃消息，丢失的成交会让组合持仓一直错下去。
+网关为每条成交回报按交易对分配连续序号（seq）并带上网关会话 ID（gateway_id），
+最近的成交保存在网关的回放日志中（见 rust/gateway/src/trade_journal.rs）：
+
+- TradeDeduplicator: 最近 trade_id 的 LRU 集合，丢弃重复的成交回报（含未编号的旧网关消息）
+- SequenceTracker: 按 (gateway_id, symbol) 跟踪下一个期望序号，序号跳跃时记录缺失的序号，
+  补到的成交从缺失集合中移除；第一次见到的会话以收到的序号为起点（之前的成交不回补）
+- TradeReplayClient: 向网关回放服务（REQ/REP）请求补发缺失区间，超时后重建 socket
+
+回放请求为 JSON {gateway_id, symbol, from_seq, to_seq}，应答为 [JSON 头, 成交 1, 成交 2, ...]，
+成交帧与成交回报 topic 上的消息格式相同，由引擎按正常路径解码、去重并应用
+"""
+
+import json
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+import zmq
+import logging
+
+logger = logging.getLogger(__name__)
+
+StreamKey = Tuple[str, str]
+
+
+class TradeDeduplicator:
+    """最近 capacity 个 trade_id 的 LRU 集合"""
+
+    def __init__(self, capacity: int = 100000):
+        self.capacity = capacity
+        self._seen: 'OrderedDict[str, None]' = OrderedDict()
+
+    def seen(self, trade_id: str) -> bool:
+        """是否已处理过该成交（未见过时记录并返回 False；空 trade_id 不去重）"""
+        if not trade_id:
+            return False
+        if trade_id in self._seen:
+            self._seen.move_to_end(trade_id)
+            return True
+        self._seen[trade_id] = None
+        if len(self._seen) > self.capacity:
+            self._seen.popitem(last=False)
+        return False
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+
+class SequenceTracker:
+    """按 (gateway_id, symbol) 跟踪成交序号，检测缺口"""
+
+    def __init__(self):
+        self.expected: Dict[StreamKey, int] = {}
+        self.missing: Dict[StreamKey, Set[int]] = {}
+        self.detected = 0     # 累计缺失的成交数
+        self.recovered = 0    # 缺失后补到的成交数
+        self.lost = 0         # 无法回补的成交数
+
+    def observe(self, gateway_id: str, symbol: str, seq: int) -> bool:
+        """
+        记录收到的序号
+
+        Returns:
+            是否为新成交（False 表示该序号已处理过）
+        """
+        key = (gateway_id, symbol)
+        expected = self.expected.get(key)
+        if expected is None or seq == expected:
+            self.expected[key] = seq + 1
+            return True
+        if seq > expected:
+            self.missing.setdefault(key, set()).update(range(expected, seq))
+            self.detected += seq - expected
+            self.expected[key] = seq + 1
+            logger.warning(f"Trade sequence gap on {gateway_id}/{symbol}: "
+                           f"missing seq {expected}-{seq - 1}")
+            return True
+
+        missing = self.missing.get(key)
+        if missing and seq in missing:
+            missing.discard(seq)
+            if not missing:
+                del self.missing[key]
+            self.recovered += 1
+            return True
+        return False
+
+    def gaps(self) -> List[Tuple[str, str, int, int]]:
+        """当前缺失的连续区间 [(gateway_id, symbol, from_seq, to_seq)]"""
+        result = []
+        for (gateway_id, symbol), missing in self.missing.items():
+            seqs = sorted(missing)
+            start = prev = seqs[0]
+            for seq in seqs[1:]:
+                if seq != prev + 1:
+                    result.append((gateway_id, symbol, start, prev))
+                    start = seq
+                prev = seq
+            result.append((gateway_id, symbol, start, prev))
+        return result
+
+    def give_up(self, gateway_id: str, symbol: str, from_seq: int, to_seq: int) -> int:
+        """放弃区间内仍缺失的序号，返回放弃的条数"""
+        key = (gateway_id, symbol)
+        missing = self.missing.get(key)
+        if not missing:
+            return 0
+        dropped = {seq for seq in missing if from_seq <= seq <= to_seq}
+        missing -= dropped
+        if not missing:
+            del self.missing[key]
+        self.lost += len(dropped)
+        return len(dropped)
+
+    @property
+    def missing_count(self) -> int:
+        return sum(len(missing) for missing in self.missing.values())
+
+
+class TradeReplayClient:
+    """
+    成交回放请求（REQ），超时后关闭并重建 socket（REQ 在未收到应答时不能再发送）
+
+    同步引擎以 send / recv_reply 非阻塞方式使用（socket 注册在接收循环的 poller 中），
+    asyncio 引擎在线程池中调用阻塞的 request
+
+    Args:
+        context: ZMQ context
+        endpoint: 网关回放服务地址
+        timeout_ms: 等待应答的超时
+    """
+
+    def __init__(self, context: zmq.Context, endpoint: str, timeout_ms: int = 500):
+        self.context = context
+        self.endpoint = endpoint
+        self.timeout_ms = timeout_ms
+        self.socket: Optional[zmq.Socket] = None
+
+    def _connect(self) -> zmq.Socket:
+        socket = self.context.socket(zmq.REQ)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.connect(self.endpoint)
+        self.socket = socket
+        return socket
+
+    def send(self, gateway_id: str, symbol: str, from_seq: int, to_seq: int) -> zmq.Socket:
+        """发出补发 [from_seq, to_seq] 的请求（不等待应答），返回等待应答的 socket"""
+        socket = self.socket or self._connect()
+        socket.send_json({'gateway_id': gateway_id, 'symbol': symbol,
+                          'from_seq': from_seq, 'to_seq': to_seq})
+        return socket
+
+    def recv_reply(self) -> Optional[Tuple[dict, List[bytes]]]:
+        """
+        非阻塞地读取应答
+
+        Returns:
+            (应答头, 成交消息列表)，应答尚未到达时返回 None
+        """
+        try:
+            frames = self.socket.recv_multipart(zmq.NOBLOCK)
+        except zmq.Again:
+            return None
+        return json.loads(frames[0]), frames[1:]
+
+    def request(self, gateway_id: str, symbol: str, from_seq: int,
+                to_seq: int) -> Optional[Tuple[dict, List[bytes]]]:
+        """
+        请求补发 [from_seq, to_seq] 并等待应答（阻塞，最长 timeout_ms）
+
+        Returns:
+            (应答头, 成交消息列表)，超时返回 None
+        """
+        socket = self.send(gateway_id, symbol, from_seq, to_seq)
+        if not socket.poll(self.timeout_ms, zmq.POLLIN):
+            self.close()
+            return None
+        return self.recv_reply()
+
+    def close(self):
+        if self.socket is not None:
+            self.socket.close(linger=0)
+            self.socket = None
@@ -0,0 +1,248 @@
+"""
+测试 asyncio 策略引擎 - 同步 / 异步 / 执行器策略、有界邮箱、跨线程下单、后台任务
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import asyncio
+import json
+import threading
+import time
+import zmq
+
+from strategy.async_engine import AsyncStrategyEngine
+from strategy.base_strategy import BaseStrategy, MarketData, Trade
+from proto.fast_codec import encode_market_data
+
+
+class SyncStrategy(BaseStrategy):
+    """普通同步策略"""
+
+    def __init__(self, strategy_id: str, config: dict):
+        super().__init__(strategy_id, config)
+        self.symbol = config['symbol']
+        self.received = []
+
+    def on_market_data(self, md: MarketData):
+        self.received.append(md.exchange_time)
+
+    def on_trade(self, trade: Trade):
+        pass
+
+
+class SlowAsyncStrategy(BaseStrategy):
+    """每条行情 await 一次慢 I/O"""
+
+    def __init__(self, strategy_id: str, config: dict):
+        super().__init__(strategy_id, config)
+        self.symbol = config['symbol']
+        self.received = []
+        self.trades = []
+
+    async def on_market_data(self, md: MarketData):
+        await asyncio.sleep(0.02)
+        self.received.append(md.exchange_time)
+
+    async def on_trade(self, trade: Trade):
+        self.trades.append(trade.trade_id)
+
+
+class ExecutorStrategy(BaseStrategy):
+    """在线程池中执行，行情到达时下单"""
+
+    def __init__(self, strategy_id: str, config: dict):
+        super().__init__(strategy_id, {**config, 'run_in_executor': True})
+        self.symbol = config['symbol']
+        self.threads = set()
+
+    def on_market_data(self, md: MarketData):
+        self.threads.add(threading.get_ident())
+        time.sleep(0.001)
+        self.send_order(md.symbol, 'BUY', md.last_price, 1)
+
+    def on_trade(self, trade: Trade):
+        pass
+
+
+class Harness:
+    """本地行情 / 成交发布端与订单接收端，引擎在后台线程中运行"""
+
+    def __init__(self, **config):
+        self.context = zmq.Context()
+        self.md_pub = self.context.socket(zmq.PUB)
+        self.md_pub.setsockopt(zmq.SNDHWM, 0)
+        md_port = self.md_pub.bind_to_random_port('tcp://127.0.0.1')
+        self.trade_pub = self.context.socket(zmq.PUB)
+        trade_port = self.trade_pub.bind_to_random_port('tcp://127.0.0.1')
+        self.order_pull = self.context.socket(zmq.PULL)
+        order_port = self.order_pull.bind_to_random_port('tcp://127.0.0.1')
+        self.engine = AsyncStrategyEngine({
+            'md_endpoints': [f'tcp://127.0.0.1:{md_port}'],
+            'trade_endpoint': f'tcp://127.0.0.1:{trade_port}',
+            'order_endpoint': f'tcp://127.0.0.1:{order_port}',
+            'use_protobuf': False,
+            'poll_timeout_ms': 50,
+            **config
+        })
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.engine.run, daemon=True)
+        self.thread.start()
+        # 订阅建立前发布的消息会丢失：发送探测行情直到引擎收到
+        deadline = time.time() + 5
+        while self.engine.stats['md_count'] == 0 and time.time() < deadline:
+            self.publish_md('PROBE', 0)
+            time.sleep(0.05)
+        assert self.engine.stats['md_count'] > 0
+
+    def publish_md(self, symbol: str, seq: int):
+        self.md_pub.send_multipart([f"md.{symbol}".encode(),
+                                    encode_market_data(symbol, 100.0 + seq, 1.0, seq, seq, 'okx')])
+
+    def publish_trade(self, strategy_id: str, trade_id: str):
+        trade = {'trade_id': trade_id, 'order_id': trade_id, 'strategy_id': strategy_id,
+                 'symbol': 'ETHUSDT', 'side': 'BUY', 'filled_price': 100.0,
+                 'filled_volume': 1, 'status': 'FILLED'}
+        self.trade_pub.send_multipart([f"trade.{strategy_id}".encode(), json.dumps(trade).encode()])
+
+    def close(self):
+        self.engine.stop()
+        self.thread.join(timeout=5)
+        assert not self.thread.is_alive()
+        self.context.destroy(linger=0)
+
+
+def _wait_for(condition, timeout: float = 5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_slow_async_strategy_does_not_block_sync():
+    """慢异步策略积压时丢弃最旧行情，同步策略不受影响，成交回报不丢弃"""
+    harness = Harness(strategy_queue_size=10, symbols=['PROBE'])
+    fast = SyncStrategy('fast', {'symbol': 'BTCUSDT'})
+    slow = SlowAsyncStrategy('slow', {'symbol': 'BTCUSDT'})
+    harness.engine.add_strategy(fast)
+    harness.engine.add_strategy(slow)
+    harness.start()
+    try:
+        start = time.time()
+        for seq in range(1, 501):
+            harness.publish_md('BTCUSDT', seq)
+        for i in range(5):
+            harness.publish_trade('slow', f"t{i}")
+
+        assert _wait_for(lambda: len(fast.received) == 500)
+        fast_elapsed = time.time() - start
+        # 500 条 × 20ms 的慢策略若阻塞行情路径需要 10 秒
+        assert fast_elapsed < 5.0, fast_elapsed
+        assert fast.received == list(range(1, 501))
+
+        assert _wait_for(lambda: len(slow.trades) == 5)
+        assert _wait_for(lambda: slow.received and slow.received[-1] == 500)
+        stats = harness.engine.worker_stats()['slow']
+        assert stats['mode'] == 'async' and stats['dropped'] > 0
+        assert len(slow.received) + stats['dropped'] == 500
+        assert slow.received == sorted(slow.received)
+        assert slow.portfolio.positions['ETHUSDT'].volume == 5
+        assert harness.engine.stats['trade_count'] == 5
+    finally:
+        harness.close()
+
+    print(f"✓ slow async strategy does not block sync ({fast_elapsed:.2f}s, "
+          f"{stats['dropped']} ticks dropped)")
+
+
+def test_executor_strategy_orders_from_loop_thread():
+    """执行器策略在线程池中运行，下单由事件循环线程发送"""
+    harness = Harness(symbols=['PROBE'])
+    strategy = ExecutorStrategy('heavy', {'symbol': 'SOLUSDT'})
+    harness.engine.add_strategy(strategy)
+
+    senders = []
+    gateway = harness.engine.order_gateway.gateway
+    send_order = gateway.send_order
+
+    def recording_send(order):
+        senders.append(threading.get_ident())
+        send_order(order)
+
+    gateway.send_order = recording_send
+    harness.start()
+    try:
+        for seq in range(1, 21):
+            harness.publish_md('SOLUSDT', seq)
+
+        orders = []
+        deadline = time.time() + 5
+        while len(orders) < 20 and time.time() < deadline:
+            if harness.order_pull.poll(100):
+                orders.append(harness.order_pull.recv_json())
+        assert len(orders) == 20
+        assert harness.engine.inference_batcher is not None and strategy.inference_batcher is None
+        assert threading.get_ident() not in strategy.threads
+        assert len(set(senders)) == 1 and senders[0] not in strategy.threads
+        assert harness.engine.worker_stats()['heavy']['mode'] == 'executor'
+    finally:
+        harness.close()
+
+    print("✓ executor strategy orders from loop thread")
+
+
+def test_periodic_tasks():
+    """同步和协程周期任务都在后台运行"""
+    harness = Harness(symbols=['PROBE'])
+    calls = {'sync': 0, 'async': 0}
+
+    def sync_task():
+        calls['sync'] += 1
+
+    async def async_task():
+        calls['async'] += 1
+
+    harness.engine.add_periodic_task('sync', sync_task, 0.05)
+    harness.engine.add_periodic_task('async', async_task, 0.05)
+    harness.start()
+    try:
+        assert _wait_for(lambda: calls['sync'] >= 3 and calls['async'] >= 3)
+    finally:
+        harness.close()
+
+    print("✓ periodic tasks")
+
+
+def test_periodic_task_not_blocked_by_busy_executor():
+    """线程池被占满时，同步周期任务（如心跳）仍在事件循环线程中按时执行"""
+    harness = Harness(symbols=['PROBE'], executor_workers=2)
+    release = threading.Event()
+    beats = []
+
+    def heartbeat():
+        beats.append((time.monotonic(), threading.get_ident()))
+
+    harness.engine.add_periodic_task('heartbeat', heartbeat, 0.05)
+    harness.start()
+    try:
+        blocked = [harness.engine.executor.submit(release.wait, 10) for _ in range(4)]
+        start = time.monotonic()
+        assert _wait_for(lambda: sum(1 for t, _ in beats if t > start) >= 5)
+        assert not any(job.done() for job in blocked)
+        loop_thread = harness.thread.ident
+        assert all(ident == loop_thread for _, ident in beats)
+    finally:
+        release.set()
+        harness.close()
+
+    print("✓ periodic task not blocked by busy executor")
+
+
+if __name__ == "__main__":
+    test_slow_async_strategy_does_not_block_sync()
+    test_executor_strategy_orders_from_loop_thread()
+    test_periodic_tasks()
+    test_periodic_task_not_blocked_by_busy_executor()
@@ -0,0 +1,102 @@
+"""
+测试批量推理 - MLFactor.calculate_batch 与 InferenceBatcher
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tempfile
+import numpy as np
+from strategy.factors.ml_factor import MLFactor
+from strategy.batch_inference import InferenceBatcher
+
+FEATURES = ['returns', 'volatility', 'rsi_14', 'macd']
+
+
+def _trained_factor(model_dir: str) -> MLFactor:
+    rng = np.random.default_rng(0)
+    n = 400
+    features = {
+        'returns': rng.normal(0, 0.01, n),
+        'volatility': rng.uniform(0.001, 0.02, n),
+        'rsi_14': rng.uniform(20, 80, n),
+        'macd': rng.normal(0, 50, n),
+    }
+    labels = (features['returns'] + rng.normal(0, 0.005, n) > 0).astype(int)
+
+    factor = MLFactor('test_ml', {'feature_names': FEATURES, 'model_dir': model_dir})
+    factor.train(features, labels)
+    return factor
+
+
+def _random_latest(rng) -> dict:
+    return {
+        'returns': rng.normal(0, 0.01),
+        'volatility': rng.uniform(0.001, 0.02),
+        'rsi_14': rng.uniform(20, 80),
+        'macd': rng.normal(0, 50),
+    }
+
+
+def test_batch_matches_sklearn():
+    """批量结果与 scaler.transform + predict / predict_proba 一致"""
+    with tempfile.TemporaryDirectory() as model_dir:
+        factor = _trained_factor(model_dir)
+        rng = np.random.default_rng(1)
+        latest = {f'SYM{i}': _random_latest(rng) for i in range(16)}
+        latest['BAD'] = {'returns': 0.0}
+
+        results = factor.calculate_batch(latest)
+        assert results['BAD'].metadata['error'] == 'invalid_features'
+
+        for symbol, values in latest.items():
+            if symbol == 'BAD':
+                continue
+            X = factor.scaler.transform(np.array([[values[name] for name in FEATURES]]))
+            proba = factor.model.predict_proba(X)[0]
+            expected = 1.0 if factor.model.predict(X)[0] == 1 else -1.0
+
+            assert results[symbol].symbol == symbol
+            assert results[symbol].value == expected
+            assert abs(results[symbol].confidence - proba.max()) < 1e-12
+            single = factor.calculate_latest(values)
+            assert single.value == expected and abs(single.confidence - proba.max()) < 1e-12
+
+    print("✓ batched MLFactor inference")
+
+
+def test_batcher_single_call_per_cycle():
+    """一个周期内多个交易对的请求只调用一次 predict_proba"""
+    with tempfile.TemporaryDirectory() as model_dir:
+        factor = _trained_factor(model_dir)
+        calls = []
+        predictor = factor.compiled if factor.compiled is not None else factor.model
+        original = predictor.predict_proba
+
+        def counting_predict_proba(X):
+            calls.append(len(X))
+            return original(X)
+
+        predictor.predict_proba = counting_predict_proba
+
+        batcher = InferenceBatcher()
+        received = {}
+        rng = np.random.default_rng(2)
+        for i in range(10):
+            symbol = f'SYM{i}'
+            batcher.submit(factor, symbol, _random_latest(rng),
+                           lambda value, symbol=symbol: received.__setitem__(symbol, value))
+
+        assert batcher.pending == 10
+        assert batcher.flush() == 10
+        assert calls == [10]
+        assert len(received) == 10 and batcher.pending == 0
+        assert batcher.flush() == 0
+
+    print("✓ InferenceBatcher")
+
+
+if __name__ == "__main__":
+    test_batch_matches_sklearn()
+    test_batcher_single_call_per_cycle()
@@ -0,0 +1,150 @@
+"""
+测试策略引擎分发索引 - 只调用关注该交易对的策略，只更新持仓组合的未实现盈亏
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import json
+import time
+from strategy.engine import StrategyEngine
+from strategy.base_strategy import BaseStrategy, MarketData, Trade
+from proto.protobuf_codec import ProtobufEncoder
+
+
+class CountingStrategy(BaseStrategy):
+    """记录收到的行情"""
+
+    def __init__(self, strategy_id: str, config: dict):
+        super().__init__(strategy_id, config)
+        self.symbol = config.get('symbol')
+        self.received = []
+
+    def on_market_data(self, md: MarketData):
+        self.received.append(md.symbol)
+
+    def on_trade(self, trade: Trade):
+        pass
+
+
+def _encode_market_data(symbol: str, price: float) -> bytes:
+    return (ProtobufEncoder.encode_string(1, symbol) +
+            ProtobufEncoder.encode_double(2, price) +
+            ProtobufEncoder.encode_double(3, 1.0) +
+            ProtobufEncoder.encode_int64(4, 1) +
+            ProtobufEncoder.encode_int64(5, 1) +
+            ProtobufEncoder.encode_string(6, 'okx'))
+
+
+def _fill(strategy_id: str, symbol: str, side: str, price: float) -> bytes:
+    return json.dumps({'trade_id': f"{symbol}{side}", 'order_id': '1', 'strategy_id': strategy_id,
+                       'symbol': symbol, 'side': side, 'filled_price': price,
+                       'filled_volume': 1, 'status': 'FILLED'}).encode()
+
+
+def _engine() -> StrategyEngine:
+    return StrategyEngine({
+        'md_endpoints': ['tcp://127.0.0.1:1'],
+        'trade_endpoint': 'tcp://127.0.0.1:1',
+        'order_endpoint': 'tcp://127.0.0.1:1',
+        'use_protobuf': False,
+    })
+
+
+def _close(engine: StrategyEngine):
+    engine.stats['start_time'] = time.time()
+    engine._shutdown()
+
+
+def test_dispatch_index():
+    """30 个策略 × 30 个交易对：每条行情只调用 1 个策略，订阅由声明的交易对生成"""
+    engine = _engine()
+    symbols = [f"SYM{i}USDT" for i in range(30)]
+    strategies = [CountingStrategy(f"s{i}", {'symbol': symbol}) for i, symbol in enumerate(symbols)]
+    for strategy in strategies:
+        engine.add_strategy(strategy)
+    try:
+        assert engine.subscribed_symbols == sorted(symbols)
+        assert engine._subscribed == {f"md.{symbol}" for symbol in symbols}
+
+        for symbol in symbols:
+            engine._handle_market_data(_encode_market_data(symbol, 100.0))
+
+        for strategy in strategies:
+            assert strategy.received == [strategy.symbol]
+
+        # 未订阅的交易对不分发
+        engine._handle_market_data(_encode_market_data('OTHERUSDT', 1.0))
+        assert sum(len(s.received) for s in strategies) == 30
+    finally:
+        _close(engine)
+
+    print("✓ dispatch index")
+
+
+def test_multi_symbol_and_wildcard():
+    """多交易对策略按 symbols 分发，未声明交易对的策略接收所有行情"""
+    engine = _engine()
+    multi = CountingStrategy('multi', {'symbols': ['BTCUSDT', 'ETHUSDT']})
+    single = CountingStrategy('single', {'symbol': 'ETHUSDT'})
+    everything = CountingStrategy('all', {})
+    for strategy in (multi, single, everything):
+        engine.add_strategy(strategy)
+    try:
+        assert multi.get_symbols() == {'BTCUSDT', 'ETHUSDT'} and everything.get_symbols() is None
+        assert "md." in engine._subscribed
+
+        for symbol in ('BTCUSDT', 'ETHUSDT', 'SOLUSDT'):
+            engine._handle_market_data(_encode_market_data(symbol, 100.0))
+
+        assert multi.received == ['BTCUSDT', 'ETHUSDT']
+        assert single.received == ['ETHUSDT']
+        assert everything.received == ['BTCUSDT', 'ETHUSDT', 'SOLUSDT']
+        assert [s.strategy_id for s in engine.strategies_for('ETHUSDT')] == ['multi', 'single', 'all']
+    finally:
+        _close(engine)
+
+    print("✓ multi symbol and wildcard")
+
+
+def test_pnl_only_for_holders():
+    """未实现盈亏只更新持有该交易对的组合，平仓后移出索引"""
+    engine = _engine()
+    holder = CountingStrategy('holder', {'symbol': 'BTCUSDT'})
+    watcher = CountingStrategy('watcher', {'symbol': 'BTCUSDT'})
+    engine.add_strategy(holder)
+    engine.add_strategy(watcher)
+
+    calls = []
+    for strategy in (holder, watcher):
+        original = strategy.portfolio.update_unrealized_pnl
+
+        def counted(symbol, price, _id=strategy.strategy_id, _original=original):
+            calls.append(_id)
+            _original(symbol, price)
+        strategy.portfolio.update_unrealized_pnl = counted
+
+    try:
+        engine._handle_market_data(_encode_market_data('BTCUSDT', 100.0))
+        assert calls == []
+
+        engine._handle_trade(_fill('holder', 'BTCUSDT', 'BUY', 100.0))
+        engine._handle_market_data(_encode_market_data('BTCUSDT', 110.0))
+        assert calls == ['holder']
+        assert holder.portfolio.positions['BTCUSDT'].unrealized_pnl == 10.0
+
+        engine._handle_trade(_fill('holder', 'BTCUSDT', 'SELL', 110.0))
+        engine._handle_market_data(_encode_market_data('BTCUSDT', 120.0))
+        assert calls == ['holder']
+        assert engine._holders['BTCUSDT'] == []
+    finally:
+        _close(engine)
+
+    print("✓ pnl only for holders")
+
+
+if __name__ == "__main__":
+    test_dispatch_index()
+    test_multi_symbol_and_wildcard()
+    test_pnl_only_for_holders()
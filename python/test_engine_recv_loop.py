@@ -0,0 +1,191 @@
+"""
+测试策略引擎接收循环 - 批量排空、批次上限、行情合并、零拷贝帧解码
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import json
+import threading
+import time
+import zmq
+from strategy.engine import StrategyEngine
+from strategy.base_strategy import BaseStrategy, MarketData, Trade
+from proto.protobuf_codec import ProtobufEncoder
+
+
+class RecordingStrategy(BaseStrategy):
+    """记录收到的行情和成交"""
+
+    def __init__(self, strategy_id: str):
+        super().__init__(strategy_id, {})
+        self.market_data = []
+        self.trades = []
+
+    def on_market_data(self, md: MarketData):
+        self.market_data.append(md)
+
+    def on_trade(self, trade: Trade):
+        self.trades.append(trade)
+
+
+def _encode_market_data(symbol: str, price: float, seq: int) -> bytes:
+    return (ProtobufEncoder.encode_string(1, symbol) +
+            ProtobufEncoder.encode_double(2, price) +
+            ProtobufEncoder.encode_double(3, 1.0) +
+            ProtobufEncoder.encode_int64(4, seq) +
+            ProtobufEncoder.encode_int64(5, seq) +
+            ProtobufEncoder.encode_string(6, 'okx'))
+
+
+class Feed:
+    """本地行情/成交发布端，引擎连接到随机端口"""
+
+    def __init__(self):
+        self.context = zmq.Context()
+        self.md_pub = self.context.socket(zmq.PUB)
+        self.md_pub.setsockopt(zmq.SNDHWM, 0)
+        md_port = self.md_pub.bind_to_random_port('tcp://127.0.0.1')
+        self.trade_pub = self.context.socket(zmq.PUB)
+        trade_port = self.trade_pub.bind_to_random_port('tcp://127.0.0.1')
+        self.order_pull = self.context.socket(zmq.PULL)
+        order_port = self.order_pull.bind_to_random_port('tcp://127.0.0.1')
+        self.endpoints = {
+            'md_endpoints': [f'tcp://127.0.0.1:{md_port}'],
+            'trade_endpoint': f'tcp://127.0.0.1:{trade_port}',
+            'order_endpoint': f'tcp://127.0.0.1:{order_port}',
+        }
+
+    def engine(self, **config) -> StrategyEngine:
+        engine = StrategyEngine({**self.endpoints, 'symbols': ['BTCUSDT', 'ETHUSDT'],
+                                 'use_protobuf': False, **config})
+        self.strategy = RecordingStrategy('recorder')
+        engine.add_strategy(self.strategy)
+        self._wait_subscribed(engine)
+        return engine
+
+    def publish_md(self, symbol: str, price: float, seq: int):
+        self.md_pub.send_multipart([f"md.{symbol}".encode(), _encode_market_data(symbol, price, seq)])
+
+    def publish_trade(self, trade_id: str):
+        trade = {'trade_id': trade_id, 'order_id': trade_id, 'strategy_id': 'recorder',
+                 'symbol': 'BTCUSDT', 'side': 'BUY', 'filled_price': 100.0,
+                 'filled_volume': 1, 'status': 'FILLED'}
+        self.trade_pub.send_multipart([b"trade.recorder", json.dumps(trade).encode()])
+
+    def _wait_subscribed(self, engine: StrategyEngine):
+        """PUB/SUB 订阅建立前发布的消息会丢失，发送探测消息直到两个 socket 都收到"""
+        md_ready = trade_ready = False
+        deadline = time.time() + 5
+        while not (md_ready and trade_ready) and time.time() < deadline:
+            if not md_ready:
+                self.publish_md('BTCUSDT', 0.0, 0)
+            if not trade_ready:
+                self.trade_pub.send_multipart([b"trade.probe", b"{}"])
+            time.sleep(0.05)
+            md_ready = md_ready or engine.md_sub.poll(0) != 0
+            trade_ready = trade_ready or engine.trade_sub.poll(0) != 0
+        assert md_ready and trade_ready
+        time.sleep(0.1)
+        engine._recv_batch(engine.md_sub, 10**6)
+        engine._recv_batch(engine.trade_sub, 10**6)
+        engine.stats.update(md_count=0, recv_batches=0, max_recv_batch=0)
+
+    def close(self, engine: StrategyEngine):
+        engine.stats['start_time'] = engine.stats['start_time'] or time.time()
+        engine._shutdown()
+        self.context.destroy(linger=0)
+
+
+def _wait_queued(delay: float = 0.3):
+    """等待已发布的消息到达订阅端队列"""
+    time.sleep(delay)
+
+
+def test_drain_with_batch_limit():
+    """每次唤醒最多读取 recv_batch_size 条，按到达顺序全部分发"""
+    feed = Feed()
+    engine = feed.engine(recv_batch_size=100)
+    try:
+        for seq in range(1, 251):
+            feed.publish_md('BTCUSDT', 100.0 + seq, seq)
+        _wait_queued()
+
+        counts = [engine._process_market_data() for _ in range(4)]
+        assert counts == [100, 100, 50, 0]
+        assert [md.exchange_time for md in feed.strategy.market_data] == list(range(1, 251))
+        assert engine.stats['md_count'] == 250 and engine.stats['max_recv_batch'] == 100
+    finally:
+        feed.close(engine)
+
+    print("✓ drain with batch limit")
+
+
+def test_conflation():
+    """合并模式下每个交易对只分发批次内最新一条"""
+    feed = Feed()
+    engine = feed.engine(conflate_market_data=True)
+    try:
+        for seq in range(1, 201):
+            symbol = 'BTCUSDT' if seq % 2 else 'ETHUSDT'
+            feed.publish_md(symbol, float(seq), seq)
+        _wait_queued()
+
+        assert engine._process_market_data() == 2
+        latest = {md.symbol: md.last_price for md in feed.strategy.market_data}
+        assert latest == {'BTCUSDT': 199.0, 'ETHUSDT': 200.0}
+        # 按各交易对最新一条的到达顺序分发
+        assert [md.symbol for md in feed.strategy.market_data] == ['BTCUSDT', 'ETHUSDT']
+        assert engine.stats['md_count'] == 200 and engine.stats['md_conflated'] == 198
+    finally:
+        feed.close(engine)
+
+    print("✓ conflation")
+
+
+def test_trades_not_conflated():
+    """成交回报逐条分发"""
+    feed = Feed()
+    engine = feed.engine(conflate_market_data=True)
+    try:
+        for i in range(5):
+            feed.publish_trade(f"t{i}")
+        _wait_queued()
+
+        assert engine._process_trades() == 5
+        assert [t.trade_id for t in feed.strategy.trades] == [f"t{i}" for i in range(5)]
+        assert engine.stats['trade_count'] == 5
+    finally:
+        feed.close(engine)
+
+    print("✓ trades not conflated")
+
+
+def test_run_loop_burst():
+    """run 循环在突发行情下不丢消息"""
+    feed = Feed()
+    engine = feed.engine(recv_batch_size=64, poll_timeout_ms=50)
+    thread = threading.Thread(target=engine.run, daemon=True)
+    thread.start()
+    try:
+        for seq in range(1, 2001):
+            feed.publish_md('ETHUSDT', float(seq), seq)
+        deadline = time.time() + 5
+        while len(feed.strategy.market_data) < 2000 and time.time() < deadline:
+            time.sleep(0.05)
+        assert [md.exchange_time for md in feed.strategy.market_data] == list(range(1, 2001))
+        assert engine.stats['recv_batches'] < 2000
+    finally:
+        engine.running = False
+        thread.join(timeout=5)
+        feed.context.destroy(linger=0)
+
+    print("✓ run loop burst")
+
+
+if __name__ == "__main__":
+    test_drain_with_batch_limit()
+    test_conflation()
+    test_trades_not_conflated()
+    test_run_loop_burst()
@@ -0,0 +1,89 @@
+"""
+测试因子缓存 - FactorStore 命中、增量追加和失效
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tempfile
+import numpy as np
+import pandas as pd
+from strategy.factors.factor_store import FactorStore
+
+
+def _make_ohlcv(n: int, seed: int = 42) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 50000 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    return pd.DataFrame({
+        'open': close * (1 + rng.normal(0, 0.001, n)),
+        'high': close * 1.002,
+        'low': close * 0.998,
+        'close': close,
+        'volume': rng.uniform(100, 1000, n),
+    })
+
+
+class _CountingCompute:
+    """记录调用次数和输入行数的因子计算函数"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, df: pd.DataFrame) -> pd.DataFrame:
+        self.calls.append(len(df))
+        close = df['close']
+        return pd.DataFrame({
+            'ma_10': close.rolling(10).mean().values,
+            'ret_5': close.pct_change(5).values,
+        }, index=df.index)
+
+
+def test_hit_and_version_miss():
+    """相同数据命中缓存，修改版本号或数据后重新计算"""
+    with tempfile.TemporaryDirectory() as cache_dir:
+        store = FactorStore(cache_dir)
+        df = _make_ohlcv(500)
+        compute = _CountingCompute()
+
+        first = store.get_or_compute('BTCUSDT_1h', df, compute, version='1')
+        second = store.get_or_compute('BTCUSDT_1h', df, compute, version='1')
+        assert compute.calls == [500]
+        pd.testing.assert_frame_equal(first, second)
+
+        store.get_or_compute('BTCUSDT_1h', df, compute, version='2')
+        assert compute.calls == [500, 500]
+
+        changed = df.copy()
+        changed.loc[10, 'close'] += 1.0
+        store.get_or_compute('BTCUSDT_1h', changed, compute, version='2')
+        assert compute.calls == [500, 500, 500]
+
+    print("✓ FactorStore hit / miss")
+
+
+def test_incremental_append():
+    """数据源增长时只计算新增 K 线，结果与全量计算一致"""
+    with tempfile.TemporaryDirectory() as cache_dir:
+        store = FactorStore(cache_dir)
+        full = _make_ohlcv(1000)
+        compute = _CountingCompute()
+
+        store.get_or_compute('ETHUSDT_1h', full.iloc[:800], compute, warmup=20)
+        grown = store.get_or_compute('ETHUSDT_1h', full, compute, warmup=20)
+
+        # 第二次只计算 warmup + 新增的 200 行
+        assert compute.calls == [800, 220]
+        expected = _CountingCompute()(full)
+        np.testing.assert_allclose(grown.values, expected.values, rtol=1e-12, equal_nan=True)
+
+        # 追加后再次读取直接命中
+        store.get_or_compute('ETHUSDT_1h', full, compute, warmup=20)
+        assert len(compute.calls) == 2
+
+    print("✓ FactorStore incremental append")
+
+
+if __name__ == "__main__":
+    test_hit_and_version_miss()
+    test_incremental_append()
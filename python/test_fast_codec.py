@@ -0,0 +1,297 @@
+"""
+测试快速 Protobuf 编解码 - 与参考实现（protobuf_codec）对比的随机模糊测试
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import random
+import struct
+import time
+
+from proto import protobuf_codec as reference
+from proto import fast_codec
+from proto.fast_codec import MARKET_DATA_FIELDS, TRADE_FIELDS
+from strategy.base_strategy import MarketData, Trade
+
+# 字段号 -> (字段名, 类型)
+MARKET_DATA_SCHEMA = {
+    1: ('symbol', 'string'), 2: ('last_price', 'double'), 3: ('volume', 'double'),
+    4: ('exchange_time', 'int64'), 5: ('local_time', 'int64'), 6: ('exchange', 'string'),
+}
+TRADE_SCHEMA = {
+    1: ('trade_id', 'string'), 2: ('order_id', 'string'), 3: ('strategy_id', 'string'),
+    4: ('symbol', 'string'), 5: ('side', 'string'), 6: ('filled_price', 'double'),
+    7: ('filled_volume', 'int32'), 8: ('trade_time', 'int64'), 9: ('status', 'string'),
+    10: ('error_code', 'int32'), 11: ('error_message', 'string'), 12: ('is_retryable', 'bool'),
+    13: ('commission', 'double'), 14: ('seq', 'uint64'), 15: ('gateway_id', 'string'),
+}
+DEFAULTS = {'string': '', 'double': 0.0, 'int64': 0, 'int32': 0, 'uint64': 0, 'bool': False}
+ALPHABET = 'abcXYZ019_-.成交行情' + 'é'
+
+
+def _varint(value: int) -> bytes:
+    if value < 0:
+        value += 1 << 64
+    out = bytearray()
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _random_value(rng: random.Random, kind: str):
+    if kind == 'string':
+        return ''.join(rng.choice(ALPHABET) for _ in range(rng.choice([0, 1, 5, 20, 200])))
+    if kind == 'double':
+        return rng.choice([0.0, -1.5, 1e-300, 1e300, rng.uniform(-1e6, 1e6)])
+    if kind == 'int64':
+        return rng.choice([0, 1, 127, 128, 2**63 - 1, -1, -2**63, rng.randrange(-2**63, 2**63)])
+    if kind == 'int32':
+        return rng.choice([0, 1, 2**31 - 1, -1, -2**31, rng.randrange(-2**31, 2**31)])
+    if kind == 'uint64':
+        return rng.choice([0, 1, 128, 2**64 - 1, rng.randrange(2**64)])
+    return rng.random() < 0.5
+
+
+def _encode_field(number: int, kind: str, value) -> bytes:
+    if kind == 'string':
+        data = value.encode('utf-8')
+        return _varint(number << 3 | 2) + _varint(len(data)) + data
+    if kind == 'double':
+        return _varint(number << 3 | 1) + struct.pack('<d', value)
+    return _varint(number << 3) + _varint(int(value))
+
+
+def _unknown_field(rng: random.Random) -> bytes:
+    """未知字段（字段号 > 15，含多字节 tag），字符串字段使用合法 UTF-8（参考实现会解码）"""
+    number = rng.choice([16, 17, 100, 5000])
+    wire_type = rng.choice([0, 1, 2])
+    if wire_type == 0:
+        return _varint(number << 3) + _varint(rng.randrange(2**64))
+    if wire_type == 1:
+        return _varint(number << 3 | 1) + bytes(rng.randrange(256) for _ in range(8))
+    data = 'unknown'.encode('utf-8') * rng.randrange(3)
+    return _varint(number << 3 | 2) + _varint(len(data)) + data
+
+
+def _random_message(rng: random.Random, schema: dict) -> bytes:
+    """随机字段顺序、可重复字段、可混入未知字段的合法消息"""
+    parts = []
+    for _ in range(rng.randrange(len(schema) * 2)):
+        number = rng.choice(list(schema))
+        parts.append(_encode_field(number, schema[number][1], _random_value(rng, schema[number][1])))
+        if rng.random() < 0.1:
+            parts.append(_unknown_field(rng))
+    return b''.join(parts)
+
+
+def _canonical_message(rng: random.Random, schema: dict) -> bytes:
+    """prost 规范布局：字段按编号顺序各出现一次（零值字段可能被省略）"""
+    parts = []
+    for number, (_, kind) in schema.items():
+        value = _random_value(rng, kind)
+        if value or rng.random() < 0.1:
+            parts.append(_encode_field(number, kind, value))
+    return b''.join(parts)
+
+
+def _message(rng: random.Random, schema: dict) -> bytes:
+    if rng.random() < 0.5:
+        return _canonical_message(rng, schema)
+    return _random_message(rng, schema)
+
+
+def _normalize(ref: dict, schema: dict) -> dict:
+    """参考实现只返回出现的字段且整数为无符号值，补默认值并按 proto3 规则转为有符号"""
+    result = {}
+    for name, kind in schema.values():
+        value = ref.get(name, DEFAULTS[kind])
+        if kind == 'int64':
+            value &= 2**64 - 1
+            value = value - 2**64 if value >= 2**63 else value
+        elif kind == 'int32':
+            value &= 2**32 - 1
+            value = value - 2**32 if value >= 2**31 else value
+        elif kind == 'uint64':
+            value &= 2**64 - 1
+        result[name] = value
+    return result
+
+
+def _same(a: dict, b: dict) -> bool:
+    # NaN 双精度按位比较
+    return all(a[k] == b[k] or (a[k] != a[k] and b[k] != b[k]) for k in a)
+
+
+CASES = [
+    (MARKET_DATA_SCHEMA, reference.decode_market_data, fast_codec.decode_market_data),
+    (TRADE_SCHEMA, reference.decode_trade, fast_codec.decode_trade),
+]
+
+
+def test_valid_messages_match_reference():
+    """合法消息：解码结果与参考实现一致（bytes 与 memoryview 输入）"""
+    rng = random.Random(0)
+    for schema, ref_decode, fast_decode in CASES:
+        for _ in range(3000):
+            data = _message(rng, schema)
+            expected = _normalize(ref_decode(data), schema)
+            assert fast_decode(data) == expected, data
+            assert fast_decode(memoryview(data)) == expected, data
+
+    print("✓ valid messages match reference")
+
+
+def test_mutated_messages():
+    """随机变异 / 截断：只允许 ValueError / UnicodeDecodeError，两者都成功时结果一致"""
+    rng = random.Random(1)
+    checked = 0
+    for schema, ref_decode, fast_decode in CASES:
+        for _ in range(5000):
+            data = bytearray(_message(rng, schema))
+            if data and rng.random() < 0.5:
+                del data[rng.randrange(len(data)):]
+            for _ in range(rng.randrange(4)):
+                if data:
+                    data[rng.randrange(len(data))] = rng.randrange(256)
+            data = bytes(data)
+
+            try:
+                result = fast_decode(data)
+            except (ValueError, UnicodeDecodeError):
+                continue
+            try:
+                ref = ref_decode(data)
+            except Exception:
+                # 快速实现可跳过参考实现不支持的未知字段（wire type 5）
+                continue
+            assert _same(result, _normalize(ref, schema)), data
+            checked += 1
+
+    assert checked > 1000
+    print(f"✓ mutated messages ({checked} compared)")
+
+
+def test_truncated_message_raises():
+    """截断的字符串 / double / varint 抛出 ValueError（参考实现会静默截断字符串）"""
+    for data in (b'\x0a\x05BTC', b'\x11\x00\x00', b'\x20\xff\xff', b'\x0a\x80'):
+        try:
+            fast_codec.decode_market_data(data)
+            assert False, data
+        except ValueError:
+            pass
+
+    print("✓ truncated messages raise ValueError")
+
+
+def test_decode_into_objects():
+    """factory 直接构造 MarketData / Trade"""
+    data = fast_codec.encode_market_data('ETHUSDT', 3000.5, 2.0, 1, 2, 'binance')
+    md = fast_codec.decode_market_data(data, MarketData)
+    assert md == MarketData('ETHUSDT', 3000.5, 2.0, 1, 2, 'binance')
+
+    # 缺省字段为 proto3 默认值（参考实现返回的 dict 缺少这些键）
+    md = fast_codec.decode_market_data(fast_codec.encode_market_data('ETHUSDT', 1.0, 0.0, 0, 0, ''), MarketData)
+    assert md.volume == 0.0 and md.exchange_time == 0 and md.exchange == ''
+
+    data = fast_codec.encode_trade(trade_id='T1', order_id='O1', strategy_id='s', symbol='BTCUSDT',
+                                   side='SELL', filled_price=100.0, filled_volume=-3, trade_time=-5,
+                                   status='REJECTED', error_code=-1, error_message='risk',
+                                   is_retryable=True, commission=0.1, seq=2**40, gateway_id='okx-1')
+    trade = fast_codec.decode_trade(data, Trade)
+    assert trade == Trade('T1', 'O1', 's', 'BTCUSDT', 'SELL', 100.0, -3, -5, 'REJECTED', -1, 'risk', True, 0.1,
+                          2**40, 'okx-1')
+    assert fast_codec.decode_trade(data) == dict(zip(TRADE_FIELDS, (
+        'T1', 'O1', 's', 'BTCUSDT', 'SELL', 100.0, -3, -5, 'REJECTED', -1, 'risk', True, 0.1, 2**40, 'okx-1')))
+    # 旧网关的成交回报没有序号字段
+    trade = fast_codec.decode_trade(fast_codec.encode_trade(trade_id='T2', status='FILLED'), Trade)
+    assert trade.seq == 0 and trade.gateway_id == ''
+
+    print("✓ decode into objects")
+
+
+def test_batch_decode():
+    """批量解码：bytes / memoryview 混合输入，skip_invalid 跳过坏消息"""
+    frames = [fast_codec.encode_market_data(f'SYM{i}', float(i), 1.0, i, i, 'okx') for i in range(100)]
+    mixed = [f if i % 2 else memoryview(f) for i, f in enumerate(frames)]
+
+    result = fast_codec.decode_market_data_batch(mixed, MarketData)
+    assert [md.symbol for md in result] == [f'SYM{i}' for i in range(100)]
+    dicts = fast_codec.decode_market_data_batch(frames)
+    assert dicts[5] == dict(zip(MARKET_DATA_FIELDS, ('SYM5', 5.0, 1.0, 5, 5, 'okx')))
+
+    bad = frames[:3] + [b'\x0a\x10BTC'] + frames[3:5]
+    try:
+        fast_codec.decode_market_data_batch(bad, MarketData)
+        assert False
+    except ValueError:
+        pass
+    assert len(fast_codec.decode_market_data_batch(bad, MarketData, skip_invalid=True)) == 5
+
+    trades = [fast_codec.encode_trade(trade_id=str(i), status='FILLED') for i in range(10)]
+    assert [t.trade_id for t in fast_codec.decode_trade_batch(trades, Trade)] == [str(i) for i in range(10)]
+
+    print("✓ batch decode")
+
+
+def test_encode_order_matches_reference():
+    """编码结果与参考实现字节一致（非负值）"""
+    rng = random.Random(2)
+    for _ in range(2000):
+        args = dict(
+            order_id=_random_value(rng, 'string'),
+            strategy_id=_random_value(rng, 'string'),
+            symbol=_random_value(rng, 'string'),
+            price=abs(_random_value(rng, 'double')),
+            volume=rng.choice([0, 1, 127, 128, 2**31 - 1]),
+            side=rng.choice(['BUY', 'SELL', '']),
+            timestamp=rng.choice([0, 1, 1700000000000000000, 2**63 - 1]),
+        )
+        assert fast_codec.encode_order(**args) == reference.encode_order(**args), args
+
+    # 负数按 proto3 编码为 10 字节补码 varint
+    data = fast_codec.encode_order('O', 's', 'BTCUSDT', 1.0, -1, 'SELL', -1)
+    assert data.count(b'\xff' * 9 + b'\x01') == 2
+
+    print("✓ encode_order matches reference")
+
+
+def test_decode_speed():
+    """解码速度对比（仅打印）"""
+    frames = [fast_codec.encode_market_data(f'SYM{i % 50}USDT', 100.0 + i, 1.5, 1760000000000000000 + i,
+                                            1760000000000000007 + i, 'okx') for i in range(20000)]
+    views = [memoryview(f) for f in frames]
+
+    start = time.perf_counter()
+    for view in views:
+        d = reference.decode_market_data(view)
+        MarketData(d['symbol'], d['last_price'], d['volume'], d['exchange_time'],
+                   d['local_time'], d['exchange'])
+    ref_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fast_codec.decode_market_data_batch(views, MarketData)
+    fast_time = time.perf_counter() - start
+
+    print(f"  reference: {ref_time / len(views) * 1e6:.2f} us/msg, "
+          f"fast: {fast_time / len(views) * 1e6:.2f} us/msg ({ref_time / fast_time:.1f}x)")
+    print("✓ decode speed")
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("Fast Protobuf Codec Test")
+    print("=" * 60)
+
+    test_valid_messages_match_reference()
+    test_mutated_messages()
+    test_truncated_message_raises()
+    test_decode_into_objects()
+    test_batch_decode()
+    test_encode_order_matches_reference()
+    test_decode_speed()
+
+    print("\n✓ All tests passed")
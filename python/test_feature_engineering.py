@@ -0,0 +1,76 @@
+"""
+测试增量特征 - get_latest_features 与 extract_features 的最后一个值一致
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from strategy.factors.feature_engineering import FeatureEngineering
+
+# 只依赖最近 20 根的窗口类特征
+WINDOW_FEATURES = [
+    'price', 'volume', 'returns', 'log_returns', 'volatility', 'ma_5', 'ma_10', 'ma_20',
+    'bb_upper', 'bb_middle', 'bb_lower', 'bb_width', 'bb_position',
+    'volume_ma_5', 'volume_ratio', 'skewness', 'kurtosis'
+]
+
+
+def _ticks(n: int, seed: int = 3):
+    rng = np.random.default_rng(seed)
+    prices = 50000 * np.exp(np.cumsum(rng.normal(0, 0.002, n)))
+    volumes = rng.uniform(100, 1000, n)
+    return prices, volumes
+
+
+def _last_values(feature_eng: FeatureEngineering, symbol: str):
+    return {k: float(v[-1]) for k, v in feature_eng.extract_features(symbol).items()}
+
+
+def test_latest_matches_batch():
+    """窗口类特征与回看窗口内批量计算一致；递推类特征与全序列批量计算一致"""
+    prices, volumes = _ticks(1500)
+    live = FeatureEngineering(lookback_period=50)
+    full = FeatureEngineering(lookback_period=len(prices))
+
+    assert live.get_latest_features('BTCUSDT') == {}
+
+    for i, (price, volume) in enumerate(zip(prices, volumes)):
+        live.update('BTCUSDT', price, volume)
+        full.update('BTCUSDT', price, volume)
+        if i < 1 or (i > 30 and i % 50 != 0):
+            continue
+
+        latest = live.get_latest_features('BTCUSDT')
+        windowed = _last_values(live, 'BTCUSDT')
+        expected = _last_values(full, 'BTCUSDT')
+        assert set(latest) == set(expected)
+
+        for name in latest:
+            reference = windowed[name] if name in WINDOW_FEATURES else expected[name]
+            assert abs(latest[name] - reference) <= 1e-8 * max(1.0, abs(reference)), name
+
+    assert live.get_sample_count('BTCUSDT') == len(prices)
+    print("✓ incremental features match batch")
+
+
+def test_symbols_independent():
+    """不同交易对的状态互不影响"""
+    prices, volumes = _ticks(100)
+    feature_eng = FeatureEngineering()
+    for price, volume in zip(prices, volumes):
+        feature_eng.update('BTCUSDT', price, volume)
+        feature_eng.update('ETHUSDT', price / 20, volume)
+
+    btc = feature_eng.get_latest_features('BTCUSDT')
+    eth = feature_eng.get_latest_features('ETHUSDT')
+    assert abs(btc['ma_20'] / eth['ma_20'] - 20) < 1e-9
+    assert abs(btc['rsi_14'] - eth['rsi_14']) < 1e-6
+
+    print("✓ per-symbol state")
+
+
+if __name__ == "__main__":
+    test_latest_matches_batch()
+    test_symbols_independent()
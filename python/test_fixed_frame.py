@@ -0,0 +1,180 @@
+"""
+测试定长二进制行情帧 - 帧布局、符号表、批量解码、引擎订阅定长帧
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import time
+import numpy as np
+import zmq
+
+from proto import fast_codec
+from proto.fixed_frame import (
+    SymbolTable, decode_frame, decode_frames, frames_to_array, encode_frame,
+    encode_symbol_table, frame_topic, FRAME_SIZE, TABLE_TOPIC
+)
+from strategy.engine import StrategyEngine
+from strategy.base_strategy import BaseStrategy, MarketData, Trade
+
+TS = 1760000000000000000
+
+
+def _table(generation: int = 7) -> SymbolTable:
+    table = SymbolTable()
+    table.update(encode_symbol_table(generation, ['BTCUSDT', 'ETHUSDT'], ['okx', 'binance']))
+    return table
+
+
+def test_frame_layout():
+    """40 字节小端布局（与 rust/common/src/market_frame.rs 一致）"""
+    frame = encode_frame(3, 1, 0xDEADBEEF, 50000.5, 1.25, TS, -1)
+    assert len(frame) == FRAME_SIZE == 40
+    assert frame[:8] == bytes([3, 0, 1, 0, 0xEF, 0xBE, 0xAD, 0xDE])
+    assert np.frombuffer(frame[8:16], '<f8')[0] == 50000.5
+    assert np.frombuffer(frame[32:40], '<i8')[0] == -1
+
+    # 同一条行情的 Protobuf 编码
+    proto = fast_codec.encode_market_data('BTCUSDT', 50000.5, 1.25, TS, TS, 'okx')
+    print(f"  fixed frame: {len(frame)} bytes, protobuf: {len(proto)} bytes")
+    print("✓ frame layout")
+
+
+def test_decode_frame():
+    """单帧解码：按 generation 解析 id，未知 id / generation 计入 unresolved"""
+    table = _table()
+    md = decode_frame(encode_frame(1, 1, 7, 3000.0, 2.0, TS, TS + 5), table, MarketData)
+    assert md == MarketData('ETHUSDT', 3000.0, 2.0, TS, TS + 5, 'binance')
+    assert decode_frame(memoryview(encode_frame(0, 0, 7, 1.0, 0.0, 0, 0)), table)['symbol'] == 'BTCUSDT'
+
+    assert decode_frame(encode_frame(5, 0, 7, 1.0, 0.0, 0, 0), table) is None
+    assert decode_frame(encode_frame(0, 0, 8, 1.0, 0.0, 0, 0), table) is None
+    assert table.unresolved == 2
+
+    # 符号表只追加：新表覆盖同 generation 的旧表
+    table.update(encode_symbol_table(7, ['BTCUSDT', 'ETHUSDT', 'SOLUSDT'], ['okx', 'binance']))
+    assert decode_frame(encode_frame(2, 0, 7, 1.0, 0.0, 0, 0), table)['symbol'] == 'SOLUSDT'
+
+    try:
+        decode_frame(b'\x00' * 39, table)
+        assert False
+    except ValueError:
+        pass
+
+    print("✓ decode frame")
+
+
+def test_decode_frames_batch():
+    """批量解码与逐帧解码一致，坏帧和未解析帧被跳过"""
+    table = _table()
+    table.update(encode_symbol_table(9, ['SOLUSDT'], ['okx']))
+    frames = [encode_frame(i % 2, i % 2, 7, 100.0 + i, 1.0, TS + i, TS + i) for i in range(1000)]
+    frames[10] = encode_frame(0, 0, 9, 5.0, 1.0, 0, 0)
+    views = [memoryview(f) for f in frames]
+
+    batch = decode_frames(views, table, MarketData)
+    assert batch == [decode_frame(f, table, MarketData) for f in frames]
+    assert batch[10].symbol == 'SOLUSDT'
+
+    before = table.unresolved
+    mixed = frames[:3] + [b'\x00' * 41, encode_frame(0, 0, 99, 1.0, 1.0, 0, 0)] + frames[3:5]
+    assert [md.exchange_time for md in decode_frames(mixed, table, MarketData)] == [TS + i for i in range(5)]
+    assert table.unresolved == before + 1
+
+    # 结构化数组（单个连续缓冲区零拷贝）
+    recorded = b''.join(frames)
+    array = frames_to_array(recorded)
+    assert array.base is not None and len(array) == 1000
+    assert np.array_equal(array['exchange_time'][:5], TS + np.arange(5))
+    assert np.array_equal(frames_to_array(views)['last_price'], array['last_price'])
+
+    print("✓ decode frames batch")
+
+
+def test_decode_speed():
+    """定长帧 vs Protobuf 批量解码速度（仅打印）"""
+    table = _table()
+    n = 20000
+    fixed = [memoryview(encode_frame(i % 2, 0, 7, 100.0 + i, 1.5, TS + i, TS + i + 7)) for i in range(n)]
+    proto = [memoryview(fast_codec.encode_market_data('ETHUSDT' if i % 2 else 'BTCUSDT', 100.0 + i, 1.5,
+                                                      TS + i, TS + i + 7, 'okx')) for i in range(n)]
+
+    start = time.perf_counter()
+    decode_frames(fixed, table, MarketData)
+    fixed_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fast_codec.decode_market_data_batch(proto, MarketData)
+    proto_time = time.perf_counter() - start
+
+    print(f"  fixed: {fixed_time / n * 1e6:.2f} us/msg, protobuf: {proto_time / n * 1e6:.2f} us/msg "
+          f"({proto_time / fixed_time:.1f}x)")
+    print("✓ decode speed")
+
+
+class RecordingStrategy(BaseStrategy):
+
+    def __init__(self, strategy_id: str, config: dict):
+        super().__init__(strategy_id, config)
+        self.symbol = config.get('symbol')
+        self.market_data = []
+
+    def on_market_data(self, md: MarketData):
+        self.market_data.append(md)
+
+    def on_trade(self, trade: Trade):
+        pass
+
+
+def test_engine_fixed_format():
+    """market_data_format='fixed'：订阅 mdf.<symbol> 与符号表，先应用符号表再解码"""
+    context = zmq.Context()
+    pub = context.socket(zmq.PUB)
+    port = pub.bind_to_random_port('tcp://127.0.0.1')
+    engine = StrategyEngine({
+        'md_endpoints': [f'tcp://127.0.0.1:{port}'],
+        'trade_endpoint': 'tcp://127.0.0.1:1',
+        'order_endpoint': 'tcp://127.0.0.1:1',
+        'use_protobuf': False,
+        'market_data_format': 'fixed',
+    })
+    strategy = RecordingStrategy('eth', {'symbol': 'ETHUSDT'})
+    engine.add_strategy(strategy)
+    try:
+        assert engine._subscribed == {TABLE_TOPIC, 'mdf.ETHUSDT'}
+
+        # 等待订阅建立（符号表消息可重复发送）
+        table = encode_symbol_table(7, ['BTCUSDT', 'ETHUSDT'], ['okx'])
+        deadline = time.time() + 5
+        while engine.md_sub.poll(0) == 0 and time.time() < deadline:
+            pub.send_multipart([TABLE_TOPIC.encode(), table])
+            time.sleep(0.05)
+
+        # 订阅之前到达的帧无法解析；未订阅的交易对不会收到
+        pub.send_multipart([frame_topic('BTCUSDT', 'okx').encode(), encode_frame(0, 0, 7, 1.0, 1.0, 1, 1)])
+        for seq in range(1, 101):
+            pub.send_multipart([frame_topic('ETHUSDT', 'okx').encode(),
+                                encode_frame(1, 0, 7, float(seq), 1.0, seq, seq)])
+        pub.send_multipart([frame_topic('ETHUSDT', 'okx').encode(), encode_frame(1, 0, 8, 0.0, 1.0, 0, 0)])
+        time.sleep(0.3)
+
+        while engine._process_market_data():
+            pass
+        assert [md.exchange_time for md in strategy.market_data] == list(range(1, 101))
+        assert strategy.market_data[-1] == MarketData('ETHUSDT', 100.0, 1.0, 100, 100, 'okx')
+        assert engine.stats['md_unresolved'] == 1
+    finally:
+        engine.stats['start_time'] = time.time()
+        engine._shutdown()
+        context.destroy(linger=0)
+
+    print("✓ engine fixed format")
+
+
+if __name__ == "__main__":
+    test_frame_layout()
+    test_decode_frame()
+    test_decode_frames_batch()
+    test_decode_speed()
+    test_engine_fixed_format()
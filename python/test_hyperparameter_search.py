@@ -0,0 +1,144 @@
+"""
+测试超参数搜索 - 随机搜索剪枝、successive halving 检查点续训、共享特征与结果表
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tempfile
+import numpy as np
+from sklearn.linear_model import SGDRegressor
+from models.hyperparameter_search import (
+    HyperparameterSearch, TrialContext, Choice, Uniform, IntUniform, sample_params, load_results
+)
+from models.qlib_metrics import QlibStyleTrainer
+
+SPACE = {
+    'quality': Uniform(0.0, 1.0),
+    'width': Choice([16, 32, 64]),
+    'depth': IntUniform(1, 4),
+    'learning_rate': Uniform(1e-4, 1e-2, log=True),
+}
+
+
+def curve_objective(trial: TrialContext):
+    """模拟训练曲线：IC 随 epoch 上升，上限由 quality 和共享数据决定"""
+    scale = float(trial.data('scale')[0])
+    epoch = trial.checkpoint['epoch'] if trial.checkpoint else 0
+    assert epoch == trial.start_epoch
+    if trial.params['depth'] == 4 and trial.params['quality'] < 0.05:
+        raise RuntimeError("diverged")
+    for epoch in range(trial.start_epoch, trial.epochs):
+        ic = scale * trial.params['quality'] * (1 - np.exp(-(epoch + 1) / 3))
+        if trial.report(epoch, ic):
+            break
+    trial.save_checkpoint({'epoch': epoch + 1})
+
+
+def test_sample_params():
+    """采样范围与约束"""
+    rng = np.random.default_rng(0)
+    for _ in range(100):
+        params = sample_params({**SPACE, 'fixed': 7}, rng, constraint=lambda p: p['width'] % 32 == 0)
+        assert params['width'] in (32, 64) and params['fixed'] == 7
+        assert 1 <= params['depth'] <= 4
+        assert 1e-4 <= params['learning_rate'] <= 1e-2
+    print("✓ sample params")
+
+
+def test_random_search_pruning():
+    """并行随机搜索：低 IC trial 在预热后被剪枝，结果表记录所有 trial"""
+    with tempfile.TemporaryDirectory() as tmp:
+        search = HyperparameterSearch(
+            curve_objective, SPACE, strategy='random', max_epochs=10, min_epochs=3,
+            n_jobs=2, shared_data={'scale': np.array([0.2])}, work_dir=tmp,
+            study_name='random', prune_min_trials=2, seed=1
+        )
+        best = search.run(n_trials=12)
+
+        statuses = [r.status for r in search.results]
+        assert len(search.results) == 12
+        assert 'pruned' in statuses and 'completed' in statuses
+        for result in search.results:
+            if result.status == 'pruned':
+                assert 3 <= result.epochs < 10
+            elif result.status == 'completed':
+                assert result.epochs == 10
+
+        qualities = [r.params['quality'] for r in search.results if r.status != 'failed']
+        assert best.params['quality'] >= np.median(qualities)
+        assert np.isclose(best.score, 0.2 * best.params['quality'] * (1 - np.exp(-10 / 3)))
+
+        table = load_results(search.results_path)
+        assert len(table) == 12 and table['score'].iloc[0] == table['score'].max()
+        assert {'param_quality', 'param_width', 'status', 'epochs'} <= set(table.columns)
+
+    print("✓ random search pruning")
+
+
+def test_successive_halving():
+    """每个 rung 保留 1/3，幸存者从检查点继续训练"""
+    with tempfile.TemporaryDirectory() as tmp:
+        search = HyperparameterSearch(
+            curve_objective, SPACE, strategy='successive_halving', max_epochs=9, min_epochs=1,
+            reduction_factor=3, n_jobs=1, shared_data={'scale': np.array([1.0])},
+            work_dir=tmp, study_name='sha', seed=2
+        )
+        best = search.run(n_trials=9)
+
+        by_rung = {}
+        for result in search.results:
+            by_rung.setdefault(result.rung, []).append(result)
+        assert [len(by_rung[r]) for r in sorted(by_rung)] == [9, 3, 1]
+        assert [r.epochs for r in by_rung[2]] == [9]
+
+        # 晋级的是上一 rung 分数最高的 trial
+        rung0 = sorted(by_rung[0], key=lambda r: r.score, reverse=True)
+        assert {r.trial_id for r in by_rung[1]} == {r.trial_id for r in rung0[:3]}
+        assert best.trial_id == by_rung[2][0].trial_id
+        assert sum(r.status == 'pruned' for r in search.results) == 8
+
+    print("✓ successive halving")
+
+
+def test_failed_trial_recorded():
+    """目标函数异常时记录为 failed，不影响其他 trial"""
+    with tempfile.TemporaryDirectory() as tmp:
+        search = HyperparameterSearch(
+            curve_objective, {**SPACE, 'depth': 4, 'quality': Choice([0.0, 0.5])},
+            max_epochs=3, n_jobs=1, shared_data={'scale': np.array([1.0])},
+            work_dir=tmp, study_name='failed', seed=0
+        )
+        best = search.run(n_trials=6)
+        statuses = {r.status for r in search.results}
+        assert statuses == {'failed', 'completed'}
+        assert best.params['quality'] == 0.5
+        table = search.results_table()
+        assert table.loc[table['status'] == 'failed', 'error'].str.contains('diverged').all()
+
+    print("✓ failed trial recorded")
+
+
+def test_trainer_epoch_callback():
+    """QlibStyleTrainer 的 epoch_callback 返回 True 时停止训练（剪枝钩子）"""
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(500, 3))
+    y = X @ np.array([0.5, -0.2, 0.1]) + rng.normal(0, 0.1, 500)
+
+    trial = TrialContext(0, {}, epochs=50, reports=[(1, e, 1.0) for e in range(50)] * 4,
+                         prune_after=2, prune_min_trials=4)
+    trainer = QlibStyleTrainer(SGDRegressor(random_state=0), early_stopping_rounds=100, verbose=False)
+    trainer.fit(X[:400], y[:400], X[400:], y[400:], n_epochs=50,
+                epoch_callback=lambda epoch, metrics: trial.report(epoch, metrics['val_ic']))
+
+    assert trial.pruned and len(trainer.history['val_ic']) == 2
+    print("✓ trainer epoch callback")
+
+
+if __name__ == "__main__":
+    test_sample_params()
+    test_random_search_pruning()
+    test_successive_halving()
+    test_failed_trial_recorded()
+    test_trainer_epoch_callback()
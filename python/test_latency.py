@@ -0,0 +1,221 @@
+"""
+测试延迟追踪 - HDR 直方图精度、引擎各阶段打点、追踪缓冲区、SIGUSR1 写出、Prometheus 导出
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import json
+import signal
+import tempfile
+import time
+import numpy as np
+import zmq
+from prometheus_client import CollectorRegistry, generate_latest
+
+from strategy.latency import LatencyHistogram, LatencyTracer
+from strategy.metrics import EngineMetrics
+from strategy.engine import StrategyEngine
+from strategy.base_strategy import BaseStrategy, MarketData, Trade
+from proto.fast_codec import encode_market_data
+
+
+def test_histogram_accuracy():
+    """分位数相对误差在桶精度内，桶区间连续"""
+    histogram = LatencyHistogram()
+    for index in range(1, 2000):
+        lower, upper = histogram.bucket_bounds(index)
+        assert lower == histogram.bucket_bounds(index - 1)[1] + 1
+        assert histogram._index(lower) == histogram._index(upper) == index
+
+    rng = np.random.default_rng(7)
+    values = rng.lognormal(mean=10, sigma=1.5, size=100000).astype(np.int64)
+    for value in values.tolist():
+        histogram.record(value)
+    assert histogram.total == len(values) and histogram.max == values.max()
+
+    for q, estimate in zip((50.0, 90.0, 99.0, 99.9), histogram.percentiles()):
+        exact = np.percentile(values, q, method='inverted_cdf')
+        assert abs(estimate - exact) / exact < 0.02, (q, estimate, exact)
+
+    # 超出范围的值计入最后一个桶
+    histogram.record(10**12)
+    assert histogram.counts[-1] == 1 and histogram.max == 10**12
+    assert histogram.percentiles((100.0,))[0] == 10**12
+
+    other = LatencyHistogram()
+    other.record(5)
+    histogram.merge(other)
+    assert histogram.total == len(values) + 2
+
+    start = time.perf_counter_ns()
+    for value in values[:20000].tolist():
+        histogram.record(value)
+    per_record = (time.perf_counter_ns() - start) / 20000
+    print(f"✓ histogram accuracy ({per_record:.0f} ns/record)")
+
+
+class OrderingStrategy(BaseStrategy):
+    """每条行情下一单"""
+
+    def __init__(self, strategy_id: str, config: dict):
+        super().__init__(strategy_id, config)
+        self.symbol = config['symbol']
+
+    def on_market_data(self, md: MarketData):
+        self.send_order(md.symbol, 'BUY', md.last_price, 1)
+
+    def on_trade(self, trade: Trade):
+        pass
+
+
+class QuietStrategy(BaseStrategy):
+
+    def __init__(self, strategy_id: str, config: dict):
+        super().__init__(strategy_id, config)
+        self.symbol = config['symbol']
+
+    def on_market_data(self, md: MarketData):
+        pass
+
+    def on_trade(self, trade: Trade):
+        pass
+
+
+def test_engine_stage_tracing():
+    """引擎记录各阶段延迟和按策略的 tick-to-order，订单追踪记录各阶段耗时"""
+    context = zmq.Context()
+    pub = context.socket(zmq.PUB)
+    md_port = pub.bind_to_random_port('tcp://127.0.0.1')
+    pull = context.socket(zmq.PULL)
+    order_port = pull.bind_to_random_port('tcp://127.0.0.1')
+    engine = StrategyEngine({
+        'md_endpoints': [f'tcp://127.0.0.1:{md_port}'],
+        'trade_endpoint': 'tcp://127.0.0.1:1',
+        'order_endpoint': f'tcp://127.0.0.1:{order_port}',
+        'use_protobuf': False,
+        'latency_trace_capacity': 50,
+        'latency_trace_sample': 10,
+        'risk_management': {'enabled': True, 'initial_capital': 1e9, 'max_positions': 10},
+    })
+    engine.add_strategy(QuietStrategy('quiet', {'symbol': 'BTCUSDT'}))
+    engine.add_strategy(OrderingStrategy('orders', {'symbol': 'BTCUSDT'}))
+    tracer = engine.latency_tracer
+    try:
+        deadline = time.time() + 5
+        while engine.md_sub.poll(0) == 0 and time.time() < deadline:
+            pub.send_multipart([b"md.BTCUSDT", encode_market_data('BTCUSDT', 100.0, 1.0, 0, 0, 'okx')])
+            time.sleep(0.05)
+        while engine._process_market_data():
+            pass
+        tracer.reset()
+
+        for seq in range(1, 101):
+            pub.send_multipart([b"md.BTCUSDT",
+                                encode_market_data('BTCUSDT', 100.0, 1.0, seq, time.time_ns(), 'okx')])
+        time.sleep(0.3)
+        while engine._process_market_data():
+            pass
+
+        summary = tracer.summary()
+        for name in ('decode', 'feed', 'encode', 'send', 'queue/quiet', 'strategy/quiet',
+                     'queue/orders', 'strategy/orders', 'risk/orders'):
+            assert summary[name]['count'] > 0, name
+        assert summary['tick_to_order/orders']['count'] == 100
+        assert 'tick_to_order/quiet' not in summary
+        assert summary['strategy/orders']['count'] == 100
+        ticks = summary['tick_to_order/orders']
+        assert 0 < ticks['p50_us'] <= ticks['p99_us'] <= ticks['max_us']
+
+        trace = tracer.trace()
+        assert len(trace) == 50
+        orders = [entry for entry in trace if entry['kind'] == 'order']
+        samples = [entry for entry in trace if entry['kind'] == 'tick']
+        assert orders and samples
+        for entry in orders:
+            assert entry['strategy_id'] == 'orders' and entry['order_id'].startswith('orders_')
+            assert entry['risk_ns'] > 0
+            parts = entry['queue_ns'] + entry['strategy_ns'] + entry['encode_ns'] + entry['send_ns']
+            assert parts <= entry['tick_to_order_ns']
+
+        received = 0
+        while pull.poll(100):
+            pull.recv()
+            received += 1
+        assert received >= 100
+    finally:
+        engine.stats['start_time'] = time.time()
+        engine._shutdown()
+        pull.close(linger=0)
+        pub.close(linger=0)
+        context.term()
+
+    print(f"✓ engine stage tracing (tick-to-order p50 {ticks['p50_us']:.0f}us, "
+          f"p99 {ticks['p99_us']:.0f}us)")
+
+
+def _filled_tracer() -> LatencyTracer:
+    tracer = LatencyTracer(trace_capacity=8)
+    for value in (1500, 2500, 80000):
+        tracer.histogram('tick_to_order', 's').record(value)
+    tracer.histogram('encode').record(900)
+    return tracer
+
+
+def test_sigusr1_dump():
+    """SIGUSR1 在后台线程写出统计和追踪记录"""
+    tracer = _filled_tracer()
+    tracer._append_trace(('order', 's', 'BTCUSDT', 's_1', 1, 2, 3, 4, 5, 15))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'trace.jsonl')
+        previous = signal.getsignal(signal.SIGUSR1)
+        try:
+            assert tracer.install_signal_handler(path)
+            os.kill(os.getpid(), signal.SIGUSR1)
+            deadline = time.time() + 5
+            lines = []
+            while len(lines) < 2 and time.time() < deadline:
+                time.sleep(0.05)
+                if os.path.exists(path):
+                    with open(path, encoding='utf-8') as f:
+                        lines = f.read().splitlines()
+        finally:
+            signal.signal(signal.SIGUSR1, previous)
+
+        header = json.loads(lines[0])
+        assert header['latency']['tick_to_order/s']['count'] == 3
+        assert json.loads(lines[1])['order_id'] == 's_1'
+
+    print("✓ sigusr1 dump")
+
+
+def test_prometheus_export():
+    """抓取时把直方图转换为 Prometheus 直方图和分位数"""
+    registry = CollectorRegistry()
+    tracer = _filled_tracer()
+    for value in (30_000, 2_000_000):
+        tracer.histogram('strategy', 's').record(value)
+    EngineMetrics().register_latency_tracer(tracer, registry)
+    text = generate_latest(registry).decode()
+
+    assert 'engine_stage_latency_us_bucket{le="2",stage="tick_to_order",strategy_id="s"} 1.0' in text
+    assert 'engine_stage_latency_us_bucket{le="5",stage="tick_to_order",strategy_id="s"} 2.0' in text
+    assert 'engine_stage_latency_us_bucket{le="+Inf",stage="tick_to_order",strategy_id="s"} 3.0' in text
+    assert 'engine_stage_latency_us_count{stage="encode",strategy_id=""} 1.0' in text
+    assert 'engine_stage_latency_quantile_us{quantile="0.99",stage="tick_to_order",strategy_id="s"}' in text
+
+    # 策略回调阶段同时按毫秒导出
+    assert 'engine_strategy_latency_ms_bucket{le="0.05",strategy_id="s"} 1.0' in text
+    assert 'engine_strategy_latency_ms_bucket{le="1",strategy_id="s"} 1.0' in text
+    assert 'engine_strategy_latency_ms_bucket{le="5",strategy_id="s"} 2.0' in text
+    assert 'engine_strategy_latency_ms_count{strategy_id="s"} 2.0' in text
+
+    print("✓ prometheus export")
+
+
+if __name__ == "__main__":
+    test_histogram_accuracy()
+    test_engine_stage_tracing()
+    test_sigusr1_dump()
+    test_prometheus_export()
@@ -0,0 +1,132 @@
+"""
+测试 ML 策略 - 引擎批量推理下单、模型热更新
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tempfile
+import threading
+import time
+import numpy as np
+import zmq
+
+from strategy.base_strategy import MarketData
+from strategy.engine import StrategyEngine
+from strategy.factors.ml_factor import MLFactor
+from strategy.strategies.ml_strategy import MLStrategy
+from proto.fast_codec import encode_market_data
+
+FEATURES = ['returns', 'volatility', 'rsi_14', 'macd']
+
+
+def _train(model_dir: str, factor_id: str, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    n = 400
+    features = {
+        'returns': rng.normal(0, 0.01, n),
+        'volatility': rng.uniform(0.001, 0.02, n),
+        'rsi_14': rng.uniform(20, 80, n),
+        'macd': rng.normal(0, 50, n),
+    }
+    labels = (features['returns'] + rng.normal(0, 0.005, n) > 0).astype(int)
+    MLFactor(factor_id, {'feature_names': FEATURES, 'model_dir': model_dir}).train(features, labels)
+
+
+def _strategy(model_dir: str, **config) -> MLStrategy:
+    return MLStrategy('ml', {'symbols': ['BTCUSDT', 'ETHUSDT'], 'feature_names': FEATURES,
+                             'model_dir': model_dir, 'confidence_threshold': 0.0, **config})
+
+
+def test_batched_strategy_sends_orders():
+    """引擎注入批处理器时，周期末 flush 的回调通过 send_order 下单"""
+    with tempfile.TemporaryDirectory() as model_dir:
+        _train(model_dir, 'ml_ml_factor')
+        strategy = _strategy(model_dir)
+        assert strategy.ml_factor.is_trained
+
+        context = zmq.Context()
+        md_pub = context.socket(zmq.PUB)
+        md_pub.setsockopt(zmq.SNDHWM, 0)
+        md_port = md_pub.bind_to_random_port('tcp://127.0.0.1')
+        order_pull = context.socket(zmq.PULL)
+        order_port = order_pull.bind_to_random_port('tcp://127.0.0.1')
+        engine = StrategyEngine({
+            'md_endpoints': [f'tcp://127.0.0.1:{md_port}'],
+            'trade_endpoint': 'tcp://127.0.0.1:1',
+            'order_endpoint': f'tcp://127.0.0.1:{order_port}',
+            'symbols': ['PROBE'],
+            'use_protobuf': False,
+            'poll_timeout_ms': 50,
+        })
+        engine.add_strategy(strategy)
+        assert strategy.inference_batcher is engine.inference_batcher
+
+        thread = threading.Thread(target=engine.run, daemon=True)
+        thread.start()
+        try:
+            # 订阅建立前发布的消息会丢失：发送探测行情直到引擎收到
+            deadline = time.time() + 5
+            while engine.stats['md_count'] == 0 and time.time() < deadline:
+                md_pub.send_multipart([b"md.PROBE", encode_market_data('PROBE', 1.0, 1.0, 0, 0, 'okx')])
+                time.sleep(0.05)
+            assert engine.stats['md_count'] > 0
+
+            rng = np.random.default_rng(3)
+            price = 100.0
+            for seq in range(1, 61):
+                price *= 1 + rng.normal(0, 0.01)
+                for symbol in ('BTCUSDT', 'ETHUSDT'):
+                    md_pub.send_multipart([f"md.{symbol}".encode(),
+                                           encode_market_data(symbol, price, 1.0 + seq, seq, seq, 'okx')])
+
+            orders = []
+            deadline = time.time() + 5
+            while not {'BTCUSDT', 'ETHUSDT'} <= {o['symbol'] for o in orders} and time.time() < deadline:
+                if order_pull.poll(100):
+                    orders.append(order_pull.recv_json())
+            assert {'BTCUSDT', 'ETHUSDT'} <= {o['symbol'] for o in orders}
+            assert all(o['strategy_id'] == 'ml' for o in orders)
+            assert engine.inference_batcher.stats['batches'] > 0
+        finally:
+            engine.running = False
+            thread.join(timeout=5)
+            context.destroy(linger=0)
+
+    print("✓ batched ML strategy sends orders")
+
+
+def test_hot_reload_swaps_model():
+    """hot_reload 时后台发现新版本，下一条行情处理前替换"""
+    with tempfile.TemporaryDirectory() as model_dir:
+        _train(model_dir, 'ml_ml_factor')
+        strategy = _strategy(model_dir, hot_reload=True, reload_interval=0.05)
+        watcher = strategy.model_watcher
+        try:
+            assert strategy.ml_factor.model_version == 'v0001'
+            _train(model_dir, 'ml_ml_factor', seed=1)
+
+            deadline = time.time() + 5
+            while watcher._pending is None and time.time() < deadline:
+                time.sleep(0.01)
+            assert watcher._pending is not None
+            # 暂存后仍使用旧模型，直到策略处理下一条行情
+            assert strategy.ml_factor.model_version == 'v0001'
+
+            # 不关注的交易对不触发替换
+            strategy.on_market_data(MarketData('OTHERUSDT', 100.0, 1.0, 1, 1, 'okx'))
+            assert strategy.ml_factor.model_version == 'v0001'
+
+            strategy.on_market_data(MarketData('BTCUSDT', 100.0, 1.0, 1, 1, 'okx'))
+            assert strategy.ml_factor.model_version == 'v0002'
+            assert watcher.stats['swaps'] == 1 and watcher.stats['rejected'] == 0
+        finally:
+            watcher.stop(timeout=5)
+
+    print("✓ hot reload swaps model")
+
+
+if __name__ == "__main__":
+    test_batched_strategy_sends_orders()
+    test_hot_reload_swaps_model()
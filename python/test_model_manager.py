@@ -0,0 +1,119 @@
+"""
+测试 ModelManager - 版本化模型库
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import json
+import pickle
+import tempfile
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from strategy.factors.model_manager import ModelManager
+from strategy.factors.ml_factor import MLFactor
+
+
+def test_versions_and_rollback():
+    """每次保存生成新版本，latest 指针可回滚，内容相同不重复发布"""
+    with tempfile.TemporaryDirectory() as model_dir:
+        manager = ModelManager(model_dir)
+
+        path_1 = manager.save_model({'w': 1}, 'm', {'note': 'first'})
+        path_2 = manager.save_model({'w': 2}, 'm', {'note': 'second'})
+        assert manager.list_versions('m') == ['v0001', 'v0002']
+        assert manager.get_latest_version('m') == 'v0002'
+        assert manager.load_model('m')[0] == {'w': 2}
+        assert manager.get_model_info('m')['note'] == 'second'
+
+        # 相同内容返回已有版本
+        assert manager.save_model({'w': 2}, 'm') == path_2
+
+        assert manager.rollback('m') == 'v0001'
+        assert manager.load_model('m')[0] == {'w': 1}
+        assert manager.load_model('m', 'v0002')[0] == {'w': 2}
+        manager.set_latest('m', 'v0002')
+        assert manager.get_latest_version('m') == 'v0002'
+
+        # 已发布版本不被修改，也没有残留的临时目录
+        assert os.path.exists(os.path.join(path_1, 'model.pkl'))
+        assert not [d for d in os.listdir(os.path.join(model_dir, 'm')) if d.startswith('.tmp')]
+        assert manager.list_models() == ['m']
+
+    print("✓ versions and rollback")
+
+
+def test_verify_and_mmap_arrays():
+    """数组以只读内存映射加载，sha256 校验能发现被篡改的文件"""
+    with tempfile.TemporaryDirectory() as model_dir:
+        manager = ModelManager(model_dir)
+        weights = np.arange(12, dtype=np.float32).reshape(3, 4)
+        path = manager.save_model(None, 'arr', arrays={'weights': weights})
+
+        artifact = manager.load_artifact('arr')
+        loaded = artifact.array('weights')
+        assert isinstance(loaded, np.memmap)
+        assert not loaded.flags.writeable
+        np.testing.assert_array_equal(loaded, weights)
+        assert manager.verify('arr')
+
+        np.save(os.path.join(path, 'arrays', 'weights.npy'), weights + 1)
+        assert not manager.verify('arr')
+
+    print("✓ verify and mmap arrays")
+
+
+def test_ml_factor_lazy_load():
+    """MLFactor 加载时只读数组，model.pkl 在访问 model 时才反序列化"""
+    rng = np.random.default_rng(0)
+    names = ['returns', 'volatility', 'rsi_14']
+    features = {name: rng.normal(size=500) for name in names}
+    labels = (features['returns'] + rng.normal(0, 0.5, 500) > 0).astype(int)
+
+    with tempfile.TemporaryDirectory() as model_dir:
+        config = {'feature_names': names, 'model_dir': model_dir}
+        trained = MLFactor('lazy', config)
+        trained.train(features, labels)
+
+        loaded = MLFactor('lazy', {**config, 'load_model': True})
+        assert loaded.is_trained
+        assert loaded._model is None and loaded.compiled is not None
+
+        X = rng.normal(size=(20, 3))
+        for a, b in zip(trained.predict_batch(X), loaded.predict_batch(X)):
+            np.testing.assert_array_equal(a, b)
+        assert loaded._model is None
+
+        # 访问 model 时反序列化
+        assert isinstance(loaded.model, RandomForestClassifier)
+        np.testing.assert_array_equal(loaded.scaler.mean_, trained.scaler.mean_)
+
+    print("✓ ml factor lazy load")
+
+
+def test_legacy_layout():
+    """旧格式 model_dir/<model_id>/model.pkl 仍可加载"""
+    with tempfile.TemporaryDirectory() as model_dir:
+        legacy = os.path.join(model_dir, 'old')
+        os.makedirs(legacy)
+        with open(os.path.join(legacy, 'model.pkl'), 'wb') as f:
+            pickle.dump({'w': 0}, f)
+        with open(os.path.join(legacy, 'metadata.json'), 'w') as f:
+            json.dump({'model_id': 'old'}, f)
+
+        manager = ModelManager(model_dir)
+        model, metadata = manager.load_model('old')
+        assert model == {'w': 0} and metadata['model_id'] == 'old'
+        assert manager.get_model_info('old')['model_id'] == 'old'
+        assert manager.load_compiled('old') is None
+        assert manager.list_models() == ['old']
+
+    print("✓ legacy layout")
+
+
+if __name__ == "__main__":
+    test_versions_and_rollback()
+    test_verify_and_mmap_arrays()
+    test_ml_factor_lazy_load()
+    test_legacy_layout()
@@ -0,0 +1,114 @@
+"""
+测试 ModelWatcher - 模型热更新与回滚
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tempfile
+import numpy as np
+from strategy.factors.ml_factor import MLFactor
+from strategy.factors.model_watcher import ModelWatcher
+
+NAMES = ['returns', 'volatility', 'rsi_14']
+
+
+def _train(factor: MLFactor, seed: int, y_fn=None):
+    rng = np.random.default_rng(seed)
+    features = {name: rng.normal(size=400) for name in NAMES}
+    score = features['returns'] + rng.normal(0, 0.5, 400)
+    labels = y_fn(score) if y_fn else (score > 0).astype(int)
+    factor.train(features, labels)
+
+
+def test_swap_between_ticks():
+    """新版本在后台加载，apply_pending 时才替换"""
+    with tempfile.TemporaryDirectory() as model_dir:
+        config = {'feature_names': NAMES, 'model_dir': model_dir}
+        _train(MLFactor('hot', config), seed=0)
+
+        live = MLFactor('hot', {**config, 'load_model': True})
+        watcher = ModelWatcher(live, probation_ticks=2)
+        assert live.model_version == 'v0001'
+        assert not watcher.check()
+
+        _train(MLFactor('hot', config), seed=1)
+        assert watcher.check()
+        # 暂存后仍使用旧模型
+        assert live.model_version == 'v0001'
+
+        assert watcher.apply_pending()
+        assert live.model_version == 'v0002'
+        assert live._model is None  # 替换时未反序列化 model.pkl
+        assert watcher.stats['swaps'] == 1
+
+        # 观察期内无异常，结束后不再回滚
+        for _ in range(3):
+            watcher.apply_pending()
+        assert watcher._previous is None
+
+    print("✓ swap between ticks")
+
+
+def test_reject_and_rollback():
+    """检查失败的版本不替换并回退 latest；观察期内推理异常则恢复旧模型"""
+    with tempfile.TemporaryDirectory() as model_dir:
+        config = {'feature_names': NAMES, 'model_dir': model_dir}
+        _train(MLFactor('hot', config), seed=0)
+        live = MLFactor('hot', {**config, 'load_model': True})
+        watcher = ModelWatcher(live)
+
+        # 类别改变（三分类）的模型被拒绝
+        _train(MLFactor('hot', config), seed=1, y_fn=lambda s: np.digitize(s, [-0.5, 0.5]))
+        assert not watcher.check()
+        assert watcher.stats['rejected'] == 1
+        assert live.model_manager.get_latest_version('hot') == 'v0001'
+
+        # 正常版本替换后推理异常 -> 回滚
+        _train(MLFactor('hot', config), seed=2)
+        assert watcher.check() and watcher.apply_pending()
+        assert live.model_version == 'v0003'
+
+        def broken(X):
+            raise RuntimeError("corrupted model")
+        live.compiled.predict_proba = broken
+        assert live.calculate_latest({name: 0.0 for name in NAMES}).metadata.get('error')
+
+        watcher.apply_pending()
+        assert live.model_version == 'v0001'
+        assert watcher.stats['rollbacks'] == 1
+        assert live.model_manager.get_latest_version('hot') == 'v0001'
+        assert live.calculate_latest({name: 0.0 for name in NAMES}).metadata.get('error') is None
+        # 已回滚的版本不再尝试
+        assert not watcher.check()
+
+    print("✓ reject and rollback")
+
+
+def test_background_thread():
+    """后台线程自动发现新版本"""
+    with tempfile.TemporaryDirectory() as model_dir:
+        config = {'feature_names': NAMES, 'model_dir': model_dir}
+        _train(MLFactor('hot', config), seed=0)
+        live = MLFactor('hot', {**config, 'load_model': True})
+
+        watcher = ModelWatcher(live, interval=0.01)
+        watcher.start()
+        try:
+            _train(MLFactor('hot', config), seed=1)
+            for _ in range(500):
+                if watcher.apply_pending():
+                    break
+                watcher._stop.wait(0.01)
+        finally:
+            watcher.stop(timeout=5)
+        assert live.model_version == 'v0002'
+
+    print("✓ background thread")
+
+
+if __name__ == "__main__":
+    test_swap_between_ticks()
+    test_reject_and_rollback()
+    test_background_thread()
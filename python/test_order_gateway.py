@@ -0,0 +1,227 @@
+"""
+测试非阻塞订单发送与异步日志 - 高水位重试队列、拒绝与过期、后台线程写日志、引擎补发
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import json
+import logging
+import threading
+import time
+import zmq
+
+from strategy import async_logging
+from strategy.async_logging import setup_async_logging, stop_async_logging, JsonFormatter
+from strategy.engine import StrategyEngine, OrderGateway
+from strategy.base_strategy import BaseStrategy, MarketData, Order, Trade
+from proto.fast_codec import encode_market_data
+
+
+def _free_endpoint() -> str:
+    """一个当前没有监听者的本地端点"""
+    context = zmq.Context()
+    socket = context.socket(zmq.PULL)
+    port = socket.bind_to_random_port('tcp://127.0.0.1')
+    socket.close(linger=0)
+    context.term()
+    return f'tcp://127.0.0.1:{port}'
+
+
+def _order(i: int) -> Order:
+    return Order(f"s_{i}", 's', 'BTCUSDT', 100.0 + i, 1, 'BUY', i)
+
+
+def _recv_all(socket: zmq.Socket, count: int, timeout: float = 5.0) -> list:
+    received = []
+    deadline = time.time() + timeout
+    while len(received) < count and time.time() < deadline:
+        if socket.poll(100):
+            received.append(socket.recv_json()['order_id'])
+    return received
+
+
+def test_noblock_send_and_retry():
+    """高水位时订单进入重试队列而不阻塞，对端就绪后按原顺序补发"""
+    endpoint = _free_endpoint()
+    gateway = OrderGateway(endpoint, use_protobuf=False, sndhwm=5, pending_timeout_ms=5000)
+    try:
+        start = time.perf_counter()
+        assert all(gateway.send_order(_order(i)) for i in range(50))
+        elapsed = time.perf_counter() - start
+        assert elapsed < 1.0, elapsed
+        assert gateway.stats['hwm_hits'] == len(gateway.pending) > 0
+        assert gateway.stats['orders_sent'] + len(gateway.pending) == 50
+        # socket 不可写时补发不会阻塞
+        assert gateway.flush_pending() == 0
+
+        context = zmq.Context()
+        pull = context.socket(zmq.PULL)
+        pull.bind(endpoint)
+        try:
+            received = []
+            deadline = time.time() + 5
+            while len(received) < 50 and time.time() < deadline:
+                gateway.flush_pending()
+                while pull.poll(10):
+                    received.append(pull.recv_json()['order_id'])
+            assert received == [f"s_{i}" for i in range(50)]
+            assert not gateway.pending
+            assert gateway.stats['orders_retried'] == gateway.stats['hwm_hits']
+            assert gateway.stats['orders_sent'] == 50
+        finally:
+            pull.close(linger=0)
+            context.term()
+    finally:
+        gateway.socket.close(linger=0)
+        gateway.context.term()
+
+    print(f"✓ noblock send and retry ({gateway.stats['hwm_hits']} HWM hits, {elapsed * 1000:.1f}ms)")
+
+
+def test_retry_queue_full_and_expiry():
+    """重试队列满时拒绝新订单，排队超时的订单不再发出"""
+    gateway = OrderGateway(_free_endpoint(), use_protobuf=False, sndhwm=1,
+                           max_pending=3, pending_timeout_ms=50)
+    try:
+        results = [gateway.send_order(_order(i)) for i in range(10)]
+        queued = gateway.stats['hwm_hits']
+        assert queued == 3
+        assert results.count(False) == gateway.stats['orders_rejected'] > 0
+        assert results[-1] is False
+
+        time.sleep(0.1)
+        assert gateway.flush_pending() == 0
+        assert gateway.stats['orders_expired'] == 3 and not gateway.pending
+    finally:
+        gateway.socket.close(linger=0)
+        gateway.context.term()
+
+    print("✓ retry queue full and expiry")
+
+
+class ListHandler(logging.Handler):
+
+    def __init__(self, block: threading.Event = None):
+        super().__init__()
+        self.lines = []
+        self.threads = set()
+        self.block = block
+
+    def emit(self, record):
+        if self.block is not None:
+            self.block.wait()
+        self.threads.add(threading.get_ident())
+        self.lines.append(self.format(record))
+
+
+def test_async_logging():
+    """日志在后台线程格式化写出，结构化字段输出为 JSON；队列满时丢弃计数"""
+    root = logging.getLogger()
+    original = list(root.handlers)
+    original_level = root.level
+    handler = ListHandler()
+    handler.setFormatter(JsonFormatter())
+    queue_handler = setup_async_logging([handler], level=logging.INFO)
+    try:
+        assert root.handlers == [queue_handler]
+        assert setup_async_logging() is queue_handler
+        order_logger = logging.getLogger('strategy.engine')
+        order_logger.info("[Order] %s %s", 'BUY', 1, extra={'event': {'event': 'order', 'order_id': 's_1'}})
+    finally:
+        stop_async_logging()
+    # 停止后后台线程的处理器回到根 logger
+    assert root.handlers == [handler]
+
+    entry = json.loads(handler.lines[0])
+    assert entry['message'] == "[Order] BUY 1"
+    assert entry['event'] == 'order' and entry['order_id'] == 's_1'
+    assert threading.get_ident() not in handler.threads
+
+    # 写盘卡住时调用线程不阻塞，超出队列容量的记录被丢弃
+    block = threading.Event()
+    slow = ListHandler(block)
+    queue_handler = setup_async_logging([slow], queue_size=10)
+    try:
+        start = time.perf_counter()
+        for i in range(100):
+            logging.getLogger('test').warning("record %d", i)
+        elapsed = time.perf_counter() - start
+        assert queue_handler.dropped >= 89
+    finally:
+        block.set()
+        stop_async_logging()
+        root.handlers[:] = original
+        root.setLevel(original_level)
+    assert async_logging._handler is None
+    assert elapsed < 1.0, elapsed
+
+    print(f"✓ async logging ({queue_handler.dropped} dropped, {elapsed * 1000:.1f}ms for 100 records)")
+
+
+class BurstStrategy(BaseStrategy):
+    """收到第一条行情时连续下单"""
+
+    def __init__(self, strategy_id: str, config: dict):
+        super().__init__(strategy_id, config)
+        self.symbol = config['symbol']
+        self.fired = False
+
+    def on_market_data(self, md: MarketData):
+        if not self.fired:
+            self.fired = True
+            for _ in range(20):
+                self.send_order(md.symbol, 'BUY', md.last_price, 1)
+
+    def on_trade(self, trade: Trade):
+        pass
+
+
+def test_engine_flushes_pending_orders():
+    """引擎在订单 socket 可写时补发重试队列中的订单"""
+    context = zmq.Context()
+    md_pub = context.socket(zmq.PUB)
+    md_port = md_pub.bind_to_random_port('tcp://127.0.0.1')
+    order_endpoint = _free_endpoint()
+    engine = StrategyEngine({
+        'md_endpoints': [f'tcp://127.0.0.1:{md_port}'],
+        'trade_endpoint': 'tcp://127.0.0.1:1',
+        'order_endpoint': order_endpoint,
+        'use_protobuf': False,
+        'poll_timeout_ms': 50,
+        'order_sndhwm': 2,
+    })
+    strategy = BurstStrategy('burst', {'symbol': 'BTCUSDT'})
+    engine.add_strategy(strategy)
+    thread = threading.Thread(target=engine.run, daemon=True)
+    thread.start()
+    pull = context.socket(zmq.PULL)
+    try:
+        deadline = time.time() + 5
+        while not strategy.fired and time.time() < deadline:
+            md_pub.send_multipart([b"md.BTCUSDT", encode_market_data('BTCUSDT', 100.0, 1.0, 1, 1, 'okx')])
+            time.sleep(0.05)
+        assert strategy.fired
+        assert engine.order_gateway.stats['hwm_hits'] > 0
+
+        pull.bind(order_endpoint)
+        received = _recv_all(pull, 20)
+        assert received == [f"burst_{i}" for i in range(1, 21)]
+    finally:
+        engine.running = False
+        thread.join(timeout=5)
+        pull.close(linger=0)
+        md_pub.close(linger=0)
+        context.term()
+    assert not thread.is_alive()
+    assert engine.order_gateway.stats['orders_retried'] == engine.order_gateway.stats['hwm_hits']
+
+    print("✓ engine flushes pending orders")
+
+
+if __name__ == "__main__":
+    test_noblock_send_and_retry()
+    test_retry_queue_full_and_expiry()
+    test_async_logging()
+    test_engine_flushes_pending_orders()
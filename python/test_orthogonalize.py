@@ -0,0 +1,145 @@
+"""
+测试因子正交化 - QR / Löwdin、分块模式和滚动模式
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pandas as pd
+from strategy.factors.orthogonalize import (
+    orthogonalize, orthogonalize_chunked, rolling_orthogonalize, RollingOrthogonalizer,
+    fit_orthogonalizer
+)
+
+
+def _make_factors(n: int = 1000, k: int = 8, seed: int = 11) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    base = rng.normal(size=(n, k))
+    # 引入较强相关性和不同量纲
+    mixed = base @ np.triu(rng.uniform(0.5, 1.5, (k, k)))
+    mixed *= np.logspace(-3, 4, k)
+    return pd.DataFrame(mixed, columns=[f'alpha{i:03d}' for i in range(k)])
+
+
+def _gram_schmidt(factors: pd.DataFrame) -> np.ndarray:
+    """原施密特正交化实现（参考）"""
+    X = factors.fillna(0).values
+    X = (X - X.mean(axis=0)) / X.std(axis=0)
+    Q = np.zeros_like(X)
+    for i in range(X.shape[1]):
+        vec = X[:, i].copy()
+        for j in range(i):
+            vec -= np.dot(vec, Q[:, j]) / (np.dot(Q[:, j], Q[:, j]) + 1e-10) * Q[:, j]
+        norm = np.linalg.norm(vec)
+        Q[:, i] = vec / norm if norm > 1e-10 else vec
+    return Q
+
+
+def test_qr_matches_gram_schmidt():
+    """QR 结果与施密特正交化一致，且列正交归一"""
+    factors = _make_factors()
+    Q = orthogonalize(factors, method='qr')
+
+    assert isinstance(Q, pd.DataFrame)
+    assert list(Q.columns) == list(factors.columns)
+    np.testing.assert_allclose(Q.values.T @ Q.values, np.eye(8), atol=1e-10)
+    np.testing.assert_allclose(Q.values, _gram_schmidt(factors), atol=1e-6)
+
+    print("✓ QR orthogonalization")
+
+
+def test_lowdin_symmetric():
+    """Löwdin 正交化：列正交归一，且与因子顺序无关"""
+    factors = _make_factors()
+    Q = orthogonalize(factors, method='lowdin').values
+    np.testing.assert_allclose(Q.T @ Q, np.eye(8), atol=1e-10)
+
+    perm = np.random.default_rng(0).permutation(8)
+    Q_perm = orthogonalize(factors.iloc[:, perm], method='lowdin').values
+    np.testing.assert_allclose(Q_perm, Q[:, perm], atol=1e-10)
+
+    print("✓ Löwdin orthogonalization")
+
+
+def test_degenerate_columns():
+    """秩亏输入：QR 中常数列和线性相关列输出为 0；Löwdin 输出为秩 rank 的部分等距矩阵"""
+    factors = _make_factors(k=4)
+    factors['const'] = 3.0
+    factors['dup'] = factors['alpha001'] * 2 - factors['alpha002']
+
+    Q = orthogonalize(factors, method='qr')
+    assert np.allclose(Q['const'], 0) and np.allclose(Q['dup'], 0)
+    np.testing.assert_allclose(Q.iloc[:, :4].values,
+                               orthogonalize(factors.iloc[:, :4]).values, atol=1e-10)
+
+    nonzero = Q.iloc[:, :4].values
+    np.testing.assert_allclose(nonzero.T @ nonzero, np.eye(4), atol=1e-10)
+    assert fit_orthogonalizer(factors, method='qr').rank == 4
+
+    # Löwdin：均值为 0，常数列为 0，Gram 矩阵是秩 4 的正交投影（非零列不再两两正交归一）
+    Q_lowdin = orthogonalize(factors, method='lowdin').values
+    assert np.isfinite(Q_lowdin).all()
+    assert fit_orthogonalizer(factors, method='lowdin').rank == 4
+    np.testing.assert_allclose(Q_lowdin.mean(axis=0), 0, atol=1e-12)
+    assert np.allclose(Q_lowdin[:, 4], 0)
+    gram = Q_lowdin.T @ Q_lowdin
+    np.testing.assert_allclose(gram @ gram, gram, atol=1e-10)
+    np.testing.assert_allclose(np.trace(gram), 4, atol=1e-10)
+    assert np.linalg.matrix_rank(Q_lowdin, tol=1e-8) == 4
+    # 输出与保留因子张成同一空间
+    X = factors.iloc[:, :4].values - factors.iloc[:, :4].values.mean(axis=0)
+    residual = Q_lowdin - X @ np.linalg.lstsq(X, Q_lowdin, rcond=None)[0]
+    assert np.abs(residual).max() < 1e-8
+
+    # 完全共线的两列共享同一方向：x 与 2x 都输出 u/√2
+    pair = pd.DataFrame({'x': factors['alpha000'], 'x2': factors['alpha000'] * 2})
+    Q_pair = orthogonalize(pair, method='lowdin').values
+    np.testing.assert_allclose(Q_pair[:, 0], Q_pair[:, 1], atol=1e-10)
+    np.testing.assert_allclose(np.linalg.norm(Q_pair, axis=0), np.sqrt(0.5), atol=1e-10)
+    Q_pair = orthogonalize(pair, method='qr').values
+    assert np.allclose(Q_pair[:, 1], 0) and np.isclose(np.linalg.norm(Q_pair[:, 0]), 1.0)
+
+    print("✓ degenerate columns")
+
+
+def test_chunked_matches_in_memory():
+    """TSQR 分块结果与一次性计算一致"""
+    X = _make_factors(n=2500).values
+
+    def chunks():
+        for start in range(0, len(X), 300):
+            yield X[start:start + 300]
+
+    for method in ('qr', 'lowdin'):
+        chunked = np.vstack(list(orthogonalize_chunked(chunks, X.shape[1], method=method)))
+        np.testing.assert_allclose(chunked, orthogonalize(X, method=method), atol=1e-9)
+
+    print("✓ chunked orthogonalization")
+
+
+def test_rolling_live_matches_batch():
+    """实盘逐根更新与回测批量滚动结果一致"""
+    X = _make_factors(n=300, k=5).values
+    batch = rolling_orthogonalize(X, window=100, method='qr', refit_every=7)
+    assert np.isnan(batch[:99]).all()
+
+    live = RollingOrthogonalizer(n_factors=5, window=100, method='qr', refit_every=7)
+    outputs = [live.update(row) for row in X]
+    assert all(out is None for out in outputs[:99])
+    np.testing.assert_allclose(np.vstack(outputs[99:]), batch[99:], atol=1e-9)
+
+    # 每根都重新拟合时，最新一行等于对窗口整体正交化后的最后一行
+    full = rolling_orthogonalize(X, window=100, method='lowdin')
+    np.testing.assert_allclose(full[-1], orthogonalize(X[-100:], method='lowdin')[-1], atol=1e-9)
+
+    print("✓ rolling orthogonalization")
+
+
+if __name__ == "__main__":
+    test_qr_matches_gram_schmidt()
+    test_lowdin_symmetric()
+    test_degenerate_columns()
+    test_chunked_matches_in_memory()
+    test_rolling_live_matches_batch()
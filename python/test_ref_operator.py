@@ -0,0 +1,64 @@
+"""
+测试 RefOperator 滚动算子 - 向量化实现与逐元素循环结果一致（含 gap 语义）
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import warnings
+import numpy as np
+from strategy.factors.ref_operator import RefOperator
+
+
+def _loop_rolling(data, window, gap, func):
+    """原逐元素实现（参考）"""
+    result = np.full(len(data), np.nan)
+    for i in range(window + gap - 1, len(data)):
+        result[i] = func(data[i - window - gap + 1:i - gap + 1])
+    return result
+
+
+def _series():
+    rng = np.random.default_rng(5)
+    prices = 50000 * np.exp(np.cumsum(rng.normal(0, 0.001, 2000)))
+    with_nan = prices.copy()
+    with_nan[[50, 300, 301, 1500]] = np.nan
+    return [prices, with_nan, np.arange(30, dtype=float)]
+
+
+def test_matches_loop():
+    """mean / std / max / min 在不同窗口和 gap 下与循环实现一致"""
+    funcs = {'mean': np.mean, 'std': np.std, 'max': np.max, 'min': np.min}
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        for data in _series():
+            for window in (1, 5, 20, 60):
+                for gap in (0, 1, 3):
+                    for name, func in funcs.items():
+                        actual = getattr(RefOperator, f'rolling_{name}')(data, window, gap)
+                        expected = _loop_rolling(data, window, gap, func)
+                        np.testing.assert_allclose(
+                            actual, expected, rtol=1e-9, atol=1e-9, equal_nan=True,
+                            err_msg=f"{name} window={window} gap={gap}"
+                        )
+
+    assert np.allclose(RefOperator.rolling_mean([1, 2, 3, 4, 5], 3)[3:], [2, 3])
+    print("✓ rolling operators match loop")
+
+
+def test_batch_api():
+    """批量接口与单窗口接口一致，前 window+gap-1 个值为 NaN"""
+    data = _series()[0]
+    batch = RefOperator.rolling_batch(data, [5, 10, 60], 'max', gap=2)
+    for window, values in batch.items():
+        np.testing.assert_array_equal(values, RefOperator.rolling_max(data, window, 2))
+        assert np.isnan(values[:window + 1]).all()
+        assert not np.isnan(values[window + 1:]).any()
+
+    print("✓ rolling batch API")
+
+
+if __name__ == "__main__":
+    test_matches_loop()
+    test_batch_api()
@@ -0,0 +1,95 @@
+"""
+测试 SequenceDataset - 零拷贝窗口与旧版 create_sequences 结果一致
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tempfile
+import numpy as np
+import pandas as pd
+import torch
+from torch.utils.data import DataLoader
+from models.sequence_dataset import SequenceDataset, save_features
+
+
+def _reference_sequences(X, y, seq_len):
+    """旧版 create_sequences（逐个复制窗口）"""
+    X_seq, y_seq = [], []
+    for i in range(seq_len, len(X)):
+        X_seq.append(X[i - seq_len:i])
+        y_seq.append(y[i])
+    return np.array(X_seq, dtype=np.float32), np.array(y_seq, dtype=np.float32)
+
+
+def _data(n=500, k=7, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.normal(size=(n, k)), rng.normal(size=n)
+
+
+def test_matches_reference():
+    """窗口、标签与逐个复制的结果一致，且窗口不复制特征"""
+    X, y = _data()
+    X_ref, y_ref = _reference_sequences(X, y, 20)
+
+    dataset = SequenceDataset(pd.DataFrame(X), y, seq_len=20)
+    assert len(dataset) == len(X_ref)
+    for i in (0, 1, 100, len(dataset) - 1, -1):
+        window, label = dataset[i]
+        np.testing.assert_array_equal(window.numpy(), X_ref[i])
+        assert label.item() == y_ref[i]
+
+    # 窗口与特征矩阵共享内存
+    assert dataset.window(5).data_ptr() == torch.from_numpy(dataset.features).data_ptr() + 5 * 7 * 4
+
+    # DataLoader 与批量 gather
+    X_loader = torch.cat([xb for xb, _ in DataLoader(dataset, batch_size=64)])
+    np.testing.assert_array_equal(X_loader.numpy(), X_ref)
+    X_batches = torch.cat([xb for xb, _ in dataset.iter_batches(64)])
+    np.testing.assert_array_equal(X_batches.numpy(), X_ref)
+
+    Xb, yb = dataset.get_batch(np.array([3, 10, 2]))
+    np.testing.assert_array_equal(Xb.numpy(), X_ref[[3, 10, 2]])
+    np.testing.assert_array_equal(yb.numpy(), y_ref[[3, 10, 2]])
+
+    print("✓ windows match reference")
+
+
+def test_memmap_file():
+    """内存映射文件不会被读入或修改"""
+    X, y = _data()
+    X_ref, y_ref = _reference_sequences(X, y, 30)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = save_features(os.path.join(tmp, 'features.npy'), X)
+        dataset = SequenceDataset.from_file(path, y, seq_len=30)
+        assert isinstance(dataset.features, np.memmap)
+
+        shuffled = list(dataset.iter_batches(50, shuffle=True, generator=torch.Generator().manual_seed(0)))
+        assert sum(len(xb) for xb, _ in shuffled) == len(X_ref)
+        for i in (0, len(dataset) - 1):
+            np.testing.assert_array_equal(dataset[i][0].numpy(), X_ref[i])
+
+        dataset.window(0).zero_()  # 写时复制，不影响文件
+        np.testing.assert_array_equal(np.load(path), X.astype(np.float32))
+
+    print("✓ memmap file")
+
+
+def test_unlabeled():
+    """无标签时只返回窗口"""
+    X, _ = _data(n=50)
+    dataset = SequenceDataset(X, seq_len=10)
+    assert len(dataset) == 40
+    assert dataset[0].shape == (10, 7)
+    X_batch, y_batch = dataset.get_batch([0, 1])
+    assert y_batch is None and X_batch.shape == (2, 10, 7)
+
+    print("✓ unlabeled")
+
+
+if __name__ == "__main__":
+    test_matches_reference()
+    test_memmap_file()
+    test_unlabeled()
@@ -0,0 +1,348 @@
+"""
+测试多进程分片 - 分片分配、共享状态、全局风控、工作进程崩溃重启
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import signal
+import tempfile
+import time
+from types import SimpleNamespace
+
+from strategy import shard_supervisor
+from strategy.shard_supervisor import (
+    assign_shards, SharedShardState, SharedRiskManager, ShardSupervisor, WorkerStatePublisher
+)
+from strategy.risk_manager import RiskConfig
+from strategy.base_strategy import BaseStrategy, MarketData, Trade, Position
+
+
+class IdleStrategy(BaseStrategy):
+
+    def __init__(self, strategy_id: str, config: dict):
+        super().__init__(strategy_id, config)
+        self.symbol = config['symbol']
+
+    def on_market_data(self, md: MarketData):
+        pass
+
+    def on_trade(self, trade: Trade):
+        pass
+
+
+class LosingStrategy(IdleStrategy):
+    """
+    第一次启动的进程在启动后（第一次查询盈亏即当日起点之后）持有一笔亏损的多头仓位
+    （重启后订单编号从新区间开始，持仓为空）
+    """
+
+    def set_order_gateway(self, gateway):
+        super().set_order_gateway(gateway)
+        self._losing = self._order_counter == 0
+        self._queried = False
+
+    def get_total_pnl(self) -> float:
+        if self._losing and self._queried and not self.portfolio.positions:
+            self.portfolio.positions[self.symbol] = Position(self.symbol, 2, 100.0, -20.0, -280.0)
+            self.portfolio.total_pnl = -280.0
+        self._queried = True
+        return super().get_total_pnl()
+
+
+def make_strategy(config: dict):
+    """工作进程中的策略工厂（模块级函数，spawn 时可 pickle）"""
+    cls = LosingStrategy if config.get('losing') else IdleStrategy
+    return cls(config['name'], {'symbol': config['symbol']})
+
+
+def test_assign_shards():
+    """symbol 分片同一交易对在同一进程；weight 分片按权重均衡"""
+    configs = [
+        {'name': 'btc_a', 'symbol': 'BTCUSDT', 'weight': 2.0},
+        {'name': 'btc_b', 'symbol': 'BTCUSDT'},
+        {'name': 'eth', 'symbol': 'ETHUSDT', 'weight': 2.0},
+        {'name': 'sol', 'symbol': 'SOLUSDT'},
+        {'name': 'bnb', 'symbol': 'BNBUSDT'},
+    ]
+    shards = assign_shards(configs, 2, 'symbol')
+    names = [[c['name'] for c in shard] for shard in shards]
+    assert names == [['btc_a', 'btc_b', 'bnb'], ['eth', 'sol']], names
+
+    shards = assign_shards(configs, 3, 'weight')
+    loads = [sum(c.get('weight', 1.0) for c in shard) for shard in shards]
+    assert sorted(loads) == [2.0, 2.0, 3.0], loads
+    assert sorted(c['name'] for shard in shards for c in shard) == sorted(c['name'] for c in configs)
+
+    # 几十个策略均衡分配
+    many = [{'name': f"s{i}", 'symbol': f"SYM{i}", 'weight': 1.0 + i % 3} for i in range(48)]
+    loads = [sum(c['weight'] for c in shard) for shard in assign_shards(many, 8, 'symbol')]
+    assert max(loads) - min(loads) <= 1.0, loads
+
+    assert assign_shards(configs[:1], 3) == [[configs[0]], [], []]
+    try:
+        assign_shards(configs, 2, 'exchange')
+        assert False
+    except ValueError:
+        pass
+
+    print("✓ assign shards")
+
+
+def test_shared_state():
+    """工作进程行 seqlock 读写，另一个句柄连接同一共享内存"""
+    state = SharedShardState.create(3)
+    try:
+        other = SharedShardState.attach(state.name, 3)
+        other.write_worker(0, pid=11, pnl=-100.0, exposure=5000.0, positions=1)
+        other.write_worker(2, pid=13, pnl=40.0, exposure=2500.0, positions=2)
+        other.write_worker(2, pnl=60.0)
+
+        row = state.read_worker(2)
+        assert row['pid'] == 13 and row['pnl'] == 60.0 and row['seq'] == 4
+        assert state.totals() == {'pnl': -40.0, 'exposure': 7500.0, 'positions': 3.0}
+        assert state.totals(exclude=0)['exposure'] == 2500.0
+
+        # 基线计入汇总，排除工作进程时其基线仍然计入
+        state.write_baseline(0, pnl=-300.0, exposure=1000.0, positions=1)
+        assert state.read_baseline(0)['seq'] == 2
+        assert state.totals() == {'pnl': -340.0, 'exposure': 8500.0, 'positions': 4.0}
+        assert state.totals(exclude=0) == {'pnl': -240.0, 'exposure': 3500.0, 'positions': 3.0}
+        assert state.read_worker(0)['pnl'] == -100.0
+
+        # 写入途中（seq 为奇数）读端重试后返回最后一次读取的值
+        state.array[1, 0] += 1
+        assert state.read_worker(0)['pnl'] == -100.0
+
+        assert not other.halted
+        state.write_control(halted=1.0)
+        assert other.halted and other.read_control()['halted'] == 1.0
+        other.close()
+    finally:
+        state.close()
+        state.unlink()
+
+    print("✓ shared state")
+
+
+def test_shared_risk_manager():
+    """全局暂停、汇总亏损和其他进程的持仓市值参与风控检查"""
+    state = SharedShardState.create(2)
+    try:
+        config = RiskConfig(max_position_pct=0.5, max_total_position_pct=0.8, daily_loss_limit=1000.0)
+        risk = SharedRiskManager(config, 100000.0, state, worker_index=0)
+        assert risk.check_daily_loss_limit()
+        assert risk.check_position_limit('BTCUSDT', 1, 40000.0)
+
+        # 另一个进程持有 50000 市值：总仓位 90000 > 80000
+        today = shard_supervisor._trading_day()
+        state.write_worker(1, exposure=50000.0, day=today, pnl=-600.0)
+        assert not risk.check_position_limit('BTCUSDT', 1, 40000.0)
+        assert risk.check_position_limit('BTCUSDT', 1, 20000.0)
+
+        # 本进程的盈亏写入后汇总亏损超限
+        assert risk.check_daily_loss_limit()
+        state.write_worker(0, day=today, pnl=-500.0)
+        assert not risk.check_daily_loss_limit()
+        # 前一天的盈亏不计入
+        state.write_worker(0, day=today - 1)
+        assert risk.check_daily_loss_limit()
+        state.write_worker(0, day=today)
+
+        state.write_worker(0, pnl=0.0)
+        state.write_control(halted=1.0)
+        assert not risk.check_daily_loss_limit()
+        state.write_control(halted=0.0)
+        assert risk.check_daily_loss_limit()
+    finally:
+        state.close()
+        state.unlink()
+
+    print("✓ shared risk manager")
+
+
+def test_day_rollover():
+    """工作进程写入当日盈亏；跨日后基线盈亏清零、亏损触发的暂停解除，持仓市值仍计入"""
+    day = [738000]
+    original = shard_supervisor._trading_day
+    shard_supervisor._trading_day = lambda: day[0]
+    engine_config = {'risk_management': {'enabled': True, 'daily_loss_limit': 1000.0}}
+    supervisor = ShardSupervisor(engine_config, [{'name': 'a', 'symbol': 'BTCUSDT'},
+                                                 {'name': 'b', 'symbol': 'ETHUSDT'}], 2, make_strategy)
+    supervisor.state = state = SharedShardState.create(2)
+    try:
+        strategy = IdleStrategy('a', {'symbol': 'BTCUSDT'})
+        strategy.portfolio.total_pnl = -5000.0   # 之前各天的累计亏损
+        engine = SimpleNamespace(strategies={'a': strategy}, stats={'md_count': 0, 'trade_count': 0})
+        publisher = WorkerStatePublisher(engine, state, 0, 0)
+        risk = SharedRiskManager(RiskConfig(daily_loss_limit=1000.0), 100000.0, state, worker_index=1)
+
+        strategy.portfolio.total_pnl -= 800.0
+        publisher.publish()
+        assert state.read_worker(0)['pnl'] == -800.0
+        # 分片 1 当天早些时候崩溃留下的亏损和仓位
+        state.write_baseline(1, day=day[0], pnl=-400.0, exposure=3000.0, positions=1)
+        supervisor.check_risk()
+        assert state.halted and not risk.check_daily_loss_limit()
+
+        # 跨日：工作进程尚未写入新一天的盈亏时也不会再次触发暂停
+        day[0] += 1
+        supervisor.check_risk()
+        assert not state.halted and risk.check_daily_loss_limit()
+        assert state.totals(day=day[0]) == {'pnl': 0.0, 'exposure': 3000.0, 'positions': 1.0}
+
+        publisher.publish()
+        assert state.read_worker(0)['pnl'] == 0.0 and state.read_worker(0)['day'] == day[0]
+        strategy.portfolio.total_pnl -= 300.0
+        publisher.publish()
+        supervisor.check_risk()
+        assert not state.halted and state.totals(day=day[0])['pnl'] == -300.0
+
+        # 手动暂停跨日后保持
+        supervisor.halt()
+        day[0] += 1
+        supervisor.check_risk()
+        assert state.halted
+    finally:
+        shard_supervisor._trading_day = original
+        state.close()
+        state.unlink()
+
+    print("✓ day rollover")
+
+
+def _wait_for(condition, timeout: float):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.1)
+    return condition()
+
+
+def test_supervisor_restarts_crashed_worker():
+    """工作进程被杀死后由监督进程重启，其他分片不受影响"""
+    engine_config = {
+        'md_endpoints': ['tcp://127.0.0.1:1'],
+        'trade_endpoint': 'tcp://127.0.0.1:1',
+        'order_endpoint': 'tcp://127.0.0.1:1',
+        'use_protobuf': False,
+        'poll_timeout_ms': 50,
+    }
+    configs = [{'name': f"s{i}", 'symbol': ['BTCUSDT', 'ETHUSDT', 'SOLUSDT'][i % 3]} for i in range(6)]
+    supervisor = ShardSupervisor(engine_config, configs, 3, strategy_factory=make_strategy,
+                                 heartbeat_interval=0.1, restart_delay=0.1)
+    assert [shard.engine_config['trade_topics'] for shard in supervisor.shards] == \
+        [['trade.BTCUSDT.'], ['trade.ETHUSDT.'], ['trade.SOLUSDT.']]
+
+    supervisor.start()
+    try:
+        def all_beating():
+            supervisor.check_workers()
+            rows = supervisor.snapshot()
+            return all(row['heartbeat'] > time.time() - 1 and row['strategies'] == 2 for row in rows)
+
+        assert _wait_for(all_beating, 60)
+        pids = [int(row['pid']) for row in supervisor.snapshot()]
+        assert pids == [shard.process.pid for shard in supervisor.shards]
+
+        os.kill(pids[1], signal.SIGKILL)
+
+        def restarted():
+            supervisor.check_workers()
+            row = supervisor.snapshot()[1]
+            return row['pid'] not in (0, pids[1]) and row['restarts'] == 1 and all_beating()
+
+        assert _wait_for(restarted, 60)
+        shards = supervisor.shards
+        assert shards[1].restarts == 1 and shards[1].exit_codes == [-signal.SIGKILL]
+        assert shards[0].restarts == 0 and shards[0].process.pid == pids[0]
+        assert shards[2].restarts == 0 and shards[2].process.pid == pids[2]
+    finally:
+        supervisor.shutdown()
+
+    assert all(not shard.process.is_alive() for shard in supervisor.shards)
+    print("✓ supervisor restarts crashed worker")
+
+
+def _crash_losing_worker(restored: bool, **config):
+    """
+    杀死持有亏损的工作进程，检查重启后汇总盈亏和持仓市值不变
+
+    restored 为新进程是否从快照恢复了持仓（恢复的持仓从基线中减去，不重复计入）
+    """
+    engine_config = {
+        'md_endpoints': ['tcp://127.0.0.1:1'],
+        'trade_endpoint': 'tcp://127.0.0.1:1',
+        'order_endpoint': 'tcp://127.0.0.1:1',
+        'use_protobuf': False,
+        'poll_timeout_ms': 50,
+        **config,
+    }
+    configs = [{'name': 'loser', 'symbol': 'BTCUSDT', 'losing': True},
+               {'name': 'idle', 'symbol': 'ETHUSDT'}]
+    supervisor = ShardSupervisor(engine_config, configs, 2, strategy_factory=make_strategy,
+                                 heartbeat_interval=0.1, restart_delay=0.1)
+    supervisor.start()
+    try:
+        def all_beating():
+            supervisor.check_workers()
+            return all(row['heartbeat'] > time.time() - 1 for row in supervisor.snapshot())
+
+        assert _wait_for(lambda: all_beating() and supervisor.state.totals()['positions'] == 1, 60)
+        before = supervisor.state.totals()
+        assert before == {'pnl': -300.0, 'exposure': 180.0, 'positions': 1.0}, before
+        if restored:
+            # 等待亏损写入周期快照
+            time.sleep(1.0)
+        pid = int(supervisor.snapshot()[0]['pid'])
+
+        os.kill(pid, signal.SIGKILL)
+
+        def restarted():
+            supervisor.check_workers()
+            row = supervisor.snapshot()[0]
+            return row['pid'] not in (0, pid) and row['restarts'] == 1 and all_beating()
+
+        assert _wait_for(restarted, 60)
+        supervisor.check_workers()
+        row = supervisor.snapshot()[0]
+        baseline = supervisor.state.read_baseline(0)
+        # 崩溃前的当日亏损保留在基线中，新进程的当日盈亏从（恢复后的）总盈亏起算
+        assert row['pnl'] == 0.0 and baseline['pnl'] == -300.0
+        if restored:
+            assert (row['exposure'], row['restored_exposure'], row['positions']) == (180.0, 180.0, 1.0)
+            assert (baseline['exposure'], baseline['positions']) == (0.0, 0.0)
+        else:
+            assert (row['exposure'], row['positions']) == (0.0, 0.0)
+            assert (baseline['exposure'], baseline['positions']) == (180.0, 1.0)
+        assert supervisor.state.totals() == before
+        # 本进程的仓位检查仍然看到崩溃前未恢复的持仓市值
+        assert supervisor.state.totals(exclude=0)['exposure'] == (0.0 if restored else 180.0)
+    finally:
+        supervisor.shutdown()
+
+
+def test_crashed_worker_loss_kept_in_totals():
+    """持有亏损的工作进程崩溃重启后，汇总盈亏和持仓市值不变"""
+    _crash_losing_worker(restored=False)
+    print("✓ crashed worker loss kept in totals")
+
+
+def test_crashed_worker_with_state_dir():
+    """配置 state_dir：快照中的持仓由新进程恢复，快照之前崩溃时仍由基线计入"""
+    with tempfile.TemporaryDirectory() as state_dir:
+        _crash_losing_worker(restored=True, state_dir=state_dir, state_codec='json', snapshot_interval=0.2)
+    # 只有启动时的快照（亏损发生在快照之后）：恢复出空仓，崩溃前的持仓全部保留在基线中
+    with tempfile.TemporaryDirectory() as state_dir:
+        _crash_losing_worker(restored=False, state_dir=state_dir, state_codec='json', snapshot_interval=0)
+    print("✓ crashed worker with state dir")
+
+
+if __name__ == "__main__":
+    test_assign_shards()
+    test_shared_state()
+    test_shared_risk_manager()
+    test_day_rollover()
+    test_supervisor_restarts_crashed_worker()
+    test_crashed_worker_loss_kept_in_totals()
+    test_crashed_worker_with_state_dir()
@@ -0,0 +1,262 @@
+"""
+测试策略状态快照 - 策略 / 风控状态往返、引擎重启后恢复快照并重放事件日志、快照损坏回退与清理
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import json
+import tempfile
+import time
+import zmq
+
+from strategy.engine import StrategyEngine
+from strategy.state_store import StateStore
+from strategy.risk_manager import RiskManager, RiskConfig
+from strategy.base_strategy import BaseStrategy, MarketData, Trade
+from strategy.strategies.ema_cross import EMACrossStrategy
+from strategy.strategies.grid_trading import GridTradingStrategy
+from strategy.strategies.momentum import MomentumStrategy
+from proto.fast_codec import encode_market_data, encode_trade
+
+
+def _md(symbol: str, price: float, volume: float = 1.0) -> MarketData:
+    return MarketData(symbol, price, volume, 0, 0, 'okx')
+
+
+def _fill(strategy_id: str, symbol: str, side: str, price: float, volume: int, seq: int) -> Trade:
+    return Trade(f"T{seq}", f"{strategy_id}_{seq}", strategy_id, symbol, side, price, volume,
+                 seq, 'FILLED', 0, '', False, 0.1, seq, 'okx-1')
+
+
+def _roundtrip(state):
+    """快照内容须能被 JSON / msgpack 编码"""
+    return json.loads(json.dumps(state))
+
+
+def test_strategy_state_roundtrip():
+    """各策略和风控的 get_state 可序列化，set_state 后状态一致"""
+    ema = EMACrossStrategy('ema', {'symbol': 'BTCUSDT', 'fast_period': 3, 'slow_period': 8})
+    grid = GridTradingStrategy('grid', {'symbol': 'BTCUSDT', 'grid_count': 4})
+    momentum = MomentumStrategy('momentum', {'symbol': 'SOLUSDT', 'lookback_period': 5})
+    for strategy in (ema, grid, momentum):
+        strategy.set_order_gateway(None)
+    for i, price in enumerate([100, 101, 103, 99, 98, 104, 107, 102]):
+        ema.ema_fast.update(price)
+        ema.ema_slow.update(price)
+        momentum.price_history.append(price)
+        momentum.volume_history.append(i + 1.0)
+    ema.last_cross = 'golden'
+    grid.initialize_grids(100.0)
+    grid.buy_grids[1].filled = True
+    momentum.in_position = True
+    ema.portfolio.update_position(_fill('ema', 'BTCUSDT', 'BUY', 100.0, 3, 1))
+    ema.portfolio.update_position(_fill('ema', 'BTCUSDT', 'SELL', 104.0, 1, 2))
+    ema._order_counter = 7
+
+    restored = [EMACrossStrategy('ema', {'symbol': 'BTCUSDT', 'fast_period': 3, 'slow_period': 8}),
+                GridTradingStrategy('grid', {'symbol': 'BTCUSDT', 'grid_count': 4}),
+                MomentumStrategy('momentum', {'symbol': 'SOLUSDT', 'lookback_period': 5})]
+    for original, copy in zip((ema, grid, momentum), restored):
+        copy.set_state(_roundtrip(original.get_state()))
+        if original is not momentum:
+            assert copy.get_state() == original.get_state(), original.strategy_id
+
+    assert restored[0].ema_slow.value == ema.ema_slow.value and restored[0].last_cross == 'golden'
+    assert restored[0].get_position('BTCUSDT').volume == 2 and restored[0].portfolio.total_pnl == ema.portfolio.total_pnl
+    assert [g.filled for g in restored[1].buy_grids] == [False, True, False, False] and restored[1].initialized
+    # 历史超过 lookback_period 时只保留最近的
+    assert restored[2].price_history == [99, 98, 104, 107, 102] and restored[2].in_position
+    assert restored[2].volume_history == [4.0, 5.0, 6.0, 7.0, 8.0]
+
+    # 订单编号只增不减（分片重启时已设置的起点不被快照覆盖）
+    ahead = EMACrossStrategy('ema', {'symbol': 'BTCUSDT'})
+    ahead._order_counter = 1_000_000_000
+    ahead.set_state(ema.get_state())
+    assert ahead._order_counter == 1_000_000_000
+
+    risk = RiskManager(RiskConfig(), 50000.0)
+    risk.update_position('BTCUSDT', 100.0, 2, 'BUY')
+    risk.update_pnl(-120.0)
+    risk.check_stop_loss_take_profit('BTCUSDT', 97.0)
+    risk_copy = RiskManager(RiskConfig(), 50000.0)
+    risk_copy.set_state(_roundtrip(risk.get_state()))
+    assert risk_copy.position_risks == risk.position_risks
+    assert risk_copy.position_risks['BTCUSDT'].should_close
+    assert (risk_copy.daily_pnl, risk_copy.daily_trades, risk_copy.current_capital) == (-120.0, 1, 49880.0)
+    assert risk_copy.last_reset_date == risk.last_reset_date
+
+    print("✓ strategy state roundtrip")
+
+
+class CountingStrategy(BaseStrategy):
+    """每 5 条行情下一单，记录收到的成交"""
+
+    def __init__(self, strategy_id: str, config: dict):
+        super().__init__(strategy_id, config)
+        self.symbol = config['symbol']
+        self.ticks = 0
+        self.fills = 0
+
+    def on_market_data(self, md: MarketData):
+        self.ticks += 1
+        if self.ticks % 5 == 0:
+            self.send_order(md.symbol, 'BUY', md.last_price, 1)
+
+    def on_trade(self, trade: Trade):
+        self.fills += 1
+
+    def get_state(self):
+        return {**super().get_state(), 'ticks': self.ticks, 'fills': self.fills}
+
+    def set_state(self, state):
+        super().set_state(state)
+        self.ticks = state['ticks']
+        self.fills = state['fills']
+
+
+def _make_engine(state_dir: str, **config):
+    engine = StrategyEngine({
+        'md_endpoints': ['tcp://127.0.0.1:1'],
+        'trade_endpoint': 'tcp://127.0.0.1:1',
+        'order_endpoint': 'tcp://127.0.0.1:1',
+        'use_protobuf': True,
+        'state_dir': state_dir,
+        'state_codec': 'json',
+        'risk_management': {'enabled': True, 'initial_capital': 1e9, 'max_positions': 10},
+        **config,
+    })
+    strategies = [EMACrossStrategy('ema', {'symbol': 'BTCUSDT', 'fast_period': 5, 'slow_period': 200}),
+                  MomentumStrategy('momentum', {'symbol': 'ETHUSDT', 'lookback_period': 10,
+                                                'breakout_threshold': 100.0}),
+                  CountingStrategy('counting', {'symbol': 'BTCUSDT'})]
+    for strategy in strategies:
+        engine.add_strategy(strategy)
+    return engine
+
+
+def _feed(engine: StrategyEngine, start: int, count: int):
+    for i in range(start, start + count):
+        engine._handle_market_data(encode_market_data('BTCUSDT', 100.0 + (i % 17) * 0.5, 1.0, i, 0, 'okx'))
+        engine._handle_market_data(encode_market_data('ETHUSDT', 50.0 + (i % 7) * 0.25, 2.0 + i % 3, i, 0, 'okx'))
+        if i % 10 == 0:
+            engine._handle_trade(encode_trade(trade_id=f"T{i}", order_id=f"counting_{i}", strategy_id='counting',
+                                              symbol='BTCUSDT', side='BUY', filled_price=100.0, filled_volume=1,
+                                              trade_time=i, status='FILLED', seq=i // 10, gateway_id='okx-1'))
+
+
+def _close(engine: StrategyEngine):
+    # 订单网关没有对端，丢弃未送达的订单
+    engine.order_gateway.socket.setsockopt(zmq.LINGER, 0)
+    engine.stats['start_time'] = time.time()
+    engine._shutdown()
+
+
+def _crash(engine: StrategyEngine):
+    """模拟崩溃：已写出的日志保留，不写最终快照"""
+    engine.state_store.close()
+    engine._journal = engine._md_journal = None
+    _close(engine)
+
+
+def _states(engine: StrategyEngine):
+    return {strategy_id: strategy.get_state() for strategy_id, strategy in engine.strategies.items()}
+
+
+def test_engine_restart_restores_state():
+    """崩溃重启：恢复快照并重放日志尾部后与崩溃前状态一致，重放中的订单不再发出"""
+    with tempfile.TemporaryDirectory() as state_dir:
+        engine = _make_engine(state_dir)
+        assert not engine.restore_state()
+        _feed(engine, 1, 400)
+        engine.save_snapshot()
+        # 快照之后的事件只在日志中
+        _feed(engine, 401, 150)
+        engine._flush_journal()
+        before = _states(engine)
+        risk_before = engine.risk_manager.get_state()
+        expected = dict(engine.trade_sequencer.expected)
+        assert before['counting']['fills'] == 55 and before['counting']['order_counter'] == 110
+        _crash(engine)
+
+        engine = _make_engine(state_dir)
+        start = time.perf_counter()
+        assert engine.restore_state()
+        elapsed = time.perf_counter() - start
+        try:
+            assert _states(engine) == before
+            assert engine.risk_manager.get_state() == risk_before
+            assert engine.trade_sequencer.expected == expected
+            assert engine.strategies['ema'].ema_slow.value is not None
+            assert engine.order_gateway.stats['orders_sent'] == 0 and not engine.order_gateway.pending
+            assert engine._holders['BTCUSDT'] == [engine.strategies['counting'].portfolio]
+            assert elapsed < 1.0
+
+            # 重放过的成交再次到达时作为重复丢弃；停机期间的成交序号跳跃被识别为缺口
+            engine._handle_trade(encode_trade(trade_id='T550', strategy_id='counting', symbol='BTCUSDT',
+                                              side='BUY', filled_price=100.0, filled_volume=1,
+                                              status='FILLED', seq=55, gateway_id='okx-1'))
+            assert engine.stats['trade_duplicates'] == 1
+            engine._handle_trade(encode_trade(trade_id='T580', strategy_id='counting', symbol='BTCUSDT',
+                                              side='BUY', filled_price=100.0, filled_volume=1,
+                                              status='FILLED', seq=58, gateway_id='okx-1'))
+            assert engine.trade_sequencer.gaps() == [('okx-1', 'BTCUSDT', 56, 57)]
+        finally:
+            _close(engine)
+
+        # 正常关闭时写最终快照，下次启动无需重放
+        engine = _make_engine(state_dir)
+        try:
+            assert engine.restore_state()
+            assert engine.strategies['counting'].fills == 56
+        finally:
+            _close(engine)
+        names = sorted(os.listdir(state_dir))
+        assert len([n for n in names if n.startswith('snapshot-')]) == 2, names
+
+    print(f"✓ engine restart restores state ({elapsed * 1000:.1f}ms)")
+
+
+def test_snapshot_fallback_and_pruning():
+    """最新快照损坏时回退到上一个并重放两者之后的日志，末尾写了一半的记录被忽略"""
+    with tempfile.TemporaryDirectory() as state_dir:
+        store = StateStore(state_dir, codec='json')
+        first = store.begin_snapshot()
+        store.write_snapshot(first, {'strategies': {}, 'value': 1})
+        store.append(['m', 'BTCUSDT', 1.0, 1.0, 0, 0, 'okx'])
+        second = store.begin_snapshot()
+        store.write_snapshot(second, {'strategies': {}, 'value': 2})
+        store.append(['m', 'BTCUSDT', 2.0, 1.0, 0, 0, 'okx'])
+        third = store.begin_snapshot()
+        store.write_snapshot(third, {'strategies': {}, 'value': 3})
+        store.append(['m', 'BTCUSDT', 3.0, 1.0, 0, 0, 'okx'])
+        store.close()
+
+        # 只保留最近两个快照及其之后的日志
+        assert sorted(os.listdir(state_dir)) == [
+            'journal-00000002.jsonl', 'journal-00000003.jsonl',
+            'snapshot-00000002.json', 'snapshot-00000003.json']
+
+        snapshot, records = StateStore(state_dir, codec='json').load()
+        assert snapshot['value'] == 3 and [r[2] for r in records] == [3.0]
+
+        with open(os.path.join(state_dir, 'snapshot-00000003.json'), 'w') as f:
+            f.write('{"version": 1, "strat')
+        with open(os.path.join(state_dir, 'journal-00000003.jsonl'), 'a') as f:
+            f.write('["m", "BTCUSDT", 4.0')
+        snapshot, records = StateStore(state_dir, codec='json').load()
+        assert snapshot['value'] == 2 and [r[2] for r in records] == [2.0, 3.0]
+
+        # 新的快照编号接在已有文件之后
+        store = StateStore(state_dir, codec='json')
+        assert store.begin_snapshot() == 4
+        store.close()
+
+    print("✓ snapshot fallback and pruning")
+
+
+if __name__ == "__main__":
+    test_strategy_state_roundtrip()
+    test_engine_restart_restores_state()
+    test_snapshot_fallback_and_pruning()
@@ -0,0 +1,301 @@
+"""
+测试成交回报去重与缺口修复 - LRU 去重、序号缺口检测、网关回放补发、回放超时重试
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import json
+import threading
+import time
+import zmq
+
+from strategy.trade_recovery import TradeDeduplicator, SequenceTracker
+from strategy.engine import StrategyEngine
+from strategy.base_strategy import BaseStrategy, MarketData, Trade
+from proto.fast_codec import encode_trade
+
+
+class FillStrategy(BaseStrategy):
+
+    def __init__(self, strategy_id: str, config: dict):
+        super().__init__(strategy_id, config)
+        self.symbol = config['symbol']
+        self.fills = []
+
+    def on_market_data(self, md: MarketData):
+        pass
+
+    def on_trade(self, trade: Trade):
+        self.fills.append(trade.trade_id)
+
+
+def test_deduplicator_lru():
+    """最近的 trade_id 去重，超出容量时淘汰最久未见的"""
+    dedup = TradeDeduplicator(capacity=3)
+    assert not any(dedup.seen(t) for t in ('a', 'b', 'c'))
+    assert dedup.seen('a')
+    # a 刚被访问过，淘汰 b
+    assert not dedup.seen('d')
+    assert len(dedup) == 3
+    assert dedup.seen('a') and dedup.seen('c') and dedup.seen('d')
+    assert not dedup.seen('b')
+    assert not dedup.seen('') and not dedup.seen('')
+
+    print("✓ deduplicator lru")
+
+
+def test_sequence_tracker():
+    """序号跳跃记录缺口，补到的序号移除，重复序号拒绝，新会话以收到的序号为起点"""
+    tracker = SequenceTracker()
+    assert tracker.observe('gw-1', 'BTCUSDT', 5)
+    assert tracker.observe('gw-1', 'BTCUSDT', 6)
+    assert not tracker.observe('gw-1', 'BTCUSDT', 6)
+    assert tracker.observe('gw-1', 'BTCUSDT', 9)
+    assert tracker.observe('gw-1', 'BTCUSDT', 12)
+    # 其他交易对 / 会话独立编号
+    assert tracker.observe('gw-1', 'ETHUSDT', 1)
+    assert tracker.observe('gw-2', 'BTCUSDT', 1)
+
+    assert tracker.gaps() == [('gw-1', 'BTCUSDT', 7, 8), ('gw-1', 'BTCUSDT', 10, 11)]
+    assert tracker.detected == 4 and tracker.missing_count == 4
+
+    assert tracker.observe('gw-1', 'BTCUSDT', 8)
+    assert not tracker.observe('gw-1', 'BTCUSDT', 8)
+    assert tracker.gaps() == [('gw-1', 'BTCUSDT', 7, 7), ('gw-1', 'BTCUSDT', 10, 11)]
+    assert tracker.recovered == 1
+
+    assert tracker.give_up('gw-1', 'BTCUSDT', 7, 10) == 2
+    assert tracker.gaps() == [('gw-1', 'BTCUSDT', 11, 11)]
+    assert tracker.observe('gw-1', 'BTCUSDT', 11)
+    assert not tracker.missing and tracker.lost == 2 and tracker.recovered == 2
+
+    print("✓ sequence tracker")
+
+
+class FakeReplayGateway:
+    """网关回放服务：按 (symbol, seq) 保存已发布的成交，只保存 first_seq 之后的"""
+
+    def __init__(self, context: zmq.Context, gateway_id: str, first_seq: int = 1):
+        self.socket = context.socket(zmq.REP)
+        self.port = self.socket.bind_to_random_port('tcp://127.0.0.1')
+        self.gateway_id = gateway_id
+        self.first_seq = first_seq
+        self.trades = {}
+        self.requests = []
+        self.running = True
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _serve(self):
+        while self.running:
+            if not self.socket.poll(50):
+                continue
+            request = json.loads(self.socket.recv())
+            self.requests.append(request)
+            seqs = [seq for (symbol, seq) in self.trades
+                    if symbol == request['symbol'] and seq >= self.first_seq]
+            header = {'gateway_id': self.gateway_id, 'first_seq': min(seqs, default=0),
+                      'last_seq': max(seqs, default=0)}
+            payloads = []
+            if request['gateway_id'] == self.gateway_id:
+                payloads = [self.trades[(request['symbol'], seq)] for seq in sorted(seqs)
+                            if request['from_seq'] <= seq <= request['to_seq']]
+            else:
+                header['error'] = 'gateway session changed'
+            header['count'] = len(payloads)
+            self.socket.send_multipart([json.dumps(header).encode()] + payloads)
+
+    def close(self):
+        self.running = False
+        self.thread.join(timeout=2)
+        self.socket.close(linger=0)
+
+
+def _trade(seq: int, gateway_id: str = 'okx-1', volume: int = 1) -> bytes:
+    return encode_trade(trade_id=f"T{gateway_id}-{seq}", order_id=f"grid_{seq}", strategy_id='grid',
+                        symbol='BTCUSDT', side='BUY', filled_price=100.0, filled_volume=volume,
+                        trade_time=seq, status='FILLED', seq=seq, gateway_id=gateway_id)
+
+
+def _drain(engine: StrategyEngine, expected: int, timeout: float = 5.0):
+    deadline = time.time() + timeout
+    received = 0
+    while received < expected and time.time() < deadline:
+        if engine.trade_sub.poll(50):
+            received += engine._process_trades()
+    assert received == expected, received
+
+
+def _recover(engine: StrategyEngine, timeout: float = 5.0):
+    """按接收循环的方式驱动非阻塞回放，直到缺口处理完或进入重试等待"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if engine._replay_gap is not None:
+            engine.poller.poll(10)
+            engine._poll_trade_replay()
+        elif engine.trade_sequencer.missing and time.monotonic() >= engine._replay_due:
+            engine._recover_trade_gaps()
+        else:
+            return
+
+
+def _make_engine(context: zmq.Context, replay_endpoint=None, **config):
+    pub = context.socket(zmq.PUB)
+    port = pub.bind_to_random_port('tcp://127.0.0.1')
+    engine = StrategyEngine({
+        'md_endpoints': ['tcp://127.0.0.1:1'],
+        'trade_endpoint': f'tcp://127.0.0.1:{port}',
+        'order_endpoint': 'tcp://127.0.0.1:1',
+        'use_protobuf': True,
+        'trade_replay_endpoint': replay_endpoint,
+        **config,
+    })
+    strategy = FillStrategy('grid', {'symbol': 'BTCUSDT'})
+    engine.add_strategy(strategy)
+
+    # 等待订阅生效
+    deadline = time.time() + 5
+    warmup = 0
+    while engine.trade_sub.poll(0) == 0 and time.time() < deadline:
+        warmup += 1
+        pub.send_multipart([b"trade.WARMUP.okx", encode_trade(trade_id=f"warmup-{warmup}", status='FILLED')])
+        time.sleep(0.05)
+    while engine._process_trades():
+        pass
+    return engine, strategy, pub
+
+
+def _close(engine: StrategyEngine, pub: zmq.Socket):
+    engine.stats['start_time'] = time.time()
+    pub.close(linger=0)
+    engine._shutdown()
+
+
+def test_engine_replays_missing_trades():
+    """丢失的成交通过回放补齐，重复的成交不重复计入持仓，网关不再保存的成交记为丢失"""
+    context = zmq.Context()
+    gateway = FakeReplayGateway(context, 'okx-1', first_seq=3)
+    engine, strategy, pub = _make_engine(context, f'tcp://127.0.0.1:{gateway.port}')
+    try:
+        for seq in range(1, 11):
+            gateway.trades[('BTCUSDT', seq)] = _trade(seq)
+        # 2 / 3 / 4 和 7 在 PUB/SUB 上丢失，5 重复到达；2 已不在网关的回放日志中
+        sent = [1, 5, 5, 6, 8, 9, 10]
+        for seq in sent:
+            pub.send_multipart([b"trade.BTCUSDT.okx", gateway.trades[('BTCUSDT', seq)]])
+        _drain(engine, len(sent))
+
+        assert engine.stats['trade_duplicates'] == 1
+        assert engine.trade_sequencer.gaps() == [('okx-1', 'BTCUSDT', 2, 4), ('okx-1', 'BTCUSDT', 7, 7)]
+        assert strategy.portfolio.positions['BTCUSDT'].volume == 6
+
+        _recover(engine)
+        assert [(r['from_seq'], r['to_seq']) for r in gateway.requests] == [(2, 4), (7, 7)]
+        assert not engine.trade_sequencer.missing
+        assert engine.trade_sequencer.recovered == 3 and engine.trade_sequencer.lost == 1
+        assert strategy.portfolio.positions['BTCUSDT'].volume == 9
+        assert sorted(strategy.fills, key=lambda t: int(t.split('-')[-1])) == \
+            [f"Tokx-1-{seq}" for seq in range(1, 11) if seq != 2]
+
+        # 回放的成交再次到达时作为重复丢弃
+        pub.send_multipart([b"trade.BTCUSDT.okx", gateway.trades[('BTCUSDT', 7)]])
+        _drain(engine, 1)
+        assert engine.stats['trade_duplicates'] == 2
+        assert strategy.portfolio.positions['BTCUSDT'].volume == 9
+
+        # 11 不在网关的回放日志中，记为丢失
+        pub.send_multipart([b"trade.BTCUSDT.okx", _trade(12)])
+        _drain(engine, 1)
+        _recover(engine)
+        assert engine.trade_sequencer.lost == 2 and not engine.trade_sequencer.missing
+
+        # 网关重启：新会话以收到的第一个序号为起点
+        gateway.gateway_id = 'okx-2'
+        pub.send_multipart([b"trade.BTCUSDT.okx", _trade(1, 'okx-2')])
+        _drain(engine, 1)
+        assert not engine.trade_sequencer.missing
+        assert strategy.portfolio.positions['BTCUSDT'].volume == 11
+    finally:
+        _close(engine, pub)
+        gateway.close()
+        context.term()
+
+    print("✓ engine replays missing trades")
+
+
+def test_replay_timeout_retries_then_gives_up():
+    """回放服务无应答时按间隔重试，达到最大次数后记为丢失"""
+    context = zmq.Context()
+    silent = context.socket(zmq.ROUTER)
+    port = silent.bind_to_random_port('tcp://127.0.0.1')
+    engine, strategy, pub = _make_engine(context, f'tcp://127.0.0.1:{port}',
+                                         trade_replay_timeout_ms=50, trade_replay_retry_ms=100,
+                                         trade_replay_max_attempts=2)
+    try:
+        for seq in (1, 4):
+            pub.send_multipart([b"trade.BTCUSDT.okx", _trade(seq)])
+        _drain(engine, 2)
+        assert engine.trade_sequencer.missing_count == 2
+
+        # 发出请求后立即返回，不等待应答：请求已到达回放端，缺口处于进行中，未消费任何应答
+        engine._recover_trade_gaps()
+        assert engine._replay_gap == ('okx-1', 'BTCUSDT', 2, 3)
+        assert silent.poll(1000)
+        request = json.loads(silent.recv_multipart()[-1])
+        assert (request['symbol'], request['from_seq'], request['to_seq']) == ('BTCUSDT', 2, 3)
+        assert engine.trade_replay.recv_reply() is None
+        assert engine.trade_sequencer.missing_count == 2 and engine._replay_attempts == 0
+
+        _recover(engine)
+        assert engine._replay_attempts == 1 and engine.trade_sequencer.missing_count == 2
+        assert engine._replay_gap is None
+
+        # 重试间隔内不再请求
+        engine._recover_trade_gaps()
+        assert engine._replay_attempts == 1
+
+        time.sleep(0.15)
+        _recover(engine)
+        assert engine.trade_sequencer.lost == 2 and not engine.trade_sequencer.missing
+        assert engine._replay_attempts == 0
+    finally:
+        _close(engine, pub)
+        silent.close(linger=0)
+        context.term()
+
+    print("✓ replay timeout retries then gives up")
+
+
+def test_no_replay_endpoint():
+    """未配置回放地址时缺口直接记为丢失，未编号的成交只按 trade_id 去重"""
+    context = zmq.Context()
+    engine, strategy, pub = _make_engine(context)
+    try:
+        assert engine.trade_replay is None
+        for data in (_trade(1), _trade(3),
+                     encode_trade(trade_id='legacy', strategy_id='grid', symbol='BTCUSDT', side='BUY',
+                                  filled_price=100.0, filled_volume=1, status='FILLED'),
+                     encode_trade(trade_id='legacy', strategy_id='grid', symbol='BTCUSDT', side='BUY',
+                                  filled_price=100.0, filled_volume=1, status='FILLED')):
+            pub.send_multipart([b"trade.BTCUSDT.okx", data])
+        _drain(engine, 4)
+        assert engine.stats['trade_duplicates'] == 1
+        assert strategy.portfolio.positions['BTCUSDT'].volume == 3
+
+        engine._recover_trade_gaps()
+        assert engine.trade_sequencer.lost == 1 and not engine.trade_sequencer.missing
+    finally:
+        _close(engine, pub)
+        context.term()
+
+    print("✓ no replay endpoint")
+
+
+if __name__ == "__main__":
+    test_deduplicator_lru()
+    test_sequence_tracker()
+    test_engine_replays_missing_trades()
+    test_replay_timeout_retries_then_gives_up()
+    test_no_replay_endpoint()
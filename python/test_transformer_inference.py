@@ -0,0 +1,151 @@
+"""
+测试 Transformer 推理 - 滚动窗口、跨交易对批处理、TorchScript 与 eager 结果一致
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import torch
+import torch.nn as nn
+from prometheus_client import CollectorRegistry, generate_latest
+from models.transformer_inference import TransformerInference, RollingFeatureWindow
+from strategy.latency import LatencyTracer
+from strategy.metrics import EngineMetrics
+from strategy.factors.transformer_factor import TransformerFactor
+from strategy.batch_inference import InferenceBatcher
+
+SEQ_LEN = 16
+N_FEATURES = 5
+
+
+class _TinyTransformer(nn.Module):
+    """与 QlibTransformer 接口相同的小模型：[batch, seq, feature] -> [batch, 1]"""
+
+    def __init__(self):
+        super().__init__()
+        self.embedding = nn.Linear(N_FEATURES, 16)
+        self.encoder = nn.TransformerEncoder(
+            nn.TransformerEncoderLayer(16, 2, 32, dropout=0.0, batch_first=True), num_layers=1
+        )
+        self.head = nn.Linear(16, 1)
+
+    def forward(self, x):
+        return self.head(self.encoder(self.embedding(x)).mean(dim=1))
+
+
+def _model():
+    torch.manual_seed(0)
+    return _TinyTransformer().eval()
+
+
+def test_rolling_window():
+    """滚动窗口始终为最近 seq_len 行且为连续视图"""
+    rng = np.random.default_rng(0)
+    rows = rng.normal(size=(50, N_FEATURES)).astype(np.float32)
+    window = RollingFeatureWindow(SEQ_LEN, N_FEATURES)
+    for t, row in enumerate(rows):
+        window.push(row)
+        assert window.ready == (t + 1 >= SEQ_LEN)
+        if window.ready:
+            np.testing.assert_array_equal(window.window(), rows[t + 1 - SEQ_LEN:t + 1])
+            assert window.window().base is window.buffer
+
+    print("✓ rolling window")
+
+
+def test_batched_matches_eager():
+    """跨交易对批量推理与逐窗口 eager 推理一致"""
+    model = _model()
+    rng = np.random.default_rng(1)
+    data = {s: rng.normal(size=(40, N_FEATURES)).astype(np.float32) for s in ('A', 'B', 'C')}
+
+    for backend in ('torchscript', 'eager'):
+        engine = TransformerInference(model, SEQ_LEN, N_FEATURES, backend=backend, max_batch=2)
+        for t in range(40):
+            for symbol, rows in data.items():
+                engine.update(symbol, rows[t])
+            if t + 1 < SEQ_LEN:
+                assert engine.predict() == {}
+                continue
+            predictions = engine.predict()
+            windows = np.stack([rows[t + 1 - SEQ_LEN:t + 1] for rows in data.values()])
+            with torch.no_grad():
+                expected = model(torch.from_numpy(windows)).numpy().reshape(-1)
+            np.testing.assert_allclose([predictions[s] for s in data], expected, rtol=1e-4, atol=1e-5)
+
+        summary = engine.latency_summary()
+        # 3 个交易对、max_batch=2：每次预测 2 次前向
+        assert summary['count'] == 2 * (40 - SEQ_LEN + 1)
+        assert 0 < summary['p50_us'] <= summary['p99_us'] <= summary['max_us'] * 1.2
+
+    print("✓ batched matches eager")
+
+
+def test_latency_exported():
+    """传入 LatencyTracer 的直方图时推理延迟随引擎延迟一起导出"""
+    tracer = LatencyTracer()
+    engine = TransformerInference(_model(), SEQ_LEN, N_FEATURES, backend='eager',
+                                  latency=tracer.histogram('inference', 'tf'))
+    rows = np.random.default_rng(3).normal(size=(SEQ_LEN + 4, N_FEATURES)).astype(np.float32)
+    for row in rows:
+        engine.update('A', row)
+        engine.predict()
+    assert engine.latency is tracer.histograms[('inference', 'tf')]
+    assert tracer.summary()['inference/tf']['count'] == 5
+
+    registry = CollectorRegistry()
+    EngineMetrics().register_latency_tracer(tracer, registry)
+    text = generate_latest(registry).decode()
+    assert 'engine_stage_latency_us_count{stage="inference",strategy_id="tf"} 5.0' in text
+
+    print("✓ latency exported")
+
+
+def test_factor_with_batcher():
+    """TransformerFactor 通过 InferenceBatcher 每周期一次前向，窗口按 K 线推进"""
+    names = [f'f{i}' for i in range(N_FEATURES)]
+    threads = torch.get_num_threads()
+    factor = TransformerFactor('tf', {'feature_names': names, 'seq_len': SEQ_LEN}, model=_model())
+    # 不修改进程级 torch 线程设置
+    assert torch.get_num_threads() == threads
+    batcher = InferenceBatcher()
+    rng = np.random.default_rng(2)
+    results = {}
+
+    for t in range(SEQ_LEN):
+        for symbol in ('A', 'B'):
+            row = {**dict(zip(names, rng.normal(size=N_FEATURES))), 'bar_time': t}
+            batcher.submit(factor, symbol, row, lambda fv, s=symbol: results.__setitem__(s, fv))
+        batcher.flush()
+        if t + 1 < SEQ_LEN:
+            assert results['A'].metadata['error'] == 'warming_up'
+
+    assert 'error' not in results['A'].metadata and 'error' not in results['B'].metadata
+    assert factor.inference.stats['calls'] == 1
+    assert factor.calculate_batch({'A': {'f0': 1.0}})['A'].metadata['error'] == 'invalid_features'
+
+    # 同一根 K 线内重复调用（如每个 tick 一次 flush）不推进窗口，也不再前向
+    window = factor.inference.windows['A'].window().copy()
+    last_bar = {**dict(zip(names, rng.normal(size=N_FEATURES))), 'bar_time': SEQ_LEN - 1}
+    for _ in range(5):
+        assert factor.calculate_batch({'A': last_bar})['A'] is results['A']
+    assert np.array_equal(factor.inference.windows['A'].window(), window)
+    assert factor.inference.stats['calls'] == 1
+
+    # 新 K 线写入一行
+    new_bar = {**dict(zip(names, rng.normal(size=N_FEATURES))), 'bar_time': SEQ_LEN}
+    value = factor.calculate_batch({'A': new_bar})['A']
+    assert 'error' not in value.metadata and value is not results['A']
+    assert np.array_equal(factor.inference.windows['A'].window()[:-1], window[1:])
+    assert factor.inference.stats['calls'] == 2
+
+    print("✓ factor with batcher")
+
+
+if __name__ == "__main__":
+    test_rolling_window()
+    test_batched_matches_eager()
+    test_latency_exported()
+    test_factor_with_batcher()
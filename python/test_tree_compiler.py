@@ -0,0 +1,109 @@
+"""
+测试树模型编译器 - 编译结果与 sklearn predict_proba 完全一致
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tempfile
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
+from sklearn.linear_model import LogisticRegression
+from strategy.factors.tree_compiler import (compile_ensemble, try_compile, CompiledTreeEnsemble,
+                                            UnsupportedModelError)
+from strategy.factors.model_manager import ModelManager
+
+
+def _data(n_classes: int = 2, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(1500, 6))
+    score = X[:, 0] + 0.5 * X[:, 1] ** 2 + rng.normal(0, 0.5, len(X))
+    if n_classes == 2:
+        y = (score > 0.5).astype(int)
+    else:
+        y = np.digitize(score, [0.0, 1.0])
+    return X, y, rng.normal(size=(300, 6))
+
+
+def test_identical_to_sklearn():
+    """RandomForest / GradientBoosting（二分类、多分类）结果与 sklearn 完全一致"""
+    models = [
+        RandomForestClassifier(n_estimators=50, max_depth=10, min_samples_leaf=10, random_state=42),
+        GradientBoostingClassifier(n_estimators=50, max_depth=5, random_state=42),
+    ]
+    for n_classes in (2, 3):
+        X, y, X_test = _data(n_classes)
+        for model in models:
+            model.fit(X, y)
+            compiled = compile_ensemble(model)
+
+            np.testing.assert_array_equal(compiled.predict_proba(X_test), model.predict_proba(X_test))
+            np.testing.assert_array_equal(compiled.predict(X_test), model.predict(X_test))
+            # 单行快速路径
+            for row in X_test[:20]:
+                np.testing.assert_array_equal(compiled.predict_proba(row.reshape(1, -1)),
+                                              model.predict_proba(row.reshape(1, -1)))
+
+    print("✓ compiled ensembles match sklearn")
+
+
+def test_missing_values_routed_like_sklearn():
+    """NaN 按节点的 missing_go_to_left 路由（训练时有 / 无缺失值），与 sklearn 一致"""
+    X, y, X_test = _data()
+    rng = np.random.default_rng(1)
+    X_missing = np.where(rng.random(X.shape) < 0.2, np.nan, X)
+    X_test = np.where(rng.random(X_test.shape) < 0.2, np.nan, X_test)
+
+    for X_train in (X, X_missing):
+        model = RandomForestClassifier(n_estimators=30, max_depth=8, random_state=0).fit(X_train, y)
+        compiled = compile_ensemble(model)
+        assert compiled.missing_left.any()
+
+        np.testing.assert_array_equal(compiled.predict_proba(X_test), model.predict_proba(X_test))
+        for row in X_test[:20]:
+            np.testing.assert_array_equal(compiled.predict_proba(row.reshape(1, -1)),
+                                          model.predict_proba(row.reshape(1, -1)))
+
+    print("✓ missing values routed like sklearn")
+
+
+def test_unsupported_model():
+    """不支持的模型抛出 UnsupportedModelError，try_compile 返回 None"""
+    X, y, _ = _data()
+    model = LogisticRegression().fit(X, y)
+    try:
+        compile_ensemble(model)
+        assert False, "expected UnsupportedModelError"
+    except UnsupportedModelError:
+        pass
+    assert try_compile(model) is None
+
+    print("✓ unsupported model")
+
+
+def test_saved_with_model():
+    """ModelManager 保存模型时同时保存编译结果"""
+    X, y, X_test = _data()
+    model = RandomForestClassifier(n_estimators=20, max_depth=6, random_state=0).fit(X, y)
+
+    with tempfile.TemporaryDirectory() as model_dir:
+        manager = ModelManager(model_dir)
+        manager.save_model({'model': model, 'scaler': None}, 'rf_test')
+
+        compiled = manager.load_compiled('rf_test')
+        assert isinstance(compiled, CompiledTreeEnsemble)
+        assert manager.get_model_info('rf_test')['compiled'] is True
+        np.testing.assert_array_equal(compiled.predict_proba(X_test), model.predict_proba(X_test))
+
+        manager.save_model({'model': 'not a tree model'}, 'other')
+        assert manager.load_compiled('other') is None
+
+    print("✓ compiled model persisted")
+
+
+if __name__ == "__main__":
+    test_identical_to_sklearn()
+    test_missing_values_routed_like_sklearn()
+    test_unsupported_model()
+    test_saved_with_model()
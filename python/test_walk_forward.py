@@ -0,0 +1,122 @@
+"""
+测试 Walk-Forward 滚动重训练 - 月度划分、并行与串行结果一致、模型发布与特征缓存
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tempfile
+import numpy as np
+import pandas as pd
+from strategy.factors.walk_forward import WalkForwardPipeline, monthly_folds, index_folds
+from strategy.factors.model_manager import ModelManager
+
+
+def _features(df):
+    """一阶动量 + 噪声特征（t 行只使用 t 及之前的数据）"""
+    close = df['close']
+    return pd.DataFrame({
+        'ret_1': close.pct_change(),
+        'ret_5': close.pct_change(5),
+        'vol_ratio': df['volume'] / df['volume'].rolling(10).mean(),
+    }, index=df.index)
+
+
+def _data(n=6000, seed=0):
+    rng = np.random.default_rng(seed)
+    # 带一阶自相关的收益率，动量特征有预测能力
+    eps = rng.normal(0, 0.01, n)
+    ret = np.zeros(n)
+    for t in range(1, n):
+        ret[t] = 0.3 * ret[t - 1] + eps[t]
+    return pd.DataFrame({
+        'timestamp': pd.date_range('2023-01-01', periods=n, freq='h'),
+        'open': 100 * np.exp(np.cumsum(ret)),
+        'high': 100 * np.exp(np.cumsum(ret)),
+        'low': 100 * np.exp(np.cumsum(ret)),
+        'close': 100 * np.exp(np.cumsum(ret)),
+        'volume': rng.uniform(1, 2, n),
+    })
+
+
+def _open_features(df):
+    """只用开盘价的特征（修改收盘价不影响特征，只影响标签）"""
+    open_ = df['open']
+    return pd.DataFrame({'ret_1': open_.pct_change(), 'ret_5': open_.pct_change(5)}, index=df.index)
+
+
+def test_no_label_leakage():
+    """horizon 大于 gap 时，训练标签不使用测试区间的价格"""
+    df = _data(n=1500)
+    fold = index_folds(len(df), n_splits=2, gap=1)[0]
+    # 测试区间收盘价整体抬高 / 压低：泄露时训练集最后几行的标签全为上涨 / 全为下跌
+    up, down = df.copy(), df.copy()
+    up.loc[fold.test_start:, 'close'] *= 100.0
+    down.loc[fold.test_start:, 'close'] /= 100.0
+
+    pipeline = WalkForwardPipeline(_open_features, model_id='wf', horizon=3, cache_dir=None,
+                                   publish=False, model_params={'n_estimators': 20})
+    result = pipeline.train_fold(up, fold, 'synthetic')
+    assert result.train_samples == fold.test_start - 3 - fold.train_start
+    np.testing.assert_array_equal(pipeline.train_fold(down, fold, 'synthetic').predictions,
+                                  result.predictions)
+
+    print("✓ no label leakage")
+
+
+def test_monthly_folds():
+    """测试区间为自然月，训练集在测试集之前且留出间隔"""
+    df = _data()
+    folds = monthly_folds(df['timestamp'], n_folds=4, min_train=1000)
+    assert [f.label for f in folds] == ['2023-06', '2023-07', '2023-08', '2023-09']
+    for fold in folds:
+        months = df['timestamp'].iloc[fold.test_start:fold.test_end].dt.to_period('M').unique()
+        assert len(months) == 1 and str(months[0]) == fold.label
+        assert fold.train_end == fold.test_start - 1
+
+    folds = index_folds(1200, n_splits=5)
+    assert folds[-1].test_end == 1200 and folds[0].test_start == 200
+
+    print("✓ monthly folds")
+
+
+def test_parallel_pipeline():
+    """并行结果与串行一致，模型发布到 ModelManager，特征按 fold 缓存"""
+    df = _data()
+    folds = monthly_folds(df['timestamp'], n_folds=3, min_train=1000)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        params = dict(model_id='wf', model_params={'n_estimators': 20},
+                      model_dir=os.path.join(tmp, 'models'), cache_dir=os.path.join(tmp, 'cache'))
+        parallel = WalkForwardPipeline(_features, n_jobs=3, **params).run(df, folds, 'synthetic')
+        serial = WalkForwardPipeline(_features, n_jobs=1, publish=False, **params).run(df, folds, 'synthetic')
+
+        for p, s in zip(parallel, serial):
+            assert p.error is None, p.error
+            assert p.metrics['ic'] == s.metrics['ic']
+            np.testing.assert_array_equal(p.predictions, s.predictions)
+        # 动量信号在样本外仍有效
+        assert np.mean([r.metrics['ic'] for r in parallel]) > 0.1
+
+        manager = ModelManager(params['model_dir'])
+        assert sorted(manager.list_models()) == ['wf_fold00', 'wf_fold01', 'wf_fold02']
+        info = manager.get_model_info('wf_fold01')
+        assert info['walk_forward']['label'] == folds[1].label
+        assert info['metrics']['ic'] == parallel[1].metrics['ic']
+        assert manager.load_compiled('wf_fold01') is not None
+
+        # 每个 fold 一个缓存条目
+        entries = os.listdir(os.path.join(params['cache_dir'], 'synthetic_walk_forward'))
+        assert len(entries) == 3
+
+        table = WalkForwardPipeline.summary(parallel)
+        assert list(table['fold'])[-1] == 'mean' and len(table) == 4
+
+    print("✓ parallel pipeline")
+
+
+if __name__ == "__main__":
+    test_monthly_folds()
+    test_parallel_pipeline()
+    test_no_label_leakage()
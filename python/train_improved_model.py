@@ -24,9 +24,14 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import TimeSeriesSplit
 import pickle
 
+from strategy.factors.factor_store import FactorStore
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 高级特征定义版本（修改 calculate_advanced_features 时递增）
+ADVANCED_FEATURES_VERSION = "1"
+
 
 def calculate_advanced_features(df):
     """计算高级特征"""
@@ -129,10 +134,19 @@ def create_improved_labels(prices, threshold=0.01):
     return labels
 
 
-def train_improved_model(df, test_size=0.2):
+def train_improved_model(df, test_size=0.2, factor_store=None, dataset_name='default'):
     """训练改进的模型"""
     logger.info("计算高级特征...")
-    features = calculate_advanced_features(df)
+    if factor_store is not None:
+        # OBV 按全样本最大值归一化，数据增长时整体重算 (warmup=None)
+        feature_df = factor_store.get_or_compute(
+            os.path.join(dataset_name, 'advanced'), df,
+            lambda d: pd.DataFrame(calculate_advanced_features(d), index=d.index),
+            version=ADVANCED_FEATURES_VERSION
+        )
+        features = {name: feature_df[name].values for name in feature_df.columns}
+    else:
+        features = calculate_advanced_features(df)
 
     # 创建特征矩阵
     feature_names = list(features.keys())
@@ -224,7 +238,11 @@ def main():
     logger.info(f"  价格范围: ${df['close'].min():,.2f} - ${df['close'].max():,.2f}")
 
     # 训练改进的模型
-    model, scaler, feature_names = train_improved_model(df, test_size=0.2)
+    factor_store = FactorStore('data/cache/factors')
+    dataset_name = os.path.splitext(os.path.basename(data_file))[0]
+    model, scaler, feature_names = train_improved_model(
+        df, test_size=0.2, factor_store=factor_store, dataset_name=dataset_name
+    )
 
     print("\n"+"="*70)
     print("训练完成！")
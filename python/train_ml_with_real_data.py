@@ -286,6 +286,10 @@ def main():
             'training_date': datetime.now().isoformat(),
             'data_file': data_file,
             'n_samples': len(labels),
+        },
+        arrays={
+            'scaler_mean': best_model.scaler.mean_,
+            'scaler_scale': best_model.scaler.scale_,
         }
     )
 
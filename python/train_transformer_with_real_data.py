@@ -18,7 +18,9 @@ TORCH_ERROR = None
 try:
     import torch
     import torch.nn as nn
-    from torch.utils.data import TensorDataset, DataLoader
+    from torch.utils.data import DataLoader
+    from models.sequence_dataset import SequenceDataset, save_features
+    from models.cpu_training import CPUTrainer, CPUTrainingConfig
     from models.qlib_transformer import QlibTransformer as QlibStyleTransformer
     from models.qlib_metrics import QlibStyleTrainer
     TORCH_AVAILABLE = True
@@ -37,6 +39,8 @@ from strategy.factors.qlib_style_data_handler import DataMasking, TimeSeriesSpli
 from strategy.factors.ref_operator import RefOperator
 from strategy.factors.alpha101 import Alpha101
 from strategy.factors.feature_engineering import FeatureEngineering
+from strategy.factors.factor_store import FactorStore
+from strategy.factors.ic_engine import ICEngine
 from models.qlib_metrics import QlibMetrics
 
 logging.basicConfig(level=logging.INFO)
@@ -47,6 +51,11 @@ if TORCH_AVAILABLE:
 else:
     logger.warning(f"PyTorch 加载失败 ({TORCH_ERROR})，将使用 RandomForest 作为备选")
 
+# 技术指标定义版本（修改 prepare_technical_features 时递增）
+TECH_FEATURES_VERSION = "1"
+# 技术指标最长回看窗口，用于 FactorStore 增量计算
+TECH_FEATURES_WARMUP = 60
+
 
 def load_historical_data(file_path):
     """加载历史数据"""
@@ -102,8 +111,8 @@ def prepare_technical_features(df):
     return features
 
 
-def prepare_alpha101_features(df, ic_threshold=0.03):
-    """准备 Alpha101 因子 (带 IC 筛选)"""
+def compute_alpha101_factors(df):
+    """计算全部 Alpha101 因子 (不筛选)"""
     logger.info("计算 Alpha101 因子...")
 
     alpha = Alpha101()
@@ -150,6 +159,26 @@ def prepare_alpha101_features(df, ic_threshold=0.03):
             logger.warning(f"Alpha{i:03d} 计算失败: {e}")
 
     logger.info(f"成功计算 {len(all_factors)} 个 Alpha101 因子")
+    return pd.DataFrame(all_factors, index=df.index)
+
+
+def prepare_alpha101_features(df, ic_threshold=0.03, factor_store=None, dataset_name='default',
+                              max_factor_corr=1.0):
+    """
+    准备 Alpha101 因子 (带 IC 筛选)
+
+    max_factor_corr < 1 时在 IC 筛选后做贪心去相关，
+    与已选因子 |相关系数| 超过该值的因子被剔除
+    """
+    if factor_store is not None:
+        # Alpha101.rank 是全序列排名，数据增长时必须整体重算 (warmup=None)
+        factors = factor_store.get_or_compute(
+            os.path.join(dataset_name, 'alpha101'), df, compute_alpha101_factors,
+            version=Alpha101.VERSION
+        )
+    else:
+        factors = compute_alpha101_factors(df)
+    all_factors = {name: factors[name].values for name in factors.columns}
 
     # IC 筛选 (如果有标签)
     if ic_threshold > 0:
@@ -160,21 +189,19 @@ def prepare_alpha101_features(df, ic_threshold=0.03):
         prices = df['close'].values
         labels = ref.returns(prices, 1)  # 下一期收益率
 
-        metrics = QlibMetrics()
-        selected_factors = {}
-
-        for name, values in all_factors.items():
-            # 移除 NaN
-            mask = ~(np.isnan(values) | np.isnan(labels))
-            if mask.sum() < 100:  # 至少需要 100 个有效样本
-                continue
+        # 批量计算所有因子的 IC (至少需要 100 个有效样本)
+        engine = ICEngine(method='pearson', min_periods=100)
+        factor_frame = pd.DataFrame(all_factors, index=df.index)
+        report = engine.evaluate(factor_frame, labels, rank=False,
+                                 factor_corr=max_factor_corr < 1.0)
+        selected = engine.select(report, ic_threshold=ic_threshold, max_corr=max_factor_corr)
 
-            # 计算 IC
-            ic = metrics.information_coefficient(values[mask], labels[mask])
-
-            if abs(ic) > ic_threshold:
-                selected_factors[name] = values
-                logger.info(f"  {name}: IC = {ic:.4f} ✓")
+        ic_values = report.ic.iloc[:, 0]
+        selected_factors = {}
+        for name in all_factors:
+            if name in selected:
+                selected_factors[name] = all_factors[name]
+                logger.info(f"  {name}: IC = {ic_values[name]:.4f} ✓")
 
         logger.info(f"筛选后保留 {len(selected_factors)} 个因子")
         return pd.DataFrame(selected_factors, index=df.index)
@@ -182,17 +209,31 @@ def prepare_alpha101_features(df, ic_threshold=0.03):
     return pd.DataFrame(all_factors, index=df.index)
 
 
-def prepare_features_and_labels(df, ic_threshold=0.03):
-    """准备完整特征集和标签"""
+def prepare_features_and_labels(df, ic_threshold=0.03, factor_store=None, dataset_name='default',
+                                max_factor_corr=1.0):
+    """
+    准备完整特征集和标签
+
+    factor_store 不为空时，技术指标和 Alpha101 因子从缓存读取，
+    数据文件在末尾新增 K 线时只计算新增部分
+    """
     logger.info("\n" + "="*70)
     logger.info("准备特征和标签")
     logger.info("="*70)
 
     # 1. 技术指标
-    tech_features = prepare_technical_features(df)
+    if factor_store is not None:
+        tech_features = factor_store.get_or_compute(
+            os.path.join(dataset_name, 'technical'), df, prepare_technical_features,
+            version=TECH_FEATURES_VERSION, warmup=TECH_FEATURES_WARMUP
+        )
+    else:
+        tech_features = prepare_technical_features(df)
 
     # 2. Alpha101 因子
-    alpha_features = prepare_alpha101_features(df, ic_threshold)
+    alpha_features = prepare_alpha101_features(
+        df, ic_threshold, factor_store, dataset_name, max_factor_corr
+    )
 
     # 3. 合并特征
     features = pd.concat([tech_features, alpha_features], axis=1)
@@ -212,51 +253,37 @@ def prepare_features_and_labels(df, ic_threshold=0.03):
 
 
 def create_sequences(X, y, seq_len=60):
-    """创建时间序列数据"""
-    X_seq, y_seq = [], []
-    for i in range(seq_len, len(X)):
-        X_seq.append(X[i-seq_len:i])
-        y_seq.append(y[i])
-    return np.array(X_seq), np.array(y_seq)
-
-
-def train_transformer(features, labels, args):
-    """训练 Transformer 模型"""
-    if not TORCH_AVAILABLE:
-        logger.error("PyTorch 未安装，无法训练 Transformer")
-        return train_randomforest_fallback(features, labels, args)
-
-    logger.info("\n" + "="*70)
-    logger.info("训练 Qlib Transformer 模型")
-    logger.info("="*70)
-
-    # 1. 时间序列分割
-    splitter = TimeSeriesSplitter()
-    X_train, X_test, y_train, y_test = splitter.split(
-        features, labels, test_size=args.test_size, gap=1
-    )
-
-    logger.info(f"训练集: {len(y_train)} 样本")
-    logger.info(f"测试集: {len(y_test)} 样本")
-
-    # 2. 创建序列数据
-    logger.info(f"创建序列数据 (seq_len={args.seq_len})...")
-    X_train_seq, y_train_seq = create_sequences(X_train, y_train, args.seq_len)
-    X_test_seq, y_test_seq = create_sequences(X_test, y_test, args.seq_len)
+    """
+    创建时间序列数据
+
+    返回 (n - seq_len, seq_len, n_features) 的只读跨步视图，不复制窗口；
+    训练时使用 SequenceDataset
+    """
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    windows = np.lib.stride_tricks.sliding_window_view(X, seq_len, axis=0)
+    return windows[:-1].transpose(0, 2, 1), np.asarray(y)[seq_len:]
+
+
+def create_sequence_datasets(X_train, X_test, y_train, y_test, args):
+    """
+    创建训练/测试序列数据集（窗口为零拷贝视图）
+
+    指定 --features-mmap 时特征先写入 .npy 文件再以内存映射方式读取
+    """
+    if getattr(args, 'features_mmap', None):
+        train_path = save_features(os.path.join(args.features_mmap, 'train_features.npy'), X_train)
+        test_path = save_features(os.path.join(args.features_mmap, 'test_features.npy'), X_test)
+        train_dataset = SequenceDataset.from_file(train_path, y_train, args.seq_len)
+        test_dataset = SequenceDataset.from_file(test_path, y_test, args.seq_len)
+    else:
+        train_dataset = SequenceDataset(X_train, y_train, args.seq_len)
+        test_dataset = SequenceDataset(X_test, y_test, args.seq_len)
+    return train_dataset, test_dataset
 
-    logger.info(f"训练序列: {X_train_seq.shape}")
-    logger.info(f"测试序列: {X_test_seq.shape}")
-
-    # 3. 创建 DataLoader
-    train_dataset = TensorDataset(
-        torch.FloatTensor(X_train_seq),
-        torch.FloatTensor(y_train_seq)
-    )
-    test_dataset = TensorDataset(
-        torch.FloatTensor(X_test_seq),
-        torch.FloatTensor(y_test_seq)
-    )
 
+def _train_eager(model, train_dataset, test_dataset, args, device):
+    """逐 epoch 在完整测试集上评估的训练循环（GPU）"""
+    # 创建 DataLoader
     train_loader = DataLoader(
         train_dataset,
         batch_size=args.batch_size,
@@ -268,24 +295,7 @@ def train_transformer(features, labels, args):
         shuffle=False
     )
 
-    # 4. 创建模型
-    device = 'cuda' if torch.cuda.is_available() else 'cpu'
-    logger.info(f"使用设备: {device}")
-
-    model = QlibStyleTransformer(
-        input_dim=features.shape[1],
-        d_model=args.d_model,
-        nhead=args.nhead,
-        num_layers=args.num_layers,
-        max_seq_len=args.seq_len,
-        dropout=args.dropout
-    )
-
-    # 统计参数量
-    n_params = sum(p.numel() for p in model.parameters() if p.requires_grad)
-    logger.info(f"模型参数量: {n_params:,}")
-
-    # 5. 训练
+    # 训练
     model = model.to(device)
     optimizer = torch.optim.Adam(
         model.parameters(),
@@ -299,7 +309,7 @@ def train_transformer(features, labels, args):
     ic_history = []
     rank_ic_history = []
     best_ic = -np.inf
-    best_epoch = 0
+    best_epoch = -1
 
     for epoch in range(args.epochs):
         # 训练阶段
@@ -364,7 +374,7 @@ def train_transformer(features, labels, args):
                        f"IC: {ic:.4f} | "
                        f"Rank IC: {rank_ic:.4f}")
 
-    # 6. 最终评估
+    # 最终评估
     logger.info("\n" + "="*70)
     logger.info("最终评估")
     logger.info("="*70)
@@ -385,6 +395,94 @@ def train_transformer(features, labels, args):
     all_preds = np.array(all_preds)
     all_labels = np.array(all_labels)
 
+    return all_preds, all_labels, ic_history, best_ic, best_epoch
+
+
+def _train_on_cpu(model, train_dataset, test_dataset, args):
+    """CPU 训练模式：线程数、bf16、torch.compile、批次预取、梯度累积、抽样验证"""
+    config = CPUTrainingConfig(
+        num_threads=args.threads,
+        bf16=args.bf16,
+        compile=args.compile,
+        batch_size=args.batch_size,
+        grad_accum_steps=args.grad_accum,
+        prefetch=args.prefetch,
+        eval_samples=args.eval_samples or None,
+    )
+    trainer = CPUTrainer(
+        model, config,
+        learning_rate=args.learning_rate,
+        weight_decay=args.weight_decay
+    )
+
+    logger.info(f"\n开始训练 (epochs={args.epochs}, CPU 模式)...")
+    history = trainer.fit(train_dataset, test_dataset, epochs=args.epochs)
+    logger.info(f"平均每轮耗时: {np.mean(history['epoch_time']):.1f}s")
+
+    # 最终评估使用完整测试集
+    logger.info("\n" + "="*70)
+    logger.info("最终评估")
+    logger.info("="*70)
+
+    all_preds = trainer.predict(test_dataset)
+    all_labels = test_dataset.labels.numpy().astype(np.float64)
+    return all_preds, all_labels, history['ic'], trainer.best_ic, trainer.best_epoch
+
+
+def train_transformer(features, labels, args):
+    """训练 Transformer 模型"""
+    if not TORCH_AVAILABLE:
+        logger.error("PyTorch 未安装，无法训练 Transformer")
+        return train_randomforest_fallback(features, labels, args)
+
+    logger.info("\n" + "="*70)
+    logger.info("训练 Qlib Transformer 模型")
+    logger.info("="*70)
+
+    # 1. 时间序列分割
+    splitter = TimeSeriesSplitter()
+    X_train, X_test, y_train, y_test = splitter.split(
+        features, labels, test_size=args.test_size, gap=1
+    )
+
+    logger.info(f"训练集: {len(y_train)} 样本")
+    logger.info(f"测试集: {len(y_test)} 样本")
+
+    # 2. 创建序列数据
+    logger.info(f"创建序列数据 (seq_len={args.seq_len})...")
+    train_dataset, test_dataset = create_sequence_datasets(X_train, X_test, y_train, y_test, args)
+
+    logger.info(f"训练序列: {len(train_dataset)} × ({args.seq_len}, {train_dataset.n_features})")
+    logger.info(f"测试序列: {len(test_dataset)} × ({args.seq_len}, {test_dataset.n_features})")
+    logger.info(f"特征内存: {(train_dataset.nbytes + test_dataset.nbytes) / 1024**2:.1f} MB")
+
+    # 3. 创建模型
+    device = 'cuda' if torch.cuda.is_available() and not args.cpu else 'cpu'
+    logger.info(f"使用设备: {device}")
+
+    model = QlibStyleTransformer(
+        input_dim=features.shape[1],
+        d_model=args.d_model,
+        nhead=args.nhead,
+        num_layers=args.num_layers,
+        max_seq_len=args.seq_len,
+        dropout=args.dropout
+    )
+
+    # 统计参数量
+    n_params = sum(p.numel() for p in model.parameters() if p.requires_grad)
+    logger.info(f"模型参数量: {n_params:,}")
+
+    # 4. 训练
+    if device == 'cpu':
+        all_preds, all_labels, ic_history, best_ic, best_epoch = _train_on_cpu(
+            model, train_dataset, test_dataset, args
+        )
+    else:
+        all_preds, all_labels, ic_history, best_ic, best_epoch = _train_eager(
+            model, train_dataset, test_dataset, args, device
+        )
+
     # 计算所有指标
     final_metrics = QlibMetrics.compute_all_metrics(all_preds, all_labels, n_quantiles=5)
 
@@ -401,7 +499,7 @@ def train_transformer(features, labels, args):
     logger.info(f"Long-Short 收益: {final_metrics['long_short_return']:.4f}")
     logger.info(f"最佳 IC: {best_ic:.4f} (Epoch {best_epoch+1})")
 
-    # 7. 保存模型
+    # 5. 保存模型
     model_dir = os.path.join(os.path.dirname(__file__), 'models')
     os.makedirs(model_dir, exist_ok=True)
 
@@ -409,7 +507,7 @@ def train_transformer(features, labels, args):
     torch.save(model.state_dict(), model_path)
     logger.info(f"\n模型已保存: {model_path}")
 
-    # 8. 导出 ONNX
+    # 6. 导出 ONNX
     try:
         from models.export_onnx import export_to_onnx
         onnx_path = os.path.join(model_dir, 'transformer_real_data.onnx')
@@ -490,8 +588,16 @@ def main():
                        help='数据文件路径')
     parser.add_argument('--ic-threshold', type=float, default=0.03,
                        help='因子筛选 IC 阈值')
+    parser.add_argument('--max-factor-corr', type=float, default=1.0,
+                       help='因子去相关阈值 (1.0 表示不去相关)')
     parser.add_argument('--test-size', type=float, default=0.2,
                        help='测试集比例')
+    parser.add_argument('--factor-cache', type=str, default='data/cache/factors',
+                       help='因子缓存目录')
+    parser.add_argument('--no-factor-cache', action='store_true',
+                       help='禁用因子缓存，每次重新计算')
+    parser.add_argument('--features-mmap', type=str, default=None,
+                       help='特征矩阵写入该目录并以内存映射方式训练（数据量大于内存时使用）')
 
     # 模型参数
     parser.add_argument('--seq-len', type=int, default=60,
@@ -515,6 +621,22 @@ def main():
     parser.add_argument('--weight-decay', type=float, default=1e-5,
                        help='权重衰减')
 
+    # CPU 训练参数
+    parser.add_argument('--cpu', action='store_true',
+                       help='有 GPU 时也使用 CPU 训练模式')
+    parser.add_argument('--threads', type=int, default=None,
+                       help='intra-op 线程数 (默认物理核数)')
+    parser.add_argument('--bf16', action='store_true',
+                       help='CPU bf16 autocast')
+    parser.add_argument('--compile', action='store_true',
+                       help='使用 torch.compile')
+    parser.add_argument('--grad-accum', type=int, default=1,
+                       help='梯度累积步数')
+    parser.add_argument('--prefetch', type=int, default=2,
+                       help='后台预取批次数 (0 表示不预取)')
+    parser.add_argument('--eval-samples', type=int, default=20000,
+                       help='每轮验证抽样数 (0 表示完整测试集)')
+
     args = parser.parse_args()
 
     logger.info("\n" + "="*70)
@@ -534,7 +656,11 @@ def main():
     df = load_historical_data(args.data)
 
     # 2. 准备特征和标签
-    features, labels = prepare_features_and_labels(df, args.ic_threshold)
+    factor_store = None if args.no_factor_cache else FactorStore(args.factor_cache)
+    dataset_name = os.path.splitext(os.path.basename(args.data))[0]
+    features, labels = prepare_features_and_labels(
+        df, args.ic_threshold, factor_store, dataset_name, args.max_factor_corr
+    )
 
     # 3. 训练模型
     model, metrics = train_transformer(features, labels, args)
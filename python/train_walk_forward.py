@@ -0,0 +1,133 @@
+"""
+Walk-Forward 滚动重训练
+
+按月划分测试区间，每个 fold 用之前的数据训练一个 ML 因子模型并做样本外评估，
+各 fold 在独立进程中并行训练，模型通过 ModelManager 发布为 <model_id>_foldNN
+
+用法：
+    python train_walk_forward.py --data data/historical/BTCUSDT_1h_365d_okx.csv --folds 12 --jobs 8
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pandas as pd
+import logging
+import argparse
+
+from strategy.factors.ref_operator import RefOperator
+from strategy.factors.walk_forward import WalkForwardPipeline, monthly_folds
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 特征定义版本（修改 compute_features 时递增）
+FEATURES_VERSION = "1"
+
+
+def load_historical_data(file_path):
+    """加载历史数据"""
+    logger.info(f"加载数据: {file_path}")
+    df = pd.read_csv(file_path)
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    df = df.sort_values('timestamp').reset_index(drop=True)
+    logger.info(f"加载 {len(df)} 条记录")
+    return df
+
+
+def compute_features(df):
+    """技术指标特征（t 行只使用 t 及之前的数据）"""
+    ref = RefOperator()
+    prices = df['close'].values
+    volumes = df['volume'].values
+    returns = ref.returns(prices, 1)
+
+    features = pd.DataFrame(index=df.index)
+    for period in [1, 5, 10]:
+        features[f'returns_{period}'] = ref.returns(prices, period)
+
+    ma = ref.rolling_batch(prices, [5, 10, 20, 60], 'mean')
+    for period, values in ma.items():
+        features[f'ma_{period}_ratio'] = prices / (values + 1e-10) - 1
+
+    vol = ref.rolling_batch(returns, [5, 10, 20], 'std')
+    for period, values in vol.items():
+        features[f'volatility_{period}'] = values
+
+    high = ref.rolling_batch(prices, [5, 10, 20], 'max')
+    low = ref.rolling_batch(prices, [5, 10, 20], 'min')
+    for period in [5, 10, 20]:
+        features[f'price_position_{period}'] = (prices - low[period]) / (high[period] - low[period] + 1e-10)
+
+    vol_ma = ref.rolling_batch(volumes, [5, 10, 20], 'mean')
+    for period, values in vol_ma.items():
+        features[f'volume_ratio_{period}'] = volumes / (values + 1e-10)
+
+    for period in [5, 10, 20]:
+        features[f'momentum_{period}'] = ref.delta(prices, period) / (prices + 1e-10)
+
+    return features
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Walk-Forward 滚动重训练')
+    parser.add_argument('--data', type=str,
+                       default='data/historical/BTCUSDT_1h_365d_okx.csv',
+                       help='数据文件路径')
+    parser.add_argument('--folds', type=int, default=12,
+                       help='月度 fold 数')
+    parser.add_argument('--train-window', type=int, default=None,
+                       help='训练窗口行数 (默认扩展窗口)')
+    parser.add_argument('--min-train', type=int, default=1000,
+                       help='最少训练样本数')
+    parser.add_argument('--jobs', type=int, default=None,
+                       help='并行进程数 (默认 CPU 核数)')
+    parser.add_argument('--model-type', type=str, default='random_forest',
+                       choices=['random_forest', 'gradient_boosting'],
+                       help='模型类型')
+    parser.add_argument('--model-id', type=str, default='btcusdt_wf',
+                       help='模型 ID 前缀')
+    parser.add_argument('--model-dir', type=str, default='models',
+                       help='模型目录')
+    parser.add_argument('--factor-cache', type=str, default='data/cache/factors',
+                       help='特征缓存目录')
+    parser.add_argument('--no-factor-cache', action='store_true',
+                       help='禁用特征缓存')
+    parser.add_argument('--no-publish', action='store_true',
+                       help='不发布模型')
+    parser.add_argument('--output', type=str, default=None,
+                       help='汇总表输出 CSV 路径')
+    args = parser.parse_args()
+
+    df = load_historical_data(args.data)
+    folds = monthly_folds(df['timestamp'], args.folds, min_train=args.min_train,
+                          train_window=args.train_window)
+    logger.info(f"Walk-forward: {len(folds)} folds ({folds[0].label} ~ {folds[-1].label})"
+                if folds else "Walk-forward: no folds")
+    if not folds:
+        return
+
+    pipeline = WalkForwardPipeline(
+        compute_features,
+        model_id=args.model_id,
+        model_type=args.model_type,
+        model_dir=args.model_dir,
+        cache_dir=None if args.no_factor_cache else args.factor_cache,
+        feature_version=FEATURES_VERSION,
+        n_jobs=args.jobs,
+        publish=not args.no_publish
+    )
+    dataset_name = os.path.splitext(os.path.basename(args.data))[0]
+    results = pipeline.run(df, folds, dataset_name)
+
+    table = WalkForwardPipeline.summary(results)
+    logger.info("\n" + table.to_string(index=False, float_format=lambda x: f"{x:.4f}"))
+
+    if args.output:
+        table.to_csv(args.output, index=False)
+        logger.info(f"汇总表已保存: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
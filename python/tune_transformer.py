@@ -0,0 +1,203 @@
+"""
+QlibTransformer 超参数搜索
+
+特征和标签只计算一次（FactorStore 缓存），写入 .npy 后由各工作进程内存映射共享；
+每个 trial 在独立进程中用 CPUTrainer 训练，每个 epoch 在验证集抽样子集上上报 IC，
+低 IC 的 trial 提前剪枝。所有 trial 记录在 <work-dir>/<study>_trials.jsonl
+
+用法：
+    python tune_transformer.py --data data/historical/BTCUSDT_1h_365d_okx.csv \
+        --strategy successive_halving --trials 27 --max-epochs 27 --jobs 8
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import logging
+import argparse
+
+# 特征流水线与训练脚本一致
+from train_transformer_with_real_data import load_historical_data, prepare_features_and_labels
+from strategy.factors.qlib_style_data_handler import TimeSeriesSplitter
+from strategy.factors.factor_store import FactorStore
+from models.hyperparameter_search import (
+    HyperparameterSearch, TrialContext, Choice, Uniform, IntUniform
+)
+
+logger = logging.getLogger(__name__)
+
+SEARCH_SPACE = {
+    'd_model': Choice([32, 64, 128, 256]),
+    'nhead': Choice([2, 4, 8]),
+    'num_layers': IntUniform(1, 4),
+    'learning_rate': Uniform(1e-5, 1e-3, log=True),
+    'seq_len': Choice([20, 40, 60, 120]),
+    'dropout': Uniform(0.0, 0.3),
+}
+
+
+def transformer_objective(trial: TrialContext):
+    """训练一个 QlibTransformer trial，每个 epoch 上报验证 IC"""
+    import torch
+    from models.sequence_dataset import SequenceDataset
+    from models.cpu_training import CPUTrainer, CPUTrainingConfig
+    from models.qlib_transformer import QlibTransformer
+
+    params = trial.params
+    torch.manual_seed(trial.seed)
+
+    train_dataset = SequenceDataset(trial.data('X_train'), trial.data('y_train'), params['seq_len'])
+    val_dataset = SequenceDataset(trial.data('X_val'), trial.data('y_val'), params['seq_len'])
+
+    model = QlibTransformer(
+        input_dim=train_dataset.n_features,
+        d_model=params['d_model'],
+        nhead=params['nhead'],
+        num_layers=params['num_layers'],
+        max_seq_len=params['seq_len'],
+        dropout=params['dropout']
+    )
+    config = CPUTrainingConfig(
+        batch_size=params['batch_size'],
+        prefetch=params['prefetch'],
+        eval_samples=params['eval_samples'],
+        seed=trial.seed,
+        log_every=10**9
+    )
+    trainer = CPUTrainer(model, config, learning_rate=params['learning_rate'],
+                         weight_decay=params['weight_decay'])
+
+    # successive halving 的下一 rung 从上一 rung 的状态继续训练
+    if trial.checkpoint is not None:
+        model.load_state_dict(trial.checkpoint['model'])
+        trainer.optimizer.load_state_dict(trial.checkpoint['optimizer'])
+
+    eval_indices = trainer.eval_indices(len(val_dataset), config.eval_samples)
+    for epoch in range(trial.start_epoch, trial.epochs):
+        trainer.train_epoch(train_dataset)
+        metrics = trainer.evaluate(val_dataset, eval_indices)
+        if trial.report(epoch, metrics['ic']):
+            break
+
+    trial.save_checkpoint({'model': model.state_dict(), 'optimizer': trainer.optimizer.state_dict()})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='QlibTransformer 超参数搜索')
+
+    # 数据参数
+    parser.add_argument('--data', type=str,
+                        default='data/historical/BTCUSDT_1h_365d_okx.csv',
+                        help='数据文件路径')
+    parser.add_argument('--ic-threshold', type=float, default=0.03,
+                        help='因子筛选 IC 阈值')
+    parser.add_argument('--max-factor-corr', type=float, default=1.0,
+                        help='因子去相关阈值 (1.0 表示不去相关)')
+    parser.add_argument('--test-size', type=float, default=0.2,
+                        help='验证集比例')
+    parser.add_argument('--factor-cache', type=str, default='data/cache/factors',
+                        help='因子缓存目录')
+    parser.add_argument('--no-factor-cache', action='store_true',
+                        help='禁用因子缓存，每次重新计算')
+
+    # 搜索参数
+    parser.add_argument('--strategy', type=str, default='successive_halving',
+                        choices=['random', 'successive_halving'],
+                        help='搜索策略')
+    parser.add_argument('--trials', type=int, default=27,
+                        help='trial 数')
+    parser.add_argument('--max-epochs', type=int, default=27,
+                        help='每个 trial 最大训练轮数')
+    parser.add_argument('--min-epochs', type=int, default=3,
+                        help='剪枝前预热轮数 / 第一个 rung 的轮数')
+    parser.add_argument('--reduction-factor', type=int, default=3,
+                        help='successive halving 每个 rung 保留 1/N')
+    parser.add_argument('--min-ic', type=float, default=None,
+                        help='预热后 IC 低于该值直接剪枝')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='并行进程数 (默认 CPU 核数)')
+    parser.add_argument('--threads', type=int, default=1,
+                        help='每个进程的计算线程数')
+    parser.add_argument('--work-dir', type=str, default='data/hpo',
+                        help='共享特征与结果表目录')
+    parser.add_argument('--study', type=str, default='transformer',
+                        help='搜索名称')
+    parser.add_argument('--seed', type=int, default=42,
+                        help='随机种子')
+
+    # 固定训练参数
+    parser.add_argument('--batch-size', type=int, default=256,
+                        help='批次大小')
+    parser.add_argument('--weight-decay', type=float, default=1e-5,
+                        help='权重衰减')
+    parser.add_argument('--prefetch', type=int, default=2,
+                        help='预取批次数')
+    parser.add_argument('--eval-samples', type=int, default=20000,
+                        help='每个 epoch 验证抽样数')
+
+    args = parser.parse_args()
+
+    # 1. 特征和标签（只计算一次）
+    df = load_historical_data(args.data)
+    factor_store = None if args.no_factor_cache else FactorStore(args.factor_cache)
+    dataset_name = os.path.splitext(os.path.basename(args.data))[0]
+    features, labels = prepare_features_and_labels(
+        df, args.ic_threshold, factor_store, dataset_name, args.max_factor_corr
+    )
+    X_train, X_val, y_train, y_val = TimeSeriesSplitter().split(
+        features, labels, test_size=args.test_size, gap=1
+    )
+    logger.info(f"训练集: {len(y_train)} 样本, 验证集: {len(y_val)} 样本, 特征: {features.shape[1]}")
+
+    # 2. 搜索
+    space = {
+        **SEARCH_SPACE,
+        'batch_size': args.batch_size,
+        'weight_decay': args.weight_decay,
+        'prefetch': args.prefetch,
+        'eval_samples': args.eval_samples or None,
+    }
+    search = HyperparameterSearch(
+        transformer_objective, space,
+        strategy=args.strategy,
+        max_epochs=args.max_epochs,
+        min_epochs=args.min_epochs,
+        reduction_factor=args.reduction_factor,
+        n_jobs=args.jobs,
+        worker_threads=args.threads,
+        shared_data={
+            'X_train': X_train.to_numpy(dtype=np.float32),
+            'y_train': np.asarray(y_train, dtype=np.float32),
+            'X_val': X_val.to_numpy(dtype=np.float32),
+            'y_val': np.asarray(y_val, dtype=np.float32),
+        },
+        work_dir=args.work_dir,
+        study_name=args.study,
+        min_score=args.min_ic,
+        constraint=lambda p: p['d_model'] % p['nhead'] == 0,
+        seed=args.seed
+    )
+    best = search.run(n_trials=args.trials)
+
+    # 3. 结果
+    table = search.results_table()
+    logger.info("\n" + table.head(20).to_string(index=False))
+    logger.info(f"结果表: {search.results_path}")
+
+    if best is None:
+        logger.error("没有成功完成的 trial")
+        return
+
+    p = best.params
+    logger.info(f"\n最佳 trial {best.trial_id}: IC {best.score:.4f} ({best.epochs} epochs)")
+    logger.info("训练命令:")
+    logger.info(f"  python train_transformer_with_real_data.py --data {args.data} --cpu "
+                f"--seq-len {p['seq_len']} --d-model {p['d_model']} --nhead {p['nhead']} "
+                f"--num-layers {p['num_layers']} --dropout {p['dropout']:.3f} "
+                f"--learning-rate {p['learning_rate']:.2e} --batch-size {args.batch_size}")
+
+
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,7 @@ pub mod config;
 pub mod time;
 pub mod database;
 pub mod symbol;
+pub mod market_frame;
 
 pub use proto::{MarketData, Order, Trade, Metrics};
 pub use database::{Database, MarketDataBatchWriter};
@@ -0,0 +1,195 @@
+//! 定长二进制行情帧（与 Protobuf 行情并行发布）
+//!
+//! 帧布局（小端，40 字节）：
+//!
+//! | 偏移 | 类型 | 字段          |
+//! |------|------|---------------|
+//! | 0    | u16  | symbol_id     |
+//! | 2    | u16  | exchange_id   |
+//! | 4    | u32  | generation    |
+//! | 8    | f64  | last_price    |
+//! | 16   | f64  | volume        |
+//! | 24   | i64  | exchange_time |
+//! | 32   | i64  | local_time    |
+//!
+//! symbol_id / exchange_id 由发布端符号表分配（只追加）。符号表以 JSON 发布在
+//! `TABLE_TOPIC` 上：出现新符号时立即发布，之后每隔 `TABLE_INTERVAL` 重发，供晚加入的
+//! 订阅者获取。generation 标识发布端的符号表实例（进程重启后变化），订阅端按
+//! generation 解析 id，避免重启前后 id 错配。
+//!
+//! 对应 Python 解码：python/proto/fixed_frame.py
+
+use anyhow::{anyhow, Result};
+use serde::Serialize;
+use std::collections::HashMap;
+use std::time::{Duration, Instant};
+
+use crate::time::now_nanos;
+use crate::MarketData;
+
+/// 定长帧 topic 前缀：mdf.<symbol>.<exchange>
+pub const FRAME_TOPIC_PREFIX: &str = "mdf.";
+/// 符号表 topic
+pub const TABLE_TOPIC: &str = "mdf.$table";
+/// 帧长度（字节）
+pub const FRAME_SIZE: usize = 40;
+/// 符号表重发间隔
+pub const TABLE_INTERVAL: Duration = Duration::from_secs(1);
+
+/// 环境变量 MD_FIXED_FRAMES=1 时启用定长帧
+pub fn enabled_from_env() -> bool {
+    matches!(std::env::var("MD_FIXED_FRAMES").as_deref(), Ok("1") | Ok("true"))
+}
+
+#[derive(Serialize)]
+struct TableMessage<'a> {
+    generation: u32,
+    symbols: &'a [String],
+    exchanges: &'a [String],
+}
+
+/// 发布端符号表
+pub struct SymbolTable {
+    generation: u32,
+    symbols: Vec<String>,
+    exchanges: Vec<String>,
+    symbol_ids: HashMap<String, u16>,
+    exchange_ids: HashMap<String, u16>,
+    dirty: bool,
+    last_published: Option<Instant>,
+}
+
+impl SymbolTable {
+    pub fn new(generation: u32) -> Self {
+        Self {
+            generation,
+            symbols: Vec::new(),
+            exchanges: Vec::new(),
+            symbol_ids: HashMap::new(),
+            exchange_ids: HashMap::new(),
+            dirty: false,
+            last_published: None,
+        }
+    }
+
+    /// 以启动时间和进程号生成 generation
+    pub fn with_new_generation() -> Self {
+        let nanos = now_nanos() as u64;
+        Self::new(((nanos ^ (nanos >> 32)) as u32) ^ std::process::id())
+    }
+
+    pub fn generation(&self) -> u32 {
+        self.generation
+    }
+
+    /// 获取（必要时分配）交易对和交易所 id
+    pub fn intern(&mut self, symbol: &str, exchange: &str) -> Result<(u16, u16)> {
+        let (symbol_id, new_symbol) = intern_into(&mut self.symbols, &mut self.symbol_ids, symbol)?;
+        let (exchange_id, new_exchange) = intern_into(&mut self.exchanges, &mut self.exchange_ids, exchange)?;
+        self.dirty |= new_symbol || new_exchange;
+        Ok((symbol_id, exchange_id))
+    }
+
+    /// 是否需要（重新）发布符号表
+    pub fn table_due(&self, now: Instant) -> bool {
+        self.dirty
+            || self
+                .last_published
+                .map_or(true, |t| now.duration_since(t) >= TABLE_INTERVAL)
+    }
+
+    pub fn mark_published(&mut self, now: Instant) {
+        self.dirty = false;
+        self.last_published = Some(now);
+    }
+
+    /// 符号表消息（JSON）：{"generation": g, "symbols": [...], "exchanges": [...]}，下标即 id
+    pub fn table_message(&self) -> Result<Vec<u8>> {
+        Ok(serde_json::to_vec(&TableMessage {
+            generation: self.generation,
+            symbols: &self.symbols,
+            exchanges: &self.exchanges,
+        })?)
+    }
+}
+
+fn intern_into(names: &mut Vec<String>, ids: &mut HashMap<String, u16>, name: &str) -> Result<(u16, bool)> {
+    if let Some(&id) = ids.get(name) {
+        return Ok((id, false));
+    }
+    let id = u16::try_from(names.len()).map_err(|_| anyhow!("Symbol table full"))?;
+    names.push(name.to_string());
+    ids.insert(name.to_string(), id);
+    Ok((id, true))
+}
+
+/// 编码定长帧
+pub fn encode_frame(symbol_id: u16, exchange_id: u16, generation: u32, md: &MarketData) -> [u8; FRAME_SIZE] {
+    let mut buf = [0u8; FRAME_SIZE];
+    buf[0..2].copy_from_slice(&symbol_id.to_le_bytes());
+    buf[2..4].copy_from_slice(&exchange_id.to_le_bytes());
+    buf[4..8].copy_from_slice(&generation.to_le_bytes());
+    buf[8..16].copy_from_slice(&md.last_price.to_le_bytes());
+    buf[16..24].copy_from_slice(&md.volume.to_le_bytes());
+    buf[24..32].copy_from_slice(&md.exchange_time.to_le_bytes());
+    buf[32..40].copy_from_slice(&md.local_time.to_le_bytes());
+    buf
+}
+
+/// 定长帧 topic
+pub fn frame_topic(md: &MarketData) -> String {
+    format!("{}{}.{}", FRAME_TOPIC_PREFIX, md.symbol, md.exchange)
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    fn md(symbol: &str) -> MarketData {
+        MarketData {
+            symbol: symbol.to_string(),
+            last_price: 50000.5,
+            volume: 1.25,
+            exchange_time: 1_760_000_000_000_000_000,
+            local_time: -1,
+            exchange: "okx".to_string(),
+        }
+    }
+
+    #[test]
+    fn test_intern() {
+        let mut table = SymbolTable::new(7);
+        assert_eq!(table.intern("BTCUSDT", "okx").unwrap(), (0, 0));
+        assert_eq!(table.intern("ETHUSDT", "okx").unwrap(), (1, 0));
+        assert_eq!(table.intern("BTCUSDT", "binance").unwrap(), (0, 1));
+        assert!(table.table_due(Instant::now()));
+
+        let now = Instant::now();
+        table.mark_published(now);
+        assert!(!table.table_due(now));
+        table.intern("BTCUSDT", "okx").unwrap();
+        assert!(!table.table_due(now));
+        table.intern("SOLUSDT", "okx").unwrap();
+        assert!(table.table_due(now));
+        assert!(table.table_due(now + TABLE_INTERVAL));
+
+        let json: serde_json::Value = serde_json::from_slice(&table.table_message().unwrap()).unwrap();
+        assert_eq!(json["generation"], 7);
+        assert_eq!(json["symbols"][2], "SOLUSDT");
+        assert_eq!(json["exchanges"][1], "binance");
+    }
+
+    #[test]
+    fn test_encode_frame() {
+        let frame = encode_frame(3, 1, 0xDEADBEEF, &md("BTCUSDT"));
+        assert_eq!(frame.len(), FRAME_SIZE);
+        assert_eq!(u16::from_le_bytes([frame[0], frame[1]]), 3);
+        assert_eq!(u16::from_le_bytes([frame[2], frame[3]]), 1);
+        assert_eq!(u32::from_le_bytes(frame[4..8].try_into().unwrap()), 0xDEADBEEF);
+        assert_eq!(f64::from_le_bytes(frame[8..16].try_into().unwrap()), 50000.5);
+        assert_eq!(f64::from_le_bytes(frame[16..24].try_into().unwrap()), 1.25);
+        assert_eq!(i64::from_le_bytes(frame[24..32].try_into().unwrap()), 1_760_000_000_000_000_000);
+        assert_eq!(i64::from_le_bytes(frame[32..40].try_into().unwrap()), -1);
+        assert_eq!(frame_topic(&md("BTCUSDT")), "mdf.BTCUSDT.okx");
+    }
+}
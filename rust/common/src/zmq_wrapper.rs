@@ -1,10 +1,16 @@
-use anyhow::Result;
+use anyhow::{anyhow, Result};
 use prost::Message;
-use std::time::Duration;
+use std::sync::Mutex;
+use std::time::{Duration, Instant};
+
+use crate::market_frame::{self, SymbolTable};
+use crate::MarketData;
 
 /// ZeroMQ Publisher 封装
 pub struct ZmqPublisher {
     socket: zmq::Socket,
+    // 定长行情帧符号表（未启用时为 None）
+    frames: Option<Mutex<SymbolTable>>,
 }
 
 impl ZmqPublisher {
@@ -16,7 +22,12 @@ impl ZmqPublisher {
         // 性能优化配置
         socket.set_sndhwm(1000)?;
 
-        Ok(Self { socket })
+        Ok(Self { socket, frames: None })
+    }
+
+    /// 启用定长行情帧（send_fixed 生效）
+    pub fn enable_fixed_frames(&mut self) {
+        self.frames = Some(Mutex::new(SymbolTable::with_new_generation()));
     }
 
     /// 发送消息（Topic + Protobuf Data）
@@ -27,6 +38,30 @@ impl ZmqPublisher {
         self.socket.send_multipart(&[topic.as_bytes(), &buf], 0)?;
         Ok(())
     }
+
+    /// 发送原始字节（Topic + Data）
+    pub fn send_raw(&self, topic: &str, data: &[u8]) -> Result<()> {
+        self.socket.send_multipart(&[topic.as_bytes(), data], 0)?;
+        Ok(())
+    }
+
+    /// 在 mdf.<symbol>.<exchange> 上发布定长行情帧（未启用时不发送），需要时先发布符号表
+    pub fn send_fixed(&self, md: &MarketData) -> Result<()> {
+        let Some(frames) = &self.frames else {
+            return Ok(());
+        };
+        let frame = {
+            let mut table = frames.lock().map_err(|_| anyhow!("Symbol table lock poisoned"))?;
+            let (symbol_id, exchange_id) = table.intern(&md.symbol, &md.exchange)?;
+            let now = Instant::now();
+            if table.table_due(now) {
+                self.send_raw(market_frame::TABLE_TOPIC, &table.table_message()?)?;
+                table.mark_published(now);
+            }
+            market_frame::encode_frame(symbol_id, exchange_id, table.generation(), md)
+        };
+        self.send_raw(&market_frame::frame_topic(md), &frame)
+    }
 }
 
 /// ZeroMQ Subscriber 封装
@@ -133,6 +133,8 @@ impl BinanceExchange {
             error_message: String::new(),
             is_retryable: false,
             commission,
+            seq: 0,
+            gateway_id: String::new(),
         })
     }
 
@@ -160,6 +162,8 @@ impl BinanceExchange {
             error_message: String::new(),
             is_retryable: false,
             commission,
+            seq: 0,
+            gateway_id: String::new(),
         }
     }
 }
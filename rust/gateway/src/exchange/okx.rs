@@ -159,6 +159,8 @@ impl OkxExchange {
             error_message: String::new(),
             is_retryable: false,
             commission,
+            seq: 0,
+            gateway_id: String::new(),
         })
     }
 
@@ -186,6 +188,8 @@ impl OkxExchange {
             error_message: String::new(),
             is_retryable: false,
             commission,
+            seq: 0,
+            gateway_id: String::new(),
         }
     }
 }
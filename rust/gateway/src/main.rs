@@ -6,6 +6,7 @@ mod risk;
 mod exchange;
 mod order_manager;
 mod metrics;
+mod trade_journal;
 
 use risk::RiskManager;
 use exchange::ExchangeRouter;
@@ -32,10 +33,17 @@ async fn main() -> Result<()> {
         .parse()
         .unwrap_or(8080);
     let db_uri = std::env::var("DB_URI").ok();
+    let zmq_replay_endpoint = std::env::var("ZMQ_REPLAY_ENDPOINT")
+        .unwrap_or_else(|_| "tcp://*:5561".to_string());
+    let trade_journal_size: usize = std::env::var("TRADE_JOURNAL_SIZE")
+        .ok()
+        .and_then(|v| v.parse().ok())
+        .unwrap_or(trade_journal::DEFAULT_JOURNAL_CAPACITY);
 
     info!("Exchange: {}", exchange);
     info!("ZMQ PULL endpoint: {}", zmq_pull_endpoint);
     info!("ZMQ PUB endpoint: {}", zmq_pub_endpoint);
+    info!("ZMQ trade replay endpoint: {}", zmq_replay_endpoint);
     info!("Metrics port: {}", metrics_port);
 
     // Start metrics HTTP server (in background)
@@ -53,7 +61,8 @@ async fn main() -> Result<()> {
         &zmq_pub_endpoint,
         risk_manager,
         exchange_router,
-    )?;
+    )?
+    .with_trade_replay(&zmq_replay_endpoint, trade_journal_size)?;
 
     // Initialize database connection if URI is provided
     if let Some(uri) = db_uri {
@@ -1,7 +1,7 @@
-use anyhow::Result;
-use prost::Message;
+use anyhow::{anyhow, Result};
 use tracing::{info, warn, error};
 use chrono::Utc;
+use std::sync::{Arc, Mutex};
 
 use ttquant_common::proto::{Order, Trade};
 use ttquant_common::zmq_wrapper::{ZmqPuller, ZmqPublisher};
@@ -9,6 +9,7 @@ use ttquant_common::Database;
 
 use super::risk::RiskManager;
 use super::exchange::ExchangeRouter;
+use super::trade_journal::{self, TradeJournal, DEFAULT_JOURNAL_CAPACITY};
 
 pub struct OrderManager {
     puller: ZmqPuller,
@@ -17,6 +18,7 @@ pub struct OrderManager {
     exchange_router: ExchangeRouter,
     order_count: u64,
     db: Option<Database>,
+    journal: Arc<Mutex<TradeJournal>>,
 }
 
 impl OrderManager {
@@ -33,6 +35,11 @@ impl OrderManager {
         info!("Listening for orders on: {}", pull_endpoint);
         info!("Publishing trades on: {}", pub_endpoint);
 
+        // 网关会话 ID：重启后变化，策略引擎据此区分序号
+        let gateway_id = format!("{}-{}", exchange_router.exchange_name(), Utc::now().timestamp_millis());
+        info!("Gateway session: {}", gateway_id);
+        let journal = Arc::new(Mutex::new(TradeJournal::new(gateway_id, DEFAULT_JOURNAL_CAPACITY)));
+
         Ok(Self {
             puller,
             publisher,
@@ -40,6 +47,7 @@ impl OrderManager {
             exchange_router,
             order_count: 0,
             db: None,
+            journal,
         })
     }
 
@@ -50,6 +58,17 @@ impl OrderManager {
         self
     }
 
+    /// 启动成交回放服务（每个交易对保存最近 capacity 条成交）
+    pub fn with_trade_replay(self, endpoint: &str, capacity: usize) -> Result<Self> {
+        {
+            let mut journal = self.journal.lock().map_err(|_| anyhow!("Trade journal lock poisoned"))?;
+            let gateway_id = journal.gateway_id().to_string();
+            *journal = TradeJournal::new(gateway_id, capacity);
+        }
+        trade_journal::spawn_replay_server(endpoint, Arc::clone(&self.journal))?;
+        Ok(self)
+    }
+
     pub async fn run(&mut self) -> Result<()> {
         loop {
             // Receive order from strategy
@@ -75,7 +94,13 @@ impl OrderManager {
                     }
 
                     // Process order
-                    let trade = self.process_order(&order).await;
+                    let mut trade = self.process_order(&order).await;
+
+                    // 分配成交序号并保存到回放日志
+                    let payload = match self.journal.lock() {
+                        Ok(mut journal) => journal.record(&mut trade),
+                        Err(_) => Err(anyhow!("Trade journal lock poisoned")),
+                    };
 
                     // 写入成交记录到数据库
                     if let Some(ref db) = self.db {
@@ -86,7 +111,11 @@ impl OrderManager {
 
                     // Publish trade result
                     let topic = format!("trade.{}.{}", order.symbol, self.exchange_router.exchange_name());
-                    if let Err(e) = self.publisher.send(&topic, &trade) {
+                    let published = match payload {
+                        Ok(payload) => self.publisher.send_raw(&topic, &payload),
+                        Err(e) => Err(e),
+                    };
+                    if let Err(e) = published {
                         error!("Failed to publish trade: {}", e);
                     }
 
@@ -174,6 +203,9 @@ impl OrderManager {
             error_message: error_message.to_string(),
             is_retryable,
             commission: 0.0,
+            // seq / gateway_id 在发布前由 TradeJournal 填写
+            seq: 0,
+            gateway_id: String::new(),
         }
     }
 
@@ -0,0 +1,216 @@
+//! 成交回报序号与回放
+//!
+//! 每条发布的成交回报按交易对分配连续序号（seq，从 1 开始），并带上网关会话 ID
+//! （gateway_id，网关重启后变化）。最近 capacity 条编码后的成交按交易对保存在内存中，
+//! 回放服务（ZMQ REP）按 {gateway_id, symbol, from_seq, to_seq} 补发，
+//! 策略引擎据此修复 PUB/SUB 在高水位时静默丢弃的成交回报。
+//!
+//! 回放请求为 JSON，应答为多帧消息：[JSON 头, 成交 1, 成交 2, ...]，
+//! 成交帧与 trade.<symbol>.<exchange> 上发布的 Protobuf 消息字节一致。
+
+use anyhow::{anyhow, Result};
+use prost::Message;
+use serde::{Deserialize, Serialize};
+use std::collections::{HashMap, VecDeque};
+use std::sync::{Arc, Mutex};
+use tracing::{info, warn, error};
+
+use ttquant_common::proto::Trade;
+
+/// 每个交易对默认保存的成交条数
+pub const DEFAULT_JOURNAL_CAPACITY: usize = 10000;
+
+struct Stream {
+    next_seq: u64,
+    trades: VecDeque<(u64, Vec<u8>)>,
+}
+
+/// 按交易对保存最近发布的成交回报
+pub struct TradeJournal {
+    gateway_id: String,
+    capacity: usize,
+    streams: HashMap<String, Stream>,
+}
+
+/// 回放请求
+#[derive(Debug, Deserialize)]
+pub struct ReplayRequest {
+    pub gateway_id: String,
+    pub symbol: String,
+    pub from_seq: u64,
+    pub to_seq: u64,
+}
+
+/// 回放应答头（first_seq / last_seq 为该交易对仍可回放的序号范围，0 表示没有）
+#[derive(Debug, Serialize)]
+pub struct ReplayHeader {
+    pub gateway_id: String,
+    pub first_seq: u64,
+    pub last_seq: u64,
+    pub count: usize,
+    #[serde(skip_serializing_if = "Option::is_none")]
+    pub error: Option<String>,
+}
+
+impl TradeJournal {
+    pub fn new(gateway_id: String, capacity: usize) -> Self {
+        Self {
+            gateway_id,
+            capacity: capacity.max(1),
+            streams: HashMap::new(),
+        }
+    }
+
+    pub fn gateway_id(&self) -> &str {
+        &self.gateway_id
+    }
+
+    /// 分配序号和网关会话 ID，编码并保存，返回用于发布的消息字节
+    pub fn record(&mut self, trade: &mut Trade) -> Result<Vec<u8>> {
+        let stream = self.streams.entry(trade.symbol.clone()).or_insert_with(|| Stream {
+            next_seq: 1,
+            trades: VecDeque::new(),
+        });
+        trade.seq = stream.next_seq;
+        trade.gateway_id = self.gateway_id.clone();
+        stream.next_seq += 1;
+
+        let mut buf = Vec::with_capacity(trade.encoded_len());
+        trade.encode(&mut buf)?;
+        stream.trades.push_back((trade.seq, buf.clone()));
+        if stream.trades.len() > self.capacity {
+            stream.trades.pop_front();
+        }
+        Ok(buf)
+    }
+
+    /// 取出 [from_seq, to_seq] 中仍保存的成交（会话 ID 不符时不返回成交）
+    pub fn replay(&self, request: &ReplayRequest) -> (ReplayHeader, Vec<Vec<u8>>) {
+        let stream = self.streams.get(&request.symbol);
+        let (first_seq, last_seq) = stream
+            .and_then(|s| Some((s.trades.front()?.0, s.trades.back()?.0)))
+            .unwrap_or((0, 0));
+
+        let mut header = ReplayHeader {
+            gateway_id: self.gateway_id.clone(),
+            first_seq,
+            last_seq,
+            count: 0,
+            error: None,
+        };
+        if request.gateway_id != self.gateway_id {
+            header.error = Some("gateway session changed".to_string());
+            return (header, Vec::new());
+        }
+
+        let trades: Vec<Vec<u8>> = stream
+            .map(|s| {
+                s.trades
+                    .iter()
+                    .filter(|(seq, _)| *seq >= request.from_seq && *seq <= request.to_seq)
+                    .map(|(_, data)| data.clone())
+                    .collect()
+            })
+            .unwrap_or_default();
+        header.count = trades.len();
+        (header, trades)
+    }
+}
+
+/// 在后台线程中运行回放服务（REP），绑定失败时返回错误
+pub fn spawn_replay_server(endpoint: &str, journal: Arc<Mutex<TradeJournal>>) -> Result<std::thread::JoinHandle<()>> {
+    let context = zmq::Context::new();
+    let socket = context.socket(zmq::REP)?;
+    socket.bind(endpoint)?;
+    info!("Trade replay server listening on: {}", endpoint);
+
+    let handle = std::thread::Builder::new()
+        .name("trade-replay".to_string())
+        .spawn(move || {
+            // context 随线程保留
+            let _context = context;
+            loop {
+                let request = match socket.recv_bytes(0) {
+                    Ok(request) => request,
+                    Err(e) => {
+                        error!("Trade replay receive failed: {}", e);
+                        continue;
+                    }
+                };
+
+                let reply = match handle_request(&request, &journal) {
+                    Ok(reply) => reply,
+                    Err(e) => {
+                        warn!("Invalid trade replay request: {}", e);
+                        let header = serde_json::json!({ "error": e.to_string() });
+                        vec![header.to_string().into_bytes()]
+                    }
+                };
+                if let Err(e) = socket.send_multipart(reply, 0) {
+                    error!("Trade replay send failed: {}", e);
+                }
+            }
+        })?;
+    Ok(handle)
+}
+
+fn handle_request(request: &[u8], journal: &Arc<Mutex<TradeJournal>>) -> Result<Vec<Vec<u8>>> {
+    let request: ReplayRequest = serde_json::from_slice(request)?;
+    let (header, trades) = {
+        let journal = journal.lock().map_err(|_| anyhow!("Trade journal lock poisoned"))?;
+        journal.replay(&request)
+    };
+    info!(
+        "Trade replay {} seq {}-{}: {} trades",
+        request.symbol, request.from_seq, request.to_seq, header.count
+    );
+
+    let mut reply = Vec::with_capacity(trades.len() + 1);
+    reply.push(serde_json::to_vec(&header)?);
+    reply.extend(trades);
+    Ok(reply)
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    fn trade(symbol: &str, id: &str) -> Trade {
+        Trade {
+            trade_id: id.to_string(),
+            symbol: symbol.to_string(),
+            status: "FILLED".to_string(),
+            ..Default::default()
+        }
+    }
+
+    #[test]
+    fn test_sequence_per_symbol() {
+        let mut journal = TradeJournal::new("okx-1".to_string(), 3);
+        for i in 0..5 {
+            let mut t = trade("BTCUSDT", &format!("T{}", i));
+            journal.record(&mut t).unwrap();
+            assert_eq!(t.seq, i + 1);
+            assert_eq!(t.gateway_id, "okx-1");
+        }
+        let mut eth = trade("ETHUSDT", "E1");
+        journal.record(&mut eth).unwrap();
+        assert_eq!(eth.seq, 1);
+
+        let request = ReplayRequest {
+            gateway_id: "okx-1".to_string(),
+            symbol: "BTCUSDT".to_string(),
+            from_seq: 1,
+            to_seq: 4,
+        };
+        let (header, trades) = journal.replay(&request);
+        // 只保存最近 3 条
+        assert_eq!((header.first_seq, header.last_seq, header.count), (3, 5, 2));
+        let seqs: Vec<u64> = trades.iter().map(|t| Trade::decode(&t[..]).unwrap().seq).collect();
+        assert_eq!(seqs, vec![3, 4]);
+
+        let stale = ReplayRequest { gateway_id: "okx-0".to_string(), ..request };
+        let (header, trades) = journal.replay(&stale);
+        assert!(header.error.is_some() && trades.is_empty());
+    }
+}
@@ -4,7 +4,7 @@ use serde_json::Value;
 use tokio::time::{Duration, interval};
 use tokio_tungstenite::{connect_async, tungstenite::Message};
 use tracing::{info, warn, error};
-use ttquant_common::{MarketData, zmq_wrapper::ZmqPublisher, time::now_nanos, Database, MarketDataBatchWriter};
+use ttquant_common::{MarketData, market_frame, zmq_wrapper::ZmqPublisher, time::now_nanos, Database, MarketDataBatchWriter};
 use bumpalo::Bump;
 
 const BINANCE_WS_URL: &str = "wss://stream.binance.com:9443/ws";
@@ -13,7 +13,12 @@ pub async fn run(zmq_endpoint: &str, db_uri: Option<&str>) -> Result<()> {
     info!("Starting Binance market data service");
 
     // 创建 ZMQ Publisher
-    let publisher = ZmqPublisher::new(zmq_endpoint)?;
+    let mut publisher = ZmqPublisher::new(zmq_endpoint)?;
+    if market_frame::enabled_from_env() {
+        // 定长行情帧与 Protobuf 行情并行发布（mdf.<symbol>.<exchange>）
+        publisher.enable_fixed_frames();
+        info!("Fixed-layout market data frames enabled");
+    }
 
     // 创建数据库连接（如果提供了 URI）
     let db_writer = if let Some(uri) = db_uri {
@@ -186,6 +191,7 @@ async fn handle_message(
             // 发布到 ZMQ
             let topic = format!("md.{}.binance", symbol);
             publisher.send(&topic, &md)?;
+            publisher.send_fixed(&md)?;
 
             // 异步写入数据库（不阻塞行情发布）
             if let Some(writer) = db_writer {
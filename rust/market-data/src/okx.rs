@@ -6,7 +6,7 @@ use tokio::net::TcpStream;
 use tokio_tungstenite::{connect_async, tungstenite::Message, MaybeTlsStream, WebSocketStream};
 use tokio_socks::tcp::Socks5Stream;
 use tracing::{info, warn, error};
-use ttquant_common::{MarketData, zmq_wrapper::ZmqPublisher, time::now_nanos, Database, MarketDataBatchWriter};
+use ttquant_common::{MarketData, market_frame, zmq_wrapper::ZmqPublisher, time::now_nanos, Database, MarketDataBatchWriter};
 use bumpalo::Bump;
 use url::Url;
 
@@ -16,7 +16,12 @@ pub async fn run(zmq_endpoint: &str, db_uri: Option<&str>) -> Result<()> {
     info!("Starting OKX market data service");
 
     // 创建 ZMQ Publisher
-    let publisher = ZmqPublisher::new(zmq_endpoint)?;
+    let mut publisher = ZmqPublisher::new(zmq_endpoint)?;
+    if market_frame::enabled_from_env() {
+        // 定长行情帧与 Protobuf 行情并行发布（mdf.<symbol>.<exchange>）
+        publisher.enable_fixed_frames();
+        info!("Fixed-layout market data frames enabled");
+    }
 
     // 创建数据库连接（如果提供了 URI）
     let db_writer = if let Some(uri) = db_uri {
@@ -245,6 +250,7 @@ async fn process_trade_data(
     // 发布到 ZMQ
     let topic = format!("md.{}.okx", normalized_symbol);
     publisher.send(&topic, &md)?;
+    publisher.send_fixed(&md)?;
 
     // 异步写入数据库（不阻塞行情发布）
     if let Some(writer) = db_writer {